@@ -0,0 +1,60 @@
+"""add notification_unread_counters table and notifications feed index
+
+Revision ID: a1c2e3f4b5d6
+Revises: f0a1b2c3d4e5
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+import sqlalchemy as sa
+from sqlalchemy import inspect
+from alembic import op
+
+
+revision: str = 'a1c2e3f4b5d6'
+down_revision: Union[str, None] = 'f0a1b2c3d4e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = inspect(op.get_bind())
+    existing_indexes = [ix['name'] for ix in inspector.get_indexes('notifications')]
+    if 'ix_notifications_user_created_id' not in existing_indexes:
+        op.create_index(
+            'ix_notifications_user_created_id', 'notifications',
+            ['user_id', 'created_at', 'id'], unique=False,
+        )
+
+    if not inspector.has_table('notification_unread_counters'):
+        op.create_table(
+            'notification_unread_counters',
+            sa.Column('id', sa.String(length=36), primary_key=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.Column('user_id', sa.String(length=36), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+        )
+        op.create_index(
+            'ix_notification_unread_counters_user_id', 'notification_unread_counters', ['user_id'], unique=True,
+        )
+        # Mavjud o'qilmagan bildirishnomalardan boshlang'ich qiymatlar
+        op.execute(
+            """
+            INSERT INTO notification_unread_counters (id, user_id, count)
+            SELECT MIN(id), user_id, COUNT(*)
+            FROM notifications
+            WHERE is_read = false AND user_id IS NOT NULL
+            GROUP BY user_id
+            """
+        )
+
+
+def downgrade() -> None:
+    inspector = inspect(op.get_bind())
+    if inspector.has_table('notification_unread_counters'):
+        op.drop_index('ix_notification_unread_counters_user_id', table_name='notification_unread_counters')
+        op.drop_table('notification_unread_counters')
+    existing_indexes = [ix['name'] for ix in inspector.get_indexes('notifications')]
+    if 'ix_notifications_user_created_id' in existing_indexes:
+        op.drop_index('ix_notifications_user_created_id', table_name='notifications')
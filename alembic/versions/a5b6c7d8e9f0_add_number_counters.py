@@ -0,0 +1,38 @@
+"""add number_counters table
+
+Revision ID: a5b6c7d8e9f0
+Revises: f4a5b6c7d8e9
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+import sqlalchemy as sa
+from sqlalchemy import inspect
+from alembic import op
+
+
+revision: str = 'a5b6c7d8e9f0'
+down_revision: Union[str, None] = 'f4a5b6c7d8e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = inspect(op.get_bind())
+    if not inspector.has_table('number_counters'):
+        op.create_table(
+            'number_counters',
+            sa.Column('id', sa.String(length=36), primary_key=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.Column('key', sa.String(length=50), nullable=False),
+            sa.Column('next_value', sa.BigInteger(), nullable=False),
+        )
+        op.create_index('ix_number_counters_key', 'number_counters', ['key'], unique=True)
+
+
+def downgrade() -> None:
+    inspector = inspect(op.get_bind())
+    if inspector.has_table('number_counters'):
+        op.drop_index('ix_number_counters_key', table_name='number_counters')
+        op.drop_table('number_counters')
@@ -0,0 +1,52 @@
+"""add schedules.repeat_until and schedule_exceptions table
+
+Revision ID: b6c7d8e9f0a1
+Revises: a5b6c7d8e9f0
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+import sqlalchemy as sa
+from sqlalchemy import inspect
+from alembic import op
+
+
+revision: str = 'b6c7d8e9f0a1'
+down_revision: Union[str, None] = 'a5b6c7d8e9f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = inspect(op.get_bind())
+    columns = [col['name'] for col in inspector.get_columns('schedules')]
+    if 'repeat_until' not in columns:
+        op.add_column('schedules', sa.Column('repeat_until', sa.Date(), nullable=True))
+
+    if not inspector.has_table('schedule_exceptions'):
+        op.create_table(
+            'schedule_exceptions',
+            sa.Column('id', sa.String(length=36), primary_key=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.Column('schedule_id', sa.String(length=36), sa.ForeignKey('schedules.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('date', sa.Date(), nullable=False),
+            sa.Column('is_cancelled', sa.Boolean(), nullable=False, server_default=sa.false()),
+            sa.Column('start_time', sa.Time(), nullable=True),
+            sa.Column('end_time', sa.Time(), nullable=True),
+            sa.Column('whole_day', sa.Boolean(), nullable=True),
+            sa.Column('employee_list', sa.JSON(), nullable=True),
+            sa.Column('price', sa.DECIMAL(10, 2), nullable=True),
+            sa.UniqueConstraint('schedule_id', 'date', name='uq_schedule_exception_date'),
+        )
+        op.create_index('ix_schedule_exceptions_schedule_id', 'schedule_exceptions', ['schedule_id'], unique=False)
+
+
+def downgrade() -> None:
+    inspector = inspect(op.get_bind())
+    if inspector.has_table('schedule_exceptions'):
+        op.drop_index('ix_schedule_exceptions_schedule_id', table_name='schedule_exceptions')
+        op.drop_table('schedule_exceptions')
+    columns = [col['name'] for col in inspector.get_columns('schedules')]
+    if 'repeat_until' in columns:
+        op.drop_column('schedules', 'repeat_until')
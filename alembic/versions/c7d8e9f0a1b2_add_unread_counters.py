@@ -0,0 +1,76 @@
+"""add chat_unread_counters and unread_totals tables
+
+Revision ID: c7d8e9f0a1b2
+Revises: b6c7d8e9f0a1
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+import sqlalchemy as sa
+from sqlalchemy import inspect
+from alembic import op
+
+
+revision: str = 'c7d8e9f0a1b2'
+down_revision: Union[str, None] = 'b6c7d8e9f0a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = inspect(op.get_bind())
+    if not inspector.has_table('chat_unread_counters'):
+        op.create_table(
+            'chat_unread_counters',
+            sa.Column('id', sa.String(length=36), primary_key=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.Column('user_chat_id', sa.String(length=36), sa.ForeignKey('user_chats.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('receiver_id', sa.String(length=36), nullable=False),
+            sa.Column('receiver_type', sa.String(length=20), nullable=False),
+            sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+            sa.UniqueConstraint('user_chat_id', 'receiver_id', name='uq_chat_unread_receiver'),
+        )
+        op.create_index('ix_chat_unread_counters_user_chat_id', 'chat_unread_counters', ['user_chat_id'], unique=False)
+        op.create_index('ix_chat_unread_counters_receiver_id', 'chat_unread_counters', ['receiver_id'], unique=False)
+        # Mavjud o'qilmagan xabarlardan boshlang'ich qiymatlar
+        op.execute(
+            """
+            INSERT INTO chat_unread_counters (id, user_chat_id, receiver_id, receiver_type, count)
+            SELECT MIN(id), user_chat_id, receiver_id, MIN(receiver_type), COUNT(*)
+            FROM messages
+            WHERE is_read = false
+            GROUP BY user_chat_id, receiver_id
+            """
+        )
+
+    if not inspector.has_table('unread_totals'):
+        op.create_table(
+            'unread_totals',
+            sa.Column('id', sa.String(length=36), primary_key=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.Column('receiver_id', sa.String(length=36), nullable=False),
+            sa.Column('receiver_type', sa.String(length=20), nullable=False),
+            sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+        )
+        op.create_index('ix_unread_totals_receiver_id', 'unread_totals', ['receiver_id'], unique=True)
+        op.execute(
+            """
+            INSERT INTO unread_totals (id, receiver_id, receiver_type, count)
+            SELECT MIN(id), receiver_id, MIN(receiver_type), SUM(count)
+            FROM chat_unread_counters
+            GROUP BY receiver_id
+            """
+        )
+
+
+def downgrade() -> None:
+    inspector = inspect(op.get_bind())
+    if inspector.has_table('unread_totals'):
+        op.drop_index('ix_unread_totals_receiver_id', table_name='unread_totals')
+        op.drop_table('unread_totals')
+    if inspector.has_table('chat_unread_counters'):
+        op.drop_index('ix_chat_unread_counters_receiver_id', table_name='chat_unread_counters')
+        op.drop_index('ix_chat_unread_counters_user_chat_id', table_name='chat_unread_counters')
+        op.drop_table('chat_unread_counters')
@@ -0,0 +1,48 @@
+"""add (user_chat_id, created_at, id) index to messages and user_chats.message_count
+
+Revision ID: d8e9f0a1b2c3
+Revises: c7d8e9f0a1b2
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+import sqlalchemy as sa
+from sqlalchemy import inspect
+from alembic import op
+
+
+revision: str = 'd8e9f0a1b2c3'
+down_revision: Union[str, None] = 'c7d8e9f0a1b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = inspect(op.get_bind())
+    existing_indexes = [ix['name'] for ix in inspector.get_indexes('messages')]
+    # Tarix sahifalari (created_at, id) cursor bo'yicha o'qiladi
+    if 'ix_messages_chat_created_id' not in existing_indexes:
+        op.create_index('ix_messages_chat_created_id', 'messages', ['user_chat_id', 'created_at', 'id'], unique=False)
+
+    existing_columns = [col['name'] for col in inspector.get_columns('user_chats')]
+    if 'message_count' not in existing_columns:
+        op.add_column('user_chats', sa.Column('message_count', sa.Integer(), nullable=False, server_default='0'))
+        # Tarixdagi "total" uchun COUNT(*) o'rniga
+        op.execute(
+            """
+            UPDATE user_chats
+            SET message_count = (
+                SELECT COUNT(*) FROM messages WHERE messages.user_chat_id = user_chats.id
+            )
+            """
+        )
+
+
+def downgrade() -> None:
+    inspector = inspect(op.get_bind())
+    existing_columns = [col['name'] for col in inspector.get_columns('user_chats')]
+    if 'message_count' in existing_columns:
+        op.drop_column('user_chats', 'message_count')
+    existing_indexes = [ix['name'] for ix in inspector.get_indexes('messages')]
+    if 'ix_messages_chat_created_id' in existing_indexes:
+        op.drop_index('ix_messages_chat_created_id', table_name='messages')
@@ -0,0 +1,31 @@
+"""add (salon_id, date) index to schedules
+
+Revision ID: e3f4a5b6c7d8
+Revises: c1d2e3f4a5b6
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+from sqlalchemy import inspect
+from alembic import op
+
+
+revision: str = 'e3f4a5b6c7d8'
+down_revision: Union[str, None] = 'c1d2e3f4a5b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = inspect(op.get_bind())
+    existing_indexes = [ix['name'] for ix in inspector.get_indexes('schedules')]
+    # Slot hisoblash faqat bitta salonning shu kundagi jadvallarini o'qiydi
+    if 'ix_schedules_salon_date' not in existing_indexes:
+        op.create_index('ix_schedules_salon_date', 'schedules', ['salon_id', 'date'], unique=False)
+
+
+def downgrade() -> None:
+    inspector = inspect(op.get_bind())
+    existing_indexes = [ix['name'] for ix in inspector.get_indexes('schedules')]
+    if 'ix_schedules_salon_date' in existing_indexes:
+        op.drop_index('ix_schedules_salon_date', table_name='schedules')
@@ -0,0 +1,43 @@
+"""add user_chats.last_message_id for WebSocket resume
+
+Revision ID: e9f0a1b2c3d4
+Revises: d8e9f0a1b2c3
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+import sqlalchemy as sa
+from sqlalchemy import inspect
+from alembic import op
+
+
+revision: str = 'e9f0a1b2c3d4'
+down_revision: Union[str, None] = 'd8e9f0a1b2c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = inspect(op.get_bind())
+    existing_columns = [col['name'] for col in inspector.get_columns('user_chats')]
+    if 'last_message_id' not in existing_columns:
+        op.add_column('user_chats', sa.Column('last_message_id', sa.String(length=36), nullable=True))
+        # Qayta ulanishda ?since= shu id bilan solishtiriladi
+        op.execute(
+            """
+            UPDATE user_chats
+            SET last_message_id = (
+                SELECT messages.id FROM messages
+                WHERE messages.user_chat_id = user_chats.id
+                ORDER BY messages.created_at DESC, messages.id DESC
+                LIMIT 1
+            )
+            """
+        )
+
+
+def downgrade() -> None:
+    inspector = inspect(op.get_bind())
+    existing_columns = [col['name'] for col in inspector.get_columns('user_chats')]
+    if 'last_message_id' in existing_columns:
+        op.drop_column('user_chats', 'last_message_id')
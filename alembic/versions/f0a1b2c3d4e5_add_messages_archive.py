@@ -0,0 +1,63 @@
+"""add messages_archive table and user_chats.archived_until
+
+Revision ID: f0a1b2c3d4e5
+Revises: e9f0a1b2c3d4
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+import sqlalchemy as sa
+from sqlalchemy import inspect
+from alembic import op
+
+
+revision: str = 'f0a1b2c3d4e5'
+down_revision: Union[str, None] = 'e9f0a1b2c3d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = inspect(op.get_bind())
+    # Faqat sxema: mavjud xabarlar uzoq lock'siz, batch bilan ko'chiriladi
+    # (python -m app.services.message_archive yoki oylik scheduler job)
+    if not inspector.has_table('messages_archive'):
+        op.create_table(
+            'messages_archive',
+            sa.Column('id', sa.String(length=36), primary_key=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.Column('user_chat_id', sa.String(length=36), sa.ForeignKey('user_chats.id'), nullable=False),
+            sa.Column('sender_id', sa.String(length=36), nullable=False),
+            sa.Column('sender_type', sa.String(length=20), nullable=False),
+            sa.Column('receiver_id', sa.String(length=36), nullable=False),
+            sa.Column('receiver_type', sa.String(length=20), nullable=False),
+            sa.Column('message_text', sa.Text(), nullable=True),
+            sa.Column('message_type', sa.String(length=20), nullable=True),
+            sa.Column('file_url', sa.String(length=255), nullable=True),
+            sa.Column('is_read', sa.Boolean(), nullable=True),
+        )
+        op.create_index(
+            'ix_messages_archive_chat_created_id', 'messages_archive',
+            ['user_chat_id', 'created_at', 'id'], unique=False,
+        )
+
+    existing_columns = [col['name'] for col in inspector.get_columns('user_chats')]
+    if 'archived_until' not in existing_columns:
+        op.add_column('user_chats', sa.Column('archived_until', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    inspector = inspect(op.get_bind())
+    existing_columns = [col['name'] for col in inspector.get_columns('user_chats')]
+    if 'archived_until' in existing_columns:
+        op.drop_column('user_chats', 'archived_until')
+    if inspector.has_table('messages_archive'):
+        # Arxivdagi xabarlar yo'qolmasin
+        columns = (
+            "id, created_at, updated_at, user_chat_id, sender_id, sender_type, receiver_id, "
+            "receiver_type, message_text, message_type, file_url, is_read"
+        )
+        op.execute(f"INSERT INTO messages ({columns}) SELECT {columns} FROM messages_archive")
+        op.drop_index('ix_messages_archive_chat_created_id', table_name='messages_archive')
+        op.drop_table('messages_archive')
@@ -0,0 +1,45 @@
+"""add idempotency_keys table
+
+Revision ID: f4a5b6c7d8e9
+Revises: e3f4a5b6c7d8
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+import sqlalchemy as sa
+from sqlalchemy import inspect
+from alembic import op
+
+
+revision: str = 'f4a5b6c7d8e9'
+down_revision: Union[str, None] = 'e3f4a5b6c7d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = inspect(op.get_bind())
+    if not inspector.has_table('idempotency_keys'):
+        op.create_table(
+            'idempotency_keys',
+            sa.Column('id', sa.String(length=36), primary_key=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.Column('key_hash', sa.String(length=64), nullable=False),
+            sa.Column('scope', sa.String(length=50), nullable=False),
+            sa.Column('fingerprint', sa.String(length=64), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('response_status', sa.Integer(), nullable=True),
+            sa.Column('response_body', sa.JSON(), nullable=True),
+            sa.Column('expires_at', sa.DateTime(), nullable=False),
+        )
+        op.create_index('ix_idempotency_keys_key_hash', 'idempotency_keys', ['key_hash'], unique=True)
+        op.create_index('ix_idempotency_keys_expires_at', 'idempotency_keys', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    inspector = inspect(op.get_bind())
+    if inspector.has_table('idempotency_keys'):
+        op.drop_index('ix_idempotency_keys_expires_at', table_name='idempotency_keys')
+        op.drop_index('ix_idempotency_keys_key_hash', table_name='idempotency_keys')
+        op.drop_table('idempotency_keys')
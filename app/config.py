@@ -41,6 +41,26 @@ class Settings(BaseSettings):
     click_merchant_user_id: Optional[str] = os.getenv("CLICK_MERCHANT_USER_ID")
     click_api_url: Optional[str] = os.getenv("CLICK_API_URL", "https://api.click.uz/v2")
 
+    # WebSocket xonalarini workerlar orasida tarqatish: bo'sh -> bitta process, redis://host:port/db
+    chat_pubsub_url: Optional[str] = os.getenv("CHAT_PUBSUB_URL")
+
+    # WS xabarlari: write-behind navbat (batch hajmi / kutish ms); CHAT_WRITE_BEHIND=0 -> har xabar uchun commit
+    chat_write_behind: bool = os.getenv("CHAT_WRITE_BEHIND", "1").lower() not in ("0", "false", "no")
+    chat_write_batch_size: int = int(os.getenv("CHAT_WRITE_BATCH_SIZE", 200))
+    chat_write_flush_ms: int = int(os.getenv("CHAT_WRITE_FLUSH_MS", 20))
+    # Har bir WS socketning chiqish navbati; to'lsa sekin mijoz uziladi (1013)
+    chat_send_queue_size: int = int(os.getenv("CHAT_SEND_QUEUE_SIZE", 256))
+    # Server ping oralig'i va mijozdan hech narsa kelmasa uzish muddati (soniya)
+    chat_heartbeat_seconds: float = float(os.getenv("CHAT_HEARTBEAT_SECONDS", 25))
+    chat_idle_timeout_seconds: float = float(os.getenv("CHAT_IDLE_TIMEOUT_SECONDS", 70))
+    # Shundan eski o'qilgan xabarlar har oy messages_archive ga ko'chiriladi (0 -> o'chirilgan)
+    chat_archive_after_days: int = int(os.getenv("CHAT_ARCHIVE_AFTER_DAYS", 180))
+
+    # Bildirishnomalar navbati: batch hajmi / kutish ms; bir xil collapse_key'lar shu oynada bitta yozuvga birlashadi
+    notification_batch_size: int = int(os.getenv("NOTIFICATION_BATCH_SIZE", 200))
+    notification_flush_ms: int = int(os.getenv("NOTIFICATION_FLUSH_MS", 500))
+    notification_collapse_seconds: float = float(os.getenv("NOTIFICATION_COLLAPSE_SECONDS", 300))
+
     # Frontend URL
     frontend_url: str = "https://freya-admin.vercel.app"
 
@@ -50,6 +50,9 @@ messages = {
             "time_out_of_schedule": "Tanlangan vaqt jadval oralig'ida emas",
             "service_end_out_of_schedule": "Xizmat tugash vaqti jadval oralig'ida emas",
             "master_busy": "Bu vaqtda master band",
+            "slot_locked": "Bu vaqt hozir band qilinmoqda, qaytadan urinib ko'ring",
+            "schedule_overlap": "Jadval mavjud jadval bilan kesishadi",
+            "invalid_cursor": "Sahifa cursori noto'g'ri",
             "login_required_for_payment": "To'lov uchun login talab qilinadi",
             "card_id_required": "Karta ID majburiy",
             "card_id_required_prepay": "Oldindan to'lov uchun karta ID majburiy",
@@ -109,6 +112,9 @@ messages = {
             "time_out_of_schedule": "Выбранное время вне диапазона расписания",
             "service_end_out_of_schedule": "Время окончания услуги вне диапазона расписания",
             "master_busy": "На это время мастер уже занят",
+            "slot_locked": "Это время сейчас бронируется, попробуйте ещё раз",
+            "schedule_overlap": "Расписание пересекается с существующим",
+            "invalid_cursor": "Неверный курсор страницы",
             "login_required_for_payment": "Для оплаты требуется авторизация",
             "card_id_required": "ID карты обязателен",
             "card_id_required_prepay": "ID карты обязателен для предоплаты",
@@ -168,6 +174,9 @@ messages = {
             "time_out_of_schedule": "Selected time is outside schedule range",
             "service_end_out_of_schedule": "Service end time is outside schedule range",
             "master_busy": "Master is already busy at this time",
+            "slot_locked": "This time is being booked right now, please try again",
+            "schedule_overlap": "Schedule overlaps an existing schedule",
+            "invalid_cursor": "Invalid page cursor",
             "login_required_for_payment": "Login is required for payment",
             "card_id_required": "Card ID is required",
             "card_id_required_prepay": "Card ID is required for prepayment",
@@ -4,8 +4,8 @@ from .user import User
 from .salon import Salon
 from .salon_comment import SalonComment
 from .employee import Employee, EmployeeComment, EmployeePost, PostMedia, EmployeePostLimit
-from .schedule import Schedule
-from .message import Message
+from .schedule import Schedule, ScheduleException
+from .message import Message, ArchivedMessage
 from .payment_card import PaymentCard
 from .notification import Notification
 from .user_session import UserSession
@@ -27,6 +27,9 @@ from .photo import Photo
 from .notif import Notif
 from .user_employee_contact import UserEmployeeContact
 from .salon_bot_registration import SalonBotRegistration
+from .idempotency_key import IdempotencyKey
+from .number_counter import NumberCounter
+from .unread_counter import ChatUnreadCounter, NotificationUnread, UnreadTotal
 
 __all__ = [
     # "BaseModel",
@@ -40,7 +43,9 @@ __all__ = [
     "PostMedia",
     "EmployeePostLimit",
     "Schedule",
+    "ScheduleException",
     "Message",
+    "ArchivedMessage",
     "PaymentCard",
     "Notification",
     "UserSession",
@@ -62,4 +67,9 @@ __all__ = [
     "Photo",
     "UserEmployeeContact"
     ,"SalonBotRegistration"
+    ,"IdempotencyKey"
+    ,"NumberCounter"
+    ,"ChatUnreadCounter"
+    ,"UnreadTotal"
+    ,"NotificationUnread"
 ]
\ No newline at end of file
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, DateTime, Integer, JSON, String
+from .base import BaseModel
+
+
+class IdempotencyKey(BaseModel):
+    __tablename__ = "idempotency_keys"
+
+    # sha256(scope | egasi | Idempotency-Key) — bitta unique index bo'yicha qidiriladi
+    key_hash = Column(String(64), unique=True, nullable=False, index=True)
+    scope = Column(String(50), nullable=False)
+    # So'rov tanasining sha256 izi: bir xil kalit boshqa tana bilan ishlatilsa rad etiladi
+    fingerprint = Column(String(64), nullable=False)
+    status = Column(String(20), nullable=False, default="in_progress")  # in_progress | completed
+    response_status = Column(Integer, nullable=True)
+    response_body = Column(JSON, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
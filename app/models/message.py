@@ -1,9 +1,13 @@
-from sqlalchemy import Column, String, Text, Boolean, ForeignKey
+from sqlalchemy import Column, String, Text, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from .base import BaseModel
 
 class Message(BaseModel):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Tarix cursor bo'yicha o'qiladi: (created_at, id) < / > cursor
+        Index('ix_messages_chat_created_id', 'user_chat_id', 'created_at', 'id'),
+    )
     
     user_chat_id = Column(String(36), ForeignKey("user_chats.id"), nullable=False)
     sender_id = Column(String(36), nullable=False)
@@ -16,4 +20,24 @@ class Message(BaseModel):
     is_read = Column(Boolean, default=False)
     
     # Relationships
-    user_chat = relationship("UserChat", back_populates="messages")
\ No newline at end of file
+    user_chat = relationship("UserChat", back_populates="messages")
+
+class ArchivedMessage(BaseModel):
+    """
+    Eski (o'qilgan) xabarlar — messages bilan bir xil ustunlar. Oylik archival
+    job ko'chiradi; tarix sahifalari ikkala jadvaldan birga o'qiladi.
+    """
+    __tablename__ = "messages_archive"
+    __table_args__ = (
+        Index('ix_messages_archive_chat_created_id', 'user_chat_id', 'created_at', 'id'),
+    )
+
+    user_chat_id = Column(String(36), ForeignKey("user_chats.id"), nullable=False)
+    sender_id = Column(String(36), nullable=False)
+    sender_type = Column(String(20), nullable=False)
+    receiver_id = Column(String(36), nullable=False)
+    receiver_type = Column(String(20), nullable=False)
+    message_text = Column(Text, nullable=True)
+    message_type = Column(String(20), default='text')
+    file_url = Column(String(255), nullable=True)
+    is_read = Column(Boolean, default=False)
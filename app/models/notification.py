@@ -1,9 +1,13 @@
-from sqlalchemy import Column, String, Text, Boolean, ForeignKey, JSON
+from sqlalchemy import Column, String, Text, Boolean, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
 from .base import BaseModel
 
 class Notification(BaseModel):
     __tablename__ = "notifications"
+    __table_args__ = (
+        # Keyset feed: user bo'yicha yangidan eskiga (created_at, id)
+        Index("ix_notifications_user_created_id", "user_id", "created_at", "id"),
+    )
     
     user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"))
     title = Column(String(200), nullable=False)
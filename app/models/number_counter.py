@@ -0,0 +1,11 @@
+from sqlalchemy import BigInteger, Column, String
+from .base import BaseModel
+
+
+class NumberCounter(BaseModel):
+    __tablename__ = "number_counters"
+
+    # Masalan "APP-20251019" yoki "BOOK-20251019": prefiks + kun
+    key = Column(String(50), unique=True, nullable=False, index=True)
+    # Keyingi bo'sh raqam; worker'lar bloklab (bir nechta raqam birdan) band qiladi
+    next_value = Column(BigInteger, nullable=False, default=1)
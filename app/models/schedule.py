@@ -1,9 +1,12 @@
-from sqlalchemy import Column, String, Boolean, Date, Integer, DECIMAL, ForeignKey, Text, Time, JSON
+from sqlalchemy import Column, String, Boolean, Date, Integer, DECIMAL, ForeignKey, Text, Time, JSON, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from .base import BaseModel
 
 class Schedule(BaseModel):
     __tablename__ = "schedules"
+    __table_args__ = (
+        Index('ix_schedules_salon_date', 'salon_id', 'date'),
+    )
     
     salon_id = Column(String(36), ForeignKey("salons.id", ondelete="CASCADE"))
     name = Column(String(200), nullable=False)
@@ -14,6 +17,9 @@ class Schedule(BaseModel):
     end_time = Column(Time, nullable=True)
     repeat = Column(Boolean, default=False)
     repeat_value = Column(Text)
+    # Takrorlanish qoidasi: to'ldirilgan bo'lsa qator date..repeat_until oralig'ida
+    # repeat_value hafta kunlari bo'yicha dangasa (so'ralgan oynada) yoyiladi
+    repeat_until = Column(Date, nullable=True)
     employee_list = Column(JSON, default=list)
     price = Column(DECIMAL(10,2), nullable=False)
     full_pay = Column(DECIMAL(10,2))
@@ -25,8 +31,28 @@ class Schedule(BaseModel):
     
     # Relationships
     salon = relationship("Salon", back_populates="schedules")
+    exceptions = relationship("ScheduleException", back_populates="schedule", cascade="all, delete-orphan")
     # appointments = relationship("Appointment", back_populates="schedule")
 
+class ScheduleException(BaseModel):
+    """Takrorlanuvchi jadvalning bitta sanasi uchun bekor qilish yoki o'zgartirish"""
+    __tablename__ = "schedule_exceptions"
+    __table_args__ = (
+        UniqueConstraint('schedule_id', 'date', name='uq_schedule_exception_date'),
+    )
+
+    schedule_id = Column(String(36), ForeignKey("schedules.id", ondelete="CASCADE"), nullable=False, index=True)
+    date = Column(Date, nullable=False)
+    is_cancelled = Column(Boolean, default=False, nullable=False)
+    # None bo'lgan maydonlar qoidadagi qiymatni saqlaydi
+    start_time = Column(Time, nullable=True)
+    end_time = Column(Time, nullable=True)
+    whole_day = Column(Boolean, nullable=True)
+    employee_list = Column(JSON, nullable=True)
+    price = Column(DECIMAL(10,2), nullable=True)
+
+    schedule = relationship("Schedule", back_populates="exceptions")
+
 class ScheduleBook(BaseModel):
     __tablename__ = "schedule_books"
 
@@ -0,0 +1,32 @@
+from sqlalchemy import Column, ForeignKey, Integer, String, UniqueConstraint
+from .base import BaseModel
+
+
+class ChatUnreadCounter(BaseModel):
+    """Chatdagi bitta qabul qiluvchi uchun o'qilmagan xabarlar soni"""
+    __tablename__ = "chat_unread_counters"
+    __table_args__ = (
+        UniqueConstraint('user_chat_id', 'receiver_id', name='uq_chat_unread_receiver'),
+    )
+
+    user_chat_id = Column(String(36), ForeignKey("user_chats.id", ondelete="CASCADE"), nullable=False, index=True)
+    receiver_id = Column(String(36), nullable=False, index=True)
+    receiver_type = Column(String(20), nullable=False)  # 'user', 'employee', 'salon'
+    count = Column(Integer, nullable=False, default=0)
+
+
+class UnreadTotal(BaseModel):
+    """Qabul qiluvchining barcha chatlari bo'yicha o'qilmaganlar (ilova badge'i)"""
+    __tablename__ = "unread_totals"
+
+    receiver_id = Column(String(36), unique=True, nullable=False, index=True)
+    receiver_type = Column(String(20), nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class NotificationUnread(BaseModel):
+    """Userning o'qilmagan bildirishnomalari soni (notifications badge'i)"""
+    __tablename__ = "notification_unread_counters"
+
+    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), unique=True, nullable=False, index=True)
+    count = Column(Integer, nullable=False, default=0)
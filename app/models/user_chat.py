@@ -11,8 +11,12 @@ class UserChat(BaseModel):
     chat_type = Column(String(50), default='user_salon')  # user_salon, user_employee
     last_message = Column(Text, nullable=True)
     last_message_time = Column(DateTime, nullable=True)
+    last_message_id = Column(String(36), nullable=True)
     is_active = Column(Boolean, default=True)
     unread_count = Column(Integer, default=0)
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # messages_archive dagi eng yangi xabar vaqti (None -> arxiv bo'sh, tarix faqat messages'dan)
+    archived_until = Column(DateTime, nullable=True)
     
     # Relationships
     user = relationship("User", back_populates="user_chats")
@@ -11,8 +11,11 @@ from app.database import get_db
 from app.i18nMini import get_translation
 from app.models import Appointment, Schedule, User, Employee, Salon, Admin
 from app.models.payment import Payment as PaymentModel
-from app.models.notification import Notification
-from app.models.busy_slot import BusySlot
+from app.services.notifications import PendingNotification, notification_service
+from app.services.booking_lock import BookingLockTimeout, reserve_employee_interval
+from app.services.idempotency import RETRY_AFTER_HEADER
+from app.services.number_allocator import application_numbers
+from app.services.recurrence import resolve_occurrence
 from app.models.schedule import ScheduleBook as ScheduleBookModel
 
 router = APIRouter(prefix="/appointments", tags=["appointments"])
@@ -73,9 +76,8 @@ class PaginationResponse(BaseModel):
 
 # Вспомогательная функция для генерации номера заявки
 async def generate_application_number(db: Session) -> str:
-    """Генерирует уникальный номер заявки"""
-    count = db.query(func.count(Appointment.id)).scalar()
-    return f"APP{str(count + 1).zfill(3)}"
+    """Генерирует уникальный номер заявки (APP-YYYYMMDD-NNNNN, без запросов к БД в штатном режиме)"""
+    return application_numbers.next(db)
 
 
 # Создание новой заявки
@@ -95,6 +97,15 @@ async def create_appointment(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=get_translation(language, "errors.404")
         )
+
+    # Qoida bo'lsa shu sanadagi haqiqiy takrorlanish (istisnosi bilan): vaqt
+    # chegaralari va xodimlar shundan olinadi; bu sanada jadval bo'lmasa 404
+    schedule = resolve_occurrence(db, schedule, appointment_data.application_date)
+    if schedule is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=get_translation(language, "errors.404")
+        )
     
     # Получаем salon_id и employee_id
     salon_id = schedule.salon_id
@@ -145,55 +156,6 @@ async def create_appointment(
     end_dt = start_dt + timedelta(minutes=duration)
     end_time_val = end_dt.time()
 
-    # Проверка занятости: существующая запись или busy slot
-    if employee_id:
-        # Check against existing appointments
-        existing_apps = db.query(Appointment).filter(
-            Appointment.employee_id == employee_id,
-            Appointment.application_date == appointment_data.application_date,
-            Appointment.is_cancelled == False,
-            Appointment.status.in_(["pending", "accepted", "done"])
-        ).all()
-
-        for app in existing_apps:
-            app_start = datetime.combine(app.application_date, app.application_time)
-            if app.end_time:
-                # Handle midnight crossing
-                if app.end_time < app.application_time:
-                    app_end = datetime.combine(app.application_date + timedelta(days=1), app.end_time)
-                else:
-                    app_end = datetime.combine(app.application_date, app.end_time)
-            else:
-                app_duration = app.duration_minutes or 60
-                app_end = app_start + timedelta(minutes=app_duration)
-            
-            # Overlap condition: start < other.end AND end > other.start
-            if start_dt < app_end and end_dt > app_start:
-                 raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail=get_translation(language, "errors.409") or "Bu vaqt allaqachon band"
-                )
-
-        # Check against BusySlots
-        busy_slots = db.query(BusySlot).filter(
-            BusySlot.employee_id == employee_id,
-            BusySlot.date == appointment_data.application_date
-        ).all()
-        
-        for slot in busy_slots:
-            slot_start = datetime.combine(slot.date, slot.start_time)
-            # Handle midnight crossing for busy slots
-            if slot.end_time < slot.start_time:
-                slot_end = datetime.combine(slot.date + timedelta(days=1), slot.end_time)
-            else:
-                slot_end = datetime.combine(slot.date, slot.end_time)
-                
-            if start_dt < slot_end and end_dt > slot_start:
-                 raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail=get_translation(language, "errors.409") or "Bu vaqt allaqachon band"
-                )
-    
     # Создание заявки
     # Mijoz ismini olish prioritet:
     # 1. Agar login qilgan bo'lsa - User.full_name > User.first_name + last_name > User.username
@@ -245,8 +207,32 @@ async def create_appointment(
         status="pending"
     )
     
-    db.add(new_appointment)
-    db.commit()
+    # Проверка занятости (существующая запись или busy slot) и запись —
+    # под одной блокировкой (employee, день)
+    if employee_id:
+        try:
+            reserved = reserve_employee_interval(
+                db,
+                str(employee_id),
+                start_dt,
+                end_dt,
+                [new_appointment],
+                default_minutes=60,
+            )
+        except BookingLockTimeout:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=get_translation(language, "errors.slot_locked"),
+                headers={RETRY_AFTER_HEADER: "1"},
+            )
+        if not reserved:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=get_translation(language, "errors.409") or "Bu vaqt allaqachon band"
+            )
+    else:
+        db.add(new_appointment)
+        db.commit()
     db.refresh(new_appointment)
 
     try:
@@ -261,7 +247,7 @@ async def create_appointment(
             else:
                 title = "Appointment created"
                 message = "You created a salon appointment"
-            notif = Notification(
+            notification_service.notify(PendingNotification(
                 user_id=str(current_user.id),
                 title=title,
                 message=message,
@@ -273,9 +259,7 @@ async def create_appointment(
                     "date": appointment_data.application_date.isoformat(),
                     "time": appointment_data.application_time.strftime("%H:%M"),
                 },
-            )
-            db.add(notif)
-            db.commit()
+            ))
     except Exception:
         pass
     
@@ -461,6 +445,31 @@ async def get_appointment_by_id(
     }
 
 
+# Status o'zgarganda userga bildirishnoma (title, message)
+_STATUS_NOTIFICATIONS = {
+    "accepted": {
+        "uz": ("Appointment tasdiqlandi", "Salon appointmentingizni tasdiqladi"),
+        "ru": ("Запись подтверждена", "Салон подтвердил вашу запись"),
+        "en": ("Appointment confirmed", "The salon confirmed your appointment"),
+    },
+    "cancelled": {
+        "uz": ("Appointment bekor qilindi", "Salon appointmentingizni bekor qildi"),
+        "ru": ("Запись отменена", "Салон отменил вашу запись"),
+        "en": ("Appointment cancelled", "The salon cancelled your appointment"),
+    },
+    "ignored": {
+        "uz": ("Appointment rad etildi", "Salon appointmentingizni qabul qilmadi"),
+        "ru": ("Запись отклонена", "Салон не принял вашу запись"),
+        "en": ("Appointment declined", "The salon declined your appointment"),
+    },
+    "done": {
+        "uz": ("Appointment yakunlandi", "Tashrifingiz uchun rahmat"),
+        "ru": ("Запись завершена", "Спасибо за визит"),
+        "en": ("Appointment completed", "Thank you for your visit"),
+    },
+}
+
+
 # Обновить статус заявки
 @router.patch("/{id}/status")
 async def update_appointment_status(
@@ -507,6 +516,24 @@ async def update_appointment_status(
     db.commit()
     db.refresh(appointment)
 
+    if appointment.user_id and status_data.status in _STATUS_NOTIFICATIONS:
+        lang = (language or "").lower()[:2]
+        title, message = _STATUS_NOTIFICATIONS[status_data.status].get(lang, _STATUS_NOTIFICATIONS[status_data.status]["en"])
+        # Tez-tez o'zgarsa bitta (oxirgi holat) bildirishnoma qoladi
+        notification_service.notify(PendingNotification(
+            user_id=str(appointment.user_id),
+            title=title,
+            message=message,
+            type="error" if status_data.status in ("cancelled", "ignored") else "info",
+            data={
+                "kind": "appointment_status",
+                "appointment_id": str(appointment.id),
+                "application_number": appointment.application_number,
+                "status": status_data.status,
+            },
+            collapse_key=f"appointment_status:{appointment.id}",
+        ))
+
     # Notify user to leave a comment when appointment is accepted or done
     try:
         if appointment.user_id and status_data.status in ("accepted", "done"):
@@ -530,7 +557,7 @@ async def update_appointment_status(
             except Exception:
                 salon_id_val = None
 
-            notif = Notification(
+            notification_service.notify(PendingNotification(
                 user_id=str(appointment.user_id),
                 title=title,
                 message=message,
@@ -542,9 +569,8 @@ async def update_appointment_status(
                     "employee_id": str(appointment.employee_id) if appointment.employee_id else None,
                     "status": status_data.status,
                 },
-            )
-            db.add(notif)
-            db.commit()
+                collapse_key=f"request_comment:{appointment.id}",
+            ))
     except Exception:
         pass
     
@@ -1,8 +1,8 @@
 from dataclasses import Field
 import json
 import logging
-from typing import Dict, List, Literal, Union
-from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from typing import Dict, List, Literal, Optional, Union
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
 from sqlalchemy.orm import Session
 from app.auth.dependencies import get_current_user, get_current_user_only
 from app.config import settings
@@ -19,6 +19,8 @@ from app.schemas.Click import (
 )
 from app.services.Click import PaymentStatus
 from app.services.click_complate import complate_payment, deactivate_expired_premiums
+from app.services.idempotency import run_idempotent
+from app.services.booking_payments import confirm_booking_payment, fail_booking_payment
 from app.utils.payment_validator import PaymentValidator
 
 
@@ -287,7 +289,20 @@ def pay_for_premium(
     quantity_months: int = 1,
     current_user: User = Depends(get_current_user_only),
     db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ):
+    # Idempotency-Key bilan takroriy so'rov Click'ga qayta murojaat qilmaydi
+    return run_idempotent(
+        db,
+        scope="click_pay_premium",
+        key=idempotency_key,
+        owner=str(current_user.id),
+        payload={"card_id": card_id, "quantity_months": quantity_months},
+        handler=lambda: _pay_for_premium(card_id, quantity_months, current_user, db),
+    )
+
+
+def _pay_for_premium(card_id: Optional[str], quantity_months: int, current_user: User, db: Session):
     amount_for_month = settings.AMOUNT_FOR_PREMIUM  # Example amount for 1 month
     payment = ClickPayment(
         payment_for=f"premium_{current_user.id}_{quantity_months}",
@@ -372,6 +387,30 @@ def pay_for_post(
     ),
     employe: Employee = Depends(get_current_user),
     db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    return run_idempotent(
+        db,
+        scope="click_pay_for_post",
+        key=idempotency_key,
+        owner=str(employe.id),
+        payload={
+            "post_quantity": post_quantity,
+            "pay_with": pay_with,
+            "card_type": card_type,
+            "return_url": return_url,
+        },
+        handler=lambda: _pay_for_post(post_quantity, pay_with, card_type, return_url, employe, db),
+    )
+
+
+def _pay_for_post(
+    post_quantity: int,
+    pay_with: str,
+    card_type: str,
+    return_url: str,
+    employe: Employee,
+    db: Session,
 ):
     if employe.role != "employee":
         raise HTTPException(
@@ -526,7 +565,11 @@ async def webhook_complete(request: Request, db: Session = Depends(get_db)):
         # Обновить статус на CONFIRMED
         payment.status = PaymentStatus.CONFIRMED.value
         db.commit()
-        complate_payment(payment, db)
+        if payment.payment_for.startswith("booking_"):
+            # Oldindan to'lov: payment_pending appointment tasdiqlanadi
+            confirm_booking_payment(db, payment, paydoc_id=data.get("click_paydoc_id"))
+        else:
+            complate_payment(payment, db)
         if payment.payment_for.startswith("premium"):
             user_id = payment.payment_for.split("_")[1]
             c_user = db.query(User).filter(User.id == user_id).first()
@@ -537,6 +580,8 @@ async def webhook_complete(request: Request, db: Session = Depends(get_db)):
         payment.status = PaymentStatus.REJECTED.value
         db.commit()
         # Обновить статус на REJECTED
+        if payment.payment_for.startswith("booking_"):
+            fail_booking_payment(db, payment)
 
     response = {
         **validation_result,
@@ -8,9 +8,10 @@ from pydantic import BaseModel, ConfigDict
 
 from app.database import get_db
 from app.auth.dependencies import get_current_user_only
-from app.models import Appointment, User, Employee, Salon, Service, Schedule
+from app.models import Appointment, User, Employee, Salon, Service
 from app.schemas.salon import MobileSalonItem
 from app.routers.salon_mobile import build_mobile_item, get_localized_field
+from app.services.recurrence import load_schedule_occurrences
 
 router = APIRouter(prefix="/history", tags=["History"]) 
 
@@ -232,16 +233,15 @@ def _build_history_item(a: Appointment, db: Session, language: Optional[str], us
         else:
             # Schedule bo'yicha topishga urinamiz
             if salon and a.application_date and a.service_name:
-                sched = (
-                    db.query(Schedule)
-                    .filter(
-                        Schedule.salon_id == str(salon.id),
-                        Schedule.date == a.application_date,
-                        Schedule.name == a.service_name,
-                    )
-                    .order_by(Schedule.start_time.asc())
-                    .first()
+                day_schedules = load_schedule_occurrences(
+                    db,
+                    a.application_date,
+                    a.application_date,
+                    salon_id=str(salon.id),
+                    active_only=False,
+                    name=a.service_name,
                 )
+                sched = day_schedules[0] if day_schedules else None
                 if sched and sched.end_time:
                     end_time_str = sched.end_time.strftime("%H:%M")
     except Exception:
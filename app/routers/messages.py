@@ -14,6 +14,9 @@ from app.models.salon import Salon
 from app.models.user_chat import UserChat
 from app.models.message import Message
 from app.routers.ws_chat import manager, _now_local_iso, _to_local_iso
+from app.services.chat_history import InvalidCursor, count_message, history_page
+from app.services.chat_list import load_parties, unread_counts
+from app.services.unread_counters import increment_unread, mark_chat_read
 
 
 def _utc_iso(dt):
@@ -21,6 +24,17 @@ def _utc_iso(dt):
     return _to_local_iso(dt)
 
 
+def _history_page(db: Session, chat_id: str, limit: int, before, after, offset: int, language):
+    """history_page, noto'g'ri cursor -> 400"""
+    try:
+        return history_page(db, chat_id, limit=limit, before=before, after=after, offset=offset)
+    except InvalidCursor:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=get_translation(language, "errors.invalid_cursor"),
+        )
+
+
 router = APIRouter(prefix="/messages", tags=["messages"])
 
 
@@ -40,22 +54,20 @@ async def get_conversations(
         .all()
     )
 
+    # O'qilmaganlar soni va ishtirokchilar barcha chatlar uchun bittadan so'rovda
+    unread = unread_counts(db, (c.id for c in chats), [current_user.id])
+    parties = load_parties(
+        db,
+        [("employee", c.employee_id) if c.employee_id else ("salon", c.salon_id) for c in chats],
+    )
+
     data = []
     for chat in chats:
-        # Hisoblash: o'qilmagan xabarlar soni (foydalanuvchi uchun)
-        unread_count = (
-            db.query(Message)
-            .filter(
-                Message.user_chat_id == chat.id,
-                Message.receiver_id == current_user.id,
-                Message.is_read == False,
-            )
-            .count()
-        )
+        unread_count = unread.get((str(chat.id), str(current_user.id)), 0)
 
         participant = None
         if chat.employee_id:
-            employee = db.query(Employee).filter(Employee.id == chat.employee_id).first()
+            employee = parties.get(("employee", str(chat.employee_id)))
             participant = {
                 "type": "employee",
                 "id": chat.employee_id,
@@ -64,7 +76,7 @@ async def get_conversations(
                 "profession": getattr(employee, "profession", None),
             }
         elif chat.salon_id:
-            salon = db.query(Salon).filter(Salon.id == chat.salon_id).first()
+            salon = parties.get(("salon", str(chat.salon_id)))
             participant = {
                 "type": "salon",
                 "id": chat.salon_id,
@@ -98,6 +110,8 @@ async def get_conversation_messages(
     chat_with_type: Optional[str] = Query(None, description="employee | salon"),
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
+    before: Optional[str] = Query(None, description="Shu xabar id'sidan oldingi xabarlar"),
+    after: Optional[str] = Query(None, description="Shu xabar id'sidan keyingi xabarlar"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
     language: Union[str, None] = Header(None, alias="X-User-language"),
@@ -143,20 +157,7 @@ async def get_conversation_messages(
             "name": getattr(salon, "salon_name", None),
         }
 
-    total_msgs = (
-        db.query(Message)
-        .filter(Message.user_chat_id == chat.id)
-        .count()
-    )
-    messages = (
-        db.query(Message)
-        .filter(Message.user_chat_id == chat.id)
-        .order_by(desc(Message.created_at))
-        .offset(offset)
-        .limit(limit)
-        .all()
-    )
-    messages = list(reversed(messages))
+    messages, pagination = _history_page(db, chat.id, limit, before, after, offset, language)
 
     data = [
         {
@@ -182,7 +183,7 @@ async def get_conversation_messages(
             "chat_type": chat.chat_type,
             "participant": participant,
             "messages": data,
-            "pagination": {"limit": limit, "offset": offset, "total": total_msgs},
+            "pagination": pagination,
             "user_avatar_url": getattr(current_user, "avatar_url", None),
             "employee_avatar_url": employee_avatar,
             "employee_profession": employee_profession,
@@ -287,6 +288,12 @@ async def send_message(
     chat.last_message_time = datetime.now(timezone.utc)
 
     db.add(new_message)
+    db.flush()
+    # Qayta ulanishda mijoz shu id bilan solishtiriladi (resume)
+    chat.last_message_id = new_message.id
+    # O'qilmaganlar hisoblagichlari xabar bilan bitta tranzaksiyada oshiriladi
+    unread_count, total_unread_count = increment_unread(db, chat.id, receiver_id, receiver_type)
+    count_message(db, chat.id)
     db.commit()
     db.refresh(new_message)
 
@@ -315,11 +322,6 @@ async def send_message(
         }
         await manager.broadcast(room_id, await_payload)
 
-        unread_count = db.query(Message).filter(
-            Message.user_chat_id == chat.id,
-            Message.receiver_id == receiver_id,
-            Message.is_read == False,
-        ).count()
         notif_payload = {
             "event": "notification",
             "room_id": room_id,
@@ -336,6 +338,7 @@ async def send_message(
             "sender_type": "user",
             "chat_id": str(chat.id),
             "unread_count": unread_count,
+            "total_unread_count": total_unread_count,
             "time": _now_local_iso(),
         }
         await manager.broadcast(room_id, notif_payload)
@@ -397,14 +400,14 @@ async def mark_conversation_read(
         )
 
     # Foydalanuvchi uchun o'qilmagan xabarlarni o'qilgan qilish
-    db.query(Message).filter(
+    read_count = db.query(Message).filter(
         Message.user_chat_id == chat.id,
         Message.receiver_id == current_user.id,
         Message.is_read == False,
     ).update({Message.is_read: True})
 
-    # O'qilmagan sonini nolga tushirish (hisoblashni soddalashtirish)
-    chat.unread_count = 0
+    # O'qilmaganlar hisoblagichlarini belgilangan xabarlar soniga kamaytirish
+    mark_chat_read(db, chat.id, current_user.id, read_count)
 
     db.commit()
 
@@ -453,22 +456,16 @@ async def get_employee_conversations(
         .all()
     )
 
+    unread = unread_counts(db, (c.id for c in chats), [current_user.id])
+    parties = load_parties(db, [("user", c.user_id) for c in chats])
+
     data = []
     for chat in chats:
-        # Hisoblash: o'qilmagan xabarlar soni (employee uchun)
-        unread_count = (
-            db.query(Message)
-            .filter(
-                Message.user_chat_id == chat.id,
-                Message.receiver_id == current_user.id,
-                Message.is_read == False,
-            )
-            .count()
-        )
+        unread_count = unread.get((str(chat.id), str(current_user.id)), 0)
 
         participant = None
         if chat.user_id:
-            user = db.query(User).filter(User.id == chat.user_id).first()
+            user = parties.get(("user", str(chat.user_id)))
             participant = {
                 "type": "user",
                 "id": chat.user_id,
@@ -502,6 +499,8 @@ async def get_employee_conversation_messages(
     user_id: str,
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
+    before: Optional[str] = Query(None, description="Shu xabar id'sidan oldingi xabarlar"),
+    after: Optional[str] = Query(None, description="Shu xabar id'sidan keyingi xabarlar"),
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user),
     language: Union[str, None] = Header(None, alias="X-User-language"),
@@ -524,19 +523,7 @@ async def get_employee_conversation_messages(
     if not chat:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=get_translation(language, "errors.404"))
 
-    total_msgs = (
-        db.query(Message)
-        .filter(Message.user_chat_id == chat.id)
-        .count()
-    )
-    messages = list(reversed(
-        db.query(Message)
-        .filter(Message.user_chat_id == chat.id)
-        .order_by(desc(Message.created_at))
-        .offset(offset)
-        .limit(limit)
-        .all()
-    ))
+    messages, pagination = _history_page(db, chat.id, limit, before, after, offset, language)
 
     # Participant details for employee-side conversation
     user = db.query(User).filter(User.id == user_id).first()
@@ -571,7 +558,7 @@ async def get_employee_conversation_messages(
             "chat_type": chat.chat_type,
             "participant": participant,
             "messages": data,
-            "pagination": {"limit": limit, "offset": offset, "total": total_msgs},
+            "pagination": pagination,
             "user_avatar_url": getattr(user, "avatar_url", None),
             "employee_avatar_url": getattr(current_user, "avatar_url", None),
         },
@@ -605,13 +592,13 @@ async def mark_employee_conversation_read(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=get_translation(language, "errors.404"))
 
     # Xodim uchun o'qilmagan xabarlarni o'qilgan qilish
-    db.query(Message).filter(
+    read_count = db.query(Message).filter(
         Message.user_chat_id == chat.id,
         Message.receiver_id == current_user.id,
         Message.is_read == False,
     ).update({Message.is_read: True})
 
-    chat.unread_count = 0
+    mark_chat_read(db, chat.id, current_user.id, read_count)
     db.commit()
 
     return {
@@ -671,6 +658,12 @@ async def employee_send_message(
     chat.last_message_time = datetime.now(timezone.utc)
 
     db.add(new_message)
+    db.flush()
+    # Qayta ulanishda mijoz shu id bilan solishtiriladi (resume)
+    chat.last_message_id = new_message.id
+    # O'qilmaganlar hisoblagichlari xabar bilan bitta tranzaksiyada oshiriladi
+    unread_count, total_unread_count = increment_unread(db, chat.id, receiver_id, "user")
+    count_message(db, chat.id)
     db.commit()
     db.refresh(new_message)
 
@@ -697,11 +690,6 @@ async def employee_send_message(
                 "created_at_local": created_local,
             }
         })
-        unread_count = db.query(Message).filter(
-            Message.user_chat_id == chat.id,
-            Message.receiver_id == receiver_id,
-            Message.is_read == False,
-        ).count()
         await manager.broadcast(room_id, {
             "event": "notification",
             "room_id": room_id,
@@ -714,6 +702,7 @@ async def employee_send_message(
             "to_user_id": receiver_id,
             "to_employee_id": None,
             "unread_count": unread_count,
+            "total_unread_count": total_unread_count,
             "time": _now_local_iso(),
         })
     except Exception:
@@ -752,23 +741,17 @@ async def get_admin_conversations(
         .all()
     )
 
+    # O'qilmagan xabarlar soni (salon tomoni uchun)
+    unread = unread_counts(db, (c.id for c in chats), [current_admin.salon_id], receiver_type="salon")
+    parties = load_parties(db, [("user", c.user_id) for c in chats])
+
     data = []
     for chat in chats:
-        # O'qilmagan xabarlar soni (salon tomoni uchun)
-        unread_count = (
-            db.query(Message)
-            .filter(
-                Message.user_chat_id == chat.id,
-                Message.receiver_type == "salon",
-                Message.receiver_id == current_admin.salon_id,
-                Message.is_read == False,
-            )
-            .count()
-        )
+        unread_count = unread.get((str(chat.id), str(current_admin.salon_id)), 0)
 
         participant = None
         if chat.user_id:
-            user = db.query(User).filter(User.id == chat.user_id).first()
+            user = parties.get(("user", str(chat.user_id)))
             participant = {
                 "type": "user",
                 "id": chat.user_id,
@@ -802,6 +785,8 @@ async def get_admin_conversation_messages(
     user_id: str,
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
+    before: Optional[str] = Query(None, description="Shu xabar id'sidan oldingi xabarlar"),
+    after: Optional[str] = Query(None, description="Shu xabar id'sidan keyingi xabarlar"),
     db: Session = Depends(get_db),
     current_admin = Depends(get_current_admin),
     language: Union[str, None] = Header(None, alias="X-User-language"),
@@ -824,19 +809,7 @@ async def get_admin_conversation_messages(
     if not chat:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=get_translation(language, "errors.404"))
 
-    total_msgs = (
-        db.query(Message)
-        .filter(Message.user_chat_id == chat.id)
-        .count()
-    )
-    messages = list(reversed(
-        db.query(Message)
-        .filter(Message.user_chat_id == chat.id)
-        .order_by(desc(Message.created_at))
-        .offset(offset)
-        .limit(limit)
-        .all()
-    ))
+    messages, pagination = _history_page(db, chat.id, limit, before, after, offset, language)
 
     user = db.query(User).filter(User.id == user_id).first()
     participant = {
@@ -870,7 +843,7 @@ async def get_admin_conversation_messages(
             "chat_type": chat.chat_type,
             "participant": participant,
             "messages": data,
-            "pagination": {"limit": limit, "offset": offset, "total": total_msgs},
+            "pagination": pagination,
             "user_avatar_url": getattr(user, "avatar_url", None),
             "salon_id": current_admin.salon_id,
         },
@@ -904,14 +877,14 @@ async def mark_admin_conversation_read(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=get_translation(language, "errors.404"))
 
     # Admin/salon uchun o'qilmagan xabarlarni o'qilgan qilish
-    db.query(Message).filter(
+    read_count = db.query(Message).filter(
         Message.user_chat_id == chat.id,
         Message.receiver_type == "salon",
         Message.receiver_id == current_admin.salon_id,
         Message.is_read == False,
     ).update({Message.is_read: True})
 
-    chat.unread_count = 0
+    mark_chat_read(db, chat.id, current_admin.salon_id, read_count)
     db.commit()
 
     return {
@@ -983,6 +956,12 @@ async def admin_send_message(
     chat.last_message_time = datetime.now(timezone.utc)
 
     db.add(new_message)
+    db.flush()
+    # Qayta ulanishda mijoz shu id bilan solishtiriladi (resume)
+    chat.last_message_id = new_message.id
+    # O'qilmaganlar hisoblagichlari xabar bilan bitta tranzaksiyada oshiriladi
+    unread_count, total_unread_count = increment_unread(db, chat.id, receiver_id, "user")
+    count_message(db, chat.id)
     db.commit()
     db.refresh(new_message)
 
@@ -1009,11 +988,6 @@ async def admin_send_message(
                 "created_at_local": created_local,
             }
         })
-        unread_count = db.query(Message).filter(
-            Message.user_chat_id == chat.id,
-            Message.receiver_id == receiver_id,
-            Message.is_read == False,
-        ).count()
         await manager.broadcast(room_id, {
             "event": "notification",
             "room_id": room_id,
@@ -1026,6 +1000,7 @@ async def admin_send_message(
             "to_user_id": receiver_id,
             "to_employee_id": None,
             "unread_count": unread_count,
+            "total_unread_count": total_unread_count,
             "time": _now_local_iso(),
         })
     except Exception:
@@ -14,7 +14,19 @@ from app.models.schedule import Schedule
 from app.schemas.employee import MobileEmployeeListResponse, MobileEmployeeItem, MobileEmployeeDetailResponse
 from app.schemas.salon import MobileSalonItem
 from app.models.appointment import Appointment
-from app.models.busy_slot import BusySlot
+from app.services.availability import load_busy_bitmap, load_busy_bitmaps, work_bitmap
+from app.services.recurrence import (
+    find_schedule_conflicts,
+    is_rule,
+    load_schedule_occurrences,
+    repeat_until_for,
+    reset_rule,
+    rule_dates,
+    rule_weeks,
+)
+from app.services.busy_slots import MAX_BULK_BUSY_SLOTS, BusyInterval, bulk_create_busy_slots, recurrence_dates
+from app.services.booking_lock import BookingLockTimeout
+from app.services.idempotency import RETRY_AFTER_HEADER
 from app.models.user_favourite_salon import UserFavouriteSalon
 from app.auth.dependencies import get_current_user
 
@@ -571,12 +583,7 @@ async def get_employee_schedules_by_date(
             )
 
         # O'sha kun uchun barcha schedule'larni olish
-        schedules = db.query(Schedule).filter(
-            and_(
-                Schedule.date == target_date,
-                Schedule.is_active == True
-            )
-        ).all()
+        schedules = load_schedule_occurrences(db, target_date, target_date)
 
         # Har bir schedule uchun employee ma'lumotlarini olish
         employee_schedules = []
@@ -668,13 +675,7 @@ async def get_my_schedules_by_date(
             )
 
         # Xodim salonidagi o'sha kundagi aktiv schedule'lar
-        schedules = db.query(Schedule).filter(
-            and_(
-                Schedule.date == target_date,
-                Schedule.is_active == True,
-                Schedule.salon_id == current_user.salon_id,
-            )
-        ).all()
+        schedules = load_schedule_occurrences(db, target_date, target_date, salon_id=current_user.salon_id)
 
         # Xodimga tegishli jadval elementlarini yig'ish
         employee_schedules: List[EmployeeScheduleItem] = []
@@ -766,12 +767,7 @@ async def get_employee_work_schedule(
         raise HTTPException(status_code=400, detail=get_translation(language, "errors.400") or "Sana formati noto'g'ri")
 
     # Shu sanadagi schedule bloklarini olish
-    schedules = (
-        db.query(Schedule)
-        .filter(and_(Schedule.date == day, Schedule.is_active == True))
-        .order_by(Schedule.start_time.asc())
-        .all()
-    )
+    schedules = load_schedule_occurrences(db, day, day)
 
     def _in_emp_list(emp_list, eid: str) -> bool:
         if not emp_list:
@@ -860,6 +856,7 @@ class MyScheduleUpdate(BaseModel):
     price: Optional[float] = None
     repeat: Optional[bool] = None
     repeat_value: Optional[str] = None
+    repeat_count: Optional[int] = None  # qoida necha hafta; berilmasa oldingi uzunligi
     is_active: Optional[bool] = None
 
 
@@ -915,47 +912,41 @@ async def create_my_schedule(
         if st_t and en_t and not (st_t < en_t):
             raise HTTPException(status_code=400, detail=get_translation(language, "errors.400") or "Start end'dan kichik bo'lishi kerak")
 
-        _WEEKDAY_MAP = {'monday':0,'tuesday':1,'wednesday':2,'thursday':3,'friday':4,'saturday':5,'sunday':6}
-
-        def _make(target_date):
-            return Schedule(
-                salon_id=str(current_user.salon_id),
-                name=payload.name,
-                title=payload.title,
-                date=target_date,
-                start_time=st_t,
-                end_time=en_t,
-                repeat=bool(payload.repeat or False),
-                repeat_value=payload.repeat_value,
-                whole_day=bool(payload.whole_day or False),
-                employee_list=[str(current_user.id)],
-                price=payload.price,
-                is_active=bool(payload.is_active if payload.is_active is not None else True),
-            )
+        new_schedule = Schedule(
+            salon_id=str(current_user.salon_id),
+            name=payload.name,
+            title=payload.title,
+            date=d,
+            start_time=st_t,
+            end_time=en_t,
+            repeat=bool(payload.repeat or False),
+            repeat_value=payload.repeat_value,
+            whole_day=bool(payload.whole_day or False),
+            employee_list=[str(current_user.id)],
+            price=payload.price,
+            is_active=bool(payload.is_active if payload.is_active is not None else True),
+        )
 
-        # Repeat bo'lsa — haftalik takrorlash
+        # Repeat bo'lsa — haftalik takrorlanish qoidasi (bitta qator, sanalar o'qishda yoyiladi)
         if payload.repeat and payload.repeat_value:
-            repeat_count = min(payload.repeat_count or 1, 52)
-            raw_days = [x.strip().lower() for x in payload.repeat_value.split(',') if x.strip()]
-            target_weekdays = [_WEEKDAY_MAP[x] for x in raw_days if x in _WEEKDAY_MAP]
-            if not target_weekdays:
-                target_weekdays = [d.weekday()]
-            created = []
-            for weekday in target_weekdays:
-                days_ahead = (weekday - d.weekday()) % 7
-                first_occ = d + timedelta(days=days_ahead)
-                for i in range(repeat_count):
-                    created.append(_make(first_occ + timedelta(weeks=i)))
-            for s in created:
-                db.add(s)
-            db.commit()
-            for s in created:
-                db.refresh(s)
-            first_item = _to_my_item(created[0]) if created else None
-            return MyScheduleResponse(success=True, data=first_item)
-
-        # Oddiy — bitta schedule
-        new_schedule = _make(d)
+            new_schedule.repeat_until = repeat_until_for(d, payload.repeat_count or 1)
+            dates = list(rule_dates(d, new_schedule.repeat_until, payload.repeat_value, d, new_schedule.repeat_until))
+        else:
+            # Oddiy — bitta schedule
+            dates = [d]
+
+        # O'z jadvallari bilan kesishish — barcha sanalar bitta oyna sifatida
+        conflicts = find_schedule_conflicts(
+            db, current_user.salon_id, [current_user.id], dates, st_t, en_t,
+            whole_day=new_schedule.whole_day,
+        )
+        if conflicts:
+            raise HTTPException(
+                status_code=409,
+                detail=f"{get_translation(language, 'errors.schedule_overlap')}: "
+                + ", ".join(x.isoformat() for x in conflicts),
+            )
+
         db.add(new_schedule)
         db.commit()
         db.refresh(new_schedule)
@@ -1001,6 +992,9 @@ async def update_my_schedule(
         if not only_me:
             raise HTTPException(status_code=403, detail=get_translation(language, "errors.403") or "Faqat o'zingizga tegishli jadvalni tahrirlashingiz mumkin")
 
+        weeks = payload.repeat_count or rule_weeks(schedule)
+        was_rule = is_rule(schedule)
+
         # Maydonlarni yangilash
         if payload.name is not None:
             schedule.name = payload.name
@@ -1041,6 +1035,29 @@ async def update_my_schedule(
         # employee_list ni faqat o'ziga o'rnatamiz
         schedule.employee_list = [my_id]
 
+        # Takrorlanish o'zgarsa qoida (repeat_until) qayta hisoblanadi; eski
+        # materializatsiya qilingan qatorlar faqat repeat=True yuborilsa qoidaga aylanadi
+        if payload.repeat is not None or payload.repeat_value is not None or payload.date is not None or payload.repeat_count:
+            make_rule = bool(schedule.repeat) and schedule.date is not None and (was_rule or payload.repeat is not None)
+            dates = reset_rule(schedule, make_rule, weeks)
+        elif was_rule:
+            dates = list(rule_dates(schedule.date, schedule.repeat_until, schedule.repeat_value, schedule.date, schedule.repeat_until))
+        else:
+            dates = [schedule.date]
+
+        # O'z jadvallari bilan kesishish (o'zi hisobga olinmaydi)
+        conflicts = find_schedule_conflicts(
+            db, current_user.salon_id, [current_user.id], [x for x in dates if x is not None], st_t, en_t,
+            whole_day=bool(schedule.whole_day), exclude_id=schedule.id,
+        )
+        if conflicts:
+            db.rollback()
+            raise HTTPException(
+                status_code=409,
+                detail=f"{get_translation(language, 'errors.schedule_overlap')}: "
+                + ", ".join(x.isoformat() for x in conflicts),
+            )
+
         db.commit()
         db.refresh(schedule)
 
@@ -1052,6 +1069,131 @@ async def update_my_schedule(
         raise HTTPException(status_code=500, detail=get_translation(language, "errors.500"))
 
 
+# ==================== Bulk busy slots (ta'til, tanaffus) ====================
+class BusySlotIntervalIn(BaseModel):
+    date: str  # YYYY-MM-DD
+    start_time: str  # HH:MM
+    end_time: str  # HH:MM (start'dan kichik bo'lsa yarim tundan o'tadi)
+    reason: Optional[str] = None
+
+
+class BusySlotRecurrenceIn(BaseModel):
+    start_date: str  # YYYY-MM-DD
+    end_date: str  # YYYY-MM-DD
+    weekdays: Optional[str] = None  # "monday,friday"; bo'sh bo'lsa har kuni
+    start_time: str  # HH:MM
+    end_time: str  # HH:MM
+    reason: Optional[str] = None
+
+
+class BusySlotBulkCreate(BaseModel):
+    items: List[BusySlotIntervalIn] = []
+    recurrence: Optional[BusySlotRecurrenceIn] = None
+    # True bo'lsa bitta konflikt ham butun paketni bekor qiladi
+    atomic: bool = False
+
+
+class BusySlotBulkItem(BaseModel):
+    index: int
+    date: Optional[str] = None
+    start_time: Optional[str] = None
+    end_time: Optional[str] = None
+    status: str  # created | conflict | invalid | skipped
+    conflict: Optional[str] = None  # appointment | busy_slot | duplicate
+    id: Optional[str] = None
+
+
+class BusySlotBulkResponse(BaseModel):
+    success: bool
+    created: int
+    conflicts: int
+    data: List[BusySlotBulkItem]
+
+
+def _parse_busy_interval(index: int, day: str, start: str, end: str, reason: Optional[str]) -> BusyInterval:
+    st_t = datetime.strptime(start, "%H:%M").time()
+    en_t = datetime.strptime(end, "%H:%M").time()
+    if st_t == en_t:
+        raise ValueError("empty interval")
+    return BusyInterval(
+        index=index,
+        date=datetime.strptime(day, "%Y-%m-%d").date(),
+        start_time=st_t,
+        end_time=en_t,
+        reason=reason,
+    )
+
+
+@router.post(
+    "/me/busy-slots/bulk",
+    response_model=BusySlotBulkResponse,
+    summary="Mobil: Xodim bir nechta band vaqtni birdaniga belgilaydi",
+    description=(
+        "Intervallar ro'yxati va/yoki kunlar bo'yicha takrorlanish (ta'til, tanaffus). "
+        "Appointmentlar bilan kesishish bitta so'rovda tekshiriladi, natija har bir interval uchun qaytadi"
+    ),
+)
+async def create_my_busy_slots_bulk(
+    payload: BusySlotBulkCreate,
+    db: Session = Depends(get_db),
+    language: Union[str, None] = Header(None, alias="X-User-language"),
+    current_user = Depends(get_current_user),
+):
+    if getattr(current_user, "role", None) != "employee":
+        raise HTTPException(status_code=403, detail=get_translation(language, "errors.403"))
+
+    intervals: List[BusyInterval] = []
+    invalid: List[BusySlotBulkItem] = []
+    for i, item in enumerate(payload.items):
+        try:
+            intervals.append(_parse_busy_interval(i, item.date, item.start_time, item.end_time, item.reason))
+        except ValueError:
+            invalid.append(BusySlotBulkItem(index=i, date=item.date, start_time=item.start_time, end_time=item.end_time, status="invalid"))
+
+    rec = payload.recurrence
+    if rec is not None:
+        try:
+            start_d = datetime.strptime(rec.start_date, "%Y-%m-%d").date()
+            end_d = datetime.strptime(rec.end_date, "%Y-%m-%d").date()
+            if end_d < start_d:
+                raise ValueError("end before start")
+            if (end_d - start_d).days >= MAX_BULK_BUSY_SLOTS:
+                raise ValueError("range too long")
+            base = len(payload.items)
+            for offset, day in enumerate(recurrence_dates(start_d, end_d, rec.weekdays)):
+                intervals.append(
+                    _parse_busy_interval(base + offset, day.isoformat(), rec.start_time, rec.end_time, rec.reason)
+                )
+        except ValueError:
+            raise HTTPException(status_code=400, detail=get_translation(language, "errors.400"))
+
+    if len(intervals) + len(invalid) > MAX_BULK_BUSY_SLOTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{get_translation(language, 'errors.400')} (max {MAX_BULK_BUSY_SLOTS})",
+        )
+    if payload.atomic and invalid:
+        raise HTTPException(status_code=400, detail=get_translation(language, "errors.400"))
+
+    try:
+        results = bulk_create_busy_slots(db, str(current_user.id), intervals, atomic=payload.atomic)
+    except BookingLockTimeout:
+        raise HTTPException(
+            status_code=409,
+            detail=get_translation(language, "errors.slot_locked"),
+            headers={RETRY_AFTER_HEADER: "1"},
+        )
+
+    items = sorted([BusySlotBulkItem(**r) for r in results] + invalid, key=lambda x: x.index)
+    created = sum(1 for x in items if x.status == "created")
+    return BusySlotBulkResponse(
+        success=created > 0 or not items,
+        created=created,
+        conflicts=sum(1 for x in items if x.status == "conflict"),
+        data=items,
+    )
+
+
 # ==================== Available employees for a time window ====================
 class AvailableEmployeesResponse(BaseModel):
     success: bool
@@ -1125,30 +1267,15 @@ async def get_available_employees(
             except Exception:
                 return None
 
+        # Shu kundagi schedule'lar bir marta olinadi
+        day_schedules = load_schedule_occurrences(db, day, day, salon_id=salon_id)
+
         def is_within_work_window(emp: Employee) -> bool:
-            # If the employee has schedules on this day, require the interval to be fully inside ANY schedule window
-            day_schedules = (
-                db.query(Schedule)
-                .filter(and_(Schedule.date == day, Schedule.is_active == True))
-                .order_by(Schedule.start_time.asc())
-                .all()
-            )
-            has_emp_schedule = False
-            for sch in day_schedules:
-                try:
-                    emp_list = sch.employee_list or []
-                except Exception:
-                    emp_list = []
-                if str(emp.id) in emp_list:
-                    has_emp_schedule = True
-                    if sch.start_time and sch.end_time:
-                        sdt = datetime.combine(day, sch.start_time)
-                        edt = datetime.combine(day, sch.end_time)
-                        if start_dt >= sdt and end_dt <= edt:
-                            return True
-            if has_emp_schedule:
-                # Schedule bor, lekin tanlangan vaqt ichiga kirmadi
-                return False
+            # If the employee has schedules on this day, require the interval to be fully inside the schedule windows
+            emp_schedules = [sch for sch in day_schedules if str(emp.id) in (sch.employee_list or [])]
+            if emp_schedules:
+                blocks = [(sch.start_time, sch.end_time) for sch in emp_schedules if sch.start_time and sch.end_time]
+                return work_bitmap(day, blocks).covers(start_dt, end_dt)
 
             # Fallback: employee ish vaqti
             ws = _parse_hhmm(getattr(emp, "work_start_time", None))
@@ -1157,39 +1284,11 @@ async def get_available_employees(
                 return False
             return start_dt >= ws and end_dt <= we
 
+        # Appointments va busy slotlar bitta so'rovda, barcha xodimlar uchun bitmap ko'rinishida
+        busy_map = load_busy_bitmaps(db, [str(e.id) for e in employees], day)
+
         def is_busy(emp_id: str) -> bool:
-            # Appointments overlap
-            apps = (
-                db.query(Appointment)
-                .filter(
-                    and_(
-                        Appointment.employee_id == emp_id,
-                        Appointment.application_date == day,
-                        Appointment.is_cancelled == False,
-                        Appointment.status.in_(["pending", "accepted", "done"]),
-                    )
-                )
-                .all()
-            )
-            for a in apps:
-                s = datetime.combine(day, a.application_time)
-                dur = a.duration_minutes or 30
-                e = datetime.combine(day, a.end_time) if a.end_time else s + timedelta(minutes=dur)
-                if (start_dt < e) and (end_dt > s):
-                    return True
-
-            # Busy slots overlap
-            busy_rows = (
-                db.query(BusySlot)
-                .filter(and_(BusySlot.employee_id == emp_id, BusySlot.date == day))
-                .all()
-            )
-            for b in busy_rows:
-                bs = datetime.combine(day, b.start_time)
-                be = datetime.combine(day, b.end_time)
-                if (start_dt < be) and (end_dt > bs):
-                    return True
-            return False
+            return busy_map[emp_id].overlaps(start_dt, end_dt)
 
         items: List[MobileEmployeeItem] = []
         for emp in employees:
@@ -1280,39 +1379,11 @@ async def get_busy_employees(
         start_dt = datetime.combine(day, st)
         end_dt = datetime.combine(day, et)
 
+        # Appointments va busy slotlar bitta so'rovda, barcha xodimlar uchun bitmap ko'rinishida
+        busy_map = load_busy_bitmaps(db, [str(e.id) for e in employees], day)
+
         def is_busy(emp_id: str) -> bool:
-            # Appointments overlap
-            apps = (
-                db.query(Appointment)
-                .filter(
-                    and_(
-                        Appointment.employee_id == emp_id,
-                        Appointment.application_date == day,
-                        Appointment.is_cancelled == False,
-                        Appointment.status.in_(["pending", "accepted", "done"]),
-                    )
-                )
-                .all()
-            )
-            for a in apps:
-                s = datetime.combine(day, a.application_time)
-                dur = a.duration_minutes or 30
-                e = datetime.combine(day, a.end_time) if a.end_time else s + timedelta(minutes=dur)
-                if (start_dt < e) and (end_dt > s):
-                    return True
-
-            # Busy slots overlap
-            busy_rows = (
-                db.query(BusySlot)
-                .filter(and_(BusySlot.employee_id == emp_id, BusySlot.date == day))
-                .all()
-            )
-            for b in busy_rows:
-                bs = datetime.combine(day, b.start_time)
-                be = datetime.combine(day, b.end_time)
-                if (start_dt < be) and (end_dt > bs):
-                    return True
-            return False
+            return busy_map[emp_id].overlaps(start_dt, end_dt)
 
         items: List[MobileEmployeeItem] = []
         for emp in employees:
@@ -1392,39 +1463,10 @@ async def get_employee_busy_status(
         start_dt = datetime.combine(day, st)
         end_dt = datetime.combine(day, et)
 
+        busy = load_busy_bitmap(db, str(employee.id), day)
+
         def is_busy(emp_id: str) -> bool:
-            # Appointments overlap
-            apps = (
-                db.query(Appointment)
-                .filter(
-                    and_(
-                        Appointment.employee_id == emp_id,
-                        Appointment.application_date == day,
-                        Appointment.is_cancelled == False,
-                        Appointment.status.in_(["pending", "accepted", "done"]),
-                    )
-                )
-                .all()
-            )
-            for a in apps:
-                s = datetime.combine(day, a.application_time)
-                dur = a.duration_minutes or 30
-                e = datetime.combine(day, a.end_time) if a.end_time else s + timedelta(minutes=dur)
-                if (start_dt < e) and (end_dt > s):
-                    return True
-
-            # Busy slots overlap
-            busy_rows = (
-                db.query(BusySlot)
-                .filter(and_(BusySlot.employee_id == emp_id, BusySlot.date == day))
-                .all()
-            )
-            for b in busy_rows:
-                bs = datetime.combine(day, b.start_time)
-                be = datetime.combine(day, b.end_time)
-                if (start_dt < be) and (end_dt > bs):
-                    return True
-            return False
+            return busy.overlaps(start_dt, end_dt)
 
         items: List[MobileEmployeeItem] = []
         if is_busy(str(employee.id)):
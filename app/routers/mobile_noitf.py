@@ -12,6 +12,9 @@ from app.models.notif import Notif
 from app.models.notification import Notification
 from app.models.salon_comment import SalonComment
 from app.models.user import User
+from app.services.notif_subscriptions import notif_subscriptions
+from app.services.notification_feed import DEFAULT_LIMIT, MAX_LIMIT, InvalidCursor, feed_page, mark_all_read, mark_read
+from app.services.unread_counters import notifications_unread
 
 router = APIRouter(
     prefix="/mobile/notif",
@@ -27,14 +30,13 @@ async def check_notif(db: Session = Depends(get_db), current_user: User = Depend
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Foydalanuvchi aniqlanmadi"
         )
-    
-    user = db.query(User).filter(User.id == current_user.id).first()
-    if not user:
+    # current_user autentifikatsiyada yuklangan; obuna xotiradagi to'plamdan (notifs'ga so'rov yo'q)
+    if not isinstance(current_user, User):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Foydalanuvchi topilmadi"
         )
-    is_subscribed = bool(db.query(Notif).filter(Notif.user_id == user.id).first() is not None)
+    is_subscribed = notif_subscriptions.is_subscribed(str(current_user.id), db)
     return {"is_subscribed": is_subscribed}
 
 @router.post("/subscribe", summary="Subscribe user to notifications")
@@ -63,6 +65,7 @@ async def subscribe_notif(db: Session = Depends(get_db), current_user: User = De
     )
     db.add(new_notif)
     db.commit()
+    await notif_subscriptions.changed(str(user.id), True)
     return {"message": "Foydalanuvchi muvaffaqiyatli obuna bo'ldi"}
 
 @router.post("/unsubscribe", summary="Unsubscribe user from notifications")
@@ -87,9 +90,22 @@ async def unsubscribe_notif(db: Session = Depends(get_db), current_user: User =
     
     db.delete(existing_notif)
     db.commit()
+    await notif_subscriptions.changed(str(user.id), False)
     return {"message": "Foydalanuvchi muvaffaqiyatli obunadan chiqdi"}
 
 
+def _serialize(n: Notification) -> dict:
+    return {
+        "id": str(n.id),
+        "title": n.title,
+        "message": n.message,
+        "type": n.type,
+        "is_read": n.is_read,
+        "data": n.data,
+        "created_at": n.created_at.isoformat() if getattr(n, "created_at", None) else None,
+    }
+
+
 @router.get("/list", summary="Get user notifications")
 async def get_notifications(
     page: int = Query(1, ge=1),
@@ -98,6 +114,7 @@ async def get_notifications(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
+    """Sahifa raqami bilan (eski mijozlar uchun); yangi mijozlar /feed va /badge dan foydalanadi"""
     if not current_user or not current_user.id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Foydalanuvchi aniqlanmadi")
     offset = (page - 1) * limit
@@ -108,18 +125,7 @@ async def get_notifications(
         count_query = count_query.filter(Notification.is_read == False)
     total = count_query.scalar()
     notifs = query.order_by(Notification.created_at.desc()).offset(offset).limit(limit).all()
-    data = [
-        {
-            "id": str(n.id),
-            "title": n.title,
-            "message": n.message,
-            "type": n.type,
-            "is_read": n.is_read,
-            "data": n.data,
-            "created_at": n.created_at.isoformat() if getattr(n, "created_at", None) else None,
-        }
-        for n in notifs
-    ]
+    data = [_serialize(n) for n in notifs]
     return {
         "success": True,
         "data": data,
@@ -127,6 +133,73 @@ async def get_notifications(
     }
 
 
+@router.get("/feed", summary="Notification feed (cursor pagination)")
+async def get_notification_feed(
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    before: Optional[str] = Query(None, description="Shu bildirishnomadan eskilari (keyingi sahifa)"),
+    after: Optional[str] = Query(None, description="Shu bildirishnomadan yangilari (polling)"),
+    only_unread: Optional[bool] = Query(False),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    language: Union[str, None] = Header(None, alias="X-User-language"),
+):
+    """
+    Yangidan eskiga. Keyingi sahifa: before=pagination.before; yangi kelganlar:
+    after=pagination.after. Har sahifa (user_id, created_at, id) indeksidan
+    `limit + 1` qator o'qiydi, jami soni hisoblanmaydi — badge: unread_count.
+    """
+    if not current_user or not current_user.id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Foydalanuvchi aniqlanmadi")
+    try:
+        items, pagination = feed_page(db, str(current_user.id), limit, before, after, bool(only_unread))
+    except InvalidCursor:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=get_translation(language, "errors.invalid_cursor"),
+        )
+    return {
+        "success": True,
+        "data": [_serialize(n) for n in items],
+        "pagination": pagination,
+        "unread_count": notifications_unread(db, str(current_user.id)),
+    }
+
+
+@router.get("/badge", summary="Unread notifications count")
+async def get_notification_badge(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Polling uchun: bitta hisoblagich qatori o'qiladi (user_id unique indeksi)"""
+    if not current_user or not current_user.id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Foydalanuvchi aniqlanmadi")
+    return {"unread_count": notifications_unread(db, str(current_user.id))}
+
+
+@router.post("/read-all", summary="Mark all notifications (or up to a cursor) as read")
+async def mark_all_notifications_read(
+    up_to: Optional[str] = Query(None, description="Shu bildirishnoma va undan eskilari; bo'lmasa hammasi"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    language: Union[str, None] = Header(None, alias="X-User-language"),
+):
+    """
+    Bitta UPDATE. Ro'yxat ko'rsatilgandan keyin kelganlari o'qilmagan bo'lib
+    qolishi uchun mijoz up_to=<ko'rsatilgan eng yangi id> yuboradi.
+    """
+    if not current_user or not current_user.id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Foydalanuvchi aniqlanmadi")
+    try:
+        updated = mark_all_read(db, str(current_user.id), up_to)
+    except InvalidCursor:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=get_translation(language, "errors.invalid_cursor"),
+        )
+    db.commit()
+    return {"success": True, "updated": updated, "unread_count": notifications_unread(db, str(current_user.id))}
+
+
 @router.post("/{notif_id}/read", summary="Mark notification as read")
 async def mark_notification_read(
     notif_id: str,
@@ -135,10 +208,16 @@ async def mark_notification_read(
 ):
     if not current_user or not current_user.id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Foydalanuvchi aniqlanmadi")
-    notif = db.query(Notification).filter(Notification.id == notif_id, Notification.user_id == str(current_user.id)).first()
-    if not notif:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Notif topilmadi")
-    notif.is_read = True
+    if not mark_read(db, str(current_user.id), notif_id):
+        # O'qilgan yoki umuman yo'q
+        exists = db.query(Notification.id).filter(
+            Notification.id == notif_id, Notification.user_id == str(current_user.id)
+        ).first()
+        if not exists:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Notif topilmadi")
     db.commit()
-    db.refresh(notif)
-    return {"success": True, "data": {"id": str(notif.id), "is_read": notif.is_read}}
\ No newline at end of file
+    return {
+        "success": True,
+        "data": {"id": notif_id, "is_read": True},
+        "unread_count": notifications_unread(db, str(current_user.id)),
+    }
@@ -4,11 +4,11 @@ from sqlalchemy import func, and_
 from typing import List, Optional, Union
 from datetime import date, datetime, time, timedelta
 from pydantic import BaseModel, ConfigDict, Field, field_validator
-import uuid
 
 from app.auth.dependencies import get_current_user, get_current_user_optional
 from app.database import get_db
 from app.i18nMini import get_translation
+from app.models.admin import Admin
 from app.models.salon import Salon
 from app.models.schedule import Schedule
 from app.models.employee import Employee, EmployeeComment
@@ -17,9 +17,28 @@ from app.models.payment_card import PaymentCard
 from app.models.service import Service
 from app.models.user import User
 from app.models.user_premium import UserPremium
-from app.models.payment import ClickPayment, Payment as PaymentModel
-from app.models.notification import Notification
-from app.config import settings
+from app.models.payment import ClickPayment
+from app.services.availability import (
+    ACTIVE_APPOINTMENT_STATUSES,
+    hhmm,
+    load_busy_bitmap,
+    load_busy_bitmaps,
+    work_bitmap,
+)
+from app.services.booking_lock import BookingLockTimeout, reserve_employee_interval
+from app.services.idempotency import RETRY_AFTER_HEADER, run_idempotent_async
+from app.services.number_allocator import application_numbers
+from app.services.notifications import PendingNotification, notification_service
+from app.services.recurrence import group_by_date, load_schedule_occurrences, resolve_occurrence
+from app.services.booking_payments import (
+    PAYMENT_PENDING,
+    BookingCharge,
+    booking_payment_for,
+    fail_booking_payment,
+    submit_booking_charge,
+)
+from app.services.Click import PaymentStatus
+from app.services.availability_cache import CatalogService, availability_cache, service_catalog_cache
 from app.schemas.schedule_mobile import (
     MobileScheduleListResponse,
     MobileScheduleServiceItem,
@@ -112,6 +131,9 @@ class MobileBookedAppointmentItem(BaseModel):
 class MobileAppointmentResponse(BaseModel):
     success: bool
     message: str
+    appointment_id: Optional[str] = None
+    # pending | payment_pending (oldindan to'lov fon rejimida yechilmoqda)
+    status: Optional[str] = None
     # appointment_id: Optional[str] = None
     # application_number: Optional[str] = None
     # bookedAppointments: Optional[List[MobileBookedAppointmentItem]] = []
@@ -205,39 +227,79 @@ def _parse_hhmm(value: Optional[str]) -> Optional[time]:
         return None
 
 
-def _merge_intervals(intervals: List[tuple[datetime, datetime]]) -> List[tuple[datetime, datetime]]:
-    if not intervals:
-        return []
-    intervals = sorted(intervals, key=lambda x: x[0])
-    merged = [intervals[0]]
-    for start, end in intervals[1:]:
-        last_start, last_end = merged[-1]
-        if start <= last_end:
-            merged[-1] = (last_start, max(last_end, end))
-        else:
-            merged.append((start, end))
-    return merged
-
-
-def _subtract_intervals(base: tuple[datetime, datetime], busy: List[tuple[datetime, datetime]]) -> List[tuple[datetime, datetime]]:
-    """Subtract busy intervals from base and return free intervals."""
-    free: List[tuple[datetime, datetime]] = []
-    start, end = base
-    current = start
-    for b_start, b_end in busy:
-        # skip busy outside base
-        if b_end <= current:
+def _in_emp_list(emp_list, eid: str) -> bool:
+    if not emp_list:
+        return False
+    try:
+        if isinstance(emp_list, list):
+            # list elementlari string yoki object bo'lishi mumkin
+            return any(
+                (str(x) == str(eid)) or (isinstance(x, dict) and str(x.get("id")) == str(eid))
+                for x in emp_list
+            )
+        if isinstance(emp_list, str):
+            return str(eid) in emp_list
+    except Exception:
+        return False
+    return False
+
+
+def _employee_work_blocks(employee: Employee, day_schedules: List[Schedule]) -> List[tuple[time, time]]:
+    """Xodimning shu kundagi ish bloklari: Schedule'lardan, bo'lmasa umumiy ish vaqtidan"""
+    work_blocks: List[tuple[time, time]] = []
+    for sch in day_schedules:
+        try:
+            if _in_emp_list(sch.employee_list or [], str(employee.id)):
+                if sch.start_time and sch.end_time and sch.start_time < sch.end_time:
+                    work_blocks.append((sch.start_time, sch.end_time))
+        except Exception:
             continue
-        if b_start >= end:
-            break
-        if b_start > current:
-            free.append((current, b_start))
-        current = max(current, b_end)
-        if current >= end:
-            break
-    if current < end:
-        free.append((current, end))
-    return free
+
+    if not work_blocks:
+        # Fallback: xodimning umumiy ish vaqti
+        fallback_start = _parse_hhmm(employee.work_start_time)
+        fallback_end = _parse_hhmm(employee.work_end_time)
+        if fallback_start and fallback_end and fallback_start < fallback_end:
+            work_blocks.append((fallback_start, fallback_end))
+    return work_blocks
+
+
+def _salon_service_catalog(db: Session, salon_id: str) -> tuple:
+    """Salonning faol servislari (id, name, duration), davomiylik bo'yicha saralangan"""
+    def load():
+        rows = (
+            db.query(Service.id, Service.name, Service.duration)
+            .filter(Service.salon_id == salon_id, Service.is_active == True)
+            .order_by(Service.duration.asc())
+            .all()
+        )
+        return [CatalogService(row.id, row.name, int(row.duration or 0)) for row in rows]
+
+    return service_catalog_cache.get(salon_id, load)
+
+
+def _compute_free_slots(db: Session, employee: Employee, day: date, durations: List[int]) -> dict:
+    """Berilgan davomiyliklar uchun xodimning shu kundagi bo'sh slotlari (daqiqa indekslari)"""
+    # Ish oynasi: avvalo Schedule dan (shu sanada xodim bor bo'lsa), bo'lmasa Employee ish vaqti.
+    # Faqat xodim salonining shu kundagi (takrorlanuvchi qoidalar shu kunga yoyiladi) va
+    # employee_list'ida xodim id'si uchraydigan jadvallari o'qiladi; aniq tekshiruv
+    # _employee_work_blocks ichida
+    schedules = load_schedule_occurrences(
+        db, day, day, salon_id=employee.salon_id, employee_id=str(employee.id), active_only=False
+    )
+
+    # Bir kunda xodim qatnashadigan har bir Schedule blokini alohida ish oynasi sifatida ko'rib chiqamiz
+    # Agar Schedule bo'lmasa, xodimning umumiy ish vaqti bitta blok bo'ladi
+    work_blocks = _employee_work_blocks(employee, schedules or [])
+    if not work_blocks:
+        # Ish oynasi topilmasa, bo'sh slotlar yo'q
+        return {dur: [] for dur in durations}
+
+    # Band oraliqlar: appointments (pending|accepted|done va cancelled=False) + busy_slots.
+    # Ish oynasidan bandlarni ayirib, bo'sh daqiqalar bitmapini olamiz
+    busy = load_busy_bitmap(db, str(employee.id), day)
+    free = work_bitmap(day, work_blocks) - busy
+    return {dur: free.slot_indices(dur) for dur in durations}
 
 
 @router.get(
@@ -272,130 +334,24 @@ async def get_available_slots(
     except ValueError:
         raise HTTPException(status_code=400, detail=get_translation(language, "errors.400") or "Invalid date format")
 
-    # Ish oynasi: avvalo Schedule dan (shu sanada xodim bor bo'lsa), bo'lmasa Employee ish vaqti
-    schedules = (
-        db.query(Schedule)
-        .filter(Schedule.date == day)
-        .order_by(Schedule.start_time.asc())
-        .all()
-    )
+    # Servislar: xodim ishlayotgan salon bo'yicha faol servislar (salon katalogi keshidan)
+    services = _salon_service_catalog(db, employee.salon_id)
+    durations = sorted({svc.duration for svc in services if svc.duration > 0})
 
-    # Bir kunda xodim qatnashadigan har bir Schedule blokini alohida ish oynasi sifatida ko'rib chiqamiz
-    # Agar Schedule bo'lmasa, xodimning umumiy ish vaqti bitta blok bo'ladi
-    def _in_emp_list(emp_list, eid: str) -> bool:
-        if not emp_list:
-            return False
-        try:
-            if isinstance(emp_list, list):
-                # list elementlari string yoki object bo'lishi mumkin
-                return any(
-                    (str(x) == str(eid)) or (isinstance(x, dict) and str(x.get("id")) == str(eid))
-                    for x in emp_list
-                )
-            if isinstance(emp_list, str):
-                return str(eid) in emp_list
-        except Exception:
-            return False
-        return False
-
-    work_blocks: List[tuple[time, time]] = []
-    for sch in schedules or []:
-        try:
-            emp_list = sch.employee_list or []
-            if _in_emp_list(emp_list, employee_id):
-                if sch.start_time and sch.end_time and sch.start_time < sch.end_time:
-                    work_blocks.append((sch.start_time, sch.end_time))
-        except Exception:
-            continue
-
-    if not work_blocks:
-        # Fallback: xodimning umumiy ish vaqti
-        fallback_start = _parse_hhmm(employee.work_start_time)
-        fallback_end = _parse_hhmm(employee.work_end_time)
-        if fallback_start and fallback_end and fallback_start < fallback_end:
-            work_blocks.append((fallback_start, fallback_end))
-
-    if not work_blocks:
-        # Ish oynasi topilmasa, bo'sh slotlar yo'q
-        return AvailableSlotsResponse(success=True, employee_id=str(employee.id), date=day.isoformat(), data=[])
-
-    # Band oraliqlar: appointments (pending|accepted|done va cancelled=False) + busy_slots
-    from app.models.appointment import Appointment
-    from app.models.busy_slot import BusySlot
-
-    apps = (
-        db.query(Appointment)
-        .filter(
-            and_(
-                Appointment.employee_id == employee_id,
-                Appointment.application_date == day,
-                Appointment.is_cancelled == False,
-                Appointment.status.in_(["pending", "accepted", "done"]),
-            )
-        )
-        .all()
-    )
-
-    busy_rows = (
-        db.query(BusySlot)
-        .filter(and_(BusySlot.employee_id == employee_id, BusySlot.date == day))
-        .all()
-    )
-
-    # Busy intervallarni xom holatda yig'amiz (kun bo'yicha), keyin har bir ish blokiga clamp qilamiz
-    busy_intervals_raw: List[tuple[datetime, datetime]] = []
-    default_minutes = 30
-    for a in apps:
-        s = datetime.combine(day, a.application_time)
-        dur = a.duration_minutes or default_minutes
-        e = datetime.combine(day, a.end_time) if a.end_time else s + timedelta(minutes=dur)
-        if s < e:
-            busy_intervals_raw.append((s, e))
-
-    for b in busy_rows:
-        s = datetime.combine(day, b.start_time)
-        e = datetime.combine(day, b.end_time)
-        if s < e:
-            busy_intervals_raw.append((s, e))
-
-    # Har bir ish blokiga nisbatan bo'sh oraliqlarni hisoblaymiz
-    free_intervals_all: List[tuple[datetime, datetime]] = []
-    for ws, we in work_blocks:
-        block_start_dt = datetime.combine(day, ws)
-        block_end_dt = datetime.combine(day, we)
-        # Busylarni blok oynasiga clamp qilish
-        block_busy: List[tuple[datetime, datetime]] = []
-        for s, e in busy_intervals_raw:
-            cs = max(s, block_start_dt)
-            ce = min(e, block_end_dt)
-            if cs < ce:
-                block_busy.append((cs, ce))
-        busy_merged = _merge_intervals(block_busy)
-        free_intervals = _subtract_intervals((block_start_dt, block_end_dt), busy_merged)
-        free_intervals_all.extend(free_intervals)
-
-    # Servislar: xodim ishlayotgan salon bo'yicha faol servislar
-    services = (
-        db.query(Service)
-        .filter(Service.salon_id == employee.salon_id, Service.is_active == True)
-        .order_by(Service.duration.asc())
-        .all()
-    )
+    # Avval keshdan; yetishmagan davomiyliklar uchungina ish oynasi va bandliklar hisoblanadi
+    slots_by_duration, token = availability_cache.get_many(str(employee.id), day, durations)
+    missing = [dur for dur in durations if dur not in slots_by_duration]
+    if missing:
+        computed = _compute_free_slots(db, employee, day, missing)
+        availability_cache.put_many(str(employee.id), day, computed, token)
+        slots_by_duration.update(computed)
 
     data: List[AvailableServiceSlotsItem] = []
     for svc in services:
-        slots: List[AvailableSlotItem] = []
-        dur = int(svc.duration or 0)
+        dur = svc.duration
         if dur <= 0:
             continue
-        for f_start, f_end in free_intervals_all:
-            cursor = f_start
-            step = timedelta(minutes=dur)
-            while cursor + step <= f_end:
-                start_str = cursor.strftime("%H:%M")
-                end_str = (cursor + step).strftime("%H:%M")
-                slots.append(AvailableSlotItem(start=start_str, end=end_str))
-                cursor += step
+        slots = [AvailableSlotItem(start=hhmm(lo), end=hhmm(hi)) for lo, hi in slots_by_duration.get(dur, [])]
         if slots:
             data.append(
                 AvailableServiceSlotsItem(
@@ -436,6 +392,183 @@ async def get_my_available_slots(
     )
 
 
+@router.get(
+    "/available-slots/cache-stats",
+    summary="Bo'sh slotlar keshi statistikasi",
+    description=(
+        "Availability va salon servislar katalogi keshlarining hit/miss soni, hit rate va "
+        "invalidatsiyalar (faqat adminlar uchun)"
+    ),
+)
+async def get_available_slots_cache_stats(
+    language: Union[str, None] = Header(None, alias="X-User-language"),
+    current_user=Depends(get_current_user),
+):
+    role = str(getattr(current_user, "role", "") or "").lower()
+    if not (isinstance(current_user, Admin) or role in {"admin", "private_admin", "superadmin"}):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=get_translation(language, "errors.403"))
+    return {
+        "success": True,
+        "data": {**availability_cache.stats(), "service_catalog": service_catalog_cache.stats()},
+    }
+
+
+class NextAvailableSlotItem(BaseModel):
+    employee_id: str
+    date: str   # YYYY-MM-DD
+    start: str  # HH:MM
+    end: str    # HH:MM
+
+class NextAvailableSlotsResponse(BaseModel):
+    success: bool
+    service_id: str
+    duration_minutes: int
+    data: List[NextAvailableSlotItem]
+
+
+# Bir so'rovda yuklanadigan kunlar soni; N ta slot topilsa keyingi bo'lak yuklanmaydi
+NEXT_AVAILABLE_CHUNK_DAYS = 7
+
+
+def _find_next_slots(
+    db: Session,
+    employees: List[Employee],
+    salon_id: str,
+    duration: int,
+    start_day: date,
+    horizon_days: int,
+    limit: int,
+    not_before: Optional[datetime] = None,
+) -> List[NextAvailableSlotItem]:
+    """
+    start_day dan horizon_days kun ichida eng yaqin `limit` ta slotni topadi.
+
+    Schedule, appointments va busy_slots kunlar bo'lagi uchun bulk yuklanadi
+    (har bo'lak 3 ta so'rov); yetarli slot topilishi bilan skanerlash to'xtaydi.
+    """
+    found: List[NextAvailableSlotItem] = []
+    employee_ids = [str(e.id) for e in employees]
+    chunk_start = start_day
+    end_day = start_day + timedelta(days=horizon_days)
+
+    while chunk_start < end_day and len(found) < limit:
+        chunk_days = min(NEXT_AVAILABLE_CHUNK_DAYS, (end_day - chunk_start).days)
+        chunk_end = chunk_start + timedelta(days=chunk_days - 1)
+
+        schedules_by_day = group_by_date(
+            load_schedule_occurrences(db, chunk_start, chunk_end, salon_id=salon_id)
+        )
+
+        busy_map = load_busy_bitmaps(db, employee_ids, chunk_start, chunk_days)
+
+        for offset in range(chunk_days):
+            day = chunk_start + timedelta(days=offset)
+            day_schedules = schedules_by_day.get(day, [])
+            day_slots: List[tuple[int, str, int]] = []
+            for emp in employees:
+                work_blocks = _employee_work_blocks(emp, day_schedules)
+                if not work_blocks:
+                    continue
+                free = work_bitmap(day, work_blocks) - busy_map[str(emp.id)]
+                if not_before is not None:
+                    free.remove(free.start, not_before)
+                for lo, hi in free.slot_indices(duration):
+                    day_slots.append((lo, str(emp.id), hi))
+            # Kun ichida barcha xodimlar slotlari vaqt bo'yicha tartiblanadi
+            for lo, eid, hi in sorted(day_slots):
+                found.append(
+                    NextAvailableSlotItem(employee_id=eid, date=day.isoformat(), start=hhmm(lo), end=hhmm(hi))
+                )
+                if len(found) >= limit:
+                    return found
+
+        chunk_start = chunk_end + timedelta(days=1)
+
+    return found
+
+
+@router.get(
+    "/next-available",
+    response_model=NextAvailableSlotsResponse,
+    summary="Mobil: Eng yaqin bo'sh slotlar (bir necha kun)",
+    description=(
+        "Xodim (employee_id) yoki salon (salon_id) va servis bo'yicha start_date dan boshlab "
+        "days kun (max 30) ichidagi eng yaqin limit ta bo'sh slotni qaytaradi."
+    ),
+)
+async def get_next_available_slots(
+    service_id: str = Query(..., description="Servis ID"),
+    employee_id: Optional[str] = Query(None, description="Xodim ID (salon_id berilmasa majburiy)"),
+    salon_id: Optional[str] = Query(None, description="Salon ID (employee_id berilmasa majburiy)"),
+    start_date: Optional[str] = Query(None, description="YYYY-MM-DD formatida boshlang'ich sana (standart: bugun)"),
+    days: int = Query(30, ge=1, le=30),
+    limit: int = Query(5, ge=1, le=50),
+    db: Session = Depends(get_db),
+    language: Union[str, None] = Header(None, alias="X-User-language"),
+):
+    if not employee_id and not salon_id:
+        raise HTTPException(status_code=400, detail=get_translation(language, "errors.400") or "employee_id yoki salon_id majburiy")
+
+    now = datetime.now()
+    if start_date:
+        try:
+            start_day = datetime.strptime(start_date, "%Y-%m-%d").date()
+        except ValueError:
+            raise HTTPException(status_code=400, detail=get_translation(language, "errors.400") or "Invalid date format")
+    else:
+        start_day = now.date()
+
+    employee_filter = and_(Employee.is_active == True, Employee.deleted_at.is_(None))
+    if employee_id:
+        employees = db.query(Employee).filter(and_(Employee.id == employee_id, employee_filter)).all()
+        if not employees:
+            raise HTTPException(status_code=404, detail=get_translation(language, "errors.404"))
+        if salon_id and str(employees[0].salon_id) != str(salon_id):
+            raise HTTPException(status_code=404, detail=get_translation(language, "errors.404"))
+        salon_id = str(employees[0].salon_id)
+    else:
+        employees = (
+            db.query(Employee)
+            .filter(and_(Employee.salon_id == salon_id, employee_filter))
+            .order_by(Employee.created_at.asc())
+            .all()
+        )
+
+    svc = (
+        db.query(Service)
+        .filter(and_(Service.id == service_id, Service.salon_id == salon_id, Service.is_active == True))
+        .first()
+    )
+    if not svc:
+        raise HTTPException(
+            status_code=404,
+            detail=get_translation(language, "errors.service_not_found") or "Xizmat topilmadi",
+        )
+    duration = int(svc.duration or 0)
+    if duration <= 0:
+        raise HTTPException(
+            status_code=400,
+            detail=get_translation(language, "errors.service_duration_invalid") or "Xizmat davomiyligi noto'g'ri",
+        )
+
+    data = (
+        _find_next_slots(
+            db,
+            employees,
+            salon_id,
+            duration,
+            start_day,
+            days,
+            limit,
+            not_before=now if start_day <= now.date() else None,
+        )
+        if employees
+        else []
+    )
+
+    return NextAvailableSlotsResponse(success=True, service_id=str(svc.id), duration_minutes=duration, data=data)
+
+
 @router.get(
     "/filters/{salon_id}",
     response_model=MobileScheduleDailyFiltersResponse,
@@ -525,18 +658,14 @@ async def get_mobile_schedule_filters(
         )
     end_dt = start_dt + timedelta(days=6)
 
+    # 7 kunlik oyna bir marta yuklanadi (qoidalar yoyilgan holda), keyin kunlarga bo'linadi
+    schedules_by_day = group_by_date(load_schedule_occurrences(db, start_dt, end_dt, salon_id=salon_id))
+
     # 7 kunlik har kun uchun alohida ro'yxat tayyorlash
     daily_items: List[MobileScheduleDailyFiltersItem] = []
     day_iter = start_dt
     while day_iter <= end_dt:
-        day_schedules: List[Schedule] = (
-            db.query(Schedule)
-            .filter(Schedule.salon_id == salon_id)
-            .filter(Schedule.is_active == True)
-            .filter(Schedule.date == day_iter)
-            .order_by(Schedule.start_time.asc())
-            .all()
-        )
+        day_schedules = schedules_by_day.get(day_iter, [])
 
         # Directions
         day_directions: List[str] = sorted({s.name for s in day_schedules if s.name})
@@ -643,40 +772,54 @@ async def get_mobile_schedules_by_salon(
 
     offset = (page - 1) * limit
 
-    query = db.query(Schedule).filter(Schedule.salon_id == salon_id)
-    count_query = db.query(func.count(Schedule.id)).filter(
-        Schedule.salon_id == salon_id
-    )
-
     if date_filter:
-        query = query.filter(Schedule.date == date_filter)
-        count_query = count_query.filter(Schedule.date == date_filter)
+        # Takrorlanuvchi qoidalar shu kunga yoyiladi (istisnolari bilan), qolgan
+        # filtrlar va sahifalash yoyilgan ro'yxatda
+        occurrences = load_schedule_occurrences(db, date_filter, date_filter, salon_id=salon_id, active_only=False)
+        if direction:
+            occurrences = [s for s in occurrences if direction.lower() in (s.name or "").lower()]
+        if employee_id:
+            occurrences = [s for s in occurrences if employee_id in [str(e) for e in (s.employee_list or [])]]
+        if start_hour is not None and end_hour is not None:
+            st = time(hour=start_hour)
+            et = time(hour=end_hour)
+            occurrences = [
+                s for s in occurrences
+                if s.start_time is not None and s.end_time is not None and s.start_time <= et and s.end_time >= st
+            ]
+        total = len(occurrences)
+        schedules = occurrences[offset:offset + limit]
+    else:
+        query = db.query(Schedule).filter(Schedule.salon_id == salon_id)
+        count_query = db.query(func.count(Schedule.id)).filter(
+            Schedule.salon_id == salon_id
+        )
 
-    if direction:
-        query = query.filter(Schedule.name.ilike(f"%{direction}%"))
-        count_query = count_query.filter(Schedule.name.ilike(f"%{direction}%"))
+        if direction:
+            query = query.filter(Schedule.name.ilike(f"%{direction}%"))
+            count_query = count_query.filter(Schedule.name.ilike(f"%{direction}%"))
+
+        if employee_id:
+            query = query.filter(Schedule.employee_list.contains([employee_id]))
+            count_query = count_query.filter(Schedule.employee_list.contains([employee_id]))
+
+        # Time range filter by hours if provided
+        if start_hour is not None and end_hour is not None:
+            st = time(hour=start_hour)
+            et = time(hour=end_hour)
+            query = query.filter(and_(Schedule.start_time <= et, Schedule.end_time >= st))
+            count_query = count_query.filter(
+                and_(Schedule.start_time <= et, Schedule.end_time >= st)
+            )
 
-    if employee_id:
-        query = query.filter(Schedule.employee_list.contains([employee_id]))
-        count_query = count_query.filter(Schedule.employee_list.contains([employee_id]))
-
-    # Time range filter by hours if provided
-    if start_hour is not None and end_hour is not None:
-        st = time(hour=start_hour)
-        et = time(hour=end_hour)
-        query = query.filter(and_(Schedule.start_time <= et, Schedule.end_time >= st))
-        count_query = count_query.filter(
-            and_(Schedule.start_time <= et, Schedule.end_time >= st)
+        total = count_query.scalar() or 0
+        schedules: List[Schedule] = (
+            query.order_by(Schedule.date.asc(), Schedule.start_time.asc())
+            .offset(offset)
+            .limit(limit)
+            .all()
         )
 
-    total = count_query.scalar() or 0
-    schedules: List[Schedule] = (
-        query.order_by(Schedule.date.asc(), Schedule.start_time.asc())
-        .offset(offset)
-        .limit(limit)
-        .all()
-    )
-
     # Prepare employee id -> name cache
     emp_cache: dict = {}
 
@@ -823,8 +966,33 @@ async def create_appointment(
     db: Session = Depends(get_db),
     language: Union[str, None] = Header(None, alias="X-User-language"),
     current_user: Optional[User] = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ):
+    """
+    Yangi appointment yaratish - salon, servis, vaqt, employee va karta tekshirish bilan.
+
+    Idempotency-Key berilsa, takroriy so'rovga birinchi natija qaytariladi
+    (to'lov va to'qnashuv tekshiruvi qayta bajarilmaydi).
+    """
+    return await run_idempotent_async(
+        db,
+        scope="mobile_appointments",
+        key=idempotency_key,
+        owner=str(current_user.id) if current_user else None,
+        payload=appointment_data.model_dump(mode="json"),
+        handler=lambda: _create_appointment(appointment_data, db, language, current_user),
+    )
+
+
+async def _create_appointment(
+    appointment_data: MobileAppointmentCreate,
+    db: Session,
+    language: Optional[str],
+    current_user: Optional[User],
+) -> MobileAppointmentResponse:
     """Yangi appointment yaratish - salon, servis, vaqt, employee va karta tekshirish bilan"""
+    new_appointment = None
+    awaiting_payment = False
     try:
         # 1. Salon mavjudligini tekshirish
         salon = (
@@ -878,6 +1046,15 @@ async def create_appointment(
                 detail=get_translation(language, "errors.date_not_specified")
                 or "Sana aniqlanmadi",
             )
+        # Qoida bo'lsa shu sanadagi haqiqiy takrorlanish (istisnosi bilan): vaqt,
+        # narx va xodimlar shundan olinadi; bu sanada jadval bo'lmasa 404
+        schedule = resolve_occurrence(db, schedule, resolved_date)
+        if schedule is None:
+            raise HTTPException(
+                status_code=404,
+                detail=get_translation(language, "errors.schedule_not_found")
+                or "Jadval topilmadi",
+            )
         # Tanlangan vaqt majburiy
         selected_time = appointment_data.application_time
         if selected_time is None:
@@ -988,79 +1165,20 @@ async def create_appointment(
                         or "Xizmat tugash vaqti jadval oralig'ida emas",
                     )
 
-        # 7. Interval asosida to'qnashuvlarni tekshirish
+        # 7. Interval (to'qnashuv tekshiruvi 10-qadamda, lock ostida)
         
         # Determine duration if not set (default 60 mins for safety in overlap check)
         if not selected_end_time:
              duration_minutes = 60
              selected_end_time = (datetime.combine(resolved_date, selected_time) + timedelta(minutes=duration_minutes)).time()
 
-        from app.models.busy_slot import BusySlot
-        
         start_dt = datetime.combine(resolved_date, selected_time)
-        end_dt = datetime.combine(resolved_date, selected_end_time)
-
-        # Appointmentlar bilan to'qnashuv (cancelled=False va status in pending|accepted|done)
-        existing_apps = (
-            db.query(Appointment)
-            .filter(
-                and_(
-                    Appointment.employee_id == appointment_data.employee_id,
-                    Appointment.application_date == resolved_date,
-                    Appointment.is_cancelled == False,
-                    Appointment.status.in_(["pending", "accepted", "done", "confirmed"]),
-                )
-            )
-            .all()
-        )
-
-        for app in existing_apps:
-            app_start = datetime.combine(resolved_date, app.application_time)
-            if app.end_time:
-                # Handle midnight crossing
-                if app.end_time < app.application_time:
-                    app_end = datetime.combine(resolved_date + timedelta(days=1), app.end_time)
-                else:
-                    app_end = datetime.combine(resolved_date, app.end_time)
-            else:
-                app_duration = app.duration_minutes or 60
-                app_end = app_start + timedelta(minutes=app_duration)
-            
-            # Overlap condition: start < other.end AND end > other.start
-            if start_dt < app_end and end_dt > app_start:
-                    raise HTTPException(
-                        status_code=409,
-                        detail=get_translation(language, "errors.master_busy")
-                        or "Bu vaqtda master band",
-                    )
-
-        # Busy slots bilan to'qnashuv
-        busy_rows = (
-            db.query(BusySlot)
-            .filter(and_(BusySlot.employee_id == appointment_data.employee_id, BusySlot.date == resolved_date))
-            .all()
-        )
-        for b in busy_rows:
-            bs = datetime.combine(resolved_date, b.start_time)
-            # Handle midnight crossing for busy slots
-            if b.end_time < b.start_time:
-                be = datetime.combine(resolved_date + timedelta(days=1), b.end_time)
-            else:
-                be = datetime.combine(resolved_date, b.end_time)
-            
-            if start_dt < be and end_dt > bs:
-                raise HTTPException(
-                    status_code=409,
-                    detail=get_translation(language, "errors.master_busy")
-                    or "Bu vaqtda master band",
-                )
+        end_dt = start_dt + timedelta(minutes=duration_minutes)
 
         # 8. Application number yaratish
-        application_number = (
-            f"APP-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
-        )
+        application_number = application_numbers.next(db)
 
-        # 9. Oldindan to'lov talab etilsa — avval to'lovni amalga oshirish
+        # 9. Oldindan to'lov talab etilsa — summa va kartani tekshirish (yechib olish 11-qadamda)
         #    schedule.full_pay > 0 bo'lsa, to'liq to'lov; aks holda deposit > 0 bo'lsa, deposit miqdori
         prepay_amount = 0.0
         try:
@@ -1133,65 +1251,8 @@ async def create_appointment(
             except Exception:
                 pass
 
-            # ClickPayment yozuvi yaratish
-            click_payment = ClickPayment(
-                payment_for=f"booking_{application_number}",
-                amount=str(prepay_amount),
-                # amount=1000,
-                status="created",
-                payment_card_id=str(payment_card.id),
-            )
-            db.add(click_payment)
-            db.commit()
-            db.refresh(click_payment)
-
-            # Token orqali to'lovni amalga oshirish
-            result = settings.click_provider.payment_with_token(
-                card_token=payment_card.card_token,
-                amount=prepay_amount,
-                merchant_trans_id=click_payment.id,
-            )
-
-            # Xatolik bo'lsa to'lovni bekor qilamiz
-            if result.get("error_code") and result.get("error_code") != 0:
-                click_payment.status = "error"
-                db.add(click_payment)
-                db.commit()
-                raise HTTPException(
-                    status_code=402,
-                    detail=(
-                        result.get("error_note")
-                        or get_translation(language, "errors.payment_failed")
-                        or "To'lov amalga oshmadi"
-                    ),
-                )
-
-            # Muvaffaqiyatli bo'lsa — ClickPayment va bizning Payment jadvaliga yozamiz
-            click_payment.status = "confirmed"
-            if result.get("payment_id"):
-                click_payment.click_paydoc_id = str(result.get("payment_id"))
-            db.add(click_payment)
-            db.commit()
-
-            # payments jadvaliga yozish (qaysi user, qaysi salon, qaysi xizmat)
-            payment_row = PaymentModel(
-                user_id=current_user.id if current_user else None,
-                employee_id=appointment_data.employee_id,
-                salon_id=appointment_data.salon_id,
-                amount=int(round(prepay_amount)),
-                payment_type="service_booking",
-                transaction_id=str(click_payment.id),
-                click_trans_id=(str(result.get("payment_id")) if result.get("payment_id") else None),
-                status="completed",
-                description=(
-                    f"Prepay for {service_name} ({application_number})"
-                    + (" with 10% premium discount" if premium_discount_applied else "")
-                ),
-            )
-            db.add(payment_row)
-            db.commit()
-
-        # 10. Appointment yaratish
+        # 10. Appointment: slot lock ostida tekshiriladi va darhol yoziladi.
+        #     To'lov lock'dan tashqarida, slot band qilingandan keyin amalga oshiriladi
         # Mijoz ismini olish prioritet:
         # 1. Agar login qilgan bo'lsa - User.full_name > User.first_name + last_name > User.username
         # 2. Aks holda - mobil dasturdan jo'natilgan user_name
@@ -1240,15 +1301,70 @@ async def create_appointment(
             employee_id=appointment_data.employee_id,
             service_name=service_name,
             service_price=service_price,
-            status="pending",
+            status=PAYMENT_PENDING if prepay_amount > 0 else "pending",
             is_confirmed=False,
             is_completed=False,
             is_cancelled=False,
         )
 
-        db.add(new_appointment)
-        db.commit()
+        try:
+            reserved = reserve_employee_interval(
+                db,
+                appointment_data.employee_id,
+                start_dt,
+                end_dt,
+                [new_appointment],
+                statuses=ACTIVE_APPOINTMENT_STATUSES + ("confirmed",),
+                default_minutes=60,
+            )
+        except BookingLockTimeout:
+            raise HTTPException(
+                status_code=409,
+                detail=get_translation(language, "errors.slot_locked")
+                or "Bu vaqt hozir band qilinmoqda, qaytadan urinib ko'ring",
+                headers={RETRY_AFTER_HEADER: "1"},
+            )
+        if not reserved:
+            raise HTTPException(
+                status_code=409,
+                detail=get_translation(language, "errors.master_busy")
+                or "Bu vaqtda master band",
+            )
         db.refresh(new_appointment)
+
+        # 11. Oldindan to'lov: ClickPayment yoziladi, yechib olish fon worker'ida.
+        #     Appointment payment_pending holatida qoladi; natija webhook yoki worker orqali
+        #     keladi, mijoz /appointments/{id}/status orqali kuzatadi
+        if prepay_amount > 0:
+            awaiting_payment = True
+            click_payment = ClickPayment(
+                payment_for=booking_payment_for(application_number),
+                amount=str(prepay_amount),
+                status=PaymentStatus.PENDING.value,
+                payment_card_id=str(payment_card.id),
+            )
+            db.add(click_payment)
+            db.commit()
+            db.refresh(click_payment)
+
+            submit_booking_charge(
+                BookingCharge(
+                    click_payment_id=str(click_payment.id),
+                    appointment_id=str(new_appointment.id),
+                    card_token=payment_card.card_token,
+                    amount=prepay_amount,
+                    user_id=str(current_user.id),
+                    salon_id=appointment_data.salon_id,
+                    employee_id=appointment_data.employee_id,
+                    description=(
+                        f"Prepay for {service_name} ({application_number})"
+                        + (" with 10% premium discount" if premium_discount_applied else "")
+                    ),
+                    language=language,
+                )
+            )
+            awaiting_payment = False
+
         try:
             if current_user:
                 note_lang = (language or '').lower()
@@ -1261,7 +1377,7 @@ async def create_appointment(
                 else:
                     title = "Appointment created"
                     message = "You created a salon appointment"
-                notif = Notification(
+                notification_service.notify(PendingNotification(
                     user_id=str(current_user.id),
                     title=title,
                     message=message,
@@ -1273,9 +1389,7 @@ async def create_appointment(
                         "date": resolved_date.isoformat(),
                         "time": selected_time.strftime("%H:%M"),
                     },
-                )
-                db.add(notif)
-                db.commit()
+                ))
         except Exception:
             pass
 
@@ -1322,6 +1436,7 @@ async def create_appointment(
             message=get_translation(language, "success.appointment_created")
             or "Appointment muvaffaqiyatli yaratildi",
             appointment_id=str(new_appointment.id),
+            status=new_appointment.status,
             application_number=new_appointment.application_number,
             bookedAppointments=booked_items,
         )
@@ -1330,6 +1445,12 @@ async def create_appointment(
         raise
     except Exception as e:
         db.rollback()
+        if awaiting_payment and new_appointment is not None:
+            # To'lovni navbatga qo'yishda xatolik: band qilingan slotni bo'shatamiz
+            try:
+                fail_booking_payment(db, None, appointment=new_appointment)
+            except Exception:
+                db.rollback()
         print(f"Error creating appointment: {e}")
         raise HTTPException(
             status_code=500,
@@ -1337,6 +1458,58 @@ async def create_appointment(
         )
 
 
+class MobileAppointmentStatusResponse(BaseModel):
+    success: bool
+    appointment_id: str
+    application_number: str
+    status: str
+    is_cancelled: bool
+    cancellation_reason: Optional[str] = None
+
+
+@router.get(
+    "/appointments/{appointment_id}/status",
+    response_model=MobileAppointmentStatusResponse,
+    summary="Mobil: Appointment holati",
+    description=(
+        "Oldindan to'lov natijasini kuzatish uchun yengil endpoint: "
+        "payment_pending -> pending (to'lov o'tdi) yoki cancelled (to'lov o'tmadi)"
+    ),
+)
+async def get_appointment_status(
+    appointment_id: str,
+    db: Session = Depends(get_db),
+    language: Union[str, None] = Header(None, alias="X-User-language"),
+    current_user=Depends(get_current_user_optional),
+):
+    row = (
+        db.query(
+            Appointment.id,
+            Appointment.application_number,
+            Appointment.status,
+            Appointment.is_cancelled,
+            Appointment.cancellation_reason,
+            Appointment.user_id,
+        )
+        .filter(Appointment.id == appointment_id)
+        .first()
+    )
+    if not row:
+        raise HTTPException(status_code=404, detail=get_translation(language, "errors.404"))
+    # Login qilgan foydalanuvchining appointmenti faqat o'ziga ko'rinadi
+    if row.user_id and (not current_user or str(current_user.id) != str(row.user_id)):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=get_translation(language, "errors.403"))
+
+    return MobileAppointmentStatusResponse(
+        success=True,
+        appointment_id=str(row.id),
+        application_number=row.application_number,
+        status=row.status or "pending",
+        is_cancelled=bool(row.is_cancelled),
+        cancellation_reason=row.cancellation_reason,
+    )
+
+
 @router.get(
     "/employee/{employee_id}",
     response_model=MobileEmployeeWeeklyResponse,
@@ -1365,16 +1538,7 @@ async def get_mobile_schedules_by_employee(
     total_days = 7
     end_dt = start_dt + timedelta(days=total_days - 1)
 
-    schedules = (
-        db.query(Schedule)
-        .filter(
-            Schedule.date >= start_dt,
-            Schedule.date <= end_dt,
-            Schedule.is_active == True,
-        )
-        .order_by(Schedule.date.asc(), Schedule.start_time.asc())
-        .all()
-    )
+    schedules = load_schedule_occurrences(db, start_dt, end_dt, employee_id=employee_id)
 
     services_by_date = {}
 
@@ -1593,18 +1757,8 @@ async def get_employee_daily_summary(
             detail=get_translation(language, "errors.400") or "Invalid date format. Use YYYY-MM-DD",
         )
 
-    # Fetch schedules for target date that include the employee
-    schedules = (
-        db.query(Schedule)
-        .filter(
-            and_(
-                Schedule.date == target_date,
-                Schedule.is_active == True,
-            )
-        )
-        .order_by(Schedule.start_time.asc())
-        .all()
-    )
+    # Fetch schedules for target date that include the employee (recurring rules expanded)
+    schedules = load_schedule_occurrences(db, target_date, target_date, employee_id=employee_id)
 
     def _has_employee(emp_list, eid: str) -> bool:
         if not emp_list:
@@ -1688,18 +1842,7 @@ async def get_employee_weekly_summary(
     total_days = 7
     end_dt = start_dt + timedelta(days=total_days - 1)
 
-    schedules = (
-        db.query(Schedule)
-        .filter(
-            and_(
-                Schedule.date >= start_dt,
-                Schedule.date <= end_dt,
-                Schedule.is_active == True,
-            )
-        )
-        .order_by(Schedule.date.asc(), Schedule.start_time.asc())
-        .all()
-    )
+    schedules_by_day = group_by_date(load_schedule_occurrences(db, start_dt, end_dt, employee_id=employee_id))
 
     def _has_employee(emp_list, eid: str) -> bool:
         if not emp_list:
@@ -1716,7 +1859,7 @@ async def get_employee_weekly_summary(
     daily_items: List[SimpleEmployeeDailySummary] = []
     for i in range(total_days):
         day_dt = start_dt + timedelta(days=i)
-        day_scheds = [s for s in schedules if s.date == day_dt]
+        day_scheds = schedules_by_day.get(day_dt, [])
         matched = [s for s in day_scheds if _has_employee(s.employee_list, employee_id)]
         av = bool(matched)
 
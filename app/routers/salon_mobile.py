@@ -19,12 +19,12 @@ from app.schemas.salon import (
     NearbySalonItem
 )
 from app.models.employee import Employee, EmployeeComment
-from app.models.schedule import Schedule
 from app.models.appointment import Appointment
 from app.models.user_favourite_salon import UserFavouriteSalon
 from app.models.user import User
 from app.auth.dependencies import get_current_user_optional
 from app.models.user_premium import UserPremium
+from app.services.recurrence import load_schedule_occurrences
 
 router = APIRouter(prefix="/mobile/salons", tags=["Mobile Salons"])
 
@@ -244,13 +244,9 @@ def get_salon_working_days(db: Session, salon_id: str) -> Optional[str]:
         start = date.today()
         end = start + timedelta(days=6)
         
-        schedule_dates = (
-            db.query(Schedule.date)
-            .filter(Schedule.salon_id == salon_id, Schedule.date >= start, Schedule.date <= end)
-            .all()
-        )
-        
-        weekdays = sorted({d[0].weekday() for d in schedule_dates if d and d[0]})
+        schedules = load_schedule_occurrences(db, start, end, salon_id=salon_id, active_only=False)
+
+        weekdays = sorted({s.date.weekday() for s in schedules if s.date})
         day_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
         
         if weekdays:
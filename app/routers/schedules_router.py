@@ -2,7 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException, Header, Query, status
 from sqlalchemy.orm import Session
 from sqlalchemy import func, or_
 from typing import Optional, List, Dict, Any, Union
+from contextlib import nullcontext
 from datetime import date, datetime, time, timedelta
+from datetime import date as _date  # ScheduleUpdate.date maydoni tipni yopib qo'ymasligi uchun
 from pydantic import BaseModel, Field
 
 from app.auth.dependencies import get_current_user
@@ -11,10 +13,24 @@ from app.models.user import User
 from app.models.admin import Admin
 from app.database import get_db
 from app.models import Schedule, Salon
-from app.models.schedule import ScheduleBook as ScheduleBookModel
+from app.models.schedule import ScheduleBook as ScheduleBookModel, ScheduleException
 from app.models.busy_slot import BusySlot
 from app.models.employee import Employee
-from app.models.appointment import Appointment
+from app.services.availability import load_busy_bitmap
+from app.services.booking_lock import BookingLockTimeout, employee_day_lock, reserve_employee_interval
+from app.services.idempotency import RETRY_AFTER_HEADER
+from app.services.number_allocator import booking_numbers
+from app.services.recurrence import (
+    MAX_REPEAT_WEEKS,
+    expand_schedules,
+    find_schedule_conflicts,
+    is_rule,
+    load_schedule_occurrences,
+    repeat_until_for,
+    reset_rule,
+    rule_dates,
+    rule_weeks,
+)
 from sqlalchemy import and_
 
 router = APIRouter(prefix="/schedules", tags=["schedules"])
@@ -54,11 +70,13 @@ class ScheduleUpdate(BaseModel):
     salon_id: Optional[str] = None
     name: Optional[str] = None
     title: Optional[str] = None
-    date: Optional[date] = None
+    date: Optional[_date] = None
     start_time: Optional[time] = None
     end_time: Optional[time] = None
     repeat: Optional[bool] = None
     repeat_value: Optional[str] = None
+    # Qoida necha hafta davom etadi; berilmasa oldingi uzunligi saqlanadi
+    repeat_count: Optional[int] = None
     employee_list: Optional[List[str]] = None
     price: Optional[float] = None
     full_pay: Optional[float] = None
@@ -69,6 +87,15 @@ class ScheduleUpdate(BaseModel):
     service_duration: Optional[int] = 0
 
 
+class ScheduleOccurrenceUpdate(BaseModel):
+    start_time: Optional[time] = None
+    end_time: Optional[time] = None
+    whole_day: Optional[bool] = None
+    employee_list: Optional[List[str]] = None
+    price: Optional[float] = None
+    is_cancelled: bool = False
+
+
 class ScheduleResponse(BaseModel):
     id: str
     salon_id: str
@@ -142,51 +169,6 @@ async def book_schedule(
                 detail=get_translation(language, "errors.404"),
             )
 
-        # Check appointments overlap
-        apps = (
-            db.query(Appointment)
-            .filter(
-                and_(
-                    Appointment.employee_id == booking_data.employee_id,
-                    Appointment.application_date == date_part,
-                    Appointment.is_cancelled == False,
-                    Appointment.status.in_(["pending", "accepted", "done"]),
-                )
-            )
-            .all()
-        )
-        for a in apps:
-            s_dt = datetime.combine(date_part, a.application_time)
-            e_dt = (
-                datetime.combine(date_part, a.end_time)
-                if getattr(a, "end_time", None)
-                else s_dt + timedelta(minutes=(a.duration_minutes or 30))
-            )
-            if (datetime.combine(date_part, time_part) < e_dt) and (end_dt > s_dt):
-                raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail=get_translation(language, "errors.409"),
-                )
-
-        # Check existing busy slots overlap
-        bs_rows = (
-            db.query(BusySlot)
-            .filter(
-                and_(
-                    BusySlot.employee_id == booking_data.employee_id,
-                    BusySlot.date == date_part,
-                )
-            )
-            .all()
-        )
-        for bs in bs_rows:
-            bs_s = datetime.combine(date_part, bs.start_time)
-            bs_e = datetime.combine(date_part, bs.end_time)
-            if (datetime.combine(date_part, time_part) < bs_e) and (end_dt > bs_s):
-                raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail=get_translation(language, "errors.409"),
-                )
     booking_number = booking_data.booking_number or _generate_booking_number(
         db, date_part
     )
@@ -202,9 +184,10 @@ async def book_schedule(
         booking_number=booking_number,
     )
 
-    db.add(new_booking)
-    # Create busy slot to block future bookings/appointments for this interval
     if booking_data.employee_id:
+        # Create busy slot to block future bookings/appointments for this interval.
+        # Appointments va busy slotlar bilan to'qnashuv tekshiruvi va yozish
+        # bitta (employee, kun) lock ostida bajariladi
         bs = BusySlot(
             employee_id=booking_data.employee_id,
             date=date_part,
@@ -212,8 +195,28 @@ async def book_schedule(
             end_time=end_dt.time(),
             reason="booking",
         )
-        db.add(bs)
-    db.commit()
+        try:
+            reserved = reserve_employee_interval(
+                db,
+                booking_data.employee_id,
+                datetime.combine(date_part, time_part),
+                end_dt,
+                [new_booking, bs],
+            )
+        except BookingLockTimeout:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=get_translation(language, "errors.slot_locked"),
+                headers={RETRY_AFTER_HEADER: "1"},
+            )
+        if not reserved:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=get_translation(language, "errors.409"),
+            )
+    else:
+        db.add(new_booking)
+        db.commit()
     db.refresh(new_booking)
 
     return {
@@ -385,98 +388,90 @@ async def update_booking(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=get_translation(language, "errors.400"),
                 )
-        apps = (
-            db.query(Appointment)
-            .filter(
-                and_(
-                    Appointment.employee_id == booking_data.employee_id,
-                    Appointment.application_date == date_part,
-                    Appointment.is_cancelled == False,
-                    Appointment.status.in_(["pending", "accepted", "done"]),
-                )
-            )
-            .all()
-        )
-        for a in apps:
-            s_dt = datetime.combine(date_part, a.application_time)
-            e_dt = (
-                datetime.combine(date_part, a.end_time)
-                if getattr(a, "end_time", None)
-                else s_dt + timedelta(minutes=(a.duration_minutes or 30))
-            )
-            if (datetime.combine(date_part, time_part) < e_dt) and (end_dt > s_dt):
-                raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail=get_translation(language, "errors.409"),
-                )
 
-        bs_rows = (
-            db.query(BusySlot)
-            .filter(
-                and_(
-                    BusySlot.employee_id == booking_data.employee_id,
-                    BusySlot.date == date_part,
-                )
-            )
-            .all()
-        )
-        for bs in bs_rows:
-            bs_s = datetime.combine(date_part, bs.start_time)
-            bs_e = datetime.combine(date_part, bs.end_time)
-            if (datetime.combine(date_part, time_part) < bs_e) and (end_dt > bs_s):
+    # Bandlik tekshiruvi va yozish bitta (employee, kun) lock ostida
+    start_dt = datetime.combine(date_part, time_part)
+    lock = (
+        employee_day_lock(db, booking_data.employee_id, start_dt, end_dt)
+        if booking_data.employee_id
+        else nullcontext()
+    )
+    try:
+        with lock:
+            if booking_data.employee_id:
                 # allow updating the same slot if it exactly matches previous
-                if not (
-                    booking_full_prev_date == bs.date
-                    and booking_full_prev_start == bs.start_time
-                    and booking_full_prev_end == bs.end_time
-                ):
+                prev_slot_ids = [
+                    row.id
+                    for row in db.query(BusySlot.id).filter(
+                        and_(
+                            BusySlot.employee_id == booking_data.employee_id,
+                            BusySlot.date == booking_full_prev_date,
+                            BusySlot.start_time == booking_full_prev_start,
+                            BusySlot.end_time == booking_full_prev_end,
+                        )
+                    )
+                ]
+                busy = load_busy_bitmap(
+                    db,
+                    booking_data.employee_id,
+                    date_part,
+                    exclude_busy_slot_ids=prev_slot_ids,
+                    locking_read=True,
+                )
+                if busy.overlaps(start_dt, end_dt):
                     raise HTTPException(
                         status_code=status.HTTP_409_CONFLICT,
                         detail=get_translation(language, "errors.409"),
                     )
 
-    booking.full_name = booking_data.full_name
-    booking.phone = booking_data.phone
-    booking.time = date_part
-    booking.start_time = time_part
-    booking.end_time = end_dt.time()
-    booking.employee_id = booking_data.employee_id
-
-    # Update related busy slot: find previous and update or create new
-    if booking.employee_id:
-        prev_slot = (
-            db.query(BusySlot)
-            .filter(
-                and_(
-                    BusySlot.employee_id == booking.employee_id,
-                    BusySlot.date == booking_full_prev_date,
-                    BusySlot.start_time == booking_full_prev_start,
-                    BusySlot.end_time == booking_full_prev_end,
+            booking.full_name = booking_data.full_name
+            booking.phone = booking_data.phone
+            booking.time = date_part
+            booking.start_time = time_part
+            booking.end_time = end_dt.time()
+            booking.employee_id = booking_data.employee_id
+
+            # Update related busy slot: find previous and update or create new
+            if booking.employee_id:
+                prev_slot = (
+                    db.query(BusySlot)
+                    .filter(
+                        and_(
+                            BusySlot.employee_id == booking.employee_id,
+                            BusySlot.date == booking_full_prev_date,
+                            BusySlot.start_time == booking_full_prev_start,
+                            BusySlot.end_time == booking_full_prev_end,
+                        )
+                    )
+                    .first()
                 )
-            )
-            .first()
+                if prev_slot:
+                    prev_slot.date = date_part
+                    prev_slot.start_time = time_part
+                    prev_slot.end_time = end_dt.time()
+                    prev_slot.reason = "booking"
+                else:
+                    bs = BusySlot(
+                        employee_id=booking.employee_id,
+                        date=date_part,
+                        start_time=time_part,
+                        end_time=end_dt.time(),
+                        reason="booking",
+                    )
+                    db.add(bs)
+
+            if not getattr(booking, "booking_number", None):
+                try:
+                    booking.booking_number = _generate_booking_number(db, date_part)
+                except Exception:
+                    pass
+            db.commit()
+    except BookingLockTimeout:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=get_translation(language, "errors.slot_locked"),
+            headers={RETRY_AFTER_HEADER: "1"},
         )
-        if prev_slot:
-            prev_slot.date = date_part
-            prev_slot.start_time = time_part
-            prev_slot.end_time = end_dt.time()
-            prev_slot.reason = "booking"
-        else:
-            bs = BusySlot(
-                employee_id=booking.employee_id,
-                date=date_part,
-                start_time=time_part,
-                end_time=end_dt.time(),
-                reason="booking",
-            )
-            db.add(bs)
-
-    if not getattr(booking, "booking_number", None):
-        try:
-            booking.booking_number = _generate_booking_number(db, date_part)
-        except Exception:
-            pass
-    db.commit()
     db.refresh(booking)
 
     return {
@@ -557,17 +552,16 @@ async def delete_booking(
 async def get_schedules_grouped_by_date(
     employee_id: Optional[str] = Query(None),
     salon_id: Optional[str] = Query(None),
+    end_date: Optional[date] = Query(None, description="Oyna oxiri (default: bugundan 1 yil)"),
     db: Session = Depends(get_db),
     language: Union[str, None] = Header(None, alias="X-User-language"),
 ):
     """Расписания, сгруппированные по реальной дате (не по дню недели)"""
-    from datetime import date as _date
-    today = _date.today()
+    today = date.today()
+    # Повторяющиеся правила разворачиваются только в пределах окна
+    window_end = end_date or (today + timedelta(weeks=MAX_REPEAT_WEEKS))
 
-    q = db.query(Schedule).filter(Schedule.is_active == True, Schedule.date >= today)
-    if salon_id:
-        q = q.filter(Schedule.salon_id == salon_id)
-    all_schedules = q.order_by(Schedule.date, Schedule.created_at).all()
+    all_schedules = load_schedule_occurrences(db, today, window_end, salon_id=salon_id or None)
 
     # Filter by employee_id if provided
     if employee_id:
@@ -649,26 +643,33 @@ async def get_schedules_by_salon(
 
     offset = (page - 1) * limit
 
-    query = db.query(Schedule).filter(Schedule.salon_id == salon_id)
-    count_query = db.query(func.count(Schedule.id)).filter(
-        Schedule.salon_id == salon_id
-    )
-
     if date_filter:
-        query = query.filter(Schedule.date == date_filter)
-        count_query = count_query.filter(Schedule.date == date_filter)
+        # Takrorlanuvchi qoidalar shu kunga yoyiladi (istisnolari bilan)
+        occurrences = [
+            item
+            for item in load_schedule_occurrences(db, date_filter, date_filter, salon_id=salon_id, active_only=False)
+            if is_active is None or bool(item.is_active) == is_active
+        ]
+        occurrences.sort(key=lambda item: item.created_at or datetime.min, reverse=True)
+        total = len(occurrences)
+        schedules = occurrences[offset:offset + limit]
+    else:
+        query = db.query(Schedule).filter(Schedule.salon_id == salon_id)
+        count_query = db.query(func.count(Schedule.id)).filter(
+            Schedule.salon_id == salon_id
+        )
 
-    if is_active is not None:
-        query = query.filter(Schedule.is_active == is_active)
-        count_query = count_query.filter(Schedule.is_active == is_active)
+        if is_active is not None:
+            query = query.filter(Schedule.is_active == is_active)
+            count_query = count_query.filter(Schedule.is_active == is_active)
 
-    total = count_query.scalar()
-    schedules = (
-        query.order_by(Schedule.date.desc(), Schedule.created_at.desc())
-        .offset(offset)
-        .limit(limit)
-        .all()
-    )
+        total = count_query.scalar()
+        schedules = (
+            query.order_by(Schedule.date.desc(), Schedule.created_at.desc())
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
 
     return {
         "success": True,
@@ -732,17 +733,6 @@ async def get_all_schedules(
     }
 
 
-WEEKDAY_MAP = {
-    'monday': 0,
-    'tuesday': 1,
-    'wednesday': 2,
-    'thursday': 3,
-    'friday': 4,
-    'saturday': 5,
-    'sunday': 6,
-}
-
-
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_schedule(
     schedule_data: ScheduleCreate,
@@ -765,73 +755,72 @@ async def create_schedule(
             detail="Start time must be earlier than end time",
         )
 
-    def make_schedule(target_date):
-        return Schedule(
-            salon_id=schedule_data.salon_id,
-            name=schedule_data.name,
-            title=schedule_data.title,
-            date=target_date,
-            start_time=schedule_data.start_time,
-            end_time=schedule_data.end_time,
-            repeat=schedule_data.repeat,
-            repeat_value=schedule_data.repeat_value,
-            employee_list=schedule_data.employee_list,
-            price=schedule_data.price,
-            full_pay=schedule_data.full_pay,
-            deposit=schedule_data.deposit,
-            is_active=schedule_data.is_active,
-            whole_day=schedule_data.whole_day,
-            service_duration=schedule_data.service_duration,
-        )
+    new_schedule = Schedule(
+        salon_id=schedule_data.salon_id,
+        name=schedule_data.name,
+        title=schedule_data.title,
+        date=schedule_data.date,
+        start_time=schedule_data.start_time,
+        end_time=schedule_data.end_time,
+        repeat=schedule_data.repeat,
+        repeat_value=schedule_data.repeat_value,
+        employee_list=schedule_data.employee_list,
+        price=schedule_data.price,
+        full_pay=schedule_data.full_pay,
+        deposit=schedule_data.deposit,
+        is_active=schedule_data.is_active,
+        whole_day=schedule_data.whole_day,
+        service_duration=schedule_data.service_duration,
+    )
 
-    # Repeat bo'lsa — tanlangan hafta kunlari bo'yicha repeat_count marta (haftalik) yaratamiz
+    # Repeat bo'lsa — bitta qoida qatori: tanlangan hafta kunlari bo'yicha repeat_count hafta
+    # (max 52). Sanalar o'qishda so'ralgan oyna uchun yoyiladi
     if schedule_data.repeat and (schedule_data.repeat_count or 1) >= 1:
-        repeat_count = min(schedule_data.repeat_count or 1, 52)  # max 52 hafta (1 yil)
-
-        # Hafta kunlarini aniqlash
-        if schedule_data.repeat_value:
-            raw_days = [d.strip().lower() for d in schedule_data.repeat_value.split(',') if d.strip()]
-            target_weekdays = [WEEKDAY_MAP[d] for d in raw_days if d in WEEKDAY_MAP]
-        else:
-            # repeat_value yo'q bo'lsa — tanlangan sananing o'z hafta kuni
-            target_weekdays = [schedule_data.date.weekday()]
-
-        if not target_weekdays:
-            target_weekdays = [schedule_data.date.weekday()]
-
-        created = []
-        for weekday in target_weekdays:
-            # Shu hafta kunining birinchi sanasini topamiz (start date dan boshlab)
-            days_ahead = (weekday - schedule_data.date.weekday()) % 7
-            first_occ = schedule_data.date + timedelta(days=days_ahead)
-            for i in range(repeat_count):
-                target_date = first_occ + timedelta(weeks=i)
-                sched = make_schedule(target_date)
-                db.add(sched)
-                created.append(sched)
-
-        db.commit()
-        for s in created:
-            db.refresh(s)
-
-        return {
-            "success": True,
-            "message": get_translation(language, "success"),
-            "data": created,
-            "count": len(created),
-        }
+        new_schedule.repeat_until = repeat_until_for(schedule_data.date, schedule_data.repeat_count or 1)
+        dates = list(
+            rule_dates(
+                schedule_data.date,
+                new_schedule.repeat_until,
+                schedule_data.repeat_value,
+                schedule_data.date,
+                new_schedule.repeat_until,
+            )
+        )
+    else:
+        # Oddiy (repeat=False) — bitta sana
+        dates = [schedule_data.date]
+
+    # Xodimlarning mavjud jadvallari bilan kesishish — butun davr bitta oyna sifatida
+    conflicts = find_schedule_conflicts(
+        db,
+        schedule_data.salon_id,
+        schedule_data.employee_list,
+        dates,
+        schedule_data.start_time,
+        schedule_data.end_time,
+        whole_day=bool(schedule_data.whole_day),
+    )
+    if conflicts:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"{get_translation(language, 'errors.schedule_overlap')}: "
+            + ", ".join(d.isoformat() for d in conflicts),
+        )
 
-    # Oddiy (repeat=False) — bitta schedule
-    new_schedule = make_schedule(schedule_data.date)
     db.add(new_schedule)
     db.commit()
     db.refresh(new_schedule)
 
+    # Repeat javobi avvalgidek sanalar ro'yxati (qoida id'si bilan, yozuv bitta)
+    data = (
+        expand_schedules([new_schedule], dates[0], dates[-1]) if new_schedule.repeat_until else new_schedule
+    )
+
     return {
         "success": True,
         "message": get_translation(language, "success"),
-        "data": new_schedule,
-        "count": 1,
+        "data": data,
+        "count": len(dates),
     }
 
 
@@ -884,10 +873,50 @@ async def update_schedule(
             )
 
     update_dict = update_data.model_dump(exclude_unset=True)
+    repeat_count = update_dict.pop("repeat_count", None)
+    weeks = repeat_count or rule_weeks(schedule)
+    was_rule = is_rule(schedule)
 
     for key, value in update_dict.items():
         setattr(schedule, key, value)
 
+    if schedule.start_time and schedule.end_time and schedule.start_time >= schedule.end_time:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Start time must be earlier than end time",
+        )
+
+    # Qoida faqat repeat_until bilan aniqlanadi: repeat/sana/hafta kunlari o'zgarsa qayta hisoblanadi.
+    # Eski (materializatsiya qilingan) repeat=True qatorlar faqat repeat=True yuborilsa qoidaga aylanadi
+    if {"repeat", "repeat_value", "date"} & update_dict.keys() or repeat_count:
+        make_rule = bool(schedule.repeat) and schedule.date is not None and (was_rule or "repeat" in update_dict)
+        dates = reset_rule(schedule, make_rule, weeks)
+    else:
+        dates = list(
+            rule_dates(schedule.date, schedule.repeat_until, schedule.repeat_value, schedule.date, schedule.repeat_until)
+        ) if was_rule else [schedule.date]
+
+    if {"repeat", "repeat_value", "date", "start_time", "end_time", "employee_list", "whole_day", "salon_id"} & (
+        update_dict.keys()
+    ) or repeat_count:
+        conflicts = find_schedule_conflicts(
+            db,
+            schedule.salon_id,
+            schedule.employee_list or [],
+            [d for d in dates if d is not None],
+            schedule.start_time,
+            schedule.end_time,
+            whole_day=bool(schedule.whole_day),
+            exclude_id=schedule.id,
+        )
+        if conflicts:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"{get_translation(language, 'errors.schedule_overlap')}: "
+                + ", ".join(d.isoformat() for d in conflicts),
+            )
+
     db.commit()
     db.refresh(schedule)
 
@@ -931,20 +960,125 @@ async def delete_schedule(
     }
 
 
-def _generate_booking_number(db: Session, day: date) -> str:
-    import secrets
-
-    base = f"BOOK-{day.strftime('%Y%m%d')}"
-    while True:
-        suffix = secrets.token_hex(4).upper()
-        number = f"{base}-{suffix}"
-        exists = (
-            db.query(ScheduleBookModel)
-            .filter(ScheduleBookModel.booking_number == number)
-            .first()
+def _get_rule_occurrence(db: Session, id: str, occurrence_date: date, language) -> Schedule:
+    """Takrorlanuvchi jadval va sana uning qoidasiga tegishli ekanini tekshiradi"""
+    schedule = db.query(Schedule).filter(Schedule.id == id).first()
+    if not schedule:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=get_translation(language, "errors.404"),
         )
-        if not exists:
-            return number
+    if schedule.repeat_until is None or not any(
+        rule_dates(schedule.date, schedule.repeat_until, schedule.repeat_value, occurrence_date, occurrence_date)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=get_translation(language, "errors.400"),
+        )
+    return schedule
+
+
+def _upsert_exception(db: Session, schedule: Schedule, occurrence_date: date) -> ScheduleException:
+    exception = (
+        db.query(ScheduleException)
+        .filter(ScheduleException.schedule_id == schedule.id, ScheduleException.date == occurrence_date)
+        .first()
+    )
+    if exception is None:
+        exception = ScheduleException(schedule_id=schedule.id, date=occurrence_date)
+        db.add(exception)
+    # Kesh invalidatsiyasi qoidaning xodimlarini shu bog'lanish orqali oladi
+    exception.schedule = schedule
+    return exception
+
+
+@router.put("/{id}/occurrences/{occurrence_date}")
+async def update_schedule_occurrence(
+    id: str,
+    occurrence_date: date,
+    update_data: ScheduleOccurrenceUpdate,
+    db: Session = Depends(get_db),
+    current_user: Union[Admin, User, Employee] = Depends(get_current_user),
+    language: Union[str, None] = Header(None, alias="X-User-language"),
+):
+    """Takrorlanuvchi jadvalning bitta sanasini o'zgartirish (qoidaning o'zi o'zgarmaydi)"""
+    schedule = _get_rule_occurrence(db, id, occurrence_date, language)
+
+    start_time = update_data.start_time or schedule.start_time
+    end_time = update_data.end_time or schedule.end_time
+    if start_time and end_time and start_time >= end_time:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Start time must be earlier than end time",
+        )
+
+    if not update_data.is_cancelled:
+        employee_list = (
+            update_data.employee_list if update_data.employee_list is not None else schedule.employee_list
+        )
+        whole_day = update_data.whole_day if update_data.whole_day is not None else schedule.whole_day
+        conflicts = find_schedule_conflicts(
+            db,
+            schedule.salon_id,
+            employee_list,
+            [occurrence_date],
+            start_time,
+            end_time,
+            whole_day=bool(whole_day),
+            exclude_id=schedule.id,
+        )
+        if conflicts:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"{get_translation(language, 'errors.schedule_overlap')}: {occurrence_date.isoformat()}",
+            )
+
+    exception = _upsert_exception(db, schedule, occurrence_date)
+    exception.is_cancelled = update_data.is_cancelled
+    for field in ("start_time", "end_time", "whole_day", "employee_list", "price"):
+        setattr(exception, field, getattr(update_data, field))
+    db.commit()
+
+    occurrences = [
+        item
+        for item in load_schedule_occurrences(
+            db, occurrence_date, occurrence_date, salon_id=schedule.salon_id, active_only=False
+        )
+        if item.id == schedule.id
+    ]
+
+    return {
+        "success": True,
+        "message": get_translation(language, "success"),
+        "data": occurrences[0] if occurrences else None,
+    }
+
+
+@router.delete("/{id}/occurrences/{occurrence_date}")
+async def cancel_schedule_occurrence(
+    id: str,
+    occurrence_date: date,
+    db: Session = Depends(get_db),
+    current_user: Union[Admin, User, Employee] = Depends(get_current_user),
+    language: Union[str, None] = Header(None, alias="X-User-language"),
+):
+    """Takrorlanuvchi jadvalning bitta sanasini bekor qilish"""
+    schedule = _get_rule_occurrence(db, id, occurrence_date, language)
+
+    exception = _upsert_exception(db, schedule, occurrence_date)
+    exception.is_cancelled = True
+    db.commit()
+
+    return {
+        "success": True,
+        "message": get_translation(language, "success"),
+        "data": {"id": schedule.id, "date": occurrence_date.isoformat(), "is_cancelled": True},
+    }
+
+
+def _generate_booking_number(db: Session, day: date) -> str:
+    # Kun bo'yicha ketma-ket raqam: blok band qilingach, so'rovsiz beriladi
+    return booking_numbers.next(db, day)
 
 
 @router.get("/book/number/{booking_number}")
@@ -1,5 +1,7 @@
-from typing import Dict, Set, Any, Optional, List
+from typing import Callable, Dict, Set, Any, Optional, List
+import asyncio
 import json
+import uuid
 from datetime import datetime, timezone, timedelta
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status, Depends, Query as FastQuery, HTTPException
@@ -9,6 +11,7 @@ from sqlalchemy import func, or_, and_
 from sqlalchemy.orm import Session
 
 from app.auth.jwt_utils import JWTUtils
+from app.config import settings
 from app.database import SessionLocal, get_db
 from app.auth.dependencies import get_current_user
 from app.models.user import User
@@ -17,39 +20,320 @@ from app.models.salon import Salon
 from app.models.admin import Admin
 from app.models.user_chat import UserChat
 from app.models.message import Message
-from app.models.notification import Notification
-from app.models.notif import Notif
+from app.services.chat_history import MAX_LIMIT, InvalidCursor, history_page, resume_page
+from app.services.chat_list import latest_messages, load_parties, party_name, unread_counts
+from app.services.message_writer import MessageWriter, PendingMessage, write_messages
+from app.services.notifications import PendingNotification, notification_service
+from app.services.presence import PRESENCE_CHANNEL, PresenceMap
+from app.services.pubsub import PubSubBackend, create_pubsub
+from app.services.unread_counters import mark_chat_read, unread_total
 
 
 router = APIRouter(prefix="/api", tags=["WS"])
 
+# Bitta participant (user/xodim/salon) socketlariga yuborish kanali: "<participant>\n<payload>"
+DIRECT_CHANNEL = "__direct__"
+
+
+class _Connection:
+    """Bitta socket: chegaralangan chiqish navbati, uni yuboruvchi vazifa, oxirgi faollik"""
+
+    def __init__(self, websocket: WebSocket, maxsize: int, on_error, participant: Optional[str] = None):
+        self.websocket = websocket
+        self.participant = participant
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._on_error = on_error
+        loop = asyncio.get_running_loop()
+        self.last_activity = loop.time()
+        self.task = loop.create_task(self._run())
+
+    def offer(self, payload: str) -> bool:
+        try:
+            self.queue.put_nowait(payload)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _run(self):
+        try:
+            while True:
+                payload = await self.queue.get()
+                await self.websocket.send_text(payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Socket uzilgan
+            self._on_error(self.websocket, status.WS_1011_INTERNAL_ERROR)
+
 
 class ConnectionManager:
-    def __init__(self):
+    """
+    Lokal WebSocket xonalari + pub/sub orqali boshqa workerlardagi shu xonalar.
+
+    broadcast avval shu worker'dagi socketlarga yuboradi, keyin xabarni
+    xona kanaliga publish qiladi; boshqa workerlar uni o'z socketlariga
+    yetkazadi. Worker faqat o'zida ochiq xonalarga obuna bo'ladi.
+
+    Har bir socketning o'z navbati (send_queue_size) va yozuvchi vazifasi bor:
+    broadcast payloadni bir marta serialize qilib navbatlarga qo'yadi va
+    kutmaydi. Navbati to'lgan (sekin) mijoz 1013 kodi bilan uziladi — qayta
+    ulanib, tarixni after-cursor bilan oladi.
+
+    Heartbeat: har heartbeat_interval da jim turgan socketlarga {"event":"ping"}
+    yuboriladi; idle_timeout davomida mijozdan hech narsa kelmasa (yarim ochiq
+    mobil ulanish) socket 1001 bilan uziladi va xonalardan chiqariladi.
+    Presence (online / last_seen) shu heartbeat bilan workerlar orasida yangilanadi.
+    """
+
+    def __init__(
+        self,
+        pubsub: Optional[PubSubBackend] = None,
+        send_queue_size: Optional[int] = None,
+        heartbeat_interval: Optional[float] = None,
+        idle_timeout: Optional[float] = None,
+    ):
         self.rooms: Dict[str, Set[WebSocket]] = {}
+        self.connections: Dict[WebSocket, _Connection] = {}
+        # participant -> shu workerdagi socketlari (send_to uchun)
+        self.participants: Dict[str, Set[WebSocket]] = {}
+        # Boshqa servislar kanallari: kanal -> handler(payload), boshqa workerlardan kelganlar uchun
+        self.listeners: Dict[str, Callable[[str], None]] = {}
+        self.send_queue_size = send_queue_size or settings.chat_send_queue_size
+        self.heartbeat_interval = heartbeat_interval or settings.chat_heartbeat_seconds
+        self.idle_timeout = idle_timeout or settings.chat_idle_timeout_seconds
+        self.pubsub = pubsub or create_pubsub(settings.chat_pubsub_url)
+        self.worker_id = uuid.uuid4().hex
+        # Boshqa workerlarning to'liq ro'yxati shu vaqt ichida yangilanmasa, ular offline
+        self.presence = PresenceMap(self.worker_id, ttl=self.heartbeat_interval * 3)
+        self.dropped = 0
+        self.reaped = 0
+        self._pubsub_started = False
+        self._pubsub_lock = asyncio.Lock()
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    async def _ensure_pubsub(self):
+        if self._pubsub_started:
+            return
+        # Heartbeat (ping, reaping, presence muddati) pub/sub ishga tushishidan mustaqil
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+        async with self._pubsub_lock:
+            if self._pubsub_started:
+                return
+            try:
+                await self.pubsub.start(self._on_pubsub_message)
+                self.pubsub.subscribe(PRESENCE_CHANNEL)
+                self.pubsub.subscribe(DIRECT_CHANNEL)
+                for channel in self.listeners:
+                    self.pubsub.subscribe(channel)
+            except Exception as e:
+                # Keyingi accept/broadcast qayta urinadi; lokal yetkazish ishlayveradi
+                print(f"[WS] pub/sub start failed: {e}")
+                return
+            self._pubsub_started = True
 
-    async def connect(self, room_id: str, websocket: WebSocket):
+    async def accept(self, websocket: WebSocket, participant: Optional[str] = None):
+        """participant — presence uchun (user/employee id, admin uchun salon id)"""
         await websocket.accept()
+        await self._ensure_pubsub()
+        self._register(websocket, participant)
+        if participant and self.presence.connected(participant):
+            await self._publish_presence(self.presence.message(online=[participant]))
+
+    async def connect(self, room_id: str, websocket: WebSocket, participant: Optional[str] = None):
+        await self.accept(websocket, participant)
+        await self.join(room_id, websocket)
+
+    async def join(self, room_id: str, websocket: WebSocket):
+        """Add an already accepted socket to a room (multiplexed connections join many)."""
+        await self._ensure_pubsub()
+        self._register(websocket)
+        if room_id not in self.rooms:
+            self.pubsub.subscribe(room_id)
         self.rooms.setdefault(room_id, set()).add(websocket)
 
+    async def receive(self, websocket: WebSocket) -> str:
+        """receive_text + faollikni belgilash (heartbeat uchun har qanday xabar hisoblanadi)"""
+        data = await websocket.receive_text()
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            connection.last_activity = asyncio.get_running_loop().time()
+        return data
+
     def disconnect(self, room_id: str, websocket: WebSocket):
         try:
             if room_id in self.rooms:
                 self.rooms[room_id].discard(websocket)
                 if not self.rooms[room_id]:
                     self.rooms.pop(room_id, None)
+                    self.pubsub.unsubscribe(room_id)
         except Exception:
             pass
 
+    def release(self, websocket: WebSocket, announce: bool = True):
+        """Socket handleri tugaganda: barcha xonalardan chiqarish va navbatni yopish"""
+        rooms = [r for r, members in self.rooms.items() if websocket in members]
+        for room_id in rooms:
+            self.disconnect(room_id, websocket)
+        connection = self.connections.pop(websocket, None)
+        if connection is None:
+            return
+        connection.task.cancel()
+        participant = connection.participant
+        sockets = self.participants.get(participant)
+        if sockets is not None:
+            sockets.discard(websocket)
+            if not sockets:
+                self.participants.pop(participant, None)
+        if participant and self.presence.disconnected(participant) and announce:
+            asyncio.get_running_loop().create_task(self._announce_offline(participant, rooms))
+
+    def _register(self, websocket: WebSocket, participant: Optional[str] = None):
+        if websocket not in self.connections:
+            self.connections[websocket] = _Connection(websocket, self.send_queue_size, self._drop, participant)
+            if participant:
+                self.participants.setdefault(participant, set()).add(websocket)
+
+    def _drop(self, websocket: WebSocket, code: int):
+        if websocket not in self.connections:
+            return
+        self.release(websocket)
+        asyncio.get_running_loop().create_task(self._close(websocket, code))
+
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    def _offer(self, websocket: WebSocket, payload: str):
+        connection = self.connections.get(websocket)
+        if connection is not None and not connection.offer(payload):
+            self.dropped += 1
+            print(f"[WS] slow consumer dropped: {self.send_queue_size} messages queued")
+            self._drop(websocket, status.WS_1013_TRY_AGAIN_LATER)
+
+    def _send_local(self, room_id: str, payload: str):
+        for ws in list(self.rooms.get(room_id, ())):
+            self._offer(ws, payload)
+
+    async def send(self, websocket: WebSocket, message: Dict[str, Any]):
+        """Bitta socketga (javoblar, history) — broadcastlar bilan bir navbatda, tartib saqlanadi"""
+        self._offer(websocket, json.dumps(message, default=str))
+
     async def broadcast(self, room_id: str, message: Dict[str, Any]):
-        """Broadcast JSON message to all connections in the room."""
+        """Broadcast JSON message to all connections in the room (on every worker)."""
+        payload = json.dumps(message, default=str)
+        self._send_local(room_id, payload)
+        try:
+            await self._ensure_pubsub()
+            await self.pubsub.publish(room_id, f"{self.worker_id}\n{payload}")
+        except Exception as e:
+            # Boshqa workerlarga yetmasa ham lokal yetkazish bajarilgan
+            print(f"[WS] pub/sub publish failed for {room_id}: {e}")
+
+    async def send_to(self, participant: str, message: Dict[str, Any]):
+        """Participantning hamma socketlariga (qaysi xonada bo'lishidan qat'i nazar, har workerda)"""
         payload = json.dumps(message, default=str)
-        for ws in list(self.rooms.get(room_id, set())):
+        for ws in list(self.participants.get(participant, ())):
+            self._offer(ws, payload)
+        try:
+            await self._ensure_pubsub()
+            await self.pubsub.publish(DIRECT_CHANNEL, f"{self.worker_id}\n{participant}\n{payload}")
+        except Exception as e:
+            print(f"[WS] pub/sub publish failed for {participant}: {e}")
+
+    async def listen(self, channel: str, handler: Callable[[str], None]):
+        """Servis kanali (xonalardan tashqari): boshqa workerlarning publish()lari handler'ga keladi"""
+        self.listeners[channel] = handler
+        if self._pubsub_started:
+            self.pubsub.subscribe(channel)
+        else:
+            await self._ensure_pubsub()
+
+    async def publish(self, channel: str, data: str):
+        await self._ensure_pubsub()
+        await self.pubsub.publish(channel, f"{self.worker_id}\n{data}")
+
+    async def _on_pubsub_message(self, room_id: str, data: str):
+        origin, _, payload = data.partition("\n")
+        if room_id == PRESENCE_CHANNEL:
+            self.presence.apply(origin, payload)
+            return
+        if origin == self.worker_id:
+            return
+        if room_id in self.listeners:
+            self.listeners[room_id](payload)
+            return
+        if room_id == DIRECT_CHANNEL:
+            participant, _, payload = payload.partition("\n")
+            for ws in list(self.participants.get(participant, ())):
+                self._offer(ws, payload)
+            return
+        self._send_local(room_id, payload)
+
+    def presence_of(self, participant: str) -> Dict[str, Any]:
+        state = self.presence.get(participant)
+        last_seen = state["last_seen"]
+        return {"online": state["online"], "last_seen": _to_local_iso(last_seen) if last_seen else None}
+
+    async def _publish_presence(self, message: str):
+        try:
+            await self.pubsub.publish(PRESENCE_CHANNEL, f"{self.worker_id}\n{message}")
+        except Exception as e:
+            print(f"[WS] presence publish failed: {e}")
+
+    async def _announce_offline(self, participant: str, rooms: List[str]):
+        await self._publish_presence(self.presence.message(offline=[participant]))
+        if self.presence.is_online(participant):
+            # Boshqa workerda hali ulangan
+            return
+        state = self.presence_of(participant)
+        for room_id in rooms:
+            await self.broadcast(room_id, {"event": "presence", "room_id": room_id, "user_id": participant, **state})
+
+    def reap(self):
+        """Jim socketlarga ping, idle_timeout dan oshganlarini uzish"""
+        now = asyncio.get_running_loop().time()
+        ping = json.dumps({"event": "ping", "time": _now_local_iso()})
+        for websocket, connection in list(self.connections.items()):
+            idle = now - connection.last_activity
+            if idle >= self.idle_timeout:
+                self.reaped += 1
+                self._drop(websocket, status.WS_1001_GOING_AWAY)
+            elif idle >= self.heartbeat_interval / 2:
+                self._offer(websocket, ping)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
             try:
-                await ws.send_text(payload)
-            except Exception:
-                # Drop broken connections
-                self.disconnect(room_id, ws)
+                self.reap()
+                self.presence.expire()
+                await self._publish_presence(self.presence.full_message())
+            except Exception as e:
+                print(f"[WS] heartbeat failed: {e}")
+
+    async def close(self):
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        for websocket in list(self.connections):
+            self.release(websocket, announce=False)
+        if self._pubsub_started:
+            await self.pubsub.stop()
+            self._pubsub_started = False
+
+
+manager = ConnectionManager()
+
+# WS xabarlari navbat orqali batch bilan yoziladi (CHAT_WRITE_BEHIND=0 -> har xabar uchun commit)
+message_writer = MessageWriter(
+    SessionLocal,
+    batch_size=settings.chat_write_batch_size,
+    flush_interval=settings.chat_write_flush_ms / 1000,
+)
 
 
 def _now_local_iso() -> str:
@@ -83,6 +367,7 @@ async def ws_chat_info():
             "token": "JWT access token (majburiy)",
             "receiver_id": "Qarshi tomon ID (user/employee/salon)",
             "receiver_type": "employee | salon | user",
+            "since": "Client'dagi oxirgi xabar id (optional) — qayta ulanishda faqat yetishmaganlar keladi",
         },
         message_example={
             "message_text": "Salom!",
@@ -96,7 +381,11 @@ async def ws_chat_info():
             "Foydalanuvchi → xodim/salon: receiver_type=employee|salon",
             "Xodim → foydalanuvchi: receiver_type=user",
             "Ulanishda server avtomatik ravishda oxirgi 50 ta xabarni 'history' event bilan yuboradi.",
-            "Paginatsiya: limit default 50 (≤200), offset default 0; javobda pagination {limit, offset, total} keladi.",
+            "Qayta ulanish: ?since=<oxirgi xabar id> — 'history' da faqat undan keyingilar (resumed: true); hammasi bor bo'lsa items bo'sh. Noma'lum since -> oddiy oxirgi 50 ta.",
+            "Heartbeat: server jim ulanishga {event:'ping'} yuboradi, client {event:'pong'} bilan javob beradi; 70 s javobsiz socket 1001 bilan uziladi.",
+            "Presence: ulanishda qarshi tomon holati {event:'presence', user_id, online, last_seen}; REST GET /api/chat/presence?ids=a,b. Typing: {event:'typing', is_typing} — bazaga yozilmaydi.",
+            "Yetkazildi: client {event:'delivered', message_id} yuboradi (shu id gacha hammasi), server 'delivered' receipt'ni xonaga broadcast qiladi.",
+            "Paginatsiya: limit default 50 (≤200); cursor before/after = xabar id. Javobda pagination {limit, before, after, has_older, has_newer, total} keladi (offset eski mijozlar uchun qoldirilgan).",
             "O'qilgan deb belgilash: client {event: 'mark_read'} yuboradi, server 'read' hodisasini broadcast qiladi.",
             "Vaqtlar ISO formatda UTC+05:00 (Asia/Tashkent) offset bilan yuboriladi (join/notification 'time', message 'created_at_local').",
             "Notification sarlavhalari 3 tilda keladi: title (UZ), title_ru (RU), title_en (EN). UI tiliga mosini ko'rsating.",
@@ -106,7 +395,7 @@ async def ws_chat_info():
             "2) WS oching: ws://<host>/api/ws/chat?token=<JWT>&receiver_id=<ID>&receiver_type=employee|salon|user",
             "3) Xabar yuborish: {message_text, message_type='text'|'file'|... , file_url?}.",
             "4) O'qilgan deb belgilash: {event:'mark_read'} yuboring.",
-            "5) Tarixni olish: {event:'history', limit:50, offset:0} — keyingi sahifa uchun offsetni oshiring (masalan 50, 100...).",
+            "5) Tarixni olish: {event:'history', limit:50, before:<pagination.before>} — has_older false bo'lguncha; qayta ulanganda yetishmaganlar: {event:'history', after:<oxirgi xabar id>}.",
             "5) Employee faqat mavjud chatga ulanadi; yangi chatni boshlab yubora olmaydi.",
             "6) Salon birinchi xabarni yubora olmaydi; user boshlaydi.",
         ],
@@ -128,14 +417,41 @@ async def ws_chat_info():
             }
         }
             },
+            "ack": {
+                "desc": "Yuborilgan xabar bazaga yozildi (faqat yuboruvchiga). 'message' broadcast undan oldin keladi; ack kelmasa xabar saqlanmagan bo'lishi mumkin",
+                "trigger": {"client_send": {"message_text": "Salom!", "ref": 1}},
+                "payload": {"event": "ack", "ref": 1, "room_id": "<chat_id>", "message_id": "<msg_id>"}
+            },
+            "error_persist_failed": {
+                "desc": "Xabar bazaga yozilmadi — mijoz qayta yuborishi kerak",
+                "payload": {"event": "error", "ref": 1, "room_id": "<chat_id>", "code": "persist_failed", "message_id": "<msg_id>"}
+            },
             "read": {
                 "desc": "O'qilgan deb belgilash broadcast",
                 "trigger": {"client_send": {"event": "mark_read"}},
                 "payload": {"event": "read", "room_id": "<chat_id>", "by_user_id": "<id>", "time": "<ISO>"}
             },
+            "typing": {
+                "desc": "Yozmoqda indikatori (bazaga yozilmaydi)",
+                "trigger": {"client_send": {"event": "typing", "is_typing": True}},
+                "payload": {"event": "typing", "room_id": "<chat_id>", "user_id": "<id>", "role": "user", "is_typing": True, "time": "<ISO>"}
+            },
+            "presence": {
+                "desc": "Qarshi tomon online holati: ulanishda va ishtirokchining oxirgi ulanishi yopilganda",
+                "payload": {"event": "presence", "room_id": "<chat_id>", "user_id": "<id>", "online": False, "last_seen": "<ISO>"}
+            },
+            "ping": {
+                "desc": "Server heartbeat — client {event:'pong'} yuborishi kerak",
+                "payload": {"event": "ping", "time": "<ISO>"}
+            },
+            "delivered": {
+                "desc": "Client xabarlarni oldi (message_id gacha hammasi) — receipt broadcast",
+                "trigger": {"client_send": {"event": "delivered", "message_id": "<msg_id>"}},
+                "payload": {"event": "delivered", "room_id": "<chat_id>", "message_id": "<msg_id>", "by_user_id": "<id>", "time": "<ISO>"}
+            },
             "history": {
                 "desc": "Xabarlar tarixini paginatsiya bilan olish",
-                "trigger": {"client_send": {"event": "history", "limit": 50, "offset": 0}},
+                "trigger": {"client_send": {"event": "history", "limit": 50, "before": "<MESSAGE_ID>"}},
                 "payload": {
                     "event": "history",
                     "room_id": "<chat_id>",
@@ -147,7 +463,7 @@ async def ws_chat_info():
                             "file_url": None, "is_read": False, "created_at": "<ISO>", "created_at_local": "<ISO+05:00>"
                         }
                     ],
-                    "pagination": {"limit": 50, "offset": 0, "total": 123}
+                    "pagination": {"limit": 50, "offset": None, "before": "<OLDEST_ID>", "after": "<NEWEST_ID>", "has_older": True, "has_newer": True, "total": 123}
                 }
             },
             "notification": {
@@ -166,16 +482,34 @@ async def ws_chat_info():
                     "unread_count": 3,
                     "time": "<ISO+05:00>"
                 }
+            },
+            "user_notification": {
+                "desc": "notifications jadvaliga yozilgan bildirishnoma (chat, appointment, to'lov, premium) — userning hamma socketlariga; bir xil hodisalar birlashganda o'sha id qayta keladi (data.count); unread_count — badge (GET /api/mobile/notif/badge bilan bir xil)",
+                "payload": {
+                    "event": "user_notification",
+                    "notification": {
+                        "id": "<notification_id>", "title": "Yangi xabarlar", "message": "3 ta yangi xabar",
+                        "type": "info", "is_read": False, "created_at": "<ISO>",
+                        "data": {"kind": "chat_message", "chat_id": "<chat_id>", "count": 3}
+                    },
+                    "unread_count": 5
+                }
             }
         },
         restrictions=[
             "Employee birinchi bo'lib chat boshlay olmaydi (REST: 403, WS: ulanmaydi).",
             "Salon birinchi bo'lib yozolmaydi — faqat user boshlab yuborgan chatga javob berishi mumkin.",
-            "WS ulanish har doim bitta chatga bog'lanadi (room_id = UserChat.id).",
+            "/api/ws/chat ulanishi har doim bitta chatga bog'lanadi (room_id = UserChat.id).",
+            "/api/ws/chat/multi da faqat ruxsat berilgan chatlarga join_room qilish mumkin (forbidden xatosi).",
+            "Xabarlarni o'qishga ulgurmagan mijoz (chiqish navbati to'lgan) 1013 kodi bilan uziladi.",
         ],
         multi_chat=[
-            "Bir foydalanuvchi bir nechta chat uchun alohida WS ochishi mumkin (har chat uchun bitta ulanish).",
-            "Multi-room bir soketda qo'llanmagan; kerak bo'lsa join_room/leave_room eventlari bilan qo'shish mumkin.",
+            "Bitta ulanishda ko'p chat: ws://<host>/api/ws/chat/multi?token=<JWT> (faqat token).",
+            "Xonaga qo'shilish: {event:'join_room', room_id:<chat_id>} yoki {event:'join_room', receiver_id, receiver_type}; admin salon xonasi: {event:'join_room', receiver_type:'salon'}.",
+            "Javob: {event:'joined', room_id, chat_id, receiver_id, receiver_type}, keyin shu xona uchun 'history'.",
+            "message / mark_read / history eventlarida room_id majburiy; serverdan keladigan barcha eventlarda room_id bor.",
+            "Chiqish: {event:'leave_room', room_id}. Xatolar: {event:'error', code:'forbidden|not_joined|too_many_rooms|unknown_event'}.",
+            "Client yuborgan 'ref' maydoni joined/left/error/pong javoblarida qaytariladi.",
         ],
         ws_examples={
             "user_to_employee": "ws://<host>/api/ws/chat?token=<USER_JWT>&receiver_id=<EMP_ID>&receiver_type=employee",
@@ -184,21 +518,23 @@ async def ws_chat_info():
             "admin_to_user_existing": "ws://<host>/api/ws/chat?token=<ADMIN_JWT>&receiver_id=<USER_ID>&receiver_type=user",
             "send_message": "ws.send(JSON.stringify({ message_text: 'Salom!', message_type: 'text' }))",
             "mark_read": "ws.send(JSON.stringify({ event: 'mark_read' }))",
+            "multi_connect": "ws://<host>/api/ws/chat/multi?token=<JWT>",
+            "multi_join": "ws.send(JSON.stringify({ event: 'join_room', room_id: '<CHAT_ID>', ref: 1 }))",
+            "multi_send": "ws.send(JSON.stringify({ event: 'message', room_id: '<CHAT_ID>', message_text: 'Salom!' }))",
             "handle_notification_js": "ws.onmessage = (ev) => { const msg = JSON.parse(ev.data); if (msg.event === 'notification') { const title = (uiLang==='ru'? msg.title_ru : uiLang==='en' ? msg.title_en : msg.title); const toMe = (msg.receiver_type==='user' ? msg.to_user_id === myUserId : msg.to_employee_id === myEmployeeId); if (toMe) { showToast(title, msg.message); updateBadge(msg.unread_count); } } };",
             "handle_message_time_js": "ws.onmessage = (ev) => { const msg = JSON.parse(ev.data); if (msg.event==='message') { const tLocal = msg.message.created_at_local || msg.message.created_at; renderMessage(msg.message, tLocal); } };",
         },
         errors={
             "WS_1008_POLICY_VIOLATION": "Parametrlar yetarli emas, token noto'g'ri, yoki employee uchun chat mavjud emas.",
+            "WS_1001_GOING_AWAY": "Heartbeat: mijozdan uzoq vaqt hech narsa kelmadi (ping'ga pong yo'q).",
             "WS_1011_INTERNAL_ERROR": "Kutilmagan server xatosi.",
+            "WS_1013_TRY_AGAIN_LATER": "Mijoz xabarlarni o'qishga ulgurmadi (chiqish navbati to'ldi) — qayta ulaning.",
             "REST_403": "Employee birinchi bo'lib xabar yubora olmaydi.",
             "REST_404": "Qarshi tomon topilmadi yoki chat mavjud emas.",
         }
     )
 
 
-manager = ConnectionManager()
-
-
 def _to_local_iso(dt) -> str:
     """Convert UTC datetime to naive UTC+5 string (no timezone suffix)."""
     if dt is None:
@@ -368,83 +704,38 @@ async def get_chat_list(
                 Message.receiver_id == user_id
             )
 
-        # Foydalanuvchi qatnashgan barcha chatlarning IDlarini topamiz
-        chat_ids_query = (
-            db.query(Message.user_chat_id)
-            .filter(role_cond)
-            .distinct()
-            .all()
-        )
-        chat_ids = [str(cid[0]) for cid in chat_ids_query]
-
-        latest_msgs = []
-        for cid in chat_ids:
-            # Har bir chat uchun eng oxirgi xabarni olamiz
-            msg = (
-                db.query(Message)
-                .filter(Message.user_chat_id == cid)
-                .order_by(Message.created_at.desc())
-                .first()
-            )
-            if msg:
-                latest_msgs.append(msg)
+        # Har bir chatning oxirgi xabari bitta oyna so'rovi bilan, qarshi tomon nomlari
+        # va o'qilmaganlar soni chatlar sonidan qat'i nazar o'zgarmas miqdordagi so'rovlarda
+        latest_msgs = latest_messages(db, role_cond)
+
+        opponents = {}
+        for msg in latest_msgs:
+            # Biz (current_user) kim ekanimizni aniqlaymiz: sender yoki receiver
+            # (Admin holatida salon_id ham biz hisoblanamiz)
+            is_sender = (str(msg.sender_id) == user_id) or (salon_id and str(msg.sender_id) == salon_id)
+            if is_sender:
+                opponents[msg.id] = (str(msg.receiver_type), str(msg.receiver_id), is_sender)
+            else:
+                opponents[msg.id] = (str(msg.sender_type), str(msg.sender_id), is_sender)
+
+        parties = load_parties(db, ((kind, oid) for kind, oid, _ in opponents.values()))
+        unread = unread_counts(db, (m.user_chat_id for m in latest_msgs), (user_id, salon_id))
 
         result = []
         for msg in latest_msgs:
-            try:
-                chat_id = str(msg.user_chat_id)
-                
-                # Biz (current_user) kim ekanimizni aniqlaymiz: sender yoki receiver
-                # (Admin holatida salon_id ham biz hisoblanamiz)
-                is_sender = (str(msg.sender_id) == user_id) or (salon_id and str(msg.sender_id) == salon_id)
-                
-                if is_sender:
-                    opponent_id = str(msg.receiver_id)
-                    opponent_type = str(msg.receiver_type)
-                else:
-                    opponent_id = str(msg.sender_id)
-                    opponent_type = str(msg.sender_type)
-
-                # Qarshi tomon ismini olish
-                opponent_name = "Unknown"
-                if opponent_type == "user":
-                    user_obj = db.query(User).filter(User.id == opponent_id).first()
-                    if user_obj:
-                        opponent_name = user_obj.full_name or user_obj.username or "User"
-                elif opponent_type == "employee":
-                    emp_obj = db.query(Employee).filter(Employee.id == opponent_id).first()
-                    if emp_obj:
-                        opponent_name = f"{emp_obj.name} {emp_obj.surname or ''}".strip() or "Employee"
-                elif opponent_type == "salon" or opponent_type == "admin":
-                    # Avval salon nomini tekshiramiz
-                    salon_obj = db.query(Salon).filter(Salon.id == opponent_id).first()
-                    if salon_obj:
-                        opponent_name = getattr(salon_obj, 'salon_name', None) or "Salon"
-                    else:
-                        # Agar salon topilmasa, admin (person) ma'lumotlarini qidiramiz
-                        admin_obj = db.query(Admin).filter(Admin.id == opponent_id).first()
-                        if admin_obj:
-                            opponent_name = admin_obj.full_name or admin_obj.username or "Admin"
-                
-                # O'qilmagan xabarlar soni
-                unread_count = db.query(Message).filter(
-                    Message.user_chat_id == chat_id,
-                    Message.receiver_id == (salon_id if (role == 'admin' and not is_sender) else user_id),
-                    Message.is_read == False
-                ).count()
-
-                result.append({
-                    "chat_id": chat_id,
-                    "opponent_name": opponent_name,
-                    "opponent_id": opponent_id,
-                    "opponent_type": opponent_type,
-                    "last_message": str(msg.message_text or ""),
-                    "last_message_time": _to_local_iso(msg.created_at) if msg.created_at else None,
-                    "unread_count": unread_count
-                })
-            except Exception as e:
-                print(f"Error processing message in chat list: {e}")
-                continue
+            chat_id = str(msg.user_chat_id)
+            opponent_type, opponent_id, is_sender = opponents[msg.id]
+            # O'qilmagan xabarlar soni
+            receiver_id = salon_id if (role == 'admin' and not is_sender) else user_id
+            result.append({
+                "chat_id": chat_id,
+                "opponent_name": party_name(parties, opponent_type, opponent_id),
+                "opponent_id": opponent_id,
+                "opponent_type": opponent_type,
+                "last_message": str(msg.message_text or ""),
+                "last_message_time": _to_local_iso(msg.created_at) if msg.created_at else None,
+                "unread_count": unread.get((chat_id, str(receiver_id)), 0),
+            })
 
         # Vaqt bo'yicha saralash
         result.sort(key=lambda x: x["last_message_time"] or "", reverse=True)
@@ -459,11 +750,85 @@ async def get_chat_list(
         )
 
 
+@router.get("/chat/unread/total")
+async def get_unread_total(
+    db: Session = Depends(get_db),
+    current_user: Any = Depends(get_current_user),
+):
+    """
+    Ilova badge'i uchun barcha chatlardagi o'qilmagan xabarlar soni.
+    Admin uchun salonga kelgan xabarlar hisoblanadi.
+    """
+    role = getattr(current_user, "role", "user")
+    salon_id = getattr(current_user, "salon_id", None)
+    if role in ["admin", "superadmin", "salon_admin", "private_admin", "private_salon_admin"] and salon_id:
+        receiver_id, receiver_type = str(salon_id), "salon"
+    else:
+        receiver_id, receiver_type = str(current_user.id), "employee" if isinstance(current_user, Employee) else "user"
+
+    return {
+        "success": True,
+        "data": {
+            "receiver_id": receiver_id,
+            "receiver_type": receiver_type,
+            "unread_count": unread_total(db, receiver_id),
+        },
+    }
+
+
+def _presence_scope(db: Session, current_user: Any) -> Optional[set]:
+    """Chaqiruvchi bilan umumiy chati bor ishtirokchilar (bitta UserChat so'rovi); superadmin — None (cheklovsiz)"""
+    role = getattr(current_user, "role", "user")
+    if role == "superadmin":
+        return None
+    current_id = str(current_user.id)
+    salon_id = getattr(current_user, "salon_id", None)
+    query = db.query(UserChat.user_id, UserChat.salon_id, UserChat.employee_id, UserChat.chat_type)
+    if role in ["admin", "salon_admin", "private_admin", "private_salon_admin"]:
+        if not salon_id:
+            return {current_id}
+        rows = query.filter(UserChat.salon_id == str(salon_id), UserChat.chat_type == "user_salon").all()
+        return {str(row.user_id) for row in rows} | {current_id, str(salon_id)}
+    if isinstance(current_user, Employee):
+        rows = query.filter(UserChat.employee_id == current_id, UserChat.chat_type == "user_employee").all()
+        return {str(row.user_id) for row in rows} | {current_id}
+    rows = query.filter(UserChat.user_id == current_id).all()
+    scope = {current_id}
+    for row in rows:
+        counterpart = row.employee_id if row.chat_type == "user_employee" else row.salon_id
+        if counterpart:
+            scope.add(str(counterpart))
+    return scope
+
+
+@router.get("/chat/presence")
+async def get_chat_presence(
+    ids: str = FastQuery(..., description="Vergul bilan ajratilgan user/employee/salon id'lari (ko'pi bilan 200)"),
+    db: Session = Depends(get_db),
+    current_user: Any = Depends(get_current_user),
+):
+    """
+    Chat ishtirokchilarining online / last_seen holati (salon uchun — uning admini).
+    Faqat chaqiruvchi bilan umumiy chati bor ishtirokchilar qaytariladi, qolgan
+    id'lar javobga kirmaydi. Holat WS ulanishlari bo'yicha xotiradagi presence xaritasidan.
+    """
+    participants = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))[:200]
+    scope = _presence_scope(db, current_user)
+    if scope is not None:
+        participants = [participant for participant in participants if participant in scope]
+    return {
+        "success": True,
+        "data": {participant: manager.presence_of(participant) for participant in participants},
+    }
+
+
 @router.get("/chat/history/{chat_id}")
 async def get_chat_history(
     chat_id: str,
     limit: int = FastQuery(50, ge=1, le=200),
     offset: int = FastQuery(0, ge=0),
+    before: Optional[str] = FastQuery(None, description="Shu xabar id'sidan oldingi xabarlar"),
+    after: Optional[str] = FastQuery(None, description="Shu xabar id'sidan keyingi xabarlar"),
     db: Session = Depends(get_db),
     current_user: Any = Depends(get_current_user),
 ):
@@ -511,28 +876,310 @@ async def get_chat_history(
         # Shuning uchun faqat xabarlar bor chatlarni ko'ra oladi.
         raise HTTPException(status_code=403, detail="Sizda ushbu chatni ko'rishga ruxsat yo'q yoki chat hali bo'sh")
 
-    total = db.query(Message).filter(Message.user_chat_id == chat_id).count()
-    messages = (
-        db.query(Message)
-        .filter(Message.user_chat_id == chat_id)
-        .order_by(Message.created_at.desc())
-        .offset(offset)
-        .limit(limit)
-        .all()
-    )
+    try:
+        messages, pagination = history_page(db, chat_id, limit=limit, before=before, after=after, offset=offset)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Sahifa cursori noto'g'ri")
 
     return {
         "success": True,
         "chat_id": chat_id,
-        "items": [_serialize_message(m) for m in reversed(messages)],
-        "pagination": {
-            "limit": limit,
-            "offset": offset,
-            "total": total
+        "items": [_serialize_message(m) for m in messages],
+        "pagination": pagination,
+    }
+
+
+# ==================== WS room handlers (single and multiplexed) ====================
+def _ws_identity(token: Optional[str]):
+    """JWT -> (current_id, current_role) or None; admin roles are normalized to "admin"."""
+    if not token:
+        return None
+    try:
+        payload = JWTUtils.verify_token(token)
+    except Exception:
+        return None
+
+    current_id = str(payload.get("id"))
+    current_role = str(payload.get("role"))
+    # salon_admin, private_admin, private_salon_admin ham admin kabi ishlaydi
+    if current_role in {"salon_admin", "private_admin", "private_salon_admin"}:
+        current_role = "admin"
+    if not current_id or current_role not in {"user", "employee", "admin"}:
+        return None
+    return current_id, current_role
+
+
+def _release_db(db) -> None:
+    """
+    Mijozni kutishdan oldin ochiq (o'qish) tranzaksiyani yopish: ulanish pulga
+    qaytadi, ochiq WebSocketlar soni pul hajmi (pool_size + max_overflow) bilan cheklanmaydi.
+    """
+    if db.in_transaction():
+        try:
+            db.commit()
+        except Exception:
+            db.rollback()
+
+
+def _history_params(parsed: Dict[str, Any]):
+    """Client {limit?, offset?, before?, after?} -> (limit, offset, before, after); limit 1..200, offset >= 0"""
+    limit = parsed.get("limit") or 50
+    offset = parsed.get("offset") or 0
+    try:
+        limit = int(limit)
+        offset = int(offset)
+    except Exception:
+        limit = 50
+        offset = 0
+    if limit < 1:
+        limit = 50
+    if limit > 200:
+        limit = 200
+    if offset < 0:
+        offset = 0
+    before = parsed.get("before") or None
+    after = parsed.get("after") or None
+    return limit, offset, (str(before) if before else None), (str(after) if after else None)
+
+
+async def _history_event(db, chat_id: str, room_id: str, limit: int = 50, offset: int = 0,
+                         before: Optional[str] = None, after: Optional[str] = None) -> Dict[str, Any]:
+    """
+    "history" event for a chat room (items oldest -> newest), paged by
+    before/after message-id cursors; noto'g'ri cursor -> InvalidCursor.
+    """
+    # Shu workerda navbatda turgan xabarlar ham tarixda ko'rinsin
+    await message_writer.flush()
+    msgs, pagination = history_page(db, chat_id, limit=limit, before=before, after=after, offset=offset)
+    return {
+        "event": "history",
+        "room_id": room_id,
+        "items": [_serialize_message(m) for m in msgs],
+        "pagination": pagination,
+    }
+
+
+async def _resume_event(db, chat_id: str, room_id: str, since: str) -> Dict[str, Any]:
+    """
+    Qayta ulanishda "history": faqat `since` (mijozdagi oxirgi xabar id) dan
+    keyingilar, resumed=true. Mijoz oxirgi xabarni ko'rgan bo'lsa items bo'sh
+    va messages jadvaliga so'rov yo'q. Noma'lum since -> oddiy oxirgi sahifa.
+    """
+    await message_writer.flush()
+    try:
+        msgs, pagination = resume_page(db, chat_id, since, limit=MAX_LIMIT)
+    except InvalidCursor:
+        return await _history_event(db, chat_id, room_id)
+    return {
+        "event": "history",
+        "room_id": room_id,
+        "items": [_serialize_message(m) for m in msgs],
+        "pagination": pagination,
+        "resumed": True,
+    }
+
+
+async def _connect_history(db, chat_id: str, room_id: str, since: Optional[str]) -> Dict[str, Any]:
+    if since:
+        return await _resume_event(db, chat_id, room_id, str(since))
+    return await _history_event(db, chat_id, room_id)
+
+
+async def _ws_delivered(room_id: str, current_id: str, parsed: Dict[str, Any]):
+    """
+    Mijoz xabarni oldi: {event:"delivered", message_id} — shu id gacha hammasi.
+    Bazaga yozilmaydi, xonaga receipt sifatida yuboriladi; mijoz shu id'ni
+    keyingi ulanishda `since` qilib beradi.
+    """
+    message_id = parsed.get("message_id")
+    if not message_id:
+        return
+    await manager.broadcast(room_id, {
+        "event": "delivered",
+        "room_id": room_id,
+        "message_id": str(message_id),
+        "by_user_id": current_id,
+        "time": _now_local_iso(),
+    })
+
+
+async def _ws_typing(room_id: str, current_id: str, current_role: str, parsed: Dict[str, Any]):
+    """{event:"typing", is_typing?} — bazaga tegmasdan xonaga"""
+    await manager.broadcast(room_id, {
+        "event": "typing",
+        "room_id": room_id,
+        "user_id": current_id,
+        "role": current_role,
+        "is_typing": bool(parsed.get("is_typing", True)),
+        "time": _now_local_iso(),
+    })
+
+
+async def _ws_mark_read(db, chat: UserChat, room_id: str, current_id: str, current_role: str):
+    # Navbatdagi xabarlar ham o'qilgan deb belgilanishi uchun avval yoziladi
+    await message_writer.flush()
+
+    # Admin uchun receiver_id = salon_id (admin_id emas)
+    if current_role == "admin":
+        admin_obj = db.query(Admin).filter(Admin.id == current_id).first()
+        effective_receiver_id = str(admin_obj.salon_id) if admin_obj and getattr(admin_obj, "salon_id", None) else current_id
+    else:
+        effective_receiver_id = current_id
+
+    # Mark all unread messages in this chat as read
+    read_count = db.query(Message).filter(
+        Message.user_chat_id == chat.id,
+        Message.receiver_id == effective_receiver_id,
+        Message.is_read == False,
+    ).update({Message.is_read: True})
+
+    # Unread counters go down by exactly the number of messages marked read
+    mark_chat_read(db, chat.id, effective_receiver_id, read_count)
+
+    db.commit()
+
+    # Broadcast read receipt
+    await manager.broadcast(room_id, {
+        "event": "read",
+        "room_id": room_id,
+        "by_user_id": current_id,
+        "time": _now_local_iso(),
+    })
+
+
+async def _ws_send(websocket: Optional[WebSocket], payload: Dict[str, Any]) -> None:
+    if websocket is None:
+        return
+    # Socket yopilgan bo'lsa manager uni allaqachon unutgan — jim o'tkaziladi
+    await manager.send(websocket, payload)
+
+
+def _message_event(room_id: str, pending: PendingMessage) -> Dict[str, Any]:
+    return {
+        "event": "message",
+        "room_id": room_id,
+        "message": {
+            "id": pending.id,
+            "sender_id": pending.sender_id,
+            "sender_type": pending.sender_type,
+            "receiver_id": pending.receiver_id,
+            "receiver_type": pending.receiver_type,
+            "message_text": pending.message_text,
+            "message_type": pending.message_type,
+            "file_url": pending.file_url,
+            "is_read": False,
+            "created_at": _to_local_iso(pending.created_at),
+            "created_at_local": _to_local_iso(pending.created_at),
         }
     }
 
 
+async def _broadcast_notification(room_id: str, pending: PendingMessage, result) -> None:
+    try:
+        # Notification payload
+        notif_payload = {
+            "event": "notification",
+            "room_id": room_id,
+            "kind": "chat_message",
+            "receiver_type": pending.receiver_type,
+            "title": "Yangi xabar",
+            "title_ru": "Новое сообщение",
+            "title_en": "New message",
+            "message": pending.message_text,
+            "to_user_id": pending.receiver_id if pending.receiver_type == "user" else None,
+            "to_employee_id": pending.receiver_id if pending.receiver_type == "employee" else None,
+            "to_salon_id": pending.receiver_id if pending.receiver_type == "salon" else None,
+            "sender_id": pending.sender_id,
+            "sender_type": pending.sender_type,
+            "chat_id": pending.user_chat_id,
+            "unread_count": result.unread_count,
+            "total_unread_count": result.total_unread_count,
+            "time": _now_local_iso(),
+        }
+
+        # Broadcast a lightweight notification event to the room
+        await manager.broadcast(room_id, notif_payload)
+
+        # ── User salon ga yoki salon xodimiga yozsa, salon-level room ga ham broadcast ──
+        if result.receiver_salon_id:
+            await manager.broadcast(f"salon_{result.receiver_salon_id}", notif_payload)
+    except Exception:
+        # Do not fail WS on notification errors
+        pass
+
+
+def _queue_user_notification(pending: PendingMessage, result) -> None:
+    """Userga yozilgan xabar: notifications yozuvi fon navbati orqali, bitta chatdagi portlash bitta yozuvga"""
+    if pending.receiver_type != "user":
+        return
+    notification_service.notify(PendingNotification(
+        user_id=pending.receiver_id,
+        title="Yangi xabar",
+        message=pending.message_text or "",
+        data={
+            "kind": "chat_message",
+            "chat_id": pending.user_chat_id,
+            "sender_id": pending.sender_id,
+            "sender_type": pending.sender_role,
+            "unread_count": result.unread_count,
+        },
+        collapse_key=f"chat:{pending.user_chat_id}",
+        collapsed_title="Yangi xabarlar",
+        collapsed_message="{count} ta yangi xabar",
+        only_subscribed=True,
+    ))
+
+
+async def _ws_send_message(
+    db,
+    chat: UserChat,
+    room_id: str,
+    current_id: str,
+    current_role: str,
+    receiver_id: str,
+    receiver_type: str,
+    parsed: Dict[str, Any],
+    websocket: Optional[WebSocket] = None,
+):
+    # Id va vaqt server tomonda darhol beriladi; sender_type: admin -> salon
+    pending = PendingMessage(
+        user_chat_id=str(chat.id),
+        sender_id=current_id,
+        sender_type="salon" if current_role == "admin" else current_role,
+        sender_role=current_role,
+        receiver_id=receiver_id,
+        receiver_type=receiver_type,
+        message_text=parsed.get("message_text"),
+        message_type=parsed.get("message_type") or "text",
+        file_url=parsed.get("file_url"),
+    )
+    ref = parsed.get("ref")
+
+    async def persisted(result):
+        # ack = xabar bazada saqlandi; persist_failed bo'lsa mijoz qayta yuborishi kerak
+        if isinstance(result, Exception):
+            await _ws_send(websocket, {
+                "event": "error", "ref": ref, "room_id": room_id,
+                "code": "persist_failed", "message_id": pending.id,
+            })
+            return
+        await _ws_send(websocket, {"event": "ack", "ref": ref, "room_id": room_id, "message_id": pending.id})
+        _queue_user_notification(pending, result)
+        await _broadcast_notification(room_id, pending, result)
+
+    if not settings.chat_write_behind:
+        # Sinxron rejim: shu ulanish sessiyasida commit, keyin broadcast
+        result = write_messages(db, [pending])[0]
+        db.commit()
+        await manager.broadcast(room_id, _message_event(room_id, pending))
+        await persisted(result)
+        return
+
+    # Broadcast commit'ni kutmaydi; navbat to'lsa shu ulanish kutadi
+    await manager.broadcast(room_id, _message_event(room_id, pending))
+    await message_writer.submit(pending, persisted)
+
+
 @router.websocket("/ws/chat")
 async def websocket_chat(websocket: WebSocket):
     """
@@ -542,31 +1189,24 @@ async def websocket_chat(websocket: WebSocket):
       - token: JWT access token (required)
       - receiver_id: chat partner id (required)
       - receiver_type: "employee" | "salon" | "user" (required)
+      - since: client'dagi oxirgi xabar id (optional) — faqat undan keyingilar yuboriladi
     """
     # Extract query params
     token = websocket.query_params.get("token")
     receiver_id = websocket.query_params.get("receiver_id")
     receiver_type = websocket.query_params.get("receiver_type")
+    since = websocket.query_params.get("since")
 
     if not token or not receiver_type:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
 
     # Verify token and resolve sender identity
-    try:
-        payload = JWTUtils.verify_token(token)
-    except Exception:
-        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-        return
-
-    current_id = str(payload.get("id"))
-    current_role = str(payload.get("role"))
-    # salon_admin, private_admin, private_salon_admin ham admin kabi ishlaydi
-    if current_role in {"salon_admin", "private_admin", "private_salon_admin"}:
-        current_role = "admin"
-    if not current_id or current_role not in {"user", "employee", "admin"}:
+    identity = _ws_identity(token)
+    if not identity:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
+    current_id, current_role = identity
 
     # Admin+salon case da receiver_id shart emas; qolgan holatlarda talab qilinadi
     if not receiver_id and not (current_role == "admin" and receiver_type == "salon"):
@@ -584,7 +1224,10 @@ async def websocket_chat(websocket: WebSocket):
                 await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
                 return
             salon_room_id = f"salon_{admin_obj.salon_id}"
-            await manager.connect(salon_room_id, websocket)
+            salon_id = str(admin_obj.salon_id)
+            # Bu modda baza boshqa kerak emas — kutish paytida pul ulanishi band bo'lmasin
+            db2.close()
+            await manager.connect(salon_room_id, websocket, participant=salon_id)
             await manager.broadcast(salon_room_id, {
                 "event": "join",
                 "room_id": salon_room_id,
@@ -595,7 +1238,7 @@ async def websocket_chat(websocket: WebSocket):
             # Admin bu modda faqat notification qabul qiladi
             while True:
                 try:
-                    await websocket.receive_text()
+                    await manager.receive(websocket)
                 except Exception:
                     break
         except WebSocketDisconnect:
@@ -607,15 +1250,15 @@ async def websocket_chat(websocket: WebSocket):
                 pass
         finally:
             try:
-                if salon_room_id:
-                    manager.disconnect(salon_room_id, websocket)
+                manager.release(websocket)
                 db2.close()
             except Exception:
                 pass
         return
     # ───────────────────────────────────────────────────────────────────────
 
-    db = SessionLocal()
+    # expire_on_commit=False: _release_db dan keyin chat qayta o'qilmaydi
+    db = SessionLocal(expire_on_commit=False)
     chat = None
     room_id = None
     try:
@@ -623,9 +1266,13 @@ async def websocket_chat(websocket: WebSocket):
         if not chat:
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
             return
+        # Yangi chat darhol commit: xabarlar boshqa sessiyada (write-behind) yoziladi
+        db.commit()
 
         room_id = str(chat.id)
-        await manager.connect(room_id, websocket)
+        # Admin chatlarda salon nomidan yozadi — presence ham salon bo'yicha
+        participant = str(chat.salon_id) if current_role == "admin" and chat.salon_id else current_id
+        await manager.connect(room_id, websocket, participant=participant)
 
         # Notify join
         await manager.broadcast(room_id, {
@@ -636,37 +1283,25 @@ async def websocket_chat(websocket: WebSocket):
             "time": _now_local_iso()
         })
 
-        # On connect: send latest 50 messages (pagination default)
+        # On connect: latest 50 messages, or only the missed delta when resuming with ?since=
         try:
-            total_msgs = db.query(Message).filter(Message.user_chat_id == chat.id).count()
-            default_limit = 50
-            recent_msgs = (
-                db.query(Message)
-                .filter(Message.user_chat_id == chat.id)
-                .order_by(Message.created_at.desc())
-                .offset(0)
-                .limit(default_limit)
-                .all()
-            )
-            # Reverse to chronological order (oldest -> newest)
-            items = [_serialize_message(m) for m in reversed(recent_msgs)]
-            await websocket.send_text(json.dumps({
-                "event": "history",
-                "room_id": room_id,
-                "items": items,
-                "pagination": {
-                    "limit": default_limit,
-                    "offset": 0,
-                    "total": total_msgs,
-                }
-            }, default=str))
+            await manager.send(websocket, await _connect_history(db, chat.id, room_id, since))
         except Exception:
             # Ignore history send failures
             pass
+        # Qarshi tomon hozir onlaynmi (keyingi o'zgarishlar "presence" event bilan keladi)
+        if receiver_id:
+            await manager.send(websocket, {
+                "event": "presence",
+                "room_id": room_id,
+                "user_id": str(receiver_id),
+                **manager.presence_of(str(receiver_id)),
+            })
 
         # Receive loop
         while True:
-            data = await websocket.receive_text()
+            _release_db(db)
+            data = await manager.receive(websocket)
             try:
                 parsed = json.loads(data)
             except Exception:
@@ -675,219 +1310,250 @@ async def websocket_chat(websocket: WebSocket):
             event_type = parsed.get("event") or "message"
 
             if event_type == "mark_read":
-                # Admin uchun receiver_id = salon_id (admin_id emas)
-                if current_role == "admin":
-                    admin_obj = db.query(Admin).filter(Admin.id == current_id).first()
-                    effective_receiver_id = str(admin_obj.salon_id) if admin_obj and getattr(admin_obj, "salon_id", None) else current_id
-                else:
-                    effective_receiver_id = current_id
-
-                # Mark all unread messages in this chat as read
-                db.query(Message).filter(
-                    Message.user_chat_id == chat.id,
-                    Message.receiver_id == effective_receiver_id,
-                    Message.is_read == False,
-                ).update({Message.is_read: True})
-
-                # Reset unread counter if used
-                try:
-                    chat.unread_count = 0
-                except Exception:
-                    pass
-
-                db.commit()
+                await _ws_mark_read(db, chat, room_id, current_id, current_role)
+                continue
 
-                # Broadcast read receipt
-                await manager.broadcast(room_id, {
-                    "event": "read",
-                    "room_id": room_id,
-                    "by_user_id": current_id,
-                    "time": _now_local_iso(),
-                })
+            if event_type == "delivered":
+                await _ws_delivered(room_id, current_id, parsed)
+                continue
 
+            if event_type == "typing":
+                await _ws_typing(room_id, current_id, current_role, parsed)
                 continue
 
             if event_type == "history":
-                # Client requests paginated history: {event:"history", offset?, limit?}
+                # Client requests paginated history: {event:"history", limit?, before?, after?, offset?}
                 try:
-                    limit = parsed.get("limit") or 50
-                    offset = parsed.get("offset") or 0
-                    # Clamp values for safety
-                    try:
-                        limit = int(limit)
-                        offset = int(offset)
-                    except Exception:
-                        limit = 50
-                        offset = 0
-                    if limit < 1:
-                        limit = 50
-                    if limit > 200:
-                        limit = 200
-                    if offset < 0:
-                        offset = 0
-
-                    total_msgs = db.query(Message).filter(Message.user_chat_id == chat.id).count()
-                    msgs = (
-                        db.query(Message)
-                        .filter(Message.user_chat_id == chat.id)
-                        .order_by(Message.created_at.desc())
-                        .offset(offset)
-                        .limit(limit)
-                        .all()
+                    limit, offset, before, after = _history_params(parsed)
+                    await manager.send(
+                        websocket, await _history_event(db, chat.id, room_id, limit, offset, before, after)
                     )
-                    items = [_serialize_message(m) for m in reversed(msgs)]
-                    await websocket.send_text(json.dumps({
-                        "event": "history",
-                        "room_id": room_id,
-                        "items": items,
-                        "pagination": {
-                            "limit": limit,
-                            "offset": offset,
-                            "total": total_msgs,
-                        }
-                    }, default=str))
                 except Exception:
                     # Silently ignore history errors to keep WS alive
                     pass
                 continue
 
             if event_type == "ping":
-                try:
-                    await websocket.send_text(json.dumps({"event": "pong"}))
-                except Exception:
-                    pass
+                await manager.send(websocket, {"event": "pong"})
+                continue
+
+            if event_type == "pong":
+                # Server heartbeat javobi — faollik receive() da belgilangan
                 continue
 
             # Default: treat as a new chat message
-            message_text = parsed.get("message_text")
-            message_type = parsed.get("message_type") or "text"
-            file_url = parsed.get("file_url")
-
-            # Sender type normalization: admin -> salon
-            sender_type_eff = "salon" if current_role == "admin" else current_role
-
-            # Persist message
-            new_message = Message(
-                user_chat_id=chat.id,
-                sender_id=current_id,
-                sender_type=sender_type_eff,
-                receiver_id=receiver_id,
-                receiver_type=receiver_type,
-                message_text=message_text,
-                message_type=message_type,
-                file_url=file_url,
-                is_read=False,
-            )
+            await _ws_send_message(db, chat, room_id, current_id, current_role, receiver_id, receiver_type, parsed, websocket)
 
-            chat.last_message = message_text
-            chat.last_message_time = datetime.now(timezone.utc)
+    except WebSocketDisconnect:
+        # Client disconnected
+        pass
+    except Exception:
+        # On unexpected error, close gracefully
+        try:
+            await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+        except Exception:
+            pass
+    finally:
+        try:
+            manager.release(websocket)
+            db.close()
+        except Exception:
+            pass
 
-            db.add(new_message)
-            db.commit()
-            db.refresh(new_message)
 
-            # Broadcast to room
-            await manager.broadcast(room_id, {
-                "event": "message",
-                "room_id": room_id,
-                "message": {
-                    "id": str(new_message.id),
-                    "sender_id": current_id,
-                    "sender_type": sender_type_eff,
-                    "receiver_id": receiver_id,
-                    "receiver_type": receiver_type,
-                    "message_text": message_text,
-                    "message_type": message_type,
-                    "file_url": file_url,
-                    "is_read": False,
-                    "created_at": _to_local_iso(new_message.created_at),
-                    "created_at_local": _to_local_iso(new_message.created_at),
-                }
-            })
+# ==================== Multiplexed WS: many rooms over one connection ====================
+# Bitta ulanishda ochiq turishi mumkin bo'lgan xonalar chegarasi
+MAX_ROOMS_PER_CONNECTION = 200
 
-            # Build and persist notification (for user receivers only if subscribed)
-            try:
-                unread_count = db.query(Message).filter(
-                    Message.user_chat_id == chat.id,
-                    Message.receiver_id == receiver_id,
-                    Message.is_read == False,
-                ).count()
-
-                if receiver_type == "user":
-                    # Only create DB notification for users and when subscribed in Notif
-                    is_subscribed = db.query(Notif).filter(Notif.user_id == receiver_id).first() is not None
-                    if is_subscribed:
-                        notif = Notification(
-                            user_id=receiver_id,
-                            title="Yangi xabar",
-                            message=message_text or "",
-                            type="info",
-                            data={
-                                "kind": "chat_message",
-                                "chat_id": str(chat.id),
-                                "sender_id": current_id,
-                                "sender_type": current_role,
-                                "unread_count": unread_count,
-                            },
-                        )
-                        db.add(notif)
-                        db.commit()
 
-                # Notification payload
-                notif_payload = {
-                    "event": "notification",
-                    "room_id": room_id,
-                    "kind": "chat_message",
-                    "receiver_type": receiver_type,
-                    "title": "Yangi xabar",
-                    "title_ru": "Новое сообщение",
-                    "title_en": "New message",
-                    "message": message_text,
-                    "to_user_id": receiver_id if receiver_type == "user" else None,
-                    "to_employee_id": receiver_id if receiver_type == "employee" else None,
-                    "to_salon_id": receiver_id if receiver_type == "salon" else None,
-                    "sender_id": current_id,
-                    "sender_type": sender_type_eff,
-                    "chat_id": str(chat.id),
-                    "unread_count": unread_count,
-                    "time": _now_local_iso(),
-                }
+def _chat_counterpart(chat: UserChat, current_role: str):
+    """(receiver_id, receiver_type) of the other side of a chat for the current role."""
+    if current_role == "user":
+        if chat.chat_type == "user_employee":
+            return str(chat.employee_id), "employee"
+        return str(chat.salon_id), "salon"
+    return str(chat.user_id), "user"
 
-                # Broadcast a lightweight notification event to the room
-                await manager.broadcast(room_id, notif_payload)
 
-                # ── Agar user salon ga yozsa, salon-level room ga ham broadcast ──
-                if receiver_type == "salon":
-                    salon_room_id = f"salon_{receiver_id}"
-                    await manager.broadcast(salon_room_id, notif_payload)
+def _authorize_chat(db, chat_id: str, current_id: str, current_role: str, admin_salon_id: Optional[str]) -> Optional[UserChat]:
+    """Mavjud chatga kirish huquqi: user o'z chati, xodim o'z user_employee chati, admin o'z saloni chati."""
+    chat = db.query(UserChat).filter(UserChat.id == chat_id).first()
+    if not chat:
+        return None
+    if current_role == "user" and str(chat.user_id) == current_id:
+        return chat
+    if current_role == "employee" and chat.chat_type == "user_employee" and str(chat.employee_id) == current_id:
+        return chat
+    if current_role == "admin" and chat.chat_type == "user_salon" and admin_salon_id and str(chat.salon_id) == admin_salon_id:
+        return chat
+    return None
 
-                # ── Agar user employeega yozsa, employee salon room ga ham xabar ──
-                if receiver_type == "employee":
-                    try:
-                        emp = db.query(Employee).filter(Employee.id == receiver_id).first()
-                        if emp and getattr(emp, "salon_id", None):
-                            emp_salon_room_id = f"salon_{emp.salon_id}"
-                            await manager.broadcast(emp_salon_room_id, notif_payload)
-                    except Exception:
-                        pass
 
+@router.websocket("/ws/chat/multi")
+async def websocket_chat_multi(websocket: WebSocket):
+    """
+    Multiplexed WebSocket: bitta autentifikatsiyalangan ulanishda ko'p xona.
+
+    Query params:
+      - token: JWT access token (required)
+
+    Client events (har birida room_id; javoblarda "ref" qaytariladi):
+      - {event:"join_room", room_id, since?}               — mavjud chat (since: oxirgi ko'rilgan xabar id)
+      - {event:"join_room", receiver_id, receiver_type}    — /ws/chat bilan bir xil qoidalar
+      - {event:"join_room", receiver_type:"salon"}         — admin: salon notification xonasi
+      - {event:"leave_room", room_id}
+      - {event:"history", room_id, limit?, before?, after?}  — xato: {event:"error", code:"history_failed"} (faqat shu xona)
+      - {event:"mark_read", room_id}
+      - {event:"delivered", room_id, message_id}
+      - {event:"typing", room_id, is_typing?}
+      - {event:"pong"}                                     — server ping'iga javob
+      - {event:"message", room_id, message_text, message_type?, file_url?}
+      - {event:"ping"}
+    """
+    identity = _ws_identity(websocket.query_params.get("token"))
+    if not identity:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    current_id, current_role = identity
+
+    db = SessionLocal(expire_on_commit=False)
+    # room_id -> chat (salon notification xonasi uchun None: faqat tinglash)
+    joined: Dict[str, Optional[UserChat]] = {}
+
+    async def reply(event: str, ref=None, **fields):
+        await manager.send(websocket, {"event": event, "ref": ref, **fields})
+
+    try:
+        admin_salon_id = None
+        if current_role == "admin":
+            admin_obj = db.query(Admin).filter(Admin.id == current_id, Admin.is_active == True).first()
+            if not admin_obj or not getattr(admin_obj, "salon_id", None):
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                return
+            admin_salon_id = str(admin_obj.salon_id)
+
+        await manager.accept(websocket, participant=admin_salon_id or current_id)
+        await reply("ready", user_id=current_id, role=current_role, max_rooms=MAX_ROOMS_PER_CONNECTION, time=_now_local_iso())
+
+        while True:
+            _release_db(db)
+            data = await manager.receive(websocket)
+            try:
+                parsed = json.loads(data)
             except Exception:
-                # Do not fail WS on notification errors
-                pass
+                continue
+            if not isinstance(parsed, dict):
+                continue
+            event_type = parsed.get("event") or "message"
+            ref = parsed.get("ref")
+            room_id = str(parsed.get("room_id") or "")
+
+            if event_type == "ping":
+                await reply("pong", ref)
+                continue
+
+            if event_type == "pong":
+                continue
+
+            if event_type == "join_room":
+                receiver_id = parsed.get("receiver_id")
+                receiver_type = parsed.get("receiver_type")
+                chat = None
+                target = None
+                if current_role == "admin" and receiver_type == "salon" and not receiver_id and not room_id:
+                    target = f"salon_{admin_salon_id}"
+                elif room_id:
+                    chat = _authorize_chat(db, room_id, current_id, current_role, admin_salon_id)
+                elif receiver_id and receiver_type:
+                    chat = _get_or_create_chat(db, current_id, current_role, str(receiver_id), receiver_type)
+                    if chat:
+                        # Yangi chat boshqa ulanishlarga ham ko'rinsin
+                        db.commit()
+                if chat:
+                    target = str(chat.id)
+                if not target:
+                    await reply("error", ref, room_id=room_id or None, code="forbidden")
+                    continue
+                room_id = target
+                if room_id not in joined and len(joined) >= MAX_ROOMS_PER_CONNECTION:
+                    await reply("error", ref, room_id=room_id, code="too_many_rooms")
+                    continue
+
+                is_new = room_id not in joined
+                joined[room_id] = chat
+                await manager.join(room_id, websocket)
+                counterpart = _chat_counterpart(chat, current_role) if chat else (None, None)
+                await reply(
+                    "joined", ref, room_id=room_id, chat_id=str(chat.id) if chat else None,
+                    receiver_id=counterpart[0], receiver_type=counterpart[1],
+                    presence=manager.presence_of(counterpart[0]) if counterpart[0] else None,
+                )
+                if is_new:
+                    await manager.broadcast(room_id, {
+                        "event": "join",
+                        "room_id": room_id,
+                        "user_id": current_id,
+                        "role": current_role,
+                        "time": _now_local_iso(),
+                    })
+                if chat:
+                    try:
+                        await manager.send(websocket, await _connect_history(db, chat.id, room_id, parsed.get("since")))
+                    except Exception as e:
+                        # Faqat shu xona: boshqa qo'shilgan xonalar ulanishi uzilmaydi
+                        print(f"[WS] history for {room_id} failed: {e}")
+                        db.rollback()
+                        await reply("error", ref, room_id=room_id, code="history_failed")
+                continue
+
+            if event_type == "leave_room":
+                if room_id in joined:
+                    joined.pop(room_id)
+                    manager.disconnect(room_id, websocket)
+                await reply("left", ref, room_id=room_id)
+                continue
+
+            chat = joined.get(room_id)
+            if chat is None:
+                # Qo'shilmagan xona yoki faqat tinglanadigan salon xonasi
+                await reply("error", ref, room_id=room_id or None, code="not_joined")
+                continue
+
+            if event_type == "mark_read":
+                await _ws_mark_read(db, chat, room_id, current_id, current_role)
+            elif event_type == "delivered":
+                await _ws_delivered(room_id, current_id, parsed)
+            elif event_type == "typing":
+                await _ws_typing(room_id, current_id, current_role, parsed)
+            elif event_type == "history":
+                limit, offset, before, after = _history_params(parsed)
+                try:
+                    event = await _history_event(db, chat.id, room_id, limit, offset, before, after)
+                except InvalidCursor:
+                    await reply("error", ref, room_id=room_id, code="invalid_cursor")
+                    continue
+                except Exception as e:
+                    print(f"[WS] history for {room_id} failed: {e}")
+                    db.rollback()
+                    await reply("error", ref, room_id=room_id, code="history_failed")
+                    continue
+                await manager.send(websocket, event)
+            elif event_type == "message":
+                receiver_id, receiver_type = _chat_counterpart(chat, current_role)
+                await _ws_send_message(db, chat, room_id, current_id, current_role, receiver_id, receiver_type, parsed, websocket)
+            else:
+                await reply("error", ref, room_id=room_id, code="unknown_event")
 
     except WebSocketDisconnect:
-        # Client disconnected
         pass
     except Exception:
-        # On unexpected error, close gracefully
         try:
             await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
         except Exception:
             pass
     finally:
         try:
-            if room_id:
-                manager.disconnect(room_id, websocket)
+            manager.release(websocket)
             db.close()
         except Exception:
-            pass
\ No newline at end of file
+            pass
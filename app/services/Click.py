@@ -61,6 +61,15 @@ class ClickPaymentProvider:
         self.max_retries = max_retries
         
         logger.info(f"ClickPaymentProvider initialized: merchant_id={merchant_id}, service_id={merchant_service_id}, timeout={timeout}s")
+
+    def max_request_seconds(self) -> float:
+        """
+        Худшая длительность одного вызова API: connect и read таймауты на каждую
+        попытку плюс паузы между повторами (2 ** n)
+        """
+        attempts = self.max_retries + 1
+        backoff = sum(2 ** n for n in range(self.max_retries))
+        return attempts * 2 * self.timeout + backoff
     
     def _generate_auth_token(self, timestamp: int) -> str:
         """Генерация токена авторизации"""
@@ -103,11 +112,11 @@ class ClickPaymentProvider:
         logger.info(f"Request URL: {url}, data: {json.dumps(data, ensure_ascii=False, indent=2)}, headers: {json.dumps(headers, ensure_ascii=False, indent=2)}")
         try:
             if method == "GET":
-                response = requests.get(url, headers=headers) #timeout=self.timeout)
+                response = requests.get(url, headers=headers, timeout=self.timeout)
             elif method == "POST":
-                response = requests.post(url, json=data, headers=headers) #timeout=self.timeout)
+                response = requests.post(url, json=data, headers=headers, timeout=self.timeout)
             elif method == "DELETE":
-                response = requests.delete(url, headers=headers) #timeout=self.timeout)
+                response = requests.delete(url, headers=headers, timeout=self.timeout)
             
             elapsed_time = time.time() - start_time
             logger.info(f"✅ Request completed in {elapsed_time:.2f}s | Status: {response.status_code}")
@@ -374,6 +383,27 @@ class ClickPaymentProvider:
         
         return result
     
+    def reverse_payment(self, payment_id: str) -> Dict[str, Any]:
+        """
+        Отмена (возврат) проведённого платежа
+        
+        Args:
+            payment_id: ID платежа в Click (click_paydoc_id)
+        """
+        logger.info(f"↩️ Reversing payment: {payment_id}")
+        
+        endpoint = f"/payment/reversal/{self.merchant_service_id}/{payment_id}"
+        result = self._make_request("DELETE", endpoint)
+        
+        if result.get('error_code') == 0:
+            logger.info(f"✅ Payment reversed | payment_id={payment_id}")
+        else:
+            error_code = result.get('error_code', result.get('error'))
+            error_note = result.get('error_note', '')
+            logger.error(f"❌ Payment reversal failed: error={error_code}, note={error_note}")
+        
+        return result
+    
     # ============= WEBHOOK МЕТОДЫ =============
     
     def verify_webhook_signature(
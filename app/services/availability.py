@@ -0,0 +1,334 @@
+"""
+Availability engine: minute-resolution bitmaps for employee work and busy time
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from app.models.appointment import Appointment
+from app.models.busy_slot import BusySlot
+
+
+MINUTES_PER_DAY = 24 * 60
+
+# Bandlik hisoblanadigan appointment statuslari (payment_pending: oldindan to'lov kutilmoqda)
+ACTIVE_APPOINTMENT_STATUSES = ("pending", "accepted", "done", "payment_pending")
+
+Interval = Tuple[datetime, datetime]
+
+
+def _ones(length: int) -> int:
+    return (1 << length) - 1 if length > 0 else 0
+
+
+def time_range(
+    day: date,
+    start: time,
+    end: Optional[time] = None,
+    minutes: Optional[int] = None,
+) -> Interval:
+    """
+    (day, start) dan boshlanadigan intervalni qaytaradi.
+
+    end start'dan kichik bo'lsa interval yarim tundan o'tadi va keyingi kunda tugaydi.
+    end berilmasa, minutes davomiylik sifatida ishlatiladi.
+    """
+    start_dt = datetime.combine(day, start)
+    if end is not None:
+        end_dt = datetime.combine(day, end)
+        if end_dt < start_dt:
+            end_dt += timedelta(days=1)
+        return start_dt, end_dt
+    return start_dt, start_dt + timedelta(minutes=int(minutes or 0))
+
+
+def appointment_interval(appointment: Appointment, default_minutes: int = 30) -> Interval:
+    """Appointment egallagan vaqt oralig'i (end_time yoki duration_minutes bo'yicha)"""
+    if appointment.end_time:
+        return time_range(appointment.application_date, appointment.application_time, appointment.end_time)
+    return time_range(
+        appointment.application_date,
+        appointment.application_time,
+        minutes=appointment.duration_minutes or default_minutes,
+    )
+
+
+def busy_slot_interval(slot: BusySlot) -> Interval:
+    """BusySlot egallagan vaqt oralig'i"""
+    return time_range(slot.date, slot.start_time, slot.end_time)
+
+
+class MinuteBitmap:
+    """
+    [origin, origin + days) oralig'ini daqiqa aniqligida ifodalovchi bitmap.
+
+    i-bit origin 00:00 dan keyingi i-daqiqani bildiradi. Bitlar Python int ichida
+    saqlanadi, shuning uchun birlashtirish, ayirish va kesishish bir nechta so'z
+    darajasidagi amallar bilan bajariladi.
+    """
+
+    __slots__ = ("origin", "days", "bits", "size", "start", "_ordinal", "_runs")
+
+    def __init__(self, origin: date, days: int = 1, bits: int = 0):
+        self.origin = origin
+        self.days = max(1, int(days))
+        self.size = self.days * MINUTES_PER_DAY
+        self.start = datetime.combine(origin, time.min)
+        self._ordinal = origin.toordinal()
+        self.bits = bits & _ones(self.size) if bits else 0
+        self._runs = None
+
+    @property
+    def end(self) -> datetime:
+        return self.start + timedelta(days=self.days)
+
+    def copy(self) -> "MinuteBitmap":
+        return MinuteBitmap(self.origin, self.days, self.bits)
+
+    def index(self, moment: datetime) -> int:
+        """Datetime'ni bitmap ichidagi daqiqa indeksiga aylantiradi (chegaraga qisiladi)"""
+        minutes = (moment.toordinal() - self._ordinal) * MINUTES_PER_DAY + moment.hour * 60 + moment.minute
+        if minutes < 0:
+            return 0
+        return minutes if minutes < self.size else self.size
+
+    def at(self, index: int) -> datetime:
+        return self.start + timedelta(minutes=index)
+
+    def _span(self, start: datetime, end: datetime) -> Tuple[int, int]:
+        return self.index(start), self.index(end)
+
+    def _aligned(self, other: "MinuteBitmap") -> int:
+        """Boshqa bitmap bitlarini shu bitmap origin'iga moslaydi"""
+        if other.origin == self.origin:
+            return other.bits & _ones(self.size)
+        shift = (other.origin - self.origin).days * MINUTES_PER_DAY
+        bits = other.bits << shift if shift >= 0 else other.bits >> -shift
+        return bits & _ones(self.size)
+
+    # ---- mutatsiya ----
+    def add(self, start: datetime, end: datetime) -> "MinuteBitmap":
+        lo, hi = self._span(start, end)
+        if lo < hi:
+            self.bits |= _ones(hi - lo) << lo
+        return self
+
+    def remove(self, start: datetime, end: datetime) -> "MinuteBitmap":
+        lo, hi = self._span(start, end)
+        if lo < hi:
+            self.bits &= ~(_ones(hi - lo) << lo)
+        return self
+
+    def add_times(self, day: date, start: time, end: time) -> "MinuteBitmap":
+        return self.add(*time_range(day, start, end))
+
+    def add_intervals(self, intervals: Iterable[Interval]) -> "MinuteBitmap":
+        for start, end in intervals:
+            self.add(start, end)
+        return self
+
+    # ---- to'plam amallari ----
+    def union(self, other: "MinuteBitmap") -> "MinuteBitmap":
+        return MinuteBitmap(self.origin, self.days, self.bits | self._aligned(other))
+
+    def subtract(self, other: "MinuteBitmap") -> "MinuteBitmap":
+        return MinuteBitmap(self.origin, self.days, self.bits & ~self._aligned(other))
+
+    def intersect(self, other: "MinuteBitmap") -> "MinuteBitmap":
+        return MinuteBitmap(self.origin, self.days, self.bits & self._aligned(other))
+
+    __or__ = union
+    __sub__ = subtract
+    __and__ = intersect
+
+    def __bool__(self) -> bool:
+        return self.bits != 0
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, MinuteBitmap):
+            return NotImplemented
+        return (self.origin, self.days, self.bits) == (other.origin, other.days, other.bits)
+
+    def __repr__(self) -> str:
+        return f"MinuteBitmap(origin={self.origin.isoformat()}, days={self.days}, busy_minutes={self.count()})"
+
+    def count(self) -> int:
+        return self.bits.bit_count()
+
+    # ---- so'rovlar ----
+    def overlaps(self, start: datetime, end: datetime) -> bool:
+        """[start, end) oralig'ida kamida bitta bit o'rnatilganmi"""
+        lo, hi = self._span(start, end)
+        if lo >= hi:
+            return False
+        return (self.bits >> lo) & _ones(hi - lo) != 0
+
+    def covers(self, start: datetime, end: datetime) -> bool:
+        """[start, end) oralig'i to'liq o'rnatilganmi (bitmap tashqarisi hisobga olinmaydi)"""
+        if start < self.start or end > self.end or start >= end:
+            return False
+        lo, hi = self._span(start, end)
+        mask = _ones(hi - lo)
+        return (self.bits >> lo) & mask == mask
+
+    def runs(self) -> List[Tuple[int, int]]:
+        """Ketma-ket o'rnatilgan bitlar bloklari: (boshlanish, tugash) indekslari"""
+        cached = self._runs
+        if cached is not None and cached[0] == self.bits:
+            return cached[1]
+        result: List[Tuple[int, int]] = []
+        bits = self.bits
+        offset = 0
+        while bits:
+            low = (bits & -bits).bit_length() - 1
+            bits >>= low
+            offset += low
+            length = (bits ^ (bits + 1)).bit_length() - 1
+            result.append((offset, offset + length))
+            bits >>= length
+            offset += length
+        self._runs = (self.bits, result)
+        return result
+
+    def intervals(self) -> List[Interval]:
+        return [(self.at(lo), self.at(hi)) for lo, hi in self.runs()]
+
+    def fit_mask(self, minutes: int) -> int:
+        """i-bit o'rnatilgan bo'lsa [i, i + minutes) to'liq bo'sh (o'rnatilgan)"""
+        if minutes <= 0:
+            return 0
+        bits = self.bits
+        covered = 1
+        while covered < minutes and bits:
+            shift = min(covered, minutes - covered)
+            bits &= bits >> shift
+            covered += shift
+        return bits
+
+    def first_fit(self, minutes: int, not_before: Optional[datetime] = None) -> Optional[datetime]:
+        """minutes davomiylik sig'adigan eng birinchi boshlanish vaqti"""
+        fits = self.fit_mask(minutes)
+        if not_before is not None:
+            fits &= ~_ones(self.index(not_before))
+        if not fits:
+            return None
+        return self.at((fits & -fits).bit_length() - 1)
+
+    def slot_indices(self, minutes: int, step: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        Har bir bo'sh blok boshidan step (standart: minutes) qadam bilan
+        minutes davomiylikdagi slotlar (daqiqa indekslari).
+        """
+        if minutes <= 0:
+            return []
+        step = step or minutes
+        result: List[Tuple[int, int]] = []
+        for lo, hi in self.runs():
+            result.extend((cursor, cursor + minutes) for cursor in range(lo, hi - minutes + 1, step))
+        return result
+
+    def slots(self, minutes: int, step: Optional[int] = None) -> List[Interval]:
+        """slot_indices natijasi datetime juftliklari ko'rinishida"""
+        at = self.at
+        return [(at(lo), at(hi)) for lo, hi in self.slot_indices(minutes, step)]
+
+
+def hhmm(index: int) -> str:
+    """Daqiqa indeksini "HH:MM" ko'rinishiga aylantiradi (kun ichida)"""
+    minute_of_day = index % MINUTES_PER_DAY
+    return f"{minute_of_day // 60:02d}:{minute_of_day % 60:02d}"
+
+
+def work_bitmap(
+    day: date,
+    blocks: Iterable[Tuple[time, time]],
+    days: int = 1,
+) -> MinuteBitmap:
+    """Ish bloklaridan (start, end) bitmap yasaydi"""
+    bitmap = MinuteBitmap(day, days)
+    for start, end in blocks:
+        if start and end:
+            bitmap.add_times(day, start, end)
+    return bitmap
+
+
+def load_busy_bitmaps(
+    db: Session,
+    employee_ids: Sequence[str],
+    start_day: date,
+    days: int = 1,
+    statuses: Sequence[str] = ACTIVE_APPOINTMENT_STATUSES,
+    default_minutes: int = 30,
+    exclude_busy_slot_ids: Sequence[str] = (),
+    include_busy_slots: bool = True,
+    locking_read: bool = False,
+) -> Dict[str, MinuteBitmap]:
+    """
+    Bir nechta xodim uchun [start_day, start_day + days) oralig'idagi band bitmaplar.
+
+    Bitta appointments va bitta busy_slots so'rovi ishlatiladi. Oldingi kundan
+    yarim tundan o'tib keladigan yozuvlar ham hisobga olinadi.
+    include_busy_slots=False bo'lsa faqat appointmentlar. locking_read=True —
+    booking lock ostidagi tekshiruv uchun: snapshot emas, oxirgi commit qilingan
+    qatorlar o'qiladi (SELECT ... FOR SHARE; SQLite'da e'tiborsiz).
+    """
+    ids = [str(eid) for eid in employee_ids if eid]
+    result: Dict[str, MinuteBitmap] = {eid: MinuteBitmap(start_day, days) for eid in ids}
+    if not ids:
+        return result
+
+    first_day = start_day - timedelta(days=1)
+    last_day = start_day + timedelta(days=max(1, days) - 1)
+
+    apps_q = (
+        db.query(Appointment)
+        .filter(
+            and_(
+                Appointment.employee_id.in_(ids),
+                Appointment.application_date >= first_day,
+                Appointment.application_date <= last_day,
+                Appointment.is_cancelled == False,
+                Appointment.status.in_(list(statuses)),
+            )
+        )
+    )
+    if locking_read:
+        apps_q = apps_q.with_for_update(read=True)
+    for a in apps_q.all():
+        bitmap = result.get(str(a.employee_id))
+        if bitmap is not None and a.application_time:
+            bitmap.add(*appointment_interval(a, default_minutes))
+
+    if not include_busy_slots:
+        return result
+
+    busy_q = db.query(BusySlot).filter(
+        and_(
+            BusySlot.employee_id.in_(ids),
+            BusySlot.date >= first_day,
+            BusySlot.date <= last_day,
+        )
+    )
+    if exclude_busy_slot_ids:
+        busy_q = busy_q.filter(BusySlot.id.notin_(list(exclude_busy_slot_ids)))
+    if locking_read:
+        busy_q = busy_q.with_for_update(read=True)
+    for b in busy_q.all():
+        bitmap = result.get(str(b.employee_id))
+        if bitmap is not None and b.start_time and b.end_time:
+            bitmap.add(*busy_slot_interval(b))
+
+    return result
+
+
+def load_busy_bitmap(
+    db: Session,
+    employee_id: str,
+    start_day: date,
+    days: int = 1,
+    **kwargs,
+) -> MinuteBitmap:
+    """Bitta xodim uchun load_busy_bitmaps"""
+    return load_busy_bitmaps(db, [employee_id], start_day, days, **kwargs)[str(employee_id)]
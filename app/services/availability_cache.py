@@ -0,0 +1,305 @@
+"""
+In-process caches for computed free slots and salon service catalogues
+with write-driven invalidation
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from itertools import chain
+from typing import Callable, Dict, Iterable, List, NamedTuple, Sequence, Set, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.models.appointment import Appointment
+from app.models.busy_slot import BusySlot
+from app.models.employee import Employee
+from app.models.schedule import Schedule, ScheduleException
+from app.models.service import Service
+
+
+SlotList = List[Tuple[int, int]]
+Token = Tuple[int, int]
+
+_SESSION_KEY = "availability_invalidations"
+
+
+class AvailabilityCache:
+    """
+    (employee_id, date, duration) -> bo'sh slotlar (daqiqa indekslari) keshi.
+
+    Invalidatsiya generatsiya hisoblagichlari orqali O(1): (xodim, sana) yoki
+    butun xodim uchun hisoblagich oshiriladi, eski yozuvlar o'qishda miss bo'ladi.
+    TTL boshqa worker'lardagi yozuvlar uchun eskirish muddatini cheklaydi.
+    """
+
+    def __init__(self, max_entries: int = 20000, ttl_seconds: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, date, int], Tuple[float, Token, SlotList]]" = OrderedDict()
+        self._day_generations: Dict[Tuple[str, date], int] = {}
+        self._employee_generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _token(self, employee_id: str, day: date) -> Token:
+        return (
+            self._employee_generations.get(employee_id, 0),
+            self._day_generations.get((employee_id, day), 0),
+        )
+
+    def get_many(
+        self, employee_id: str, day: date, durations: Sequence[int]
+    ) -> Tuple[Dict[int, SlotList], Token]:
+        """
+        Keshdagi slotlar va joriy token. Token put_many ga uzatiladi: hisoblash
+        davomida invalidatsiya bo'lsa, eskirgan natija keshga yozilmaydi.
+        """
+        employee_id = str(employee_id)
+        now = time.monotonic()
+        found: Dict[int, SlotList] = {}
+        with self._lock:
+            token = self._token(employee_id, day)
+            for duration in durations:
+                key = (employee_id, day, duration)
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now and entry[1] == token:
+                    self._entries.move_to_end(key)
+                    found[duration] = entry[2]
+                    self.hits += 1
+                else:
+                    if entry is not None:
+                        del self._entries[key]
+                    self.misses += 1
+        return found, token
+
+    def put_many(self, employee_id: str, day: date, slots: Dict[int, SlotList], token: Token) -> None:
+        employee_id = str(employee_id)
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            if self._token(employee_id, day) != token:
+                return
+            for duration, value in slots.items():
+                key = (employee_id, day, duration)
+                self._entries[key] = (expires_at, token, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, employee_id: str, day: date) -> None:
+        key = (str(employee_id), day)
+        with self._lock:
+            self._day_generations[key] = self._day_generations.get(key, 0) + 1
+            self.invalidations += 1
+            if len(self._day_generations) > self.max_entries:
+                self._prune_generations()
+
+    def invalidate_employee(self, employee_id: str) -> None:
+        employee_id = str(employee_id)
+        with self._lock:
+            self._employee_generations[employee_id] = self._employee_generations.get(employee_id, 0) + 1
+            self.invalidations += 1
+
+    def _prune_generations(self) -> None:
+        # O'tgan kunlar uchun hisoblagichlar kerak emas: ularga tegishli yozuvlar ham o'chiriladi
+        cutoff = date.today() - timedelta(days=1)
+        self._day_generations = {k: v for k, v in self._day_generations.items() if k[1] >= cutoff}
+        for key in [k for k in self._entries if k[1] < cutoff]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._day_generations.clear()
+            self._employee_generations.clear()
+            self.hits = self.misses = self.invalidations = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+class CatalogService(NamedTuple):
+    id: int
+    name: str
+    duration: int
+
+
+class ServiceCatalogCache:
+    """
+    salon_id -> faol servislar (davomiylik bo'yicha saralangan) keshi.
+
+    Service yozuvlari o'zgarganda salon generatsiyasi oshiriladi; TTL boshqa
+    worker'lardagi o'zgarishlar uchun.
+    """
+
+    def __init__(self, max_entries: int = 5000, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, int, Tuple[CatalogService, ...]]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, salon_id: str, loader: Callable[[], Iterable[CatalogService]]) -> Tuple[CatalogService, ...]:
+        """Keshdagi katalog; bo'lmasa loader() natijasini keshga yozib qaytaradi"""
+        salon_id = str(salon_id)
+        now = time.monotonic()
+        with self._lock:
+            generation = self._generations.get(salon_id, 0)
+            entry = self._entries.get(salon_id)
+            if entry is not None and entry[0] > now and entry[1] == generation:
+                self._entries.move_to_end(salon_id)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        services = tuple(loader())
+        with self._lock:
+            if self._generations.get(salon_id, 0) == generation:
+                self._entries[salon_id] = (time.monotonic() + self.ttl_seconds, generation, services)
+                self._entries.move_to_end(salon_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return services
+
+    def invalidate(self, salon_id: str) -> None:
+        salon_id = str(salon_id)
+        with self._lock:
+            self._generations[salon_id] = self._generations.get(salon_id, 0) + 1
+            self._entries.pop(salon_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+availability_cache = AvailabilityCache()
+service_catalog_cache = ServiceCatalogCache()
+
+
+# ==================== Write-driven invalidation ====================
+def _attr_values(obj, name: str) -> Set:
+    """Atributning eski va yangi qiymatlari (flush oldidan)"""
+    hist = inspect(obj).attrs[name].history
+    return {v for v in chain(hist.added or (), hist.unchanged or (), hist.deleted or ()) if v is not None}
+
+
+def _employee_ids(values: Iterable) -> Set[str]:
+    ids: Set[str] = set()
+    for value in values:
+        items = value if isinstance(value, (list, tuple)) else [value]
+        for item in items:
+            if isinstance(item, dict):
+                item = item.get("id")
+            if item:
+                ids.add(str(item))
+    return ids
+
+
+def _schedule_employee_lists(obj) -> List:
+    hist = inspect(obj).attrs["employee_list"].history
+    return [v for v in chain(hist.added or (), hist.unchanged or (), hist.deleted or ()) if v]
+
+
+def _invalidation_keys(obj, deleted: bool = False) -> Set[tuple]:
+    keys: Set[tuple] = set()
+    if isinstance(obj, (Appointment, BusySlot)):
+        date_attr = "application_date" if isinstance(obj, Appointment) else "date"
+        # Yarim tundan o'tadigan interval keyingi kunga ham ta'sir qiladi
+        for eid in _employee_ids(_attr_values(obj, "employee_id")):
+            for day in _attr_values(obj, date_attr):
+                keys.add(("day", eid, day))
+                keys.add(("day", eid, day + timedelta(days=1)))
+    elif isinstance(obj, Schedule):
+        # Takrorlanish qoidasi ko'p kunga ta'sir qiladi: xodimning butun keshi eskiradi
+        rule = bool(_attr_values(obj, "repeat_until"))
+        for eid in _employee_ids(_schedule_employee_lists(obj)):
+            if rule:
+                keys.add(("employee", eid))
+                continue
+            for day in _attr_values(obj, "date"):
+                keys.add(("day", eid, day))
+    elif isinstance(obj, ScheduleException):
+        # Qoidaning xodimlari faqat schedule allaqachon yuklangan bo'lsa olinadi (flush ichida lazy load yo'q)
+        rule = inspect(obj).attrs["schedule"].loaded_value
+        lists = _schedule_employee_lists(obj)
+        if isinstance(rule, Schedule):
+            lists.append(rule.employee_list or [])
+        for eid in _employee_ids(lists):
+            for day in _attr_values(obj, "date"):
+                keys.add(("day", eid, day))
+    elif isinstance(obj, Employee):
+        state = inspect(obj)
+        if deleted or any(
+            state.attrs[name].history.has_changes()
+            for name in ("work_start_time", "work_end_time", "is_active", "deleted_at")
+        ):
+            keys.add(("employee", str(obj.id)))
+    elif isinstance(obj, Service):
+        for salon_id in _attr_values(obj, "salon_id"):
+            keys.add(("salon_services", str(salon_id)))
+    return keys
+
+
+def _collect_invalidations(session: Session, flush_context) -> None:
+    pending = session.info.setdefault(_SESSION_KEY, set())
+    deleted = set(map(id, session.deleted))
+    for obj in chain(session.new, session.dirty, session.deleted):
+        try:
+            pending |= _invalidation_keys(obj, deleted=id(obj) in deleted)
+        except Exception:
+            continue
+
+
+def queue_invalidations(session: Session, keys: Iterable[tuple]) -> None:
+    """
+    Core (bulk) yozuvlar uchun: ORM flush'siz o'zgarishlarni sessiya commit'ida
+    bir marta invalidatsiya qilish. Kalitlar _invalidation_keys formatida.
+    """
+    session.info.setdefault(_SESSION_KEY, set()).update(keys)
+
+
+def _apply_invalidations(session: Session) -> None:
+    pending = session.info.pop(_SESSION_KEY, None)
+    if not pending:
+        return
+    for key in pending:
+        if key[0] == "day":
+            availability_cache.invalidate(key[1], key[2])
+        elif key[0] == "employee":
+            availability_cache.invalidate_employee(key[1])
+        else:
+            service_catalog_cache.invalidate(key[1])
+
+
+def _discard_invalidations(session: Session, previous_transaction=None) -> None:
+    session.info.pop(_SESSION_KEY, None)
+
+
+event.listen(Session, "after_flush", _collect_invalidations)
+event.listen(Session, "after_commit", _apply_invalidations)
+event.listen(Session, "after_rollback", _discard_invalidations)
@@ -0,0 +1,149 @@
+"""
+Per-(employee, date) booking locks for race-free check-then-insert
+"""
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Iterable, Iterator, List
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.services.availability import load_busy_bitmap
+
+
+# Lock kutish chegarasi: band slotga navbat cho'zilib ketmasligi uchun qisqa
+BOOKING_LOCK_TIMEOUT_SECONDS = 5
+
+# Bitta process ichidagi fallback (SQLite / dev) uchun lock'lar soni
+_LOCAL_STRIPES = 1024
+_local_locks = [threading.Lock() for _ in range(_LOCAL_STRIPES)]
+
+
+class BookingLockTimeout(Exception):
+    """Lock belgilangan vaqt ichida olinmadi"""
+
+
+def lock_days(start: datetime, end: datetime) -> List[date]:
+    """[start, end) intervali tegadigan kunlar (yarim tundan o'tsa keyingi kun ham)"""
+    last = (end - timedelta(microseconds=1)).date() if end > start else start.date()
+    days = []
+    day = start.date()
+    while day <= last:
+        days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def _lock_key(employee_id: str, day: date) -> int:
+    """(employee_id, kun) uchun barqaror signed 64-bit kalit (pg_advisory_xact_lock uchun)"""
+    digest = hashlib.blake2b(f"booking:{employee_id}:{day.isoformat()}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+@contextmanager
+def _postgres_locks(db: Session, keys: List[int]) -> Iterator[None]:
+    # Transaction darajasidagi lock: commit/rollback bilan avtomatik bo'shaydi
+    db.execute(text(f"SET LOCAL lock_timeout = '{int(BOOKING_LOCK_TIMEOUT_SECONDS * 1000)}ms'"))
+    try:
+        for key in keys:
+            db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": key})
+    except OperationalError as e:
+        db.rollback()
+        raise BookingLockTimeout(str(e))
+    yield
+
+
+@contextmanager
+def _mysql_locks(db: Session, keys: List[int]) -> Iterator[None]:
+    # GET_LOCK ulanishga bog'langan va bitta ulanishda re-entrant: session commit
+    # qilganda ulanishini pool'ga qaytaradi, shuning uchun lock alohida olingan
+    # ulanishda ushlab turiladi va RELEASE_LOCK ham o'sha ulanishda bajariladi
+    conn = db.get_bind().connect()
+    acquired = []
+    try:
+        for key in keys:
+            name = f"booking:{key}"
+            got = conn.execute(
+                text("SELECT GET_LOCK(:name, :timeout)"),
+                {"name": name, "timeout": BOOKING_LOCK_TIMEOUT_SECONDS},
+            ).scalar()
+            if got != 1:
+                raise BookingLockTimeout(name)
+            acquired.append(name)
+        yield
+    finally:
+        try:
+            for name in reversed(acquired):
+                conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": name})
+        finally:
+            # Ulanish yopilsa (xatolikda) MySQL lock'larni o'zi bo'shatadi
+            conn.close()
+
+
+@contextmanager
+def _local_locks_for(keys: List[int]) -> Iterator[None]:
+    stripes = sorted({key % _LOCAL_STRIPES for key in keys})
+    acquired = []
+    try:
+        for stripe in stripes:
+            if not _local_locks[stripe].acquire(timeout=BOOKING_LOCK_TIMEOUT_SECONDS):
+                raise BookingLockTimeout(f"stripe {stripe}")
+            acquired.append(stripe)
+        yield
+    finally:
+        for stripe in reversed(acquired):
+            _local_locks[stripe].release()
+
+
+@contextmanager
+def employee_day_lock(db: Session, employee_id: str, start: datetime, end: datetime) -> Iterator[None]:
+    """
+    [start, end) tegadigan har bir (employee_id, kun) uchun eksklyuziv lock.
+
+    Blok ichida bandlik tekshiruvi, insert va commit bajariladi. Lock'lar
+    tartiblangan holda olinadi (deadlock bo'lmaydi); xatolikda transaction
+    rollback qilinadi. Tekshiruv locking_read=True bilan o'qiladi: lock'dan
+    oldin ochilgan REPEATABLE READ snapshot ham oxirgi commit'larni ko'radi.
+    """
+    keys = sorted({_lock_key(str(employee_id), day) for day in lock_days(start, end)})
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        locks = _postgres_locks(db, keys)
+    elif dialect in ("mysql", "mariadb"):
+        locks = _mysql_locks(db, keys)
+    else:
+        locks = _local_locks_for(keys)
+
+    with locks:
+        try:
+            yield
+        except BaseException:
+            db.rollback()
+            raise
+
+
+def reserve_employee_interval(
+    db: Session,
+    employee_id: str,
+    start: datetime,
+    end: datetime,
+    rows: Iterable,
+    **busy_kwargs,
+) -> bool:
+    """
+    Lock ostida bandlikni tekshirib, bo'sh bo'lsa rows'ni yozadi va commit qiladi.
+
+    Interval band bo'lsa hech narsa yozilmaydi va False qaytadi.
+    busy_kwargs load_busy_bitmap'ga uzatiladi (statuses, default_minutes, ...).
+    """
+    with employee_day_lock(db, employee_id, start, end):
+        busy = load_busy_bitmap(db, str(employee_id), start.date(), days=2, locking_read=True, **busy_kwargs)
+        if busy.overlaps(start, end):
+            db.rollback()
+            return False
+        db.add_all(list(rows))
+        db.commit()
+        return True
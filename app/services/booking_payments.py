@@ -0,0 +1,361 @@
+"""
+Background prepayment step for bookings: Click charge off the request path
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Optional
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.appointment import Appointment
+from app.models.payment import ClickPayment, Payment as PaymentModel
+from app.services.availability import ACTIVE_APPOINTMENT_STATUSES, appointment_interval, load_busy_bitmap
+from app.services.booking_lock import employee_day_lock
+from app.services.Click import PaymentStatus
+from app.services.notifications import PendingNotification, notification_service
+
+
+logger = logging.getLogger("BookingPayments")
+
+# To'lov kutilayotgan appointment statusi: slot band, lekin salon hali ko'rmaydi
+PAYMENT_PENDING = "payment_pending"
+
+# Click'ga bir vaqtda yuboriladigan to'lovlar soni (worker'lar band bo'lsa navbatda kutadi)
+PAYMENT_WORKERS = 4
+
+# Shu muddatda tasdiqlanmagan to'lov bekor qilinadi va slot bo'shatiladi
+PAYMENT_PENDING_TIMEOUT = timedelta(minutes=15)
+
+# expire_stale_booking_payments bekor qilgan appointment'ning cancellation_reason'i;
+# to'lov keyin tasdiqlansa slot qayta band qilinadi yoki pul qaytariladi
+PAYMENT_TIMEOUT_REASON = "payment_timeout"
+PAYMENT_REFUND_PENDING_REASON = "payment_refund_pending"
+PAYMENT_REFUNDED_REASON = "payment_refunded"
+PAYMENT_REFUND_FAILED_REASON = "payment_refund_failed"
+
+_executor = ThreadPoolExecutor(max_workers=PAYMENT_WORKERS, thread_name_prefix="booking-payment")
+
+
+@dataclass
+class BookingCharge:
+    click_payment_id: str
+    appointment_id: str
+    card_token: str
+    amount: float
+    user_id: Optional[str]
+    salon_id: str
+    employee_id: str
+    description: str
+    language: Optional[str] = None
+
+
+def booking_payment_for(application_number: str) -> str:
+    """ClickPayment.payment_for qiymati: appointment bilan bog'lash uchun"""
+    return f"booking_{application_number}"
+
+
+def _application_number(payment: ClickPayment) -> Optional[str]:
+    value = payment.payment_for or ""
+    return value[len("booking_"):] if value.startswith("booking_") else None
+
+
+_STATUS_TEXTS = {
+    "confirmed": {
+        "uz": ("To'lov qabul qilindi", "Appointment uchun to'lov muvaffaqiyatli amalga oshirildi"),
+        "ru": ("Оплата получена", "Оплата записи прошла успешно"),
+        "en": ("Payment received", "Your appointment payment was successful"),
+    },
+    "failed": {
+        "uz": ("To'lov amalga oshmadi", "To'lov o'tmadi, appointment bekor qilindi"),
+        "ru": ("Оплата не прошла", "Оплата не прошла, запись отменена"),
+        "en": ("Payment failed", "The payment failed and the appointment was cancelled"),
+    },
+    "refunded": {
+        "uz": ("To'lov qaytarildi", "To'lov kechikib tasdiqlandi, bu vaqt band bo'lib qolgani uchun pul qaytarildi"),
+        "ru": ("Оплата возвращена", "Оплата подтвердилась с опозданием, время уже занято — деньги возвращены"),
+        "en": ("Payment refunded", "The payment was confirmed too late and the time is taken, so it was refunded"),
+    },
+    "refund_failed": {
+        "uz": ("To'lov qaytarilmoqda", "Bu vaqt band bo'lib qoldi, to'lovni qaytarish ko'rib chiqilmoqda"),
+        "ru": ("Возврат оплаты", "Время уже занято, возврат оплаты рассматривается"),
+        "en": ("Refund in progress", "The time is taken, your payment refund is being reviewed"),
+    },
+}
+
+
+def _salon_id(appointment: Appointment, charge: Optional[BookingCharge]) -> Optional[str]:
+    if charge is not None:
+        return charge.salon_id
+    employee = appointment.employee
+    return str(employee.salon_id) if employee is not None and employee.salon_id else None
+
+
+def _notify(db: Session, appointment: Appointment, outcome: str, charge: Optional[BookingCharge]) -> None:
+    """Foydalanuvchiga Notification va salon WS xonasiga booking_status hodisasi"""
+    language = charge.language if charge else None
+    salon_id = _salon_id(appointment, charge)
+    lang = (language or "").lower()[:2]
+    title, message = _STATUS_TEXTS[outcome].get(lang, _STATUS_TEXTS[outcome]["en"])
+    data = {
+        "appointment_id": str(appointment.id),
+        "application_number": appointment.application_number,
+        "status": appointment.status,
+    }
+    if appointment.user_id:
+        notification_service.notify(
+            PendingNotification(
+                user_id=str(appointment.user_id),
+                title=title,
+                message=message,
+                type="success" if outcome in ("confirmed", "refunded") else "error",
+                data=data,
+            )
+        )
+
+    if salon_id:
+        _broadcast(f"salon_{salon_id}", {"event": "booking_status", **data})
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _broadcast(room_id: str, payload: dict) -> None:
+    try:
+        from app.routers.ws_chat import manager
+
+        try:
+            # Webhook kabi event loop ichidagi chaqiruvlar
+            asyncio.get_running_loop().create_task(manager.broadcast(room_id, payload))
+            return
+        except RuntimeError:
+            pass
+        # Worker/scheduler thread'dan: asosiy event loop orqali yuboriladi
+        loop = _loop
+        if loop is not None and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(manager.broadcast(room_id, payload), loop)
+    except Exception:
+        logger.exception("booking_status broadcast failed")
+
+
+def confirm_booking_payment(
+    db: Session,
+    payment: ClickPayment,
+    paydoc_id: Optional[str] = None,
+    charge: Optional[BookingCharge] = None,
+) -> Optional[Appointment]:
+    """
+    To'lov tasdiqlandi: ClickPayment/Payment yozuvlari va appointment statusi.
+    Webhook va worker ikkalasi chaqirishi mumkin — takroriy chaqiruv hech narsa o'zgartirmaydi.
+    """
+    appointment = (
+        db.query(Appointment)
+        .filter(Appointment.application_number == _application_number(payment))
+        .first()
+    )
+    payment.status = PaymentStatus.CONFIRMED.value
+    if paydoc_id:
+        payment.click_paydoc_id = str(paydoc_id)
+    if appointment is not None and appointment.cancellation_reason == PAYMENT_TIMEOUT_REASON:
+        # Muddati o'tib bekor qilingandan keyin kelgan tasdiq: pul yechilgan
+        return _confirm_expired(db, payment, appointment, paydoc_id, charge)
+    if appointment is None or appointment.status != PAYMENT_PENDING:
+        db.commit()
+        return appointment
+
+    appointment.status = "pending"
+    _record_payment(db, payment, appointment, paydoc_id, charge)
+    db.commit()
+    _notify(db, appointment, "confirmed", charge)
+    return appointment
+
+
+def _record_payment(
+    db: Session,
+    payment: ClickPayment,
+    appointment: Appointment,
+    paydoc_id: Optional[str],
+    charge: Optional[BookingCharge],
+) -> None:
+    exists = db.query(PaymentModel.id).filter(PaymentModel.transaction_id == str(payment.id)).first()
+    if not exists:
+        db.add(
+            PaymentModel(
+                user_id=appointment.user_id,
+                employee_id=appointment.employee_id,
+                salon_id=_salon_id(appointment, charge),
+                amount=int(round(float(payment.amount or 0))),
+                payment_type="service_booking",
+                transaction_id=str(payment.id),
+                click_trans_id=str(paydoc_id) if paydoc_id else None,
+                status="completed",
+                description=charge.description if charge else f"Prepay for {appointment.service_name}",
+            )
+        )
+
+
+def _confirm_expired(
+    db: Session,
+    payment: ClickPayment,
+    appointment: Appointment,
+    paydoc_id: Optional[str],
+    charge: Optional[BookingCharge],
+) -> Appointment:
+    """
+    Slot hali bo'sh bo'lsa appointment lock ostida tiklanadi (reserve_employee_interval
+    bilan bir xil tekshiruv), aks holda to'lov fon worker'ida qaytariladi.
+    """
+    restored = False
+    if appointment.employee_id and appointment.application_date and appointment.application_time:
+        start, end = appointment_interval(appointment, 60)
+        with employee_day_lock(db, appointment.employee_id, start, end):
+            busy = load_busy_bitmap(
+                db,
+                str(appointment.employee_id),
+                start.date(),
+                days=2,
+                statuses=ACTIVE_APPOINTMENT_STATUSES + ("confirmed",),
+                default_minutes=60,
+                locking_read=True,
+            )
+            if not busy.overlaps(start, end):
+                appointment.status = "pending"
+                appointment.is_cancelled = False
+                appointment.cancellation_reason = None
+                _record_payment(db, payment, appointment, paydoc_id, charge)
+                db.commit()
+                restored = True
+    if restored:
+        _notify(db, appointment, "confirmed", charge)
+        return appointment
+
+    # Takroriy webhook qayta refund qilmasligi uchun sabab darhol almashtiriladi
+    appointment.cancellation_reason = PAYMENT_REFUND_PENDING_REASON
+    db.commit()
+    _executor.submit(_refund, str(payment.id), paydoc_id or payment.click_paydoc_id, charge)
+    return appointment
+
+
+def _refund(click_payment_id: str, paydoc_id: Optional[str], charge: Optional[BookingCharge]) -> None:
+    db = SessionLocal()
+    try:
+        payment = db.query(ClickPayment).filter(ClickPayment.id == click_payment_id).first()
+        if payment is None:
+            return
+        appointment = (
+            db.query(Appointment)
+            .filter(Appointment.application_number == _application_number(payment))
+            .first()
+        )
+        refunded = False
+        if paydoc_id:
+            try:
+                result = settings.click_provider.reverse_payment(paydoc_id)
+                refunded = result.get("error_code") == 0
+            except Exception:
+                logger.exception("Booking refund crashed: %s", click_payment_id)
+        if refunded:
+            payment.status = PaymentStatus.CANCELLED.value
+        else:
+            # Qo'lda qaytarish uchun: cancellation_reason = payment_refund_failed
+            logger.error("Late booking payment %s was not refunded automatically", click_payment_id)
+        if appointment is not None:
+            appointment.cancellation_reason = PAYMENT_REFUNDED_REASON if refunded else PAYMENT_REFUND_FAILED_REASON
+        db.commit()
+        if appointment is not None:
+            _notify(db, appointment, "refunded" if refunded else "refund_failed", charge)
+    except Exception:
+        db.rollback()
+        logger.exception("Booking refund failed")
+    finally:
+        db.close()
+
+
+def fail_booking_payment(
+    db: Session,
+    payment: Optional[ClickPayment],
+    appointment: Optional[Appointment] = None,
+    reason: str = "payment_failed",
+    charge: Optional[BookingCharge] = None,
+) -> Optional[Appointment]:
+    """To'lov o'tmadi: appointment bekor qilinadi va slot bo'shaydi"""
+    if payment is not None:
+        if payment.status != PaymentStatus.REJECTED.value:
+            payment.status = PaymentStatus.ERROR.value
+        if appointment is None:
+            appointment = (
+                db.query(Appointment)
+                .filter(Appointment.application_number == _application_number(payment))
+                .first()
+            )
+    if appointment is None or appointment.status != PAYMENT_PENDING:
+        db.commit()
+        return appointment
+
+    appointment.status = "cancelled"
+    appointment.is_cancelled = True
+    appointment.cancellation_reason = reason
+    db.commit()
+    _notify(db, appointment, "failed", charge)
+    return appointment
+
+
+def _charge(charge: BookingCharge) -> None:
+    db = SessionLocal()
+    try:
+        payment = db.query(ClickPayment).filter(ClickPayment.id == charge.click_payment_id).first()
+        if payment is None:
+            return
+        try:
+            result = settings.click_provider.payment_with_token(
+                card_token=charge.card_token,
+                amount=charge.amount,
+                merchant_trans_id=payment.id,
+            )
+        except Exception as e:
+            logger.exception(f"Booking charge crashed: {e}")
+            result = {"timeout": True}
+
+        if result.get("timeout"):
+            # Natija noma'lum: webhook yoki PAYMENT_PENDING_TIMEOUT hal qiladi
+            logger.warning(f"Booking charge timed out, waiting for webhook: {payment.id}")
+        elif (result.get("error_code") and result.get("error_code") != 0) or result.get("error"):
+            fail_booking_payment(db, payment, charge=charge)
+        else:
+            confirm_booking_payment(db, payment, paydoc_id=result.get("payment_id"), charge=charge)
+    except Exception:
+        db.rollback()
+        logger.exception("Booking charge failed")
+    finally:
+        db.close()
+
+
+def submit_booking_charge(charge: BookingCharge) -> None:
+    """To'lovni fon worker'iga navbatga qo'yadi (so'rov Click javobini kutmaydi)"""
+    global _loop
+    try:
+        _loop = asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    _executor.submit(_charge, charge)
+
+
+def expire_stale_booking_payments(db: Session) -> int:
+    """
+    PAYMENT_PENDING_TIMEOUT dan eski, tasdiqlanmagan appointmentlarni bekor qiladi.
+    Vaqt bazadan olinadi: created_at server_default (func.now()) bilan yoziladi.
+    """
+    cutoff = db.execute(select(func.now())).scalar() - PAYMENT_PENDING_TIMEOUT
+    stale = (
+        db.query(Appointment)
+        .filter(and_(Appointment.status == PAYMENT_PENDING, Appointment.created_at < cutoff))
+        .all()
+    )
+    for appointment in stale:
+        fail_booking_payment(db, None, appointment=appointment, reason=PAYMENT_TIMEOUT_REASON)
+    return len(stale)
@@ -0,0 +1,131 @@
+"""
+Bulk BusySlot creation: batched conflict check and set-based insert per employee
+"""
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional, Sequence
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.models.busy_slot import BusySlot
+from app.services.availability import MinuteBitmap, busy_slot_interval, load_busy_bitmap, time_range
+from app.services.availability_cache import queue_invalidations
+from app.services.booking_lock import employee_day_lock
+from app.services.recurrence import WEEKDAY_MAP, rule_dates
+
+
+# Bitta so'rovdagi intervallar chegarasi (~1 yil har kuni)
+MAX_BULK_BUSY_SLOTS = 400
+
+ALL_WEEKDAYS = ",".join(WEEKDAY_MAP)
+
+
+@dataclass
+class BusyInterval:
+    index: int
+    date: date
+    start_time: time
+    end_time: time
+    reason: Optional[str] = None
+
+    @property
+    def span(self):
+        # end <= start bo'lsa interval yarim tundan o'tadi
+        return time_range(self.date, self.start_time, self.end_time)
+
+
+def recurrence_dates(start: date, end: date, weekdays: Optional[str]) -> List[date]:
+    """[start, end] dagi sanalar; weekdays ("monday,friday") bo'sh bo'lsa har kuni"""
+    return list(rule_dates(start, end, weekdays or ALL_WEEKDAYS, start, end))
+
+
+def _result(item: BusyInterval, status: str, conflict: Optional[str] = None, slot_id: Optional[str] = None) -> dict:
+    return {
+        "index": item.index,
+        "date": item.date.isoformat(),
+        "start_time": item.start_time.strftime("%H:%M"),
+        "end_time": item.end_time.strftime("%H:%M"),
+        "status": status,
+        "conflict": conflict,
+        "id": slot_id,
+    }
+
+
+def bulk_create_busy_slots(
+    db: Session, employee_id: str, items: Sequence[BusyInterval], atomic: bool = False
+) -> List[dict]:
+    """
+    Xodim uchun ko'p BusySlot yozadi va har bir interval natijasini qaytaradi.
+
+    Butun davr uchun (employee, kun) lock'lari ostida appointments va mavjud
+    busy_slots bir martadan o'qiladi. Kesishgan intervallar "conflict"
+    (appointment | busy_slot | duplicate) bo'ladi, qolganlari bitta INSERT
+    bilan yoziladi. atomic=True va konflikt bo'lsa hech narsa yozilmaydi
+    ("skipped"). Kesh invalidatsiyasi butun paket uchun bir marta.
+    """
+    if not items:
+        return []
+    employee_id = str(employee_id)
+    spans = [item.span for item in items]
+    first = min(start for start, _ in spans)
+    last = max(end for _, end in spans)
+    origin = first.date()
+    days = (last.date() - origin).days + 1
+
+    with employee_day_lock(db, employee_id, first, last):
+        appointments = load_busy_bitmap(db, employee_id, origin, days, include_busy_slots=False, locking_read=True)
+        existing = MinuteBitmap(origin, days)
+        for slot in (
+            db.query(BusySlot)
+            .filter(
+                BusySlot.employee_id == employee_id,
+                BusySlot.date >= origin - timedelta(days=1),
+                BusySlot.date <= last.date(),
+            )
+            .with_for_update(read=True)
+            .all()
+        ):
+            existing.add(*busy_slot_interval(slot))
+
+        batch = MinuteBitmap(origin, days)
+        results: List[dict] = []
+        rows: List[dict] = []
+        now = datetime.utcnow()
+        for item, (start, end) in zip(items, spans):
+            if appointments.overlaps(start, end):
+                results.append(_result(item, "conflict", "appointment"))
+            elif existing.overlaps(start, end):
+                results.append(_result(item, "conflict", "busy_slot"))
+            elif batch.overlaps(start, end):
+                results.append(_result(item, "conflict", "duplicate"))
+            else:
+                batch.add(start, end)
+                slot_id = str(uuid.uuid4())
+                rows.append(
+                    {
+                        "id": slot_id,
+                        "employee_id": employee_id,
+                        "date": item.date,
+                        "start_time": item.start_time,
+                        "end_time": item.end_time,
+                        "reason": item.reason,
+                        "created_at": now,
+                        "updated_at": now,
+                    }
+                )
+                results.append(_result(item, "created", slot_id=slot_id))
+
+        if not rows or (atomic and len(rows) < len(items)):
+            db.rollback()
+            for result in results:
+                if result["status"] == "created":
+                    result.update(status="skipped", id=None)
+            return results
+
+        db.execute(insert(BusySlot.__table__), rows)
+        # Core INSERT flush hodisalarini chaqirmaydi: xodim keshi commit'da bir marta eskiradi
+        queue_invalidations(db, {("employee", employee_id)})
+        db.commit()
+    return results
@@ -0,0 +1,150 @@
+"""
+Keyset (cursor) pagination for chat history on (created_at, id) across the
+hot messages table and messages_archive, and the per-chat message counter
+that replaces COUNT(*) in history responses
+"""
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from app.models.message import ArchivedMessage, Message
+from app.models.user_chat import UserChat
+
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class InvalidCursor(ValueError):
+    """before/after shu chatdagi xabar id'si emas"""
+
+
+def count_message(db: Session, chat_id: str, delta: int = 1) -> None:
+    """Yangi xabar(lar) uchun user_chats.message_count += delta (commit chaqiruvchida)"""
+    chats = UserChat.__table__
+    db.execute(
+        update(chats)
+        .where(chats.c.id == str(chat_id))
+        .values(message_count=func.coalesce(chats.c.message_count, 0) + delta)
+    )
+
+
+def message_total(db: Session, chat_id: str) -> int:
+    chats = UserChat.__table__
+    return db.execute(select(chats.c.message_count).where(chats.c.id == str(chat_id))).scalar() or 0
+
+
+def _cursor(db: Session, chat_id: str, message_id: str, archived_until) -> tuple:
+    """Cursor xabarining (created_at, id) si; arxivda ham qidiriladi"""
+    models = (Message, ArchivedMessage) if archived_until is not None else (Message,)
+    for model in models:
+        created_at = db.execute(
+            select(model.created_at).where(model.id == message_id, model.user_chat_id == chat_id)
+        ).scalar()
+        if created_at is not None:
+            return created_at, message_id
+    raise InvalidCursor(message_id)
+
+
+def _rows(db: Session, model, chat_id: str, count: int, before=None, after=None, offset: int = 0) -> list:
+    key = tuple_(model.created_at, model.id)
+    query = db.query(model).filter(model.user_chat_id == chat_id)
+    if after is not None:
+        return query.filter(key > tuple_(*after)).order_by(model.created_at.asc(), model.id.asc()).limit(count).all()
+    if before is not None:
+        query = query.filter(key < tuple_(*before))
+    return query.order_by(model.created_at.desc(), model.id.desc()).offset(offset).limit(count).all()
+
+
+def _page_rows(db: Session, chat_id: str, count: int, before, after, offset: int, archived_until) -> list:
+    """
+    messages + messages_archive dan `count` ta qator (after: o'sish, aks holda
+    kamayish tartibida). Arxiv faqat kerak bo'lganda o'qiladi: archived_until
+    dan yangi qatorlar hech qachon arxivda bo'lmaydi.
+    """
+    if archived_until is None:
+        return _rows(db, Message, chat_id, count, before, after, offset)
+    need = offset + count
+    rows = _rows(db, Message, chat_id, need, before, after)
+    if after is not None:
+        if after[0] > archived_until:
+            return rows
+    elif len(rows) >= need and rows[need - 1].created_at > archived_until:
+        return rows[offset:]
+    rows.extend(_rows(db, ArchivedMessage, chat_id, need, before, after))
+    rows.sort(key=lambda m: (m.created_at, m.id), reverse=after is None)
+    return rows[offset:need]
+
+
+def history_page(
+    db: Session,
+    chat_id: str,
+    limit: int = DEFAULT_LIMIT,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    offset: int = 0,
+) -> Tuple[List[Message], dict]:
+    """
+    Bitta sahifa xabar (eskidan yangiga) va pagination.
+
+    - cursorsiz: eng oxirgi `limit` ta xabar
+    - before=<message_id>: shu xabardan oldingilar (yuqoriga scroll)
+    - after=<message_id>: shu xabardan keyingilar (qayta ulanishda yetishmaganlar)
+    - offset: eski mijozlar uchun, faqat cursor berilmaganda
+
+    (user_chat_id, created_at, id) indeksi bo'yicha har bir sahifa `limit + 1`
+    qator o'qiydi, chat qanchalik uzun bo'lishidan qat'i nazar. Arxivlangan
+    xabarlar (messages_archive) shu sahifalarda uzilishsiz davom etadi.
+    """
+    chat_id = str(chat_id)
+    chats = UserChat.__table__
+    chat = db.execute(
+        select(chats.c.message_count, chats.c.archived_until).where(chats.c.id == chat_id)
+    ).first()
+    total, archived_until = (chat.message_count or 0, chat.archived_until) if chat else (0, None)
+
+    if after:
+        cursor = _cursor(db, chat_id, after, archived_until)
+        rows = _page_rows(db, chat_id, limit + 1, None, cursor, 0, archived_until)
+        items = rows[:limit]
+        has_older, has_newer = True, len(rows) > limit
+    else:
+        cursor = _cursor(db, chat_id, before, archived_until) if before else None
+        rows = _page_rows(db, chat_id, limit + 1, cursor, None, 0 if before else offset, archived_until)
+        items = list(reversed(rows[:limit]))
+        has_older, has_newer = len(rows) > limit, bool(before or offset)
+
+    pagination = {
+        "limit": limit,
+        "offset": offset if not (before or after) else None,
+        "before": items[0].id if items else before,
+        "after": items[-1].id if items else after,
+        "has_older": has_older,
+        "has_newer": has_newer,
+        "total": total,
+    }
+    return items, pagination
+
+
+def resume_page(db: Session, chat_id: str, since: str, limit: int = MAX_LIMIT) -> Tuple[List[Message], dict]:
+    """
+    Qayta ulanish: mijozda `since` xabarigacha hammasi bor, faqat keyingilari kerak.
+    Mijoz oxirgi xabarni ko'rgan bo'lsa (user_chats.last_message_id) messages
+    jadvaliga so'rov yo'q — faqat chat qatori o'qiladi. Noto'g'ri since -> InvalidCursor.
+    """
+    chats = UserChat.__table__
+    row = db.execute(
+        select(chats.c.last_message_id, chats.c.message_count).where(chats.c.id == str(chat_id))
+    ).first()
+    if row is not None and row.last_message_id == since:
+        return [], {
+            "limit": limit,
+            "offset": None,
+            "before": since,
+            "after": since,
+            "has_older": bool(row.message_count),
+            "has_newer": False,
+            "total": row.message_count or 0,
+        }
+    return history_page(db, chat_id, limit=limit, after=since)
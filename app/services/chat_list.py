@@ -0,0 +1,111 @@
+"""
+Set-based chat list building blocks: latest message per chat, unread counts
+and batched participant lookups (fixed number of queries per list)
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.models.admin import Admin
+from app.models.employee import Employee
+from app.models.message import Message
+from app.models.salon import Salon
+from app.models.unread_counter import ChatUnreadCounter
+from app.models.user import User
+
+
+PartyKey = Tuple[str, str]
+
+
+def latest_messages(db: Session, participation) -> List[Message]:
+    """
+    participation sharti bo'yicha qatnashilgan har bir chatning eng oxirgi xabari.
+    Bitta so'rov: row_number() oynasi chat bo'yicha.
+    """
+    chat_ids = select(Message.user_chat_id).where(participation).distinct().correlate(None)
+    ranked = (
+        select(
+            Message.id.label("id"),
+            func.row_number()
+            .over(
+                partition_by=Message.user_chat_id,
+                order_by=(Message.created_at.desc(), Message.id.desc()),
+            )
+            .label("rn"),
+        )
+        .where(Message.user_chat_id.in_(chat_ids))
+        .subquery()
+    )
+    return (
+        db.query(Message)
+        .join(ranked, ranked.c.id == Message.id)
+        .filter(ranked.c.rn == 1)
+        .all()
+    )
+
+
+def unread_counts(
+    db: Session,
+    chat_ids: Iterable[str],
+    receiver_ids: Iterable[str],
+    receiver_type: Optional[str] = None,
+) -> Dict[PartyKey, int]:
+    """(chat_id, receiver_id) -> o'qilmagan xabarlar soni; materiallashgan hisoblagichlardan bitta so'rov"""
+    chat_ids = {str(c) for c in chat_ids if c}
+    receiver_ids = {str(r) for r in receiver_ids if r}
+    if not chat_ids or not receiver_ids:
+        return {}
+    query = db.query(
+        ChatUnreadCounter.user_chat_id, ChatUnreadCounter.receiver_id, ChatUnreadCounter.count
+    ).filter(
+        ChatUnreadCounter.user_chat_id.in_(chat_ids),
+        ChatUnreadCounter.receiver_id.in_(receiver_ids),
+    )
+    if receiver_type is not None:
+        query = query.filter(ChatUnreadCounter.receiver_type == receiver_type)
+    return {(str(chat_id), str(receiver_id)): count for chat_id, receiver_id, count in query.all()}
+
+
+def load_parties(db: Session, refs: Iterable[PartyKey]) -> Dict[PartyKey, object]:
+    """
+    (turi, id) -> ORM obyekt; har bir tur uchun bitta IN so'rov.
+    "salon"/"admin" turlari avval Salon, topilmaganlari Admin jadvalidan qidiriladi.
+    Natija kalitining turi topilgan jadvalga mos ("salon" yoki "admin").
+    """
+    ids: Dict[str, set] = {}
+    for kind, party_id in refs:
+        if party_id:
+            ids.setdefault("salon" if kind == "admin" else kind, set()).add(str(party_id))
+
+    found: Dict[PartyKey, object] = {}
+    for kind, model in (("user", User), ("employee", Employee), ("salon", Salon)):
+        if ids.get(kind):
+            for obj in db.query(model).filter(model.id.in_(ids[kind])).all():
+                found[(kind, str(obj.id))] = obj
+    missing = {i for i in ids.get("salon", ()) if ("salon", i) not in found}
+    if missing:
+        for obj in db.query(Admin).filter(Admin.id.in_(missing)).all():
+            found[("admin", str(obj.id))] = obj
+    return found
+
+
+def party_name(parties: Dict[PartyKey, object], kind: str, party_id: str) -> str:
+    """Chat ro'yxati uchun qarshi tomon nomi (oldingi "Unknown"/"User"/... qiymatlari bilan)"""
+    party_id = str(party_id)
+    if kind == "user":
+        obj = parties.get(("user", party_id))
+        if obj is not None:
+            return obj.full_name or obj.username or "User"
+    elif kind == "employee":
+        obj = parties.get(("employee", party_id))
+        if obj is not None:
+            return f"{obj.name} {obj.surname or ''}".strip() or "Employee"
+    elif kind in ("salon", "admin"):
+        obj = parties.get(("salon", party_id))
+        if obj is not None:
+            return getattr(obj, "salon_name", None) or "Salon"
+        obj = parties.get(("admin", party_id))
+        if obj is not None:
+            return obj.full_name or obj.username or "Admin"
+    return "Unknown"
@@ -14,8 +14,8 @@ from app.models.payment_card import PaymentCard
 from app.models.user import User
 from app.models.employee import EmployeePostLimit
 from app.models.user_premium import UserPremium
-from app.models.notification import Notification
 from app.services.Click import PaymentStatus
+from app.services.notifications import PendingNotification, notification_service
 
 
 class Payment(BaseModel):
@@ -174,11 +174,14 @@ def deactivate_expired_premiums(db: Session) -> int:
 
         activated_premiums = 0
         affected = 0
+        # Muddati tugagani haqida bildirishnoma (commit'dan keyin)
+        expired_users = []
         for premium in expired_premiums:
             # Деактивируем все истекшие подписки
             if premium.is_active:
                 premium.is_active = False
                 affected += 1
+                expired_users.append(str(premium.user_id))
 
             # Если у пользователя есть автопродление — подготовим платеж и попробуем провести его
             if premium.user.auto_pay_for_premium and premium.user.card_for_auto_pay:
@@ -259,6 +262,15 @@ def deactivate_expired_premiums(db: Session) -> int:
 
 
         db.commit()
+        for user_id in expired_users:
+            notification_service.notify(PendingNotification(
+                user_id=user_id,
+                title="Premium muddati tugadi",
+                message="Premium obunangiz muddati tugadi",
+                type="warning",
+                data={"kind": "premium_expired"},
+                collapse_key="premium_expired",
+            ))
         logger.info(f"Deactivated {affected} expired premium record(s)")
         return affected, activated_premiums
     except Exception as e:
@@ -316,18 +328,13 @@ def auto_extend_user_premium(user_id: str, months: int, db: Session) -> None:
                 int(latest_premium.duration_months or 0) + months
             )
             db.commit()
-            try:
-                notif = Notification(
-                    user_id=str(user_id),
-                    title="Premium aktivlashtirildi",
-                    message=f"Premium {months} oyga uzaytirildi",
-                    type="success",
-                    data={"months": months},
-                )
-                db.add(notif)
-                db.commit()
-            except Exception:
-                pass
+            notification_service.notify(PendingNotification(
+                user_id=str(user_id),
+                title="Premium aktivlashtirildi",
+                message=f"Premium {months} oyga uzaytirildi",
+                type="success",
+                data={"months": months},
+            ))
             logger.info(
                 f"Extended existing premium for user {user_id} by {months} month(s). New expiry: {latest_premium.end_date}"
             )
@@ -342,18 +349,13 @@ def auto_extend_user_premium(user_id: str, months: int, db: Session) -> None:
             int(active_premiums[0].duration_months or 0) + months
         )
         db.commit()
-        try:
-            notif = Notification(
-                user_id=str(user_id),
-                title="Premium aktivlashtirildi",
-                message=f"Premium {months} oyga uzaytirildi",
-                type="success",
-                data={"months": months},
-            )
-            db.add(notif)
-            db.commit()
-        except Exception:
-            pass
+        notification_service.notify(PendingNotification(
+            user_id=str(user_id),
+            title="Premium aktivlashtirildi",
+            message=f"Premium {months} oyga uzaytirildi",
+            type="success",
+            data={"months": months},
+        ))
         logger.info(
             f"Extended existing premium for user {user_id} by {months} month(s). New expiry: {active_premiums[0].end_date}"
         )
@@ -377,18 +379,13 @@ def auto_extend_user_premium(user_id: str, months: int, db: Session) -> None:
     )
     db.add(new_premium)
     db.commit()
-    try:
-        notif = Notification(
-            user_id=str(user_id),
-            title="Premium aktivlashtirildi",
-            message=f"Premium {months} oyga faollashtirildi",
-            type="success",
-            data={"months": months},
-        )
-        db.add(notif)
-        db.commit()
-    except Exception:
-        pass
+    notification_service.notify(PendingNotification(
+        user_id=str(user_id),
+        title="Premium aktivlashtirildi",
+        message=f"Premium {months} oyga faollashtirildi",
+        type="success",
+        data={"months": months},
+    ))
     logger.info(
         f"Activated premium for user {user_id} for {months} month(s). Expires: {new_premium.end_date}"
     )
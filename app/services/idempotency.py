@@ -0,0 +1,234 @@
+"""
+Idempotency-Key support for retry-prone POST endpoints (booking, payments)
+"""
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.config import settings
+from app.models.idempotency_key import IdempotencyKey
+
+
+# Yakunlangan javob shu muddat saqlanadi va qayta yuboriladi
+IDEMPOTENCY_TTL = timedelta(hours=24)
+# Bajarilayotgan so'rov egallagan kalit: process o'lib qolsa, shu muddatdan keyin bo'shaydi.
+# Premium/post to'lovi handler ichida sinxron Click so'rovini bajaradi — lease undan
+# (timeout × urinishlar + backoff) uzun bo'lishi shart, aks holda to'lov davom etayotganda
+# kalit bo'shab, takroriy so'rov kartadan ikkinchi marta pul yechadi
+IN_PROGRESS_LEASE = timedelta(minutes=2)
+# Click so'rovidan tashqari handler'dagi DB ishlari uchun zaxira
+_LEASE_MARGIN_SECONDS = 30
+assert IN_PROGRESS_LEASE.total_seconds() >= settings.click_provider.max_request_seconds() + _LEASE_MARGIN_SECONDS, (
+    "IN_PROGRESS_LEASE Click timeout/retry budjetidan qisqa"
+)
+MAX_KEY_LENGTH = 255
+PURGE_INTERVAL_SECONDS = 600
+
+REPLAY_HEADER = "Idempotent-Replayed"
+# Vaqtinchalik rad etish belgisi (masalan slot lock'i band): bunday javob saqlanmaydi
+RETRY_AFTER_HEADER = "Retry-After"
+
+_next_purge_at = 0.0
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def request_fingerprint(payload: Any) -> str:
+    """So'rov ma'lumotlarining barqaror izi (kalitlar tartibidan mustaqil)"""
+    return _sha256(json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":")))
+
+
+def _key_hash(scope: str, owner: Optional[str], key: str) -> str:
+    return _sha256(f"{scope}|{owner or 'anonymous'}|{key}")
+
+
+def _purge_expired(session: Session, now: datetime) -> None:
+    global _next_purge_at
+    if time.monotonic() < _next_purge_at:
+        return
+    _next_purge_at = time.monotonic() + PURGE_INTERVAL_SECONDS
+    session.query(IdempotencyKey).filter(IdempotencyKey.expires_at <= now).delete(synchronize_session=False)
+    session.commit()
+
+
+def _begin(factory, scope: str, key_hash: str, fingerprint: str) -> Optional[JSONResponse]:
+    """
+    Kalitni egallaydi. Yakunlangan javob bo'lsa uni qaytaradi (bitta lookup),
+    kalit boshqa so'rov tomonidan bajarilayotgan bo'lsa 409.
+    """
+    now = datetime.utcnow()
+    session = factory()
+    try:
+        row = session.query(IdempotencyKey).filter(IdempotencyKey.key_hash == key_hash).first()
+        if row is not None and row.expires_at > now:
+            if row.fingerprint != fingerprint:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="Idempotency-Key boshqa so'rov ma'lumotlari bilan ishlatilgan",
+                )
+            if row.status == "completed":
+                return JSONResponse(
+                    content=row.response_body,
+                    status_code=row.response_status or 200,
+                    headers={REPLAY_HEADER: "true"},
+                )
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Shu Idempotency-Key bilan so'rov hali bajarilmoqda",
+            )
+
+        if row is not None:
+            # Muddati o'tgan yozuv (yoki yakunlanmay qolgan urinish) o'rniga yangisi
+            session.query(IdempotencyKey).filter(
+                IdempotencyKey.key_hash == key_hash, IdempotencyKey.expires_at <= now
+            ).delete(synchronize_session=False)
+        session.add(
+            IdempotencyKey(
+                key_hash=key_hash,
+                scope=scope,
+                fingerprint=fingerprint,
+                status="in_progress",
+                expires_at=now + IN_PROGRESS_LEASE,
+            )
+        )
+        try:
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Shu Idempotency-Key bilan so'rov hali bajarilmoqda",
+            )
+        _purge_expired(session, now)
+        return None
+    finally:
+        session.close()
+
+
+def _complete(factory, key_hash: str, status_code: int, body: Any) -> None:
+    session = factory()
+    try:
+        session.query(IdempotencyKey).filter(IdempotencyKey.key_hash == key_hash).update(
+            {
+                IdempotencyKey.status: "completed",
+                IdempotencyKey.response_status: status_code,
+                IdempotencyKey.response_body: body,
+                IdempotencyKey.expires_at: datetime.utcnow() + IDEMPOTENCY_TTL,
+            },
+            synchronize_session=False,
+        )
+        session.commit()
+    finally:
+        session.close()
+
+
+def _abandon(factory, key_hash: str) -> None:
+    session = factory()
+    try:
+        session.query(IdempotencyKey).filter(IdempotencyKey.key_hash == key_hash).delete(
+            synchronize_session=False
+        )
+        session.commit()
+    finally:
+        session.close()
+
+
+def _is_final(error: HTTPException) -> bool:
+    """
+    Saqlanadigan (deterministik) javob: 4xx. 5xx, 408/429 va Retry-After bilan
+    qaytgan xatolar (lock band) vaqtinchalik — qayta urinish handler'ni chaqiradi.
+    """
+    if error.status_code >= 500 or error.status_code in (408, 429):
+        return False
+    return RETRY_AFTER_HEADER not in (error.headers or {})
+
+
+def _prepare(
+    db: Session, scope: str, key: str, owner: Optional[str], payload: Any
+) -> Tuple[Any, str, Optional[JSONResponse]]:
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key {MAX_KEY_LENGTH} belgidan oshmasligi kerak",
+        )
+    # Handler sessiyasi rollback/commit qilsa ham kalit yozuvlari unga bog'liq bo'lmasin
+    factory = sessionmaker(bind=db.get_bind(), autoflush=False)
+    key_hash = _key_hash(scope, owner, key)
+    return factory, key_hash, _begin(factory, scope, key_hash, request_fingerprint(payload))
+
+
+def run_idempotent(
+    db: Session,
+    scope: str,
+    key: Optional[str],
+    owner: Optional[str],
+    payload: Any,
+    handler: Callable[[], Any],
+    status_code: int = 200,
+) -> Any:
+    """
+    handler() ni Idempotency-Key bilan bajaradi.
+
+    Kalit bo'lmasa handler oddiy chaqiriladi. Takroriy so'rovga saqlangan javob
+    (deterministik 4xx HTTPException'lar ham) handler'ni chaqirmasdan qaytariladi.
+    Kutilmagan yoki vaqtinchalik xatolikda (_is_final) kalit bo'shatiladi va
+    qayta urinish mumkin.
+    """
+    if not key:
+        return handler()
+    factory, key_hash, replay = _prepare(db, scope, key, owner, payload)
+    if replay is not None:
+        return replay
+    try:
+        result = handler()
+    except HTTPException as e:
+        if _is_final(e):
+            _complete(factory, key_hash, e.status_code, {"detail": e.detail})
+        else:
+            _abandon(factory, key_hash)
+        raise
+    except Exception:
+        _abandon(factory, key_hash)
+        raise
+    _complete(factory, key_hash, status_code, jsonable_encoder(result))
+    return result
+
+
+async def run_idempotent_async(
+    db: Session,
+    scope: str,
+    key: Optional[str],
+    owner: Optional[str],
+    payload: Any,
+    handler: Callable[[], Awaitable[Any]],
+    status_code: int = 200,
+) -> Any:
+    """run_idempotent'ning async handler'lar uchun varianti"""
+    if not key:
+        return await handler()
+    factory, key_hash, replay = _prepare(db, scope, key, owner, payload)
+    if replay is not None:
+        return replay
+    try:
+        result = await handler()
+    except HTTPException as e:
+        if _is_final(e):
+            _complete(factory, key_hash, e.status_code, {"detail": e.detail})
+        else:
+            _abandon(factory, key_hash)
+        raise
+    except Exception:
+        _abandon(factory, key_hash)
+        raise
+    _complete(factory, key_hash, status_code, jsonable_encoder(result))
+    return result
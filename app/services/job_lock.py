@@ -0,0 +1,66 @@
+"""
+Single-run guard for periodic jobs: every uvicorn worker starts the same
+scheduler, only the worker holding the lock runs the job
+"""
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+
+# Bitta process ichidagi fallback (SQLite / dev) uchun
+_local_locks: Dict[str, threading.Lock] = {}
+_local_guard = threading.Lock()
+
+
+def _lock_key(name: str) -> int:
+    """Job nomi uchun barqaror signed 64-bit kalit (pg_try_advisory_lock uchun)"""
+    digest = hashlib.blake2b(f"job:{name}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+@contextmanager
+def single_run(engine: Engine, name: str) -> Iterator[bool]:
+    """
+    Lock olingan bo'lsa True beradi, boshqa worker shu job'ni bajarayotgan bo'lsa
+    False (kutmaydi — job shu safar o'tkazib yuboriladi).
+
+    Lock alohida ulanishda (session darajasida) job tugaguncha ushlab turiladi;
+    bo'shatib bo'lmasa ulanish pool'dan chiqariladi va lock server tomonida bo'shaydi.
+    """
+    dialect = engine.dialect.name
+    if dialect not in ("postgresql", "mysql", "mariadb"):
+        with _local_guard:
+            lock = _local_locks.setdefault(name, threading.Lock())
+        acquired = lock.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                lock.release()
+        return
+
+    conn = engine.connect()
+    acquired = False
+    try:
+        if dialect == "postgresql":
+            acquired = bool(conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": _lock_key(name)}).scalar())
+        else:
+            acquired = conn.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": f"job:{name}"}).scalar() == 1
+        conn.commit()
+        yield acquired
+    finally:
+        try:
+            if acquired:
+                if dialect == "postgresql":
+                    conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _lock_key(name)})
+                else:
+                    conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": f"job:{name}"})
+                conn.commit()
+        except Exception:
+            conn.invalidate()
+        finally:
+            conn.close()
@@ -0,0 +1,143 @@
+"""
+Chat xabarlarini messages -> messages_archive ga ko'chirish (oylik rollover).
+
+messages jadvalida faqat "issiq" xabarlar qoladi: muddati o'tgan, o'qilgan va
+chatning oxirgi xabari bo'lmaganlari arxivga ko'chiriladi. O'qilmaganlar
+qoladi — mark_read va o'qilmaganlar hisoblagichlari faqat messages bilan
+ishlaydi; oxirgi xabar esa chatlar ro'yxati va ruxsat tekshiruvlari uchun kerak.
+
+Har bir batch — alohida qisqa tranzaksiya (INSERT ... SELECT, DELETE,
+user_chats.archived_until), jadval uzoq lock bo'lmaydi. Jarayonni istalgan
+joyda to'xtatib qayta ishga tushirish mumkin: ko'chirilganlar endi shartga
+tushmaydi, qolganidan davom etadi.
+
+Mavjud ma'lumotni birinchi marta ko'chirish (alembic faqat jadvalni yaratadi):
+    python -m app.services.message_archive --days 180 --batch 1000
+"""
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import case, delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.models.message import ArchivedMessage, Message
+from app.models.user_chat import UserChat
+
+
+DEFAULT_BATCH = 1000
+# Chatlar shu hajmdagi sahifalar bilan aylanib chiqiladi
+CHAT_PAGE = 500
+
+_COLUMNS = [column.name for column in Message.__table__.columns]
+
+
+def archive_cutoff(days: int, now: Optional[datetime] = None) -> datetime:
+    """Naive UTC, xabarlar created_at kabi"""
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    return now - timedelta(days=days)
+
+
+def archive_chat_batch(db: Session, chat_id: str, keep_id: str, cutoff: datetime, batch_size: int = DEFAULT_BATCH) -> int:
+    """
+    Bitta chatdan eng eski `batch_size` ta mos xabarni ko'chiradi (commit chaqiruvchida).
+    (user_chat_id, created_at, id) indeksi bo'yicha o'qiladi.
+    """
+    messages, archive, chats = Message.__table__, ArchivedMessage.__table__, UserChat.__table__
+    rows = db.execute(
+        select(messages.c.id, messages.c.created_at)
+        .where(
+            messages.c.user_chat_id == chat_id,
+            messages.c.created_at < cutoff,
+            messages.c.is_read == True,  # noqa: E712
+            messages.c.id != keep_id,
+        )
+        .order_by(messages.c.created_at, messages.c.id)
+        .limit(batch_size)
+    ).all()
+    if not rows:
+        return 0
+    ids = [row.id for row in rows]
+    newest = rows[-1].created_at
+    db.execute(
+        insert(archive).from_select(_COLUMNS, select(*[messages.c[name] for name in _COLUMNS]).where(messages.c.id.in_(ids)))
+    )
+    db.execute(delete(messages).where(messages.c.id.in_(ids)))
+    db.execute(
+        update(chats)
+        .where(chats.c.id == chat_id)
+        .values(archived_until=case(
+            (chats.c.archived_until.is_(None), newest),
+            (chats.c.archived_until < newest, newest),
+            else_=chats.c.archived_until,
+        ))
+    )
+    return len(ids)
+
+
+def archive_messages(
+    db: Session,
+    days: int,
+    batch_size: int = DEFAULT_BATCH,
+    pause: float = 0.0,
+    verbose: bool = False,
+) -> int:
+    """
+    `days` kundan eski o'qilgan xabarlarni arxivga ko'chiradi, har batch'dan keyin commit.
+    pause — batchlar orasida kutish (soniya), band bazaga yuklamani kamaytirish uchun.
+    Ko'chirilganlar soni qaytariladi.
+    """
+    cutoff = archive_cutoff(days)
+    chats = UserChat.__table__
+    moved = 0
+    last_chat_id = ""
+    while True:
+        page = db.execute(
+            select(chats.c.id, chats.c.last_message_id)
+            .where(chats.c.id > last_chat_id, chats.c.last_message_id.isnot(None))
+            .order_by(chats.c.id)
+            .limit(CHAT_PAGE)
+        ).all()
+        db.commit()
+        if not page:
+            return moved
+        for chat_id, keep_id in page:
+            while True:
+                try:
+                    count = archive_chat_batch(db, chat_id, keep_id, cutoff, batch_size)
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    raise
+                moved += count
+                if verbose and count:
+                    print(f"[Archive] chat {chat_id}: +{count} (total {moved})")
+                if count < batch_size:
+                    break
+                if pause:
+                    time.sleep(pause)
+        last_chat_id = page[-1].id
+
+
+def main():
+    from app.config import settings
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Eski chat xabarlarini messages_archive ga ko'chirish")
+    parser.add_argument("--days", type=int, default=settings.chat_archive_after_days or 180)
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH)
+    parser.add_argument("--pause", type=float, default=0.0, help="batchlar orasida kutish, soniya")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        moved = archive_messages(db, args.days, args.batch, args.pause, verbose=True)
+        print(f"[Archive] moved {moved} message(s) older than {args.days} days in {time.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
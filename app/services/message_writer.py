@@ -0,0 +1,265 @@
+"""
+Write-behind persistence for chat messages received over WebSocket.
+
+Xabar id va vaqtini server darhol beradi, xona broadcast'i kutmaydi; yozish
+navbatga tushadi va fon vazifasi uni batch bilan (batch_size yoki
+flush_interval bo'yicha) bitta tranzaksiyada saqlaydi: messages, user_chats
+meta/hisoblagichlari va o'qilmaganlar hisoblagichlari (notifications —
+app.services.notifications navbati orqali, ack'dan keyin).
+Har bir xabar uchun natija (yoki xato) commit'dan keyin callback'ga beriladi —
+mijozga "ack" shu paytda yuboriladi, ya'ni ack = bazada saqlangan.
+"""
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from app.models.employee import Employee
+from app.models.message import Message
+from app.models.user_chat import UserChat
+from app.services.chat_history import count_message
+from app.services.unread_counters import increment_unread
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingMessage:
+    user_chat_id: str
+    sender_id: str
+    sender_type: str
+    sender_role: str
+    receiver_id: str
+    receiver_type: str
+    message_text: Optional[str] = None
+    message_type: str = "text"
+    file_url: Optional[str] = None
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    # Naive UTC, xuddi server_default kabi
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+
+    def row(self) -> dict:
+        return {
+            "id": self.id,
+            "created_at": self.created_at,
+            "updated_at": self.created_at,
+            "user_chat_id": self.user_chat_id,
+            "sender_id": self.sender_id,
+            "sender_type": self.sender_type,
+            "receiver_id": self.receiver_id,
+            "receiver_type": self.receiver_type,
+            "message_text": self.message_text,
+            "message_type": self.message_type,
+            "file_url": self.file_url,
+            "is_read": False,
+        }
+
+
+@dataclass
+class PersistResult:
+    unread_count: int
+    total_unread_count: int
+    # Qabul qiluvchi salon yoki xodimning saloni (salon_<id> xonasi uchun)
+    receiver_salon_id: Optional[str] = None
+
+
+Callback = Callable[[object], Awaitable[None]]
+
+
+def write_messages(db: Session, items: List[PendingMessage]) -> List[PersistResult]:
+    """
+    Xabarlarni va ularga bog'liq hamma narsani yozadi (commit chaqiruvchida).
+    So'rovlar soni xabarlar soniga emas, batchdagi chat/qabul qiluvchilar soniga bog'liq.
+    """
+    if not items:
+        return []
+    db.execute(insert(Message.__table__), [item.row() for item in items])
+
+    by_chat: Dict[str, List[PendingMessage]] = {}
+    by_receiver: Dict[Tuple[str, str], List[PendingMessage]] = {}
+    for item in items:
+        by_chat.setdefault(item.user_chat_id, []).append(item)
+        by_receiver.setdefault((item.user_chat_id, item.receiver_id), []).append(item)
+
+    chats = UserChat.__table__
+    for chat_id, group in by_chat.items():
+        db.execute(
+            update(chats)
+            .where(chats.c.id == chat_id)
+            .values(
+                last_message=group[-1].message_text,
+                last_message_time=group[-1].created_at,
+                last_message_id=group[-1].id,
+            )
+        )
+        count_message(db, chat_id, len(group))
+
+    # Batch oxiridagi qiymatlar; har bir xabar uchun undan keyingilar ayirib chiqiladi
+    chat_left: Dict[Tuple[str, str], int] = {}
+    total_left: Dict[str, int] = {}
+    for (chat_id, receiver_id), group in by_receiver.items():
+        chat_left[(chat_id, receiver_id)], total_left[receiver_id] = increment_unread(
+            db, chat_id, receiver_id, group[0].receiver_type, len(group)
+        )
+
+    employee_ids = {item.receiver_id for item in items if item.receiver_type == "employee"}
+    employee_salons = dict(
+        db.query(Employee.id, Employee.salon_id).filter(Employee.id.in_(employee_ids))
+    ) if employee_ids else {}
+
+    results: List[Optional[PersistResult]] = [None] * len(items)
+    for index in reversed(range(len(items))):
+        item = items[index]
+        key = (item.user_chat_id, item.receiver_id)
+        if item.receiver_type == "salon":
+            salon_id = item.receiver_id
+        else:
+            salon_id = employee_salons.get(item.receiver_id)
+        results[index] = PersistResult(
+            unread_count=chat_left[key],
+            total_unread_count=total_left[item.receiver_id],
+            receiver_salon_id=str(salon_id) if salon_id else None,
+        )
+        chat_left[key] -= 1
+        total_left[item.receiver_id] -= 1
+
+    return results
+
+
+class MessageWriter:
+    """
+    Navbat + bitta fon vazifasi. submit() navbat to'lsa kutadi (backpressure),
+    flush() shu paytgacha topshirilgan hamma xabar commit bo'lishini kutadi,
+    close() navbatni oxirigacha yozib to'xtaydi (lifespan shutdown).
+
+    Batch yozilmasa xabarlar bittadan qayta yoziladi, shunda bitta yomon xabar
+    boshqalarini yo'qotmaydi; baribir yozilmaganlar callback'ga Exception bo'lib boradi.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        batch_size: int = 200,
+        flush_interval: float = 0.02,
+        max_pending: int = 10000,
+        close_timeout: float = 5.0,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_interval)
+        self.max_pending = max_pending
+        self.close_timeout = close_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._callbacks = set()
+        self.batches = 0
+        self.written = 0
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            if self._queue is None:
+                self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, item: PendingMessage, callback: Optional[Callback] = None) -> None:
+        self._ensure_started()
+        await self._queue.put((item, callback))
+
+    async def flush(self) -> None:
+        if self._task is None:
+            return
+        barrier = asyncio.get_running_loop().create_future()
+        await self._queue.put(barrier)
+        await barrier
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        await self.flush()
+        self._task.cancel()
+        try:
+            await self._task
+        except (asyncio.CancelledError, Exception):
+            pass
+        self._task = None
+        if self._callbacks:
+            # ack/notification yuborish to'xtab qolsa ham shutdown osilib qolmasin
+            _, pending = await asyncio.wait(set(self._callbacks), timeout=self.close_timeout)
+            for task in pending:
+                task.cancel()
+
+    async def _next_batch(self) -> list:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size and not isinstance(batch[-1], asyncio.Future):
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            entries = [entry for entry in batch if not isinstance(entry, asyncio.Future)]
+            try:
+                if entries:
+                    await self._write(entries)
+            except Exception:
+                logger.exception("chat message writer failed")
+            for entry in batch:
+                if isinstance(entry, asyncio.Future) and not entry.done():
+                    entry.set_result(None)
+
+    def _write_sync(self, items: List[PendingMessage]) -> List[PersistResult]:
+        db = self.session_factory()
+        try:
+            results = write_messages(db, items)
+            db.commit()
+            return results
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def _write(self, entries: list) -> None:
+        items = [item for item, _ in entries]
+        try:
+            results = await asyncio.to_thread(self._write_sync, items)
+        except Exception:
+            logger.exception("chat batch of %d failed, retrying one by one", len(items))
+            results = []
+            for item in items:
+                try:
+                    results.extend(await asyncio.to_thread(self._write_sync, [item]))
+                except Exception as e:
+                    logger.exception("chat message %s was not persisted", item.id)
+                    results.append(e)
+        self.batches += 1
+        self.written += sum(1 for result in results if not isinstance(result, Exception))
+        for (_, callback), result in zip(entries, results):
+            if callback is not None:
+                task = asyncio.ensure_future(self._call(callback, result))
+                self._callbacks.add(task)
+                task.add_done_callback(self._callbacks.discard)
+
+    @staticmethod
+    async def _call(callback: Callback, result) -> None:
+        try:
+            await callback(result)
+        except Exception:
+            logger.exception("chat message callback failed")
@@ -0,0 +1,115 @@
+"""
+Notif obunalari (notifs jadvali) xotirada: obuna bo'lgan user id'lar to'plami.
+
+Startup'da bir marta yuklanadi, /subscribe va /unsubscribe uni darhol
+yangilaydi va o'zgarishni pub/sub SUBSCRIPTIONS_CHANNEL orqali boshqa
+workerlarga yuboradi. Shunda /is_subscribed va bildirishnomalar navbatidagi
+only_subscribed tekshiruvi bazaga so'rov yubormaydi. Pub/sub uzilib qolsa
+o'tkazib yuborilgan o'zgarishlar davriy reload() bilan tuzaladi.
+
+Faqat obunachilar saqlanadi (user id ~100 bayt): 1M obunachi ~100 MB.
+"""
+import logging
+import threading
+from typing import Iterable, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from app.models.notif import Notif
+
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIPTIONS_CHANNEL = "__notif_subscriptions__"
+
+
+class SubscriptionSet:
+    def __init__(self):
+        self._users: Set[str] = set()
+        self.loaded = False
+        # apply() event loop'da, davriy reload scheduler thread'ida ishlaydi
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        # Yuklash davomida kelgan o'zgarishlar: almashtirishdan keyin qayta qo'llanadi
+        self._pending: Optional[List[str]] = None
+
+    def load(self, db: Session) -> int:
+        # Yangi to'plam tayyor bo'lgach almashtiriladi — o'qiyotganlar yarim to'plamni ko'rmaydi.
+        # DB o'qilayotganda kelgan apply()'lar (commit'dan keyingi holat) yo'qolmasligi uchun
+        # yangi to'plamga tartib bilan qayta qo'llanadi
+        with self._load_lock:
+            with self._lock:
+                self._pending = []
+            try:
+                users = {str(user_id) for (user_id,) in db.query(Notif.user_id).distinct()}
+            except Exception:
+                with self._lock:
+                    self._pending = None
+                raise
+            with self._lock:
+                for data in self._pending:
+                    self._apply_to(users, data)
+                self._pending = None
+                self._users = users
+                self.loaded = True
+            return len(users)
+
+    def reload(self, session_factory) -> int:
+        db = session_factory()
+        try:
+            return self.load(db)
+        finally:
+            db.close()
+
+    def _ensure(self, db: Optional[Session]) -> None:
+        # Startup'dan tashqarida (skriptlar) birinchi so'rovda yuklanadi
+        if self.loaded:
+            return
+        if db is not None:
+            self.load(db)
+        else:
+            from app.database import SessionLocal
+
+            self.reload(SessionLocal)
+
+    def is_subscribed(self, user_id: str, db: Optional[Session] = None) -> bool:
+        self._ensure(db)
+        return str(user_id) in self._users
+
+    def subscribed(self, user_ids: Iterable[str], db: Optional[Session] = None) -> Set[str]:
+        user_ids = set(user_ids)
+        if not user_ids:
+            return set()
+        self._ensure(db)
+        return {user_id for user_id in user_ids if str(user_id) in self._users}
+
+    @staticmethod
+    def _apply_to(users: Set[str], data: str) -> None:
+        sign, user_id = data[:1], data[1:]
+        if not user_id:
+            return
+        if sign == "+":
+            users.add(user_id)
+        elif sign == "-":
+            users.discard(user_id)
+
+    def apply(self, data: str) -> None:
+        """Pub/sub xabari: "+<user_id>" yoki "-<user_id>" """
+        with self._lock:
+            self._apply_to(self._users, data)
+            if self._pending is not None:
+                self._pending.append(data)
+
+    async def changed(self, user_id: str, subscribed: bool) -> None:
+        """Commit'dan keyin: shu workerda darhol, boshqalarga pub/sub orqali"""
+        data = f"{'+' if subscribed else '-'}{user_id}"
+        self.apply(data)
+        from app.routers.ws_chat import manager
+
+        try:
+            await manager.publish(SUBSCRIPTIONS_CHANNEL, data)
+        except Exception as e:
+            logger.warning("notif subscription publish failed: %s", e)
+
+
+notif_subscriptions = SubscriptionSet()
@@ -0,0 +1,104 @@
+"""
+Bildirishnomalar lentasi: (user_id, created_at, id) indeksi bo'yicha keyset
+pagination, badge hisoblagichi (notification_unread_counters) va
+o'qildi belgilash — bittalab yoki cursorgacha bitta UPDATE bilan.
+COUNT(*) va OFFSET ishlatilmaydi: sahifa `limit + 1` qator o'qiydi.
+"""
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.orm import Session
+
+from app.models.notification import Notification
+from app.services.unread_counters import mark_notifications_read
+
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+class InvalidCursor(ValueError):
+    """before/after/up_to shu userning bildirishnomasi emas"""
+
+
+def _cursor(db: Session, user_id: str, notification_id: str) -> tuple:
+    created_at = db.execute(
+        select(Notification.created_at).where(Notification.id == notification_id, Notification.user_id == user_id)
+    ).scalar()
+    if created_at is None:
+        raise InvalidCursor(notification_id)
+    return created_at, notification_id
+
+
+def feed_page(
+    db: Session,
+    user_id: str,
+    limit: int = DEFAULT_LIMIT,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    only_unread: bool = False,
+) -> Tuple[List[Notification], dict]:
+    """
+    Bitta sahifa (yangidan eskiga) va pagination.
+
+    - cursorsiz: eng yangi `limit` ta
+    - before=<notification_id>: shundan eskilari (pastga scroll)
+    - after=<notification_id>: shundan yangilari (polling'da yangi kelganlar)
+    """
+    user_id = str(user_id)
+    key = tuple_(Notification.created_at, Notification.id)
+    query = db.query(Notification).filter(Notification.user_id == user_id)
+    if only_unread:
+        query = query.filter(Notification.is_read == False)  # noqa: E712
+    if after:
+        cursor = _cursor(db, user_id, after)
+        rows = (
+            query.filter(key > tuple_(*cursor))
+            .order_by(Notification.created_at.asc(), Notification.id.asc())
+            .limit(limit + 1)
+            .all()
+        )
+        items = list(reversed(rows[:limit]))
+        has_older, has_newer = True, len(rows) > limit
+    else:
+        if before:
+            query = query.filter(key < tuple_(*_cursor(db, user_id, before)))
+        rows = query.order_by(Notification.created_at.desc(), Notification.id.desc()).limit(limit + 1).all()
+        items = rows[:limit]
+        has_older, has_newer = len(rows) > limit, bool(before)
+    pagination = {
+        "limit": limit,
+        # Keyingi (eskiroq) sahifa: before=<before>; yangilari: after=<after>
+        "before": items[-1].id if items else before,
+        "after": items[0].id if items else after,
+        "has_older": has_older,
+        "has_newer": has_newer,
+    }
+    return items, pagination
+
+
+def mark_read(db: Session, user_id: str, notification_id: str) -> int:
+    """Bitta bildirishnoma; allaqachon o'qilgan bo'lsa 0 (commit chaqiruvchida)"""
+    table = Notification.__table__
+    count = db.execute(
+        update(table)
+        .where(table.c.id == notification_id, table.c.user_id == str(user_id), table.c.is_read == False)  # noqa: E712
+        .values(is_read=True)
+    ).rowcount
+    mark_notifications_read(db, user_id, count)
+    return count
+
+
+def mark_all_read(db: Session, user_id: str, up_to: Optional[str] = None) -> int:
+    """
+    Hammasi yoki up_to (shu bildirishnoma ham) gacha bo'lganlari — bitta UPDATE;
+    up_to dan keyin kelganlar o'qilmagan bo'lib qoladi (commit chaqiruvchida).
+    """
+    user_id = str(user_id)
+    table = Notification.__table__
+    where = [table.c.user_id == user_id, table.c.is_read == False]  # noqa: E712
+    if up_to:
+        where.append(tuple_(table.c.created_at, table.c.id) <= tuple_(*_cursor(db, user_id, up_to)))
+    count = db.execute(update(table).where(*where).values(is_read=True)).rowcount
+    mark_notifications_read(db, user_id, count)
+    return count
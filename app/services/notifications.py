@@ -0,0 +1,295 @@
+"""
+Foydalanuvchi bildirishnomalari (notifications jadvali) — fon navbati orqali.
+
+Request handlerlar, webhooklar va scheduler joblari faqat notify() chaqiradi:
+bildirishnoma navbatga tushadi, fon vazifasi ularni batch bilan (batch_size
+yoki flush_interval) bitta tranzaksiyada yozadi va commit'dan keyin
+foydalanuvchining ochiq WS socketlariga "user_notification" event yuboradi.
+
+Portlashlar birlashtiriladi: collapse_key bir xil bo'lganlar (masalan bitta
+chatdagi xabarlar) bitta yozuvga tushadi — batch ichida ham, collapse_window
+davomida keyingi batchlarda ham (hali o'qilmagan yozuv yangilanadi: "20 ta yangi
+xabar"). Oyna worker xotirasida: har worker o'z portlashini birlashtiradi.
+
+only_subscribed=True — faqat Notif'ga obuna bo'lgan userlarga (chat xabarlari).
+"""
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.notification import Notification
+from app.services.notif_subscriptions import notif_subscriptions
+from app.services.unread_counters import increment_notifications_unread, notifications_unread
+
+
+logger = logging.getLogger(__name__)
+
+# (user_id, collapse_key) -> (notification id, shu paytgacha birlashganlar soni, muddati monotonic)
+Recent = Dict[Tuple[str, str], Tuple[str, int, float]]
+
+
+@dataclass
+class PendingNotification:
+    user_id: str
+    title: str
+    message: str
+    type: str = "info"
+    data: Optional[dict] = None
+    # Bir xil kalitli bildirishnomalar bitta yozuvga birlashadi
+    collapse_key: Optional[str] = None
+    # Birlashganda ishlatiladi, "{count}" o'rniga soni qo'yiladi
+    collapsed_title: Optional[str] = None
+    collapsed_message: Optional[str] = None
+    only_subscribed: bool = False
+    count: int = 1
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    # Naive UTC, xuddi server_default kabi
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+
+    def values(self) -> dict:
+        title, message = self.title, self.message
+        if self.count > 1 and self.collapsed_title:
+            title = self.collapsed_title.format(count=self.count)
+        if self.count > 1 and self.collapsed_message:
+            message = self.collapsed_message.format(count=self.count)
+        data = dict(self.data or {})
+        if self.collapse_key:
+            data["count"] = self.count
+        return {
+            "title": title,
+            "message": message,
+            "type": self.type,
+            "data": data or None,
+            "is_read": False,
+            "created_at": self.created_at,
+            "updated_at": self.created_at,
+        }
+
+
+def _collapse(items: List[PendingNotification]) -> List[PendingNotification]:
+    """Batch ichida bir xil (user_id, collapse_key) — eng oxirgisi qoladi, soni yig'iladi"""
+    merged: Dict[Tuple[str, str], PendingNotification] = {}
+    result: List[PendingNotification] = []
+    for item in items:
+        if not item.collapse_key:
+            result.append(item)
+            continue
+        key = (item.user_id, item.collapse_key)
+        previous = merged.get(key)
+        if previous is not None:
+            item.count += previous.count
+            result.remove(previous)
+        merged[key] = item
+        result.append(item)
+    return result
+
+
+def write_notifications(
+    db: Session,
+    items: List[PendingNotification],
+    recent: Optional[Recent] = None,
+    collapse_window: float = 0.0,
+) -> List[dict]:
+    """
+    Bildirishnomalarni yozadi (commit chaqiruvchida) va yozilganlarini qaytaradi
+    (WS'ga yuborish uchun). recent — oldingi batchlardagi birlashtiriladigan yozuvlar.
+    """
+    items = _collapse(items)
+    # Obunalar xotirada (notif_subscriptions) — bazaga so'rov yo'q
+    subscribed = notif_subscriptions.subscribed({item.user_id for item in items if item.only_subscribed}, db)
+    items = [item for item in items if not item.only_subscribed or item.user_id in subscribed]
+
+    now = time.monotonic()
+    table = Notification.__table__
+    rows, written = [], []
+    for item in items:
+        key = (item.user_id, item.collapse_key) if item.collapse_key else None
+        previous = recent.get(key) if key and recent is not None else None
+        if previous is not None and previous[2] > now:
+            item.id, item.count = previous[0], previous[1] + item.count
+            # O'qilgan bo'lsa yangilanmaydi — yangi yozuv ochiladi
+            changed = db.execute(
+                update(table)
+                .where(table.c.id == item.id, table.c.is_read == False)  # noqa: E712
+                .values(**item.values())
+            ).rowcount
+            if not changed:
+                item.id, item.count = str(uuid.uuid4()), item.count - previous[1]
+                rows.append(item)
+        else:
+            rows.append(item)
+        if key and recent is not None:
+            recent[key] = (item.id, item.count, now + collapse_window)
+        written.append({"id": item.id, "user_id": item.user_id, **item.values()})
+    if rows:
+        db.execute(insert(table), [{"id": item.id, "user_id": item.user_id, **item.values()} for item in rows])
+        # Birlashib yangilangan (o'qilmagan) yozuvlar badge'ni oshirmaydi
+        added: Dict[str, int] = {}
+        for item in rows:
+            added[item.user_id] = added.get(item.user_id, 0) + 1
+        for user_id, count in added.items():
+            increment_notifications_unread(db, user_id, count)
+    unread = {user_id: notifications_unread(db, user_id) for user_id in {row["user_id"] for row in written}}
+    for row in written:
+        row["unread_count"] = unread[row["user_id"]]
+    if recent:
+        for key in [key for key, (_, _, expires) in recent.items() if expires <= now]:
+            recent.pop(key, None)
+    return written
+
+
+class NotificationService:
+    """
+    Navbat + bitta fon vazifasi (start() lifespan'da). notify() kutmaydi va
+    istalgan thread'dan chaqirilishi mumkin; navbat to'lsa bildirishnoma
+    tashlab yuboriladi (dropped). start() qilinmagan bo'lsa (skriptlar, CLI)
+    notify() darhol o'z sessiyasida yozadi.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        batch_size: int = 200,
+        flush_interval: float = 0.5,
+        collapse_window: float = 300.0,
+        max_pending: int = 10000,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_interval)
+        self.collapse_window = max(0.0, collapse_window)
+        self.max_pending = max_pending
+        self._recent: Recent = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.written = 0
+        self.dropped = 0
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._task = self._loop.create_task(self._run())
+
+    def notify(self, item: PendingNotification) -> None:
+        loop = self._loop
+        if self._task is None or loop is None or loop.is_closed():
+            try:
+                self._write_sync([item], recent=None)
+            except Exception:
+                logger.exception("notification for %s was not saved", item.user_id)
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._enqueue(item)
+        else:
+            # Worker thread / scheduler'dan
+            loop.call_soon_threadsafe(self._enqueue, item)
+
+    def _enqueue(self, item: PendingNotification) -> None:
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("notification queue full, dropped notification for %s", item.user_id)
+
+    async def flush(self) -> None:
+        if self._task is None:
+            return
+        barrier = asyncio.get_running_loop().create_future()
+        await self._queue.put(barrier)
+        await barrier
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        await self.flush()
+        self._task.cancel()
+        try:
+            await self._task
+        except (asyncio.CancelledError, Exception):
+            pass
+        self._task = None
+
+    async def _next_batch(self) -> list:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size and not isinstance(batch[-1], asyncio.Future):
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            items = [entry for entry in batch if not isinstance(entry, asyncio.Future)]
+            try:
+                if items:
+                    written = await asyncio.to_thread(self._write_sync, items, self._recent)
+                    self.batches += 1
+                    self.written += len(written)
+                    await self._publish(written)
+            except Exception:
+                logger.exception("notification batch of %d failed", len(items))
+            for entry in batch:
+                if isinstance(entry, asyncio.Future) and not entry.done():
+                    entry.set_result(None)
+
+    def _write_sync(self, items: List[PendingNotification], recent: Optional[Recent]) -> List[dict]:
+        db = self.session_factory()
+        try:
+            written = write_notifications(db, items, recent, self.collapse_window)
+            db.commit()
+            return written
+        except Exception:
+            db.rollback()
+            if recent is not None:
+                # Birlashtirish holati bazadagi bilan mos kelmasligi mumkin
+                recent.clear()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    async def _publish(written: List[dict]) -> None:
+        from app.routers.ws_chat import manager
+
+        for row in written:
+            notification = {key: value for key, value in row.items() if key not in ("user_id", "updated_at", "unread_count")}
+            notification["created_at"] = row["created_at"].isoformat()
+            await manager.send_to(row["user_id"], {
+                "event": "user_notification",
+                "notification": notification,
+                "unread_count": row["unread_count"],
+            })
+
+
+notification_service = NotificationService(
+    SessionLocal,
+    batch_size=settings.notification_batch_size,
+    flush_interval=settings.notification_flush_ms / 1000,
+    collapse_window=settings.notification_collapse_seconds,
+)
@@ -0,0 +1,96 @@
+"""
+Per-day application / booking number allocator backed by block-reserving counter rows
+"""
+import threading
+import uuid
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.number_counter import NumberCounter
+
+
+# Bitta DB murojaatida band qilinadigan raqamlar soni (worker ichida xotiradan beriladi)
+DEFAULT_BLOCK_SIZE = 50
+_RESERVE_ATTEMPTS = 3
+
+
+class NumberAllocator:
+    """
+    "<PREFIX>-YYYYMMDD-NNNNN" ko'rinishidagi, kun bo'yicha noyob raqamlar.
+
+    Har bir worker counter qatoridan block_size ta raqamni bitta atomik UPDATE
+    bilan band qiladi va keyingi raqamlarni so'rovsiz xotiradan beradi. Process
+    qayta ishga tushsa ishlatilmagan raqamlar tashlab ketiladi (teshik bo'ladi,
+    takror bo'lmaydi).
+    """
+
+    def __init__(self, prefix: str, block_size: int = DEFAULT_BLOCK_SIZE, width: int = 5):
+        self.prefix = prefix
+        self.block_size = block_size
+        self.width = width
+        # counter kaliti -> (keyingi raqam, blok oxiri (kirmaydi))
+        self._blocks: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        self.reservations = 0
+
+    def _key(self, day: date) -> str:
+        return f"{self.prefix}-{day:%Y%m%d}"
+
+    def next(self, db: Session, day: Optional[date] = None) -> str:
+        """Berilgan kun (default: bugun) uchun keyingi raqam"""
+        key = self._key(day or date.today())
+        with self._lock:
+            value, limit = self._blocks.get(key, (0, 0))
+            if value >= limit:
+                value = self._reserve(db.get_bind(), key)
+                limit = value + self.block_size
+                self.reservations += 1
+                if len(self._blocks) > 64:
+                    # O'tgan kunlar bloklari endi kerak emas
+                    self._blocks = {k: v for k, v in self._blocks.items() if k >= key}
+            self._blocks[key] = (value + 1, limit)
+        return f"{key}-{str(value).zfill(self.width)}"
+
+    def _reserve(self, engine: Engine, key: str) -> int:
+        """
+        [start, start + block_size) blokini band qiladi va start'ni qaytaradi.
+        So'rov sessiyasidan alohida tranzaksiya: handler rollback qilsa ham
+        band qilingan blok boshqa worker'ga qayta berilmaydi.
+        """
+        table = NumberCounter.__table__
+        for _ in range(_RESERVE_ATTEMPTS):
+            try:
+                with engine.begin() as conn:
+                    # UPDATE qatorni lock qiladi: keyingi SELECT faqat shu blokni ko'radi
+                    updated = conn.execute(
+                        update(table)
+                        .where(table.c.key == key)
+                        .values(next_value=table.c.next_value + self.block_size)
+                    ).rowcount
+                    if updated:
+                        end = conn.execute(select(table.c.next_value).where(table.c.key == key)).scalar_one()
+                        return end - self.block_size
+                    conn.execute(
+                        insert(table).values(
+                            id=str(uuid.uuid4()), key=key, next_value=1 + self.block_size
+                        )
+                    )
+                    return 1
+            except IntegrityError:
+                # Boshqa worker shu kun qatorini bir vaqtda yaratdi: UPDATE bilan qayta
+                continue
+        raise RuntimeError(f"Could not reserve number block for {key}")
+
+    def reset(self) -> None:
+        with self._lock:
+            self._blocks.clear()
+            self.reservations = 0
+
+
+application_numbers = NumberAllocator("APP")
+booking_numbers = NumberAllocator("BOOK")
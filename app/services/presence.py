@@ -0,0 +1,99 @@
+"""
+Chat presence: participant -> online / last seen, across uvicorn workers.
+
+Har bir worker o'zidagi ulanishlarni sanaydi va o'zgarishlarni (har heartbeat'da
+esa to'liq ro'yxatni) pub/sub presence kanaliga yuboradi; boshqa workerlar
+ularni TTL bilan saqlaydi — o'chib qolgan worker'ning ulanishlari TTL o'tgach
+offline bo'ladi. So'rovlar faqat xotiradan o'qiladi, baza ishlatilmaydi;
+last_seen ham xotirada (restartdan keyin bo'sh).
+"""
+import json
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable
+
+# Kanal nomi xona id'lari (uuid, salon_<id>) bilan to'qnashmaydi
+PRESENCE_CHANNEL = "__presence__"
+
+
+def _utcnow() -> datetime:
+    # Naive UTC, xabarlar created_at kabi
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class PresenceMap:
+    def __init__(self, worker_id: str, ttl: float):
+        self.worker_id = worker_id
+        self.ttl = ttl
+        # Shu workerdagi ochiq ulanishlar soni
+        self.local: Dict[str, int] = {}
+        # participant -> {worker_id: muddati (monotonic)}
+        self.remote: Dict[str, Dict[str, float]] = {}
+        self.last_seen: Dict[str, datetime] = {}
+
+    def connected(self, participant: str) -> bool:
+        """Ulanish qo'shildi; shu workerda birinchisi bo'lsa True"""
+        self.local[participant] = self.local.get(participant, 0) + 1
+        return self.local[participant] == 1
+
+    def disconnected(self, participant: str) -> bool:
+        """Ulanish yopildi; shu workerda oxirgisi bo'lsa True"""
+        count = self.local.get(participant, 0) - 1
+        if count > 0:
+            self.local[participant] = count
+            return False
+        self.local.pop(participant, None)
+        self.last_seen[participant] = _utcnow()
+        return True
+
+    def is_online(self, participant: str) -> bool:
+        if participant in self.local:
+            return True
+        now = time.monotonic()
+        return any(expires > now for expires in self.remote.get(participant, {}).values())
+
+    def get(self, participant: str) -> dict:
+        return {"online": self.is_online(participant), "last_seen": self.last_seen.get(participant)}
+
+    def snapshot(self, participants: Iterable[str]) -> Dict[str, dict]:
+        return {participant: self.get(participant) for participant in participants}
+
+    def message(self, online: Iterable[str] = (), offline: Iterable[str] = (), full: bool = False) -> str:
+        """Boshqa workerlarga yuboriladigan o'zgarish (full=True: shu workerdagi hammasi)"""
+        return json.dumps({"online": list(online), "offline": list(offline), "full": full})
+
+    def full_message(self) -> str:
+        return self.message(online=self.local, full=True)
+
+    def apply(self, worker_id: str, data: str) -> None:
+        if worker_id == self.worker_id:
+            return
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return
+        online = set(message.get("online") or ())
+        if message.get("full"):
+            for participant in [p for p, workers in self.remote.items() if worker_id in workers and p not in online]:
+                self._forget(participant, worker_id)
+        expires = time.monotonic() + self.ttl
+        for participant in online:
+            self.remote.setdefault(participant, {})[worker_id] = expires
+        for participant in message.get("offline") or ():
+            self._forget(participant, worker_id)
+
+    def expire(self) -> None:
+        now = time.monotonic()
+        for participant, workers in list(self.remote.items()):
+            for worker_id, expires in list(workers.items()):
+                if expires <= now:
+                    self._forget(participant, worker_id)
+
+    def _forget(self, participant: str, worker_id: str) -> None:
+        workers = self.remote.get(participant)
+        if not workers or workers.pop(worker_id, None) is None:
+            return
+        if not workers:
+            self.remote.pop(participant, None)
+        self.last_seen[participant] = _utcnow()
+
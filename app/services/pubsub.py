@@ -0,0 +1,237 @@
+"""
+Pub/sub backends for WebSocket room fan-out across uvicorn workers
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from urllib.parse import unquote, urlparse
+
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[str, str], Awaitable[None]]
+
+# Kanal nomlari shu prefiks bilan (bitta Redis'da boshqa ilovalar bilan aralashmasligi uchun)
+CHANNEL_PREFIX = "freya:ws:"
+
+
+class PubSubBackend:
+    """
+    Xona (kanal) bo'yicha xabar tarqatish. subscribe/unsubscribe sinxron:
+    ConnectionManager.disconnect sinxron kontekstlardan ham chaqiriladi.
+    """
+
+    async def start(self, handler: Handler) -> None:
+        self._handler = handler
+
+    def subscribe(self, channel: str) -> None:
+        raise NotImplementedError
+
+    def unsubscribe(self, channel: str) -> None:
+        raise NotImplementedError
+
+    async def publish(self, channel: str, data: str) -> None:
+        raise NotImplementedError
+
+    async def stop(self) -> None:
+        pass
+
+
+class InProcessPubSub(PubSubBackend):
+    """Bitta process ichidagi backendlar orasida (bitta worker yoki testlar uchun)"""
+
+    _hub: Dict[str, Set["InProcessPubSub"]] = {}
+
+    def __init__(self):
+        self._handler: Optional[Handler] = None
+
+    def subscribe(self, channel: str) -> None:
+        self._hub.setdefault(channel, set()).add(self)
+
+    def unsubscribe(self, channel: str) -> None:
+        subscribers = self._hub.get(channel)
+        if subscribers is not None:
+            subscribers.discard(self)
+            if not subscribers:
+                self._hub.pop(channel, None)
+
+    async def publish(self, channel: str, data: str) -> None:
+        for backend in list(self._hub.get(channel, ())):
+            if backend._handler is not None:
+                await backend._handler(channel, data)
+
+    async def stop(self) -> None:
+        for channel in [c for c, subs in self._hub.items() if self in subs]:
+            self.unsubscribe(channel)
+
+
+# ==================== Redis protocol (RESP) ====================
+def _encode(*args: str) -> bytes:
+    out = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg.encode() if isinstance(arg, str) else arg
+        out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(out)
+
+
+async def _read_reply(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("pub/sub connection closed")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode()
+    if kind == b"-":
+        raise ConnectionError(rest.decode())
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        size = int(rest)
+        if size < 0:
+            return None
+        data = await reader.readexactly(size + 2)
+        return data[:-2].decode()
+    if kind == b"*":
+        return [await _read_reply(reader) for _ in range(int(rest))]
+    raise ConnectionError(f"unexpected reply: {line!r}")
+
+
+class RedisPubSub(PubSubBackend):
+    """
+    Redis protokoli (PUBLISH/SUBSCRIBE) orqali workerlar orasida tarqatish.
+    Har bir worker faqat o'zida ulangan xonalarga obuna bo'ladi. Ulanish
+    uzilsa qayta ulanadi va obunalarni tiklaydi; bu vaqtdagi xabarlar
+    boshqa workerlarga yetib bormaydi (lokal yetkazish davom etadi).
+    """
+
+    def __init__(self, url: str, prefix: str = CHANNEL_PREFIX, reconnect_delay: float = 1.0, timeout: float = 5.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = (parsed.path or "/").lstrip("/") or None
+        self.prefix = prefix
+        self.reconnect_delay = reconnect_delay
+        # Ulanish va PUBLISH javobi kutiladigan chegara: Redis osilib qolsa broadcast'lar
+        # _pub_lock'da cheksiz navbatga tizilmasin
+        self.timeout = timeout
+        self._handler: Optional[Handler] = None
+        self._channels: Set[str] = set()
+        self._sub_writer: Optional[asyncio.StreamWriter] = None
+        self._pub: Optional[tuple] = None
+        self._pub_lock = asyncio.Lock()
+        self._listener: Optional[asyncio.Task] = None
+        self._connected = asyncio.Event()
+
+    async def _open(self):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        commands: List[tuple] = []
+        if self.password:
+            commands.append(("AUTH", self.password))
+        if self.db:
+            commands.append(("SELECT", self.db))
+        try:
+            for command in commands:
+                writer.write(_encode(*command))
+                await asyncio.wait_for(writer.drain(), self.timeout)
+                await asyncio.wait_for(_read_reply(reader), self.timeout)
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+    async def start(self, handler: Handler) -> None:
+        self._handler = handler
+        if self._listener is None:
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    def _send_sub(self, command: str, channels) -> None:
+        if self._sub_writer is not None and channels:
+            try:
+                self._sub_writer.write(_encode(command, *(self.prefix + c for c in channels)))
+            except Exception:
+                # Ulanish uzilgan: _listen qayta ulanib obunalarni tiklaydi
+                pass
+
+    def subscribe(self, channel: str) -> None:
+        if channel not in self._channels:
+            self._channels.add(channel)
+            self._send_sub("SUBSCRIBE", [channel])
+
+    def unsubscribe(self, channel: str) -> None:
+        if channel in self._channels:
+            self._channels.discard(channel)
+            self._send_sub("UNSUBSCRIBE", [channel])
+
+    async def _listen(self) -> None:
+        while True:
+            writer = None
+            try:
+                reader, writer = await self._open()
+                self._sub_writer = writer
+                self._send_sub("SUBSCRIBE", sorted(self._channels))
+                self._connected.set()
+                while True:
+                    reply = await _read_reply(reader)
+                    if isinstance(reply, list) and len(reply) == 3 and reply[0] == "message":
+                        channel = reply[1][len(self.prefix):]
+                        try:
+                            await self._handler(channel, reply[2])
+                        except Exception:
+                            logger.exception("pub/sub handler failed for %s", channel)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("pub/sub subscriber disconnected: %s", e)
+            finally:
+                self._connected.clear()
+                self._sub_writer = None
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def publish(self, channel: str, data: str) -> None:
+        async with self._pub_lock:
+            for attempt in range(2):
+                try:
+                    if self._pub is None:
+                        self._pub = await self._open()
+                    reader, writer = self._pub
+                    writer.write(_encode("PUBLISH", self.prefix + channel, data))
+                    await asyncio.wait_for(writer.drain(), self.timeout)
+                    await asyncio.wait_for(_read_reply(reader), self.timeout)
+                    return
+                except Exception:
+                    if self._pub is not None:
+                        self._pub[1].close()
+                    self._pub = None
+                    if attempt:
+                        raise
+
+    async def wait_connected(self, timeout: float = 5.0) -> bool:
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._listener = None
+        if self._pub is not None:
+            self._pub[1].close()
+            self._pub = None
+
+
+def create_pubsub(url: Optional[str]) -> PubSubBackend:
+    """CHAT_PUBSUB_URL: bo'sh yoki "memory://" -> bitta process, "redis://host:port/db" -> Redis"""
+    if not url or url.startswith("memory://"):
+        return InProcessPubSub()
+    if url.startswith("redis://"):
+        return RedisPubSub(url)
+    raise ValueError(f"Unsupported CHAT_PUBSUB_URL scheme: {url}")
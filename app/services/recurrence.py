@@ -0,0 +1,293 @@
+"""
+Weekly recurrence rules for schedules: lazy expansion over a date window
+with per-date exceptions
+"""
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from sqlalchemy import String, and_, cast, or_
+from sqlalchemy.orm import Session
+
+from app.models.schedule import Schedule, ScheduleException
+
+
+WEEKDAY_MAP = {
+    'monday': 0,
+    'tuesday': 1,
+    'wednesday': 2,
+    'thursday': 3,
+    'friday': 4,
+    'saturday': 5,
+    'sunday': 6,
+}
+
+# Qoida maksimal uzunligi (oldingi materializatsiya chegarasi bilan bir xil)
+MAX_REPEAT_WEEKS = 52
+
+
+def parse_weekdays(repeat_value: Optional[str], anchor: date) -> List[int]:
+    """"monday,friday" -> [0, 4]; bo'sh yoki noto'g'ri bo'lsa anchor sananing hafta kuni"""
+    raw_days = [d.strip().lower() for d in (repeat_value or "").split(',') if d.strip()]
+    weekdays = sorted({WEEKDAY_MAP[d] for d in raw_days if d in WEEKDAY_MAP})
+    return weekdays or [anchor.weekday()]
+
+
+def repeat_until_for(start: date, weeks: int) -> date:
+    """start'dan boshlab weeks hafta davom etadigan qoidaning oxirgi sanasi"""
+    return start + timedelta(weeks=min(max(weeks, 1), MAX_REPEAT_WEEKS), days=-1)
+
+
+def is_rule(schedule) -> bool:
+    return getattr(schedule, "repeat_until", None) is not None
+
+
+def rule_weeks(schedule) -> int:
+    """Qoida necha hafta davom etadi (date..repeat_until); qoida bo'lmasa 1"""
+    if not is_rule(schedule) or schedule.date is None:
+        return 1
+    return max(1, ((schedule.repeat_until - schedule.date).days + 1) // 7)
+
+
+def rule_dates(
+    start: date, until: date, repeat_value: Optional[str], window_start: date, window_end: date
+) -> Iterator[date]:
+    """Qoidaning [window_start, window_end] ichiga tushadigan sanalari (o'sish tartibida)"""
+    lo = max(start, window_start)
+    hi = min(until, window_end)
+    if lo > hi:
+        return
+    weekdays = set(parse_weekdays(repeat_value, start))
+    day = lo
+    while day <= hi:
+        if day.weekday() in weekdays:
+            yield day
+        day += timedelta(days=1)
+
+
+def reset_rule(schedule, make_rule: bool, weeks: int) -> List[date]:
+    """
+    Tahrirdan keyin (repeat, repeat_value, date yoki hafta soni o'zgarganda)
+    repeat_until'ni qayta hisoblaydi: make_rule=False — oddiy bir sanali qator.
+    Jadvalning sanalarini qaytaradi (kesishish tekshiruvi uchun).
+    """
+    if not make_rule:
+        schedule.repeat_until = None
+        return [schedule.date]
+    schedule.repeat_until = repeat_until_for(schedule.date, weeks)
+    return list(
+        rule_dates(schedule.date, schedule.repeat_until, schedule.repeat_value, schedule.date, schedule.repeat_until)
+    )
+
+
+@dataclass
+class ScheduleOccurrence:
+    """Qoidaning bitta sanasi; Schedule bilan bir xil atributlar (id = qoida id'si)"""
+    id: str
+    salon_id: Optional[str]
+    name: str
+    title: Optional[str]
+    date: date
+    start_time: Optional[time]
+    end_time: Optional[time]
+    repeat: bool
+    repeat_value: Optional[str]
+    repeat_until: Optional[date]
+    employee_list: list = field(default_factory=list)
+    price: Optional[float] = None
+    full_pay: Optional[float] = None
+    deposit: Optional[float] = None
+    is_active: bool = True
+    whole_day: bool = False
+    service_duration: Optional[int] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    is_exception: bool = False
+
+
+def _occurrence(rule: Schedule, day: date, exception: Optional[ScheduleException]) -> ScheduleOccurrence:
+    item = ScheduleOccurrence(
+        id=rule.id,
+        salon_id=rule.salon_id,
+        name=rule.name,
+        title=rule.title,
+        date=day,
+        start_time=rule.start_time,
+        end_time=rule.end_time,
+        repeat=bool(rule.repeat),
+        repeat_value=rule.repeat_value,
+        repeat_until=rule.repeat_until,
+        employee_list=rule.employee_list or [],
+        price=rule.price,
+        full_pay=rule.full_pay,
+        deposit=rule.deposit,
+        is_active=bool(rule.is_active),
+        whole_day=bool(rule.whole_day),
+        service_duration=rule.service_duration,
+        created_at=rule.created_at,
+        updated_at=rule.updated_at,
+    )
+    if exception is not None:
+        item.is_exception = True
+        for name in ("start_time", "end_time", "whole_day", "employee_list", "price"):
+            value = getattr(exception, name)
+            if value is not None:
+                setattr(item, name, value)
+    return item
+
+
+def expand_schedules(
+    rows: Iterable[Schedule],
+    window_start: date,
+    window_end: date,
+    exceptions: Optional[Dict[tuple, ScheduleException]] = None,
+) -> list:
+    """
+    Oddiy qatorlar o'zgarmaydi, qoidalar oynadagi sanalarga yoyiladi.
+    exceptions: (schedule_id, date) -> ScheduleException. Natija (date, start_time) bo'yicha saralangan.
+    """
+    exceptions = exceptions or {}
+    items: list = []
+    for row in rows:
+        if not is_rule(row):
+            items.append(row)
+            continue
+        for day in rule_dates(row.date, row.repeat_until, row.repeat_value, window_start, window_end):
+            exception = exceptions.get((row.id, day))
+            if exception is not None and exception.is_cancelled:
+                continue
+            items.append(_occurrence(row, day, exception))
+    items.sort(key=lambda s: (s.date, s.start_time or time.min))
+    return items
+
+
+def load_schedule_occurrences(
+    db: Session,
+    window_start: date,
+    window_end: date,
+    salon_id: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    active_only: bool = True,
+    name: Optional[str] = None,
+) -> list:
+    """
+    [window_start, window_end] dagi jadvallar: oddiy qatorlar va yoyilgan qoidalar.
+
+    Bitta so'rov qatorlar va oynani kesib o'tadigan qoidalar uchun, yana bittasi
+    (qoidalar bo'lsa) shu oynadagi istisnolar uchun. employee_id faqat oldindan
+    filtr (employee_list matnida LIKE); aniq tekshiruvni chaqiruvchi qiladi.
+    """
+    query = db.query(Schedule).filter(
+        or_(
+            and_(
+                Schedule.repeat_until.is_(None),
+                Schedule.date >= window_start,
+                Schedule.date <= window_end,
+            ),
+            and_(
+                Schedule.repeat_until.isnot(None),
+                Schedule.date <= window_end,
+                Schedule.repeat_until >= window_start,
+            ),
+        )
+    )
+    if salon_id is not None:
+        query = query.filter(Schedule.salon_id == str(salon_id))
+    if active_only:
+        query = query.filter(Schedule.is_active == True)
+    if name is not None:
+        query = query.filter(Schedule.name == name)
+    if employee_id is not None:
+        query = query.filter(cast(Schedule.employee_list, String).like(f"%{employee_id}%"))
+    rows = query.all()
+
+    rule_ids = [row.id for row in rows if is_rule(row)]
+    exceptions: Dict[tuple, ScheduleException] = {}
+    if rule_ids:
+        for exc in (
+            db.query(ScheduleException)
+            .filter(
+                ScheduleException.schedule_id.in_(rule_ids),
+                ScheduleException.date >= window_start,
+                ScheduleException.date <= window_end,
+            )
+            .all()
+        ):
+            exceptions[(exc.schedule_id, exc.date)] = exc
+    return expand_schedules(rows, window_start, window_end, exceptions)
+
+
+def resolve_occurrence(db: Session, schedule: Schedule, day: date):
+    """
+    Jadvalning `day` sanadagi ko'rinishi yoki None (bu sanada jadval yo'q).
+
+    Oddiy qator faqat o'z sanasida; qoida — hafta kuni va repeat_until ichida,
+    istisnosi bilan (bekor qilingan sana None, override vaqt/narx/xodimlar bilan).
+    """
+    if not is_rule(schedule):
+        if schedule.date is not None and schedule.date != day:
+            return None
+        return schedule
+    if next(rule_dates(schedule.date, schedule.repeat_until, schedule.repeat_value, day, day), None) is None:
+        return None
+    exception = (
+        db.query(ScheduleException)
+        .filter(ScheduleException.schedule_id == schedule.id, ScheduleException.date == day)
+        .first()
+    )
+    if exception is not None and exception.is_cancelled:
+        return None
+    return _occurrence(schedule, day, exception)
+
+
+def group_by_date(items: Iterable) -> Dict[date, list]:
+    grouped: Dict[date, list] = {}
+    for item in items:
+        grouped.setdefault(item.date, []).append(item)
+    return grouped
+
+
+def _times_overlap(
+    a_start: Optional[time], a_end: Optional[time], b_start: Optional[time], b_end: Optional[time]
+) -> bool:
+    # Vaqti yo'q jadval butun kunni egallaydi
+    if not (a_start and a_end and b_start and b_end):
+        return True
+    return a_start < b_end and b_start < a_end
+
+
+def find_schedule_conflicts(
+    db: Session,
+    salon_id: str,
+    employee_ids: Sequence[str],
+    dates: Sequence[date],
+    start_time: Optional[time],
+    end_time: Optional[time],
+    whole_day: bool = False,
+    exclude_id: Optional[str] = None,
+) -> List[date]:
+    """
+    Shu xodimlarning mavjud jadvallari (qoidalar ham) bilan vaqti kesishadigan sanalar.
+    Butun davr bitta oyna sifatida yuklanadi.
+    """
+    employee_ids = {str(e) for e in employee_ids or [] if e}
+    if not employee_ids or not dates:
+        return []
+    wanted = set(dates)
+    conflicts = set()
+    items = load_schedule_occurrences(
+        db,
+        min(wanted),
+        max(wanted),
+        salon_id=salon_id,
+        employee_id=next(iter(employee_ids)) if len(employee_ids) == 1 else None,
+        active_only=False,
+    )
+    for item in items:
+        if item.date not in wanted or item.date in conflicts or str(item.id) == str(exclude_id):
+            continue
+        if not employee_ids.intersection(str(e) for e in (item.employee_list or [])):
+            continue
+        if whole_day or item.whole_day or _times_overlap(start_time, end_time, item.start_time, item.end_time):
+            conflicts.add(item.date)
+    return sorted(conflicts)
@@ -0,0 +1,111 @@
+"""
+Materialized unread counters: per (chat, receiver), per receiver total and
+per user notifications, maintained in the same transaction as the inserts
+and mark-read updates
+"""
+import uuid
+from typing import Optional, Tuple
+
+from sqlalchemy import and_, case, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.unread_counter import ChatUnreadCounter, NotificationUnread, UnreadTotal
+
+
+def _bump(db: Session, table, where, values: dict, delta: int) -> None:
+    """count += delta (0 dan pastga tushmaydi); qator bo'lmasa va delta > 0 bo'lsa yaratiladi"""
+    if delta >= 0:
+        new_count = table.c.count + delta
+    else:
+        new_count = case((table.c.count > -delta, table.c.count + delta), else_=0)
+    if db.execute(update(table).where(where).values(count=new_count)).rowcount or delta <= 0:
+        return
+    try:
+        # Boshqa tranzaksiya qatorni bir vaqtda yaratsa, savepoint'ni qaytarib UPDATE qilamiz
+        with db.begin_nested():
+            db.execute(insert(table).values(count=delta, **values))
+    except IntegrityError:
+        db.execute(update(table).where(where).values(count=new_count))
+
+
+def increment_unread(db: Session, chat_id: str, receiver_id: str, receiver_type: str, delta: int = 1) -> Tuple[int, int]:
+    """
+    Yangi xabar(lar) uchun chat va umumiy hisoblagichlarni `delta` ga oshiradi
+    (commit chaqiruvchida). (chatdagi o'qilmaganlar, umumiy o'qilmaganlar) qaytariladi.
+    """
+    chat_id, receiver_id = str(chat_id), str(receiver_id)
+    counters, totals = ChatUnreadCounter.__table__, UnreadTotal.__table__
+    chat_where = and_(counters.c.user_chat_id == chat_id, counters.c.receiver_id == receiver_id)
+    _bump(
+        db, counters, chat_where,
+        {"id": str(uuid.uuid4()), "user_chat_id": chat_id, "receiver_id": receiver_id, "receiver_type": receiver_type},
+        delta,
+    )
+    _bump(
+        db, totals, totals.c.receiver_id == receiver_id,
+        {"id": str(uuid.uuid4()), "receiver_id": receiver_id, "receiver_type": receiver_type},
+        delta,
+    )
+    chat_count = db.execute(select(counters.c.count).where(chat_where)).scalar() or 0
+    return chat_count, unread_total(db, receiver_id)
+
+
+def mark_chat_read(db: Session, chat_id: str, receiver_id: str, read_count: int) -> None:
+    """
+    mark_read UPDATE o'qilgan deb belgilagan xabarlar soni (rowcount) bo'yicha
+    hisoblagichlarni kamaytiradi. Parallel yuborilgan xabarlar yo'qolmaydi.
+    """
+    if not read_count or read_count <= 0:
+        return
+    chat_id, receiver_id = str(chat_id), str(receiver_id)
+    counters, totals = ChatUnreadCounter.__table__, UnreadTotal.__table__
+    _bump(
+        db, counters,
+        and_(counters.c.user_chat_id == chat_id, counters.c.receiver_id == receiver_id),
+        {}, -read_count,
+    )
+    _bump(db, totals, totals.c.receiver_id == receiver_id, {}, -read_count)
+
+
+def chat_unread(db: Session, chat_id: str, receiver_id: str) -> int:
+    counters = ChatUnreadCounter.__table__
+    return db.execute(
+        select(counters.c.count).where(
+            counters.c.user_chat_id == str(chat_id), counters.c.receiver_id == str(receiver_id)
+        )
+    ).scalar() or 0
+
+
+def unread_total(db: Session, receiver_id: Optional[str]) -> int:
+    """Qabul qiluvchining barcha chatlaridagi o'qilmaganlar (bitta qator o'qiladi)"""
+    if not receiver_id:
+        return 0
+    totals = UnreadTotal.__table__
+    return db.execute(select(totals.c.count).where(totals.c.receiver_id == str(receiver_id))).scalar() or 0
+
+
+def increment_notifications_unread(db: Session, user_id: str, delta: int = 1) -> None:
+    """Yangi bildirishnoma(lar) yozilganda (commit chaqiruvchida)"""
+    counters = NotificationUnread.__table__
+    _bump(
+        db, counters, counters.c.user_id == str(user_id),
+        {"id": str(uuid.uuid4()), "user_id": str(user_id)},
+        delta,
+    )
+
+
+def mark_notifications_read(db: Session, user_id: str, read_count: int) -> None:
+    """UPDATE ... is_read=true rowcount bo'yicha kamaytiradi (parallel yozilganlar yo'qolmaydi)"""
+    if not read_count or read_count <= 0:
+        return
+    counters = NotificationUnread.__table__
+    _bump(db, counters, counters.c.user_id == str(user_id), {}, -read_count)
+
+
+def notifications_unread(db: Session, user_id: Optional[str]) -> int:
+    """Badge: bitta qator o'qiladi (user_id unique indeksi)"""
+    if not user_id:
+        return 0
+    counters = NotificationUnread.__table__
+    return db.execute(select(counters.c.count).where(counters.c.user_id == str(user_id))).scalar() or 0
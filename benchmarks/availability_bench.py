@@ -0,0 +1,122 @@
+"""
+Micro-benchmark: interval-list slot computation vs. minute bitmaps.
+
+Ishga tushirish:
+    python -m benchmarks.availability_bench
+"""
+import random
+import timeit
+from datetime import date, datetime, time, timedelta
+from typing import List, Tuple
+
+from app.services.availability import MinuteBitmap, hhmm, work_bitmap
+
+
+DAY = date(2025, 1, 6)
+DURATIONS = [15, 30, 45, 60, 90, 120]
+
+
+# ---- Oldingi (datetime tuple) implementatsiya, taqqoslash uchun ----
+def _merge_intervals(intervals):
+    if not intervals:
+        return []
+    intervals = sorted(intervals, key=lambda x: x[0])
+    merged = [intervals[0]]
+    for start, end in intervals[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _subtract_intervals(base, busy):
+    free = []
+    start, end = base
+    current = start
+    for b_start, b_end in busy:
+        if b_end <= current:
+            continue
+        if b_start >= end:
+            break
+        if b_start > current:
+            free.append((current, b_start))
+        current = max(current, b_end)
+        if current >= end:
+            break
+    if current < end:
+        free.append((current, end))
+    return free
+
+
+def legacy_slots(work_blocks, busy_raw) -> List[List[Tuple[str, str]]]:
+    free_all = []
+    for ws, we in work_blocks:
+        bs_dt = datetime.combine(DAY, ws)
+        be_dt = datetime.combine(DAY, we)
+        block_busy = []
+        for s, e in busy_raw:
+            cs, ce = max(s, bs_dt), min(e, be_dt)
+            if cs < ce:
+                block_busy.append((cs, ce))
+        free_all.extend(_subtract_intervals((bs_dt, be_dt), _merge_intervals(block_busy)))
+    result = []
+    for dur in DURATIONS:
+        step = timedelta(minutes=dur)
+        slots = []
+        for f_start, f_end in free_all:
+            cursor = f_start
+            while cursor + step <= f_end:
+                slots.append((cursor.strftime("%H:%M"), (cursor + step).strftime("%H:%M")))
+                cursor += step
+        result.append(slots)
+    return result
+
+
+def legacy_overlaps(busy_raw, start, end) -> bool:
+    return any(start < e and end > s for s, e in busy_raw)
+
+
+# ---- Bitmap implementatsiya ----
+def bitmap_slots(work_blocks, busy_raw) -> List[List[Tuple[str, str]]]:
+    busy = MinuteBitmap(DAY).add_intervals(busy_raw)
+    free = work_bitmap(DAY, work_blocks) - busy
+    return [[(hhmm(lo), hhmm(hi)) for lo, hi in free.slot_indices(dur)] for dur in DURATIONS]
+
+
+def make_case(n_busy: int, seed: int = 42):
+    rnd = random.Random(seed)
+    work_blocks = [(time(9, 0), time(13, 0)), (time(14, 0), time(20, 0))]
+    busy_raw = []
+    for _ in range(n_busy):
+        start = datetime.combine(DAY, time(8, 0)) + timedelta(minutes=rnd.randrange(0, 13 * 60))
+        busy_raw.append((start, start + timedelta(minutes=rnd.choice([15, 30, 60]))))
+    return work_blocks, busy_raw
+
+
+def main():
+    print(f"{'busy':>6} {'legacy slots':>14} {'bitmap slots':>14} {'legacy overlap':>15} {'bitmap overlap':>15}")
+    for n_busy in (0, 5, 20, 80):
+        work_blocks, busy_raw = make_case(n_busy)
+        assert legacy_slots(work_blocks, busy_raw) == bitmap_slots(work_blocks, busy_raw)
+
+        number = 2000
+        t_legacy = timeit.timeit(lambda: legacy_slots(work_blocks, busy_raw), number=number) / number
+        t_bitmap = timeit.timeit(lambda: bitmap_slots(work_blocks, busy_raw), number=number) / number
+
+        probe_start = datetime.combine(DAY, time(12, 0))
+        probe_end = probe_start + timedelta(minutes=45)
+        busy = MinuteBitmap(DAY).add_intervals(busy_raw)
+        number = 20000
+        o_legacy = timeit.timeit(lambda: legacy_overlaps(busy_raw, probe_start, probe_end), number=number) / number
+        o_bitmap = timeit.timeit(lambda: busy.overlaps(probe_start, probe_end), number=number) / number
+
+        print(
+            f"{n_busy:>6} {t_legacy * 1e6:>12.1f}us {t_bitmap * 1e6:>12.1f}us "
+            f"{o_legacy * 1e6:>13.2f}us {o_bitmap * 1e6:>13.2f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Concurrency benchmark: double bookings and throughput under contention.
+
+Bir nechta thread bitta xodimning bitta kuniga bir-birini kesib o'tadigan
+intervallarni band qilishga urinadi. "naive" rejim tekshiruv va insert'ni
+lock'siz bajaradi (oldingi yo'l), "locked" rejim esa reserve_employee_interval
+ishlatadigan employee_day_lock ostida. think_ms tekshiruv va insert orasidagi so'rov kechikishini taqlid qiladi.
+
+Ishga tushirish:
+    python -m benchmarks.booking_race_bench
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.booking_race_bench
+"""
+import os
+import random
+import tempfile
+import threading
+import time as clock
+import uuid
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models.appointment import Appointment
+from app.models.employee import Employee
+from app.models.salon import Salon
+from app.services.availability import load_busy_bitmap
+from app.services.booking_lock import employee_day_lock
+
+
+DAY = date(2025, 1, 6)
+THREADS = 16
+ATTEMPTS_PER_THREAD = 25
+TABLES = ["salons", "employees", "users", "appointments", "busy_slots"]
+
+
+def make_engine():
+    url = os.environ.get("BENCH_DATABASE_URL")
+    if url:
+        return create_engine(url, pool_size=THREADS, max_overflow=0)
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    return create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 30})
+
+
+def reset(engine):
+    tables = [Base.metadata.tables[name] for name in TABLES]
+    Base.metadata.drop_all(engine, tables=tables)
+    Base.metadata.create_all(engine, tables=tables)
+    db = sessionmaker(bind=engine)()
+    salon = Salon(id=str(uuid.uuid4()), salon_name="Bench")
+    employee = Employee(
+        id=str(uuid.uuid4()), salon_id=salon.id, name="Bench", phone="+998000000000",
+        email="bench@bench.local", employee_password="x",
+    )
+    db.add_all([salon, employee])
+    db.commit()
+    employee_id = employee.id
+    db.close()
+    return employee_id
+
+
+def _appointment(employee_id, start, minutes):
+    return Appointment(
+        application_number=f"BENCH-{uuid.uuid4().hex[:12]}",
+        user_name="bench",
+        phone_number="0",
+        application_date=start.date(),
+        application_time=start.time(),
+        end_time=(start + timedelta(minutes=minutes)).time(),
+        duration_minutes=minutes,
+        employee_id=employee_id,
+        service_name="bench",
+        service_price=0,
+        status="pending",
+    )
+
+
+def book(db, employee_id, start, minutes, locked, think_ms):
+    end = start + timedelta(minutes=minutes)
+
+    def check_and_insert():
+        if load_busy_bitmap(db, employee_id, DAY, days=2).overlaps(start, end):
+            db.rollback()
+            return False
+        if think_ms:
+            clock.sleep(think_ms / 1000)
+        db.add(_appointment(employee_id, start, minutes))
+        db.commit()
+        return True
+
+    try:
+        if locked:
+            with employee_day_lock(db, employee_id, start, end):
+                return check_and_insert()
+        return check_and_insert()
+    except Exception:
+        # uq_employee_slot (aynan bir xil boshlanish) naive rejimda ba'zan ushlaydi
+        db.rollback()
+        return False
+
+
+def double_bookings(engine, employee_id) -> int:
+    db = sessionmaker(bind=engine)()
+    rows = db.query(Appointment).filter(Appointment.employee_id == employee_id).all()
+    db.close()
+    spans = sorted(
+        (datetime.combine(a.application_date, a.application_time), a.duration_minutes) for a in rows
+    )
+    overlaps = 0
+    for (s1, m1), (s2, _) in zip(spans, spans[1:]):
+        if s2 < s1 + timedelta(minutes=m1):
+            overlaps += 1
+    return overlaps
+
+
+def run(engine, locked, think_ms):
+    employee_id = reset(engine)
+    factory = sessionmaker(bind=engine)
+    booked = []
+    barrier = threading.Barrier(THREADS)
+
+    def worker(seed):
+        rnd = random.Random(seed)
+        db = factory()
+        barrier.wait()
+        count = 0
+        for _ in range(ATTEMPTS_PER_THREAD):
+            # 09:00-13:00 oralig'ida 5 daqiqalik qadam: bir-birini ko'p kesib o'tadi
+            start = datetime.combine(DAY, time(9)) + timedelta(minutes=5 * rnd.randrange(0, 48))
+            count += book(db, employee_id, start, rnd.choice([30, 45, 60]), locked, think_ms)
+        db.close()
+        booked.append(count)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(THREADS)]
+    started = clock.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = clock.perf_counter() - started
+    attempts = THREADS * ATTEMPTS_PER_THREAD
+    return sum(booked), double_bookings(engine, employee_id), attempts / elapsed
+
+
+def main():
+    engine = make_engine()
+    print(f"backend: {engine.dialect.name}, threads: {THREADS}, attempts: {THREADS * ATTEMPTS_PER_THREAD}")
+    print(f"{'mode':>7} {'think':>6} {'booked':>7} {'double':>7} {'attempts/s':>11}")
+    for think_ms in (0, 2):
+        for locked in (False, True):
+            booked, doubles, throughput = run(engine, locked, think_ms)
+            mode = "locked" if locked else "naive"
+            print(f"{mode:>7} {think_ms:>4}ms {booked:>7} {doubles:>7} {throughput:>11.0f}")
+            if locked:
+                assert doubles == 0, "locked booking path produced a double booking"
+
+
+if __name__ == "__main__":
+    main()
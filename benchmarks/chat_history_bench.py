@@ -0,0 +1,151 @@
+"""
+Benchmark: chat history page latency vs scroll depth (offset vs cursor).
+
+"offset" — oldingi yo'l: ORDER BY created_at DESC OFFSET n + har sahifada COUNT(*);
+"cursor" — history_page(before=<message_id>): (user_chat_id, created_at, id)
+indeksi bo'yicha, total esa user_chats.message_count'dan.
+
+Avval butun chat before-cursor bilan oxirigacha o'qiladi (har xabar aynan
+bir marta, to'g'ri tartibda) va after-cursor bilan qaytadan oldinga.
+Bir xil created_at'li xabarlar ham bor (id bo'yicha ajratiladi).
+
+Ishga tushirish:
+    python -m benchmarks.chat_history_bench
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.chat_history_bench
+"""
+import os
+import tempfile
+import time as clock
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models.message import Message
+from app.models.salon import Salon
+from app.models.user import User
+from app.models.user_chat import UserChat
+from app.services.chat_history import history_page
+
+
+MESSAGES = 20000
+PAGE = 50
+DEPTHS = (0, 1000, 10000, 19900)
+ROUNDS = 20
+TABLES = ["users", "salons", "user_chats", "messages"]
+
+
+def make_engine():
+    url = os.environ.get("BENCH_DATABASE_URL")
+    if url:
+        return create_engine(url)
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    return create_engine(f"sqlite:///{path}")
+
+
+def reset(engine):
+    tables = [Base.metadata.tables[name] for name in TABLES]
+    Base.metadata.drop_all(engine, tables=tables)
+    Base.metadata.create_all(engine, tables=tables)
+
+
+def seed(db) -> str:
+    salon = Salon(salon_name="Bench salon")
+    user = User(phone="998900000000", full_name="Bench user", password_hash="x")
+    db.add_all([salon, user])
+    db.flush()
+    chat = UserChat(user_id=user.id, salon_id=salon.id, chat_type="user_salon", message_count=MESSAGES)
+    db.add(chat)
+    db.flush()
+    started = datetime(2025, 1, 1)
+    rows = [
+        {
+            "id": str(uuid.uuid4()),
+            "user_chat_id": chat.id,
+            "sender_id": user.id,
+            "sender_type": "user",
+            "receiver_id": salon.id,
+            "receiver_type": "salon",
+            "message_text": f"message {k}",
+            "is_read": True,
+            # Har 3 ta xabar bitta soniyada
+            "created_at": started + timedelta(seconds=k // 3),
+        }
+        for k in range(MESSAGES)
+    ]
+    db.execute(insert(Message.__table__), rows)
+    db.commit()
+    return chat.id
+
+
+def offset_page(db, chat_id, depth):
+    total = db.query(Message).filter(Message.user_chat_id == chat_id).count()
+    rows = (
+        db.query(Message)
+        .filter(Message.user_chat_id == chat_id)
+        .order_by(Message.created_at.desc())
+        .offset(depth)
+        .limit(PAGE)
+        .all()
+    )
+    return rows, total
+
+
+def check_walk(db, chat_id):
+    expected = [
+        m for (m,) in db.query(Message.id)
+        .filter(Message.user_chat_id == chat_id)
+        .order_by(Message.created_at.asc(), Message.id.asc())
+    ]
+    seen, before, cursors = [], None, {}
+    while True:
+        items, pagination = history_page(db, chat_id, limit=PAGE, before=before)
+        seen[:0] = [m.id for m in items]
+        cursors[len(expected) - len(seen)] = pagination["before"]
+        if not pagination["has_older"]:
+            break
+        before = pagination["before"]
+    assert seen == expected, "before-cursor walk lost or reordered messages"
+    assert pagination["total"] == MESSAGES
+
+    forward, after = expected[:1], expected[0]
+    while True:
+        items, pagination = history_page(db, chat_id, limit=PAGE, after=after)
+        forward += [m.id for m in items]
+        if not pagination["has_newer"]:
+            break
+        after = pagination["after"]
+    assert forward == expected, "after-cursor walk lost or reordered messages"
+    return cursors
+
+
+def timed(fn):
+    fn()
+    started = clock.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    return (clock.perf_counter() - started) / ROUNDS * 1000
+
+
+def main():
+    engine = make_engine()
+    reset(engine)
+    db = sessionmaker(bind=engine)()
+    chat_id = seed(db)
+    # sahifa boshi (yangi tomondan nechta xabar o'tkazilgan) -> shu sahifa uchun before cursor
+    cursors = {MESSAGES - depth: c for depth, c in check_walk(db, chat_id).items()}
+    print(f"backend: {engine.dialect.name}, messages: {MESSAGES}, page: {PAGE}, rounds: {ROUNDS}")
+    print("walk: before/after cursors return every message once, in order")
+    print(f"{'depth':>6} {'offset ms':>10} {'cursor ms':>10}")
+    for depth in DEPTHS:
+        before = cursors.get(depth) if depth else None
+        offset_ms = timed(lambda: offset_page(db, chat_id, depth))
+        cursor_ms = timed(lambda: history_page(db, chat_id, limit=PAGE, before=before))
+        print(f"{depth:>6} {offset_ms:>10.2f} {cursor_ms:>10.2f}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Benchmark: /api/chat/list query count and latency vs number of chats.
+
+"per_chat" — oldingi yo'l: har chat uchun oxirgi xabar, qarshi tomon va
+o'qilmaganlar soni alohida so'rov bilan;
+"set"      — get_chat_list (oyna funksiyasi + IN so'rovlar), so'rovlar soni
+chatlar sonidan qat'i nazar o'zgarmas bo'lishi kerak.
+
+Ishga tushirish:
+    python -m benchmarks.chat_list_bench
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.chat_list_bench
+"""
+import asyncio
+import os
+import tempfile
+import time as clock
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, or_
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models.employee import Employee
+from app.models.message import Message
+from app.models.salon import Salon
+from app.models.user import User
+from app.models.user_chat import UserChat
+from app.routers.ws_chat import get_chat_list
+
+
+CHAT_COUNTS = (10, 50, 200)
+MESSAGES_PER_CHAT = 20
+ROUNDS = 20
+MAX_QUERIES = 6
+TABLES = ["users", "salons", "employees", "admins", "user_chats", "messages"]
+
+
+def make_engine():
+    url = os.environ.get("BENCH_DATABASE_URL")
+    if url:
+        return create_engine(url)
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    return create_engine(f"sqlite:///{path}")
+
+
+def reset(engine):
+    tables = [Base.metadata.tables[name] for name in TABLES]
+    Base.metadata.drop_all(engine, tables=tables)
+    Base.metadata.create_all(engine, tables=tables)
+
+
+def seed(db, chats: int) -> User:
+    salon = Salon(salon_name="Bench salon")
+    user = User(phone="998900000000", full_name="Bench user", password_hash="x")
+    db.add_all([salon, user])
+    db.flush()
+    started = datetime(2025, 1, 1)
+    for i in range(chats):
+        employee = Employee(
+            salon_id=salon.id, name=f"Employee {i}", phone=f"99891{i:07d}",
+            email=f"e{i}@bench.local", employee_password="x",
+        )
+        db.add(employee)
+        db.flush()
+        chat = UserChat(user_id=user.id, employee_id=employee.id, chat_type="user_employee")
+        db.add(chat)
+        db.flush()
+        for k in range(MESSAGES_PER_CHAT):
+            outgoing = k % 2 == 0
+            db.add(Message(
+                user_chat_id=chat.id,
+                sender_id=user.id if outgoing else employee.id,
+                sender_type="user" if outgoing else "employee",
+                receiver_id=employee.id if outgoing else user.id,
+                receiver_type="employee" if outgoing else "user",
+                message_text=f"message {k}",
+                is_read=k < MESSAGES_PER_CHAT - 2,
+                created_at=started + timedelta(minutes=i, seconds=k),
+            ))
+    db.commit()
+    user.role = "user"
+    return user
+
+
+def run_per_chat(db, user):
+    user_id = str(user.id)
+    chat_ids = [
+        c for (c,) in db.query(Message.user_chat_id)
+        .filter(or_(Message.sender_id == user_id, Message.receiver_id == user_id))
+        .distinct()
+    ]
+    result = []
+    for cid in chat_ids:
+        msg = db.query(Message).filter(Message.user_chat_id == cid).order_by(Message.created_at.desc()).first()
+        opponent_id = msg.receiver_id if msg.sender_id == user_id else msg.sender_id
+        employee = db.query(Employee).filter(Employee.id == opponent_id).first()
+        unread = db.query(Message).filter(
+            Message.user_chat_id == cid, Message.receiver_id == user_id, Message.is_read == False
+        ).count()
+        result.append((cid, employee.name, unread))
+    return result
+
+
+def run_set(db, user):
+    return asyncio.run(get_chat_list(db=db, current_user=user))["data"]
+
+
+def measure(engine, fn, db, user):
+    counter = {"n": 0}
+
+    def before(*_):
+        counter["n"] += 1
+
+    fn(db, user)
+    event.listen(engine, "before_cursor_execute", before)
+    started = clock.perf_counter()
+    for _ in range(ROUNDS):
+        rows = fn(db, user)
+    elapsed = (clock.perf_counter() - started) / ROUNDS
+    event.remove(engine, "before_cursor_execute", before)
+    return len(rows), counter["n"] // ROUNDS, elapsed * 1000
+
+
+def main():
+    engine = make_engine()
+    factory = sessionmaker(bind=engine)
+    print(f"backend: {engine.dialect.name}, messages/chat: {MESSAGES_PER_CHAT}, rounds: {ROUNDS}")
+    print(f"{'chats':>6} {'mode':>9} {'rows':>5} {'queries':>8} {'ms':>8}")
+    for chats in CHAT_COUNTS:
+        reset(engine)
+        db = factory()
+        user = seed(db, chats)
+        for mode, fn in (("per_chat", run_per_chat), ("set", run_set)):
+            rows, queries, ms = measure(engine, fn, db, user)
+            print(f"{chats:>6} {mode:>9} {rows:>5} {queries:>8} {ms:>8.1f}")
+            if mode == "set":
+                assert rows == chats and queries <= MAX_QUERIES, "chat list is not set-based"
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
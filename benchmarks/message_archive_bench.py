@@ -0,0 +1,197 @@
+"""
+Benchmark: messages -> messages_archive ko'chirish va arxiv chegarasidagi tarix.
+
+CHATS ta chat, har birida PER_CHAT ta xabar ~2 yilga yoyilgan (bir xil
+created_at'lilar ham bor, eski xabarlarning bir qismi o'qilmagan).
+Tekshiriladi:
+  - bir nechta chat before/after cursor bilan oxirigacha o'qiladi — arxivdan
+    keyin ham xuddi shu xabarlar, xuddi shu tartibda;
+  - jarayon o'rtada "uziladi" (bir necha batch) va qayta ishga tushiriladi —
+    takror ham, yo'qolgan xabar ham yo'q;
+  - o'qilmaganlar va har chatning oxirgi xabari messages'da qoladi.
+Vaqtlar: arxivlash, oxirgi sahifa, chuqur (arxivdagi) sahifa, chatlar
+ro'yxatidagi oxirgi xabarlar so'rovi (latest_messages).
+
+Ishga tushirish:
+    python -m benchmarks.message_archive_bench
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.message_archive_bench
+"""
+import os
+import random
+import tempfile
+import time as clock
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, func, insert, select, true
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models.message import ArchivedMessage, Message
+from app.models.salon import Salon
+from app.models.user import User
+from app.models.user_chat import UserChat
+from app.services.chat_history import history_page
+from app.services.chat_list import latest_messages
+from app.services.message_archive import archive_chat_batch, archive_cutoff, archive_messages
+
+
+CHATS = 200
+PER_CHAT = 500
+SPAN_DAYS = 700
+ARCHIVE_DAYS = 180
+UNREAD_SHARE = 0.03
+PAGE = 50
+ROUNDS = 20
+SAMPLES = 3
+TABLES = ["users", "salons", "user_chats", "messages", "messages_archive"]
+
+
+def make_engine():
+    url = os.environ.get("BENCH_DATABASE_URL")
+    if url:
+        return create_engine(url)
+    path = os.path.join(tempfile.mkdtemp(), "archive.db")
+    return create_engine(f"sqlite:///{path}")
+
+
+def reset(engine):
+    tables = [Base.metadata.tables[name] for name in TABLES]
+    Base.metadata.drop_all(engine, tables=tables)
+    Base.metadata.create_all(engine, tables=tables)
+
+
+def seed(db) -> list:
+    rng = random.Random(46)
+    salon = Salon(salon_name="Bench salon")
+    db.add(salon)
+    db.flush()
+    users = [User(phone=f"99891{i:07d}", full_name=f"User {i}", password_hash="x") for i in range(CHATS)]
+    db.add_all(users)
+    db.flush()
+    chats = [
+        UserChat(user_id=u.id, salon_id=salon.id, chat_type="user_salon", message_count=PER_CHAT)
+        for u in users
+    ]
+    db.add_all(chats)
+    db.flush()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    start = now - timedelta(days=SPAN_DAYS)
+    # Har 2 ta xabar bitta vaqtda
+    step = timedelta(days=SPAN_DAYS) / (PER_CHAT // 2)
+    for user, chat in zip(users, chats):
+        rows = []
+        for k in range(PER_CHAT):
+            created_at = start + step * (k // 2)
+            from_user = k % 3 != 0
+            rows.append({
+                "id": str(uuid.uuid4()),
+                "user_chat_id": chat.id,
+                "sender_id": user.id if from_user else salon.id,
+                "sender_type": "user" if from_user else "salon",
+                "receiver_id": salon.id if from_user else user.id,
+                "receiver_type": "salon" if from_user else "user",
+                "message_text": f"message {k}",
+                "is_read": rng.random() > UNREAD_SHARE,
+                "created_at": created_at,
+                "updated_at": created_at,
+            })
+        db.execute(insert(Message.__table__), rows)
+        chat.last_message_id = max(rows, key=lambda r: (r["created_at"], r["id"]))["id"]
+    db.commit()
+    return [c.id for c in chats]
+
+
+def walk(db, chat_id):
+    backward, before = [], None
+    while True:
+        items, pagination = history_page(db, chat_id, limit=PAGE, before=before)
+        backward[:0] = [m.id for m in items]
+        if not pagination["has_older"]:
+            break
+        before = pagination["before"]
+    forward, after = backward[:1], backward[0]
+    while True:
+        items, pagination = history_page(db, chat_id, limit=PAGE, after=after)
+        forward += [m.id for m in items]
+        if not pagination["has_newer"]:
+            break
+        after = pagination["after"]
+    assert forward == backward, "after-cursor walk differs from before-cursor walk"
+    assert pagination["total"] == PER_CHAT
+    return backward
+
+
+def timed(fn):
+    fn()
+    started = clock.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    return (clock.perf_counter() - started) / ROUNDS * 1000
+
+
+def measure(make_session, chat_id, deep_cursor):
+    # Yangi sessiya: identity map'dagi minglab obyektlar o'lchovga aralashmasin
+    db = make_session()
+    try:
+        return (
+            timed(lambda: history_page(db, chat_id, limit=PAGE)),
+            timed(lambda: history_page(db, chat_id, limit=PAGE, before=deep_cursor)),
+            timed(lambda: latest_messages(db, true())),
+        )
+    finally:
+        db.close()
+
+
+def count(db, model):
+    return db.execute(select(func.count()).select_from(model.__table__)).scalar()
+
+
+def main():
+    engine = make_engine()
+    reset(engine)
+    make_session = sessionmaker(bind=engine)
+    db = make_session()
+    chat_ids = seed(db)
+    samples = chat_ids[:SAMPLES]
+    expected = {chat_id: walk(db, chat_id) for chat_id in samples}
+    # Chatning o'rtasidan (arxivlanadigan qismdan) bitta sahifa
+    deep = expected[samples[0]][PER_CHAT // 4]
+    before_ms = measure(make_session, samples[0], deep)
+
+    # "Uzilgan" ko'chirish: bitta chatdan bir necha batch, keyin to'liq qayta ishga tushirish
+    cutoff = archive_cutoff(ARCHIVE_DAYS)
+    keep = db.get(UserChat, samples[0]).last_message_id
+    partial = sum(archive_chat_batch(db, samples[0], keep, cutoff, 40) for _ in range(3))
+    db.commit()
+    assert walk(db, samples[0]) == expected[samples[0]], "history changed after partial run"
+
+    started = clock.perf_counter()
+    moved = archive_messages(db, ARCHIVE_DAYS, batch_size=100)
+    archive_s = clock.perf_counter() - started
+    again = archive_messages(db, ARCHIVE_DAYS, batch_size=100)
+
+    hot, archived = count(db, Message), count(db, ArchivedMessage)
+    total = CHATS * PER_CHAT
+    assert hot + archived == total, f"{hot} + {archived} != {total}"
+    assert again == 0, "second run moved messages again"
+    assert not db.execute(
+        select(func.count()).select_from(ArchivedMessage.__table__).where(ArchivedMessage.is_read == False)  # noqa: E712
+    ).scalar(), "unread message archived"
+    last_ids = [c for (c,) in db.query(UserChat.last_message_id)]
+    assert db.query(Message).filter(Message.id.in_(last_ids)).count() == CHATS, "last message archived"
+    for chat_id in samples:
+        assert walk(db, chat_id) == expected[chat_id], "history differs across archive boundary"
+    after_ms = measure(make_session, samples[0], deep)
+
+    print(f"backend: {engine.dialect.name}, chats: {CHATS}, messages: {total}, span: {SPAN_DAYS} d, archive after: {ARCHIVE_DAYS} d")
+    print(f"archived: {partial} (interrupted run) + {moved} in {archive_s:.1f}s; hot rows left: {hot}, archive rows: {archived}")
+    print("walk: before/after cursors return the same messages, in order, across the archive boundary")
+    print(f"{'':>8} {'latest page ms':>15} {'deep page ms':>13} {'chat list ms':>13}")
+    for label, (latest, deep_ms, chat_list) in (("before", before_ms), ("after", after_ms)):
+        print(f"{label:>8} {latest:>15.2f} {deep_ms:>13.2f} {chat_list:>13.2f}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark: application number allocation cost and uniqueness under concurrency.
+
+"count" — oldingi yo'l (har yaratishda SELECT COUNT(*) appointments bo'yicha),
+"allocator" — NumberAllocator (blok band qilingach so'rovsiz). Bir nechta
+allocator nusxasi alohida worker process'larni taqlid qiladi: hammasi bitta
+counter qatoridan blok oladi, takror raqam bo'lmasligi kerak.
+
+Ishga tushirish:
+    python -m benchmarks.number_allocator_bench
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.number_allocator_bench
+"""
+import os
+import tempfile
+import threading
+import time as clock
+from collections import Counter
+
+from sqlalchemy import create_engine, event, func
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models.appointment import Appointment
+from app.services.number_allocator import NumberAllocator
+
+
+THREADS = 8
+WORKERS = 4
+NUMBERS_PER_THREAD = 500
+TABLES = ["number_counters", "appointments"]
+
+
+def make_engine():
+    url = os.environ.get("BENCH_DATABASE_URL")
+    if url:
+        return create_engine(url, pool_size=THREADS, max_overflow=0)
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    return create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 30})
+
+
+def reset(engine):
+    tables = [Base.metadata.tables[name] for name in TABLES]
+    Base.metadata.drop_all(engine, tables=tables)
+    Base.metadata.create_all(engine, tables=tables)
+
+
+def count_queries(engine):
+    counter = {"n": 0}
+
+    def before(*_):
+        counter["n"] += 1
+
+    event.listen(engine, "before_cursor_execute", before)
+    return counter, lambda: event.remove(engine, "before_cursor_execute", before)
+
+
+def run_count(engine):
+    factory = sessionmaker(bind=engine)
+    numbers = []
+
+    def worker():
+        db = factory()
+        for _ in range(NUMBERS_PER_THREAD):
+            count = db.query(func.count(Appointment.id)).scalar()
+            numbers.append(f"APP{str(count + 1).zfill(3)}")
+        db.close()
+
+    return _timed(engine, worker, numbers)
+
+
+def run_allocator(engine):
+    factory = sessionmaker(bind=engine)
+    allocators = [NumberAllocator("APP") for _ in range(WORKERS)]
+    numbers = []
+
+    def worker(allocator):
+        db = factory()
+        for _ in range(NUMBERS_PER_THREAD):
+            numbers.append(allocator.next(db))
+        db.close()
+
+    return _timed(engine, worker, numbers, args=[(allocators[i % WORKERS],) for i in range(THREADS)])
+
+
+def _timed(engine, target, numbers, args=None):
+    counter, stop = count_queries(engine)
+    threads = [threading.Thread(target=target, args=(args[i] if args else ())) for i in range(THREADS)]
+    started = clock.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = clock.perf_counter() - started
+    stop()
+    duplicates = sum(n - 1 for n in Counter(numbers).values() if n > 1)
+    return len(numbers), duplicates, counter["n"], len(numbers) / elapsed
+
+
+def main():
+    engine = make_engine()
+    print(f"backend: {engine.dialect.name}, threads: {THREADS}, numbers: {THREADS * NUMBERS_PER_THREAD}")
+    print(f"{'mode':>9} {'numbers':>8} {'dupes':>6} {'queries':>8} {'numbers/s':>10}")
+    for mode, fn in (("count", run_count), ("allocator", run_allocator)):
+        reset(engine)
+        total, duplicates, queries, throughput = fn(engine)
+        print(f"{mode:>9} {total:>8} {duplicates:>6} {queries:>8} {throughput:>10.0f}")
+        if mode == "allocator":
+            assert duplicates == 0, "allocator produced a duplicate number"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Minimal Redis-protocol pub/sub broker (local stand-in for CHAT_PUBSUB_URL).
+
+Faqat PUBLISH / SUBSCRIBE / UNSUBSCRIBE / PING / AUTH / SELECT buyruqlari;
+ma'lumot saqlamaydi. Ko'p worker'li tekshiruvlar va yuklama testlari uchun,
+production'da haqiqiy Redis ishlatiladi.
+
+Alohida ishga tushirish:
+    python -m benchmarks.resp_broker --port 6380
+    CHAT_PUBSUB_URL=redis://127.0.0.1:6380/0 uvicorn main:app --workers 4
+"""
+import argparse
+import asyncio
+from typing import Dict, Set
+
+from app.services.pubsub import _read_reply
+
+
+def _reply(value) -> bytes:
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(_reply(v) for v in value)
+    data = value.encode() if isinstance(value, str) else value
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+class RespBroker:
+    def __init__(self):
+        self.channels: Dict[str, Set[asyncio.StreamWriter]] = {}
+        self.published = 0
+        self._server = None
+        self._clients: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self._server = await asyncio.start_server(self._client, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # Ulanishlar yopilsa handlerlar EOF bilan o'zi tugaydi
+            for writer in list(self._clients):
+                writer.close()
+            await asyncio.gather(*self._clients.values(), return_exceptions=True)
+            await self._server.wait_closed()
+
+    def _subscriptions(self, writer) -> int:
+        return sum(1 for subs in self.channels.values() if writer in subs)
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._clients[writer] = asyncio.current_task()
+        try:
+            while True:
+                command = await _read_reply(reader)
+                if not isinstance(command, list) or not command:
+                    continue
+                name, args = command[0].upper(), command[1:]
+                if name == "SUBSCRIBE":
+                    for channel in args:
+                        self.channels.setdefault(channel, set()).add(writer)
+                        writer.write(_reply(["subscribe", channel, self._subscriptions(writer)]))
+                elif name == "UNSUBSCRIBE":
+                    for channel in args:
+                        self.channels.get(channel, set()).discard(writer)
+                        writer.write(_reply(["unsubscribe", channel, self._subscriptions(writer)]))
+                elif name == "PUBLISH":
+                    channel, data = args
+                    receivers = list(self.channels.get(channel, ()))
+                    for subscriber in receivers:
+                        subscriber.write(_reply(["message", channel, data]))
+                    self.published += 1
+                    writer.write(_reply(len(receivers)))
+                elif name == "PING":
+                    writer.write(b"+PONG\r\n")
+                elif name in ("AUTH", "SELECT"):
+                    writer.write(b"+OK\r\n")
+                else:
+                    writer.write(b"-ERR unknown command\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for subs in self.channels.values():
+                subs.discard(writer)
+            self._clients.pop(writer, None)
+            writer.close()
+
+
+async def _serve(host: str, port: int) -> None:
+    broker = RespBroker()
+    port = await broker.start(host, port)
+    print(f"RESP pub/sub broker on redis://{host}:{port}/0")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    args = parser.parse_args()
+    asyncio.run(_serve(args.host, args.port))
@@ -0,0 +1,155 @@
+"""
+Benchmark: one-year weekly schedule template (7 days x 52 weeks).
+
+"per_row"  — eski yo'l: har sana uchun qator, db.add + commit, keyin har biriga db.refresh;
+"bulk"     — har sana uchun qator, bitta executemany INSERT;
+"rule"     — bitta takrorlanish qoidasi qatori (repeat_until), sanalar o'qishda yoyiladi.
+
+Yozish vaqti/so'rovlari, jadvaldagi qatorlar soni va 7 kunlik oynani o'qish
+(load_schedule_occurrences) vaqti chiqariladi. Har rejimda salon jadvalida
+BACKGROUND_TEMPLATES ta boshqa shablon ham bor.
+
+Ishga tushirish:
+    python -m benchmarks.schedule_template_bench
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.schedule_template_bench
+"""
+import os
+import statistics
+import tempfile
+import time as clock
+import uuid
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import create_engine, event, func, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models.salon import Salon
+from app.models.schedule import Schedule
+from app.services.recurrence import load_schedule_occurrences, repeat_until_for, rule_dates
+
+
+START = date(2025, 1, 6)
+WEEKS = 52
+REPEAT_VALUE = "monday,tuesday,wednesday,thursday,friday,saturday,sunday"
+BACKGROUND_TEMPLATES = 20
+READ_ROUNDS = 50
+TABLES = ["salons", "schedules", "schedule_exceptions"]
+
+
+def make_engine():
+    url = os.environ.get("BENCH_DATABASE_URL")
+    if url:
+        return create_engine(url)
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    return create_engine(f"sqlite:///{path}")
+
+
+def reset(engine):
+    tables = [Base.metadata.tables[name] for name in TABLES]
+    Base.metadata.drop_all(engine, tables=tables)
+    Base.metadata.create_all(engine, tables=tables)
+    db = sessionmaker(bind=engine)()
+    salon = Salon(id=str(uuid.uuid4()), salon_name="Bench")
+    db.add(salon)
+    db.commit()
+    salon_id = salon.id
+    db.close()
+    return salon_id
+
+
+def template(salon_id):
+    return dict(
+        salon_id=salon_id,
+        name="Bench",
+        title="Weekly",
+        start_time=time(9),
+        end_time=time(18),
+        repeat=True,
+        repeat_value=REPEAT_VALUE,
+        employee_list=[str(uuid.uuid4())],
+        price=100,
+        is_active=True,
+        whole_day=False,
+        service_duration=60,
+    )
+
+
+def template_dates():
+    until = repeat_until_for(START, WEEKS)
+    return list(rule_dates(START, until, REPEAT_VALUE, START, until))
+
+
+def per_row(db, values):
+    created = []
+    for day in template_dates():
+        sched = Schedule(date=day, **values)
+        db.add(sched)
+        created.append(sched)
+    db.commit()
+    for s in created:
+        db.refresh(s)
+
+
+def bulk(db, values):
+    now = datetime.utcnow()
+    rows = [
+        {**values, "id": str(uuid.uuid4()), "date": day, "created_at": now, "updated_at": now}
+        for day in template_dates()
+    ]
+    db.execute(insert(Schedule.__table__), rows)
+    db.commit()
+
+
+def rule(db, values):
+    db.add(Schedule(date=START, repeat_until=repeat_until_for(START, WEEKS), **values))
+    db.commit()
+
+
+def measure(engine, write):
+    salon_id = reset(engine)
+    factory = sessionmaker(bind=engine)
+    for _ in range(BACKGROUND_TEMPLATES):
+        db = factory()
+        write(db, template(salon_id))
+        db.close()
+
+    queries = {"n": 0}
+
+    def before(*_):
+        queries["n"] += 1
+
+    db = factory()
+    event.listen(engine, "before_cursor_execute", before)
+    started = clock.perf_counter()
+    write(db, template(salon_id))
+    write_ms = (clock.perf_counter() - started) * 1000
+    event.remove(engine, "before_cursor_execute", before)
+    rows = db.query(func.count(Schedule.id)).scalar()
+
+    timings = []
+    window_start = START + timedelta(weeks=26)
+    for _ in range(READ_ROUNDS):
+        started = clock.perf_counter()
+        items = load_schedule_occurrences(db, window_start, window_start + timedelta(days=6), salon_id=salon_id)
+        timings.append(clock.perf_counter() - started)
+        db.expire_all()
+    assert len(items) == 7 * (BACKGROUND_TEMPLATES + 1)
+    db.close()
+    return queries["n"], write_ms, rows, statistics.median(timings) * 1000
+
+
+def main():
+    engine = make_engine()
+    print(
+        f"backend: {engine.dialect.name}, template: 7 days x {WEEKS} weeks, "
+        f"other templates in salon: {BACKGROUND_TEMPLATES}"
+    )
+    print(f"{'mode':>8} {'queries':>8} {'write ms':>9} {'rows':>6} {'week read ms':>13}")
+    for name, write in (("per_row", per_row), ("bulk", bulk), ("rule", rule)):
+        queries, write_ms, rows, read_ms = measure(engine, write)
+        print(f"{name:>8} {queries:>8} {write_ms:>9.2f} {rows:>6} {read_ms:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
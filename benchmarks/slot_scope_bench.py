@@ -0,0 +1,111 @@
+"""
+Benchmark: per-request cost of available-slots as the number of salons grows.
+
+Oldingi yo'l shu sanadagi barcha salonlar jadvallarini va salon servislarini har
+so'rovda o'qiydi; yangi yo'l faqat xodimning o'z salonidagi jadvallarini va
+keshlangan servislar katalogini ishlatadi.
+
+Ishga tushirish:
+    python -m benchmarks.slot_scope_bench
+"""
+import time as clock
+import uuid
+from datetime import date, time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models.employee import Employee
+from app.models.salon import Salon
+from app.models.schedule import Schedule
+from app.models.service import Service
+from app.routers.mobile_schedules import (
+    _compute_free_slots,
+    _employee_work_blocks,
+    _salon_service_catalog,
+)
+from app.services.availability import load_busy_bitmap, work_bitmap
+from app.services.availability_cache import service_catalog_cache
+
+
+DAY = date(2025, 1, 6)
+EMPLOYEES_PER_SALON = 5
+TABLES = ["salons", "employees", "schedules", "services", "users", "appointments", "busy_slots"]
+
+
+def seed(n_salons: int):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[Base.metadata.tables[name] for name in TABLES])
+    db = sessionmaker(bind=engine)()
+    probe = None
+    for s in range(n_salons):
+        salon = Salon(id=str(uuid.uuid4()), salon_name=f"Salon {s}")
+        db.add(salon)
+        employee_ids = []
+        for e in range(EMPLOYEES_PER_SALON):
+            employee = Employee(
+                id=str(uuid.uuid4()),
+                salon_id=salon.id,
+                name=f"E{s}-{e}",
+                phone=f"+998{s:05d}{e:02d}",
+                email=f"e{s}-{e}@bench.local",
+                employee_password="x",
+            )
+            db.add(employee)
+            employee_ids.append(employee.id)
+            probe = probe or employee
+        for block_start, block_end in ((time(9), time(13)), (time(14), time(20))):
+            db.add(Schedule(
+                salon_id=salon.id, name="Ish", date=DAY, start_time=block_start, end_time=block_end,
+                employee_list=employee_ids, price=0,
+            ))
+        for duration in (30, 60, 90):
+            db.add(Service(salon_id=salon.id, name=f"S{duration}", price=0, duration=duration))
+    db.commit()
+    return db, probe
+
+
+def legacy_request(db, employee):
+    schedules = db.query(Schedule).filter(Schedule.date == DAY).order_by(Schedule.start_time.asc()).all()
+    services = (
+        db.query(Service)
+        .filter(Service.salon_id == employee.salon_id, Service.is_active == True)
+        .order_by(Service.duration.asc())
+        .all()
+    )
+    durations = sorted({int(svc.duration or 0) for svc in services if int(svc.duration or 0) > 0})
+    free = work_bitmap(DAY, _employee_work_blocks(employee, schedules)) - load_busy_bitmap(db, str(employee.id), DAY)
+    return {dur: free.slot_indices(dur) for dur in durations}, len(schedules)
+
+
+def scoped_request(db, employee):
+    services = _salon_service_catalog(db, employee.salon_id)
+    durations = sorted({svc.duration for svc in services if svc.duration > 0})
+    return _compute_free_slots(db, employee, DAY, durations)
+
+
+def timed(fn, number):
+    started = clock.perf_counter()
+    for _ in range(number):
+        fn()
+    return (clock.perf_counter() - started) / number
+
+
+def main():
+    print(f"{'salons':>7} {'legacy rows':>12} {'legacy':>12} {'scoped':>12}")
+    for n_salons in (1, 10, 100, 1000):
+        db, employee = seed(n_salons)
+        service_catalog_cache.clear()
+        legacy, rows = legacy_request(db, employee)
+        assert legacy == scoped_request(db, employee)
+
+        number = 200
+        t_legacy = timed(lambda: legacy_request(db, employee), number)
+        t_scoped = timed(lambda: scoped_request(db, employee), number)
+        print(f"{n_salons:>7} {rows:>12} {t_legacy * 1e3:>10.2f}ms {t_scoped * 1e3:>10.2f}ms")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Integration check: chat WebSocket fan-out across several uvicorn workers.
+
+Har bir worker alohida uvicorn process (alohida port), hammasi bitta SQLite
+bazasi va pub/sub backend bilan. User worker 0 ga, salon admini salon
+xonasiga worker 1 da va chatga worker 2 da ulanadi; xabarlar boshqa
+worker'dagi socketlarga yetib borishi tekshiriladi.
+
+"memory" — CHAT_PUBSUB_URL yo'q (eski holat: workerlar orasida yetkazilmaydi),
+"redis"  — benchmarks.resp_broker stand-in'i orqali (hammasi yetkazilishi shart).
+
+Ishga tushirish:
+    python -m benchmarks.ws_fanout_check
+    python -m benchmarks.ws_fanout_check redis
+"""
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time as clock
+
+WORKERS = 3
+TIMEOUT = 3.0
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(tempfile.mkdtemp(), "fanout.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+import websockets  # noqa: E402
+
+from app.auth.jwt_utils import JWTUtils  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models.admin import Admin  # noqa: E402
+from app.models.salon import Salon  # noqa: E402
+from app.models.user import User  # noqa: E402
+from benchmarks.resp_broker import RespBroker  # noqa: E402
+
+
+def seed():
+    for table in Base.metadata.sorted_tables:
+        try:
+            table.create(engine, checkfirst=True)
+        except Exception:
+            # SQLite'da yaratib bo'lmaydigan jadvallar chat uchun kerak emas
+            pass
+    db = SessionLocal()
+    salon = Salon(salon_name="Fan-out salon")
+    db.add(salon)
+    db.flush()
+    user = User(phone="998900000001", full_name="Fan-out user", password_hash="x")
+    admin = Admin(salon_id=salon.id, username="fanout", email="fanout@local", password_hash="x", role="private_admin")
+    db.add_all([user, admin])
+    db.commit()
+    ids = {"salon": salon.id, "user": user.id, "admin": admin.id}
+    db.close()
+    return ids
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_workers(pubsub_url):
+    env = dict(os.environ)
+    env.pop("CHAT_PUBSUB_URL", None)
+    if pubsub_url:
+        env["CHAT_PUBSUB_URL"] = pubsub_url
+    workers = []
+    for _ in range(WORKERS):
+        port = free_port()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        workers.append((port, proc))
+    return workers
+
+
+async def wait_ready(port: int, deadline: float) -> None:
+    while clock.monotonic() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET /health HTTP/1.0\r\n\r\n")
+            await writer.drain()
+            status = await reader.readline()
+            writer.close()
+            if b"200" in status:
+                return
+        except OSError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"worker on port {port} did not start")
+
+
+async def expect(ws, event: str, predicate=lambda m: True) -> bool:
+    """TIMEOUT ichida kerakli event kelsa True"""
+    deadline = clock.monotonic() + TIMEOUT
+    while True:
+        remaining = deadline - clock.monotonic()
+        if remaining <= 0:
+            return False
+        try:
+            message = json.loads(await asyncio.wait_for(ws.recv(), remaining))
+        except asyncio.TimeoutError:
+            return False
+        if message.get("event") == event and predicate(message):
+            return True
+
+
+async def scenario(ports, ids):
+    user_token = JWTUtils.create_access_token({"id": ids["user"], "role": "user"})
+    admin_token = JWTUtils.create_access_token({"id": ids["admin"], "role": "private_admin"})
+    url = "ws://127.0.0.1:{}/api/ws/chat?token={}&receiver_type={}{}"
+
+    user_ws = await websockets.connect(url.format(ports[0], user_token, "salon", f"&receiver_id={ids['salon']}"))
+    # Chat qatori birinchi xabar bilan commit bo'ladi; admin shundan keyin ulanadi
+    await user_ws.send(json.dumps({"message_text": "hello"}))
+    await expect(user_ws, "message")
+    salon_ws = await websockets.connect(url.format(ports[1], admin_token, "salon", ""))
+    admin_ws = await websockets.connect(url.format(ports[2], admin_token, "user", f"&receiver_id={ids['user']}"))
+    # Obunalar broker'ga yetib borishi uchun
+    await asyncio.sleep(0.5)
+
+    results = {}
+    await user_ws.send(json.dumps({"message_text": "ping from worker 0"}))
+    results["chat message -> other worker"] = await expect(
+        admin_ws, "message", lambda m: m["message"]["message_text"] == "ping from worker 0"
+    )
+    results["salon room notification -> other worker"] = await expect(salon_ws, "notification")
+    await admin_ws.send(json.dumps({"message_text": "pong from worker 2"}))
+    results["reply -> origin worker"] = await expect(
+        user_ws, "message", lambda m: m["message"]["message_text"] == "pong from worker 2"
+    )
+    for ws in (user_ws, salon_ws, admin_ws):
+        await ws.close()
+    return results
+
+
+async def run(mode: str, ids) -> bool:
+    broker = None
+    pubsub_url = None
+    if mode == "redis":
+        broker = RespBroker()
+        pubsub_url = f"redis://127.0.0.1:{await broker.start()}/0"
+    workers = start_workers(pubsub_url)
+    try:
+        deadline = clock.monotonic() + 60
+        for port, _ in workers:
+            await wait_ready(port, deadline)
+        results = await scenario([port for port, _ in workers], ids)
+    finally:
+        for _, proc in workers:
+            proc.terminate()
+        for _, proc in workers:
+            # Broker shu event loop'da: kutish paytida ham javob bera olishi kerak
+            await asyncio.to_thread(proc.wait, 10)
+        if broker is not None:
+            await broker.stop()
+    print(f"[{mode}] workers: {WORKERS}" + (f", broker publishes: {broker.published}" if broker else ""))
+    for name, delivered in results.items():
+        print(f"  {name:<42} {'ok' if delivered else 'MISSED'}")
+    return all(results.values())
+
+
+def main():
+    modes = sys.argv[1:] or ["memory", "redis"]
+    ids = seed()
+    outcome = {mode: asyncio.run(run(mode, ids)) for mode in modes}
+    if "redis" in outcome and not outcome["redis"]:
+        sys.exit("cross-worker fan-out failed with the redis backend")
+
+
+if __name__ == "__main__":
+    main()
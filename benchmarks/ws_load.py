@@ -0,0 +1,348 @@
+"""
+Load test: minglab parallel /api/ws/chat ulanishlari lokal ishlayotgan ilovaga.
+
+Bazaga CHATS ta user_employee chat (user + xodim) yoziladi; har chatga ikkita
+socket ulanadi — user (receiver_type=employee) va xodim (receiver_type=user).
+--workers > 1 bo'lsa har worker alohida uvicorn process, pub/sub —
+benchmarks.resp_broker; chatning ikki tomoni turli workerlarga ulanadi.
+Ulanishlardan keyin --duration soniya davomida jami --rate event/s tezlikda
+tasodifiy socketlardan xabar, mark_read va history yuboriladi.
+
+Hisobot:
+  connect  — ulanishdan birinchi "history" kelguncha (p50/p95/p99/max);
+  fan-out  — xabar yuborilgandan qarshi tomon "message" olguncha;
+  ack      — xabar bazaga yozilgani ("ack") kelguncha;
+  read / history — mark_read va history so'rovlariga javob;
+  messages/s — yuborilgan va qarshi tomonga yetkazilgan;
+  memory   — server RSS (hamma worker) ulanishlardan oldin va keyin, ulanish boshiga KB.
+Mijoz va server bitta mashinada: kichik CPU'da latency mijoz yukini ham o'z ichiga oladi.
+
+Ishga tushirish:
+    python -m benchmarks.ws_load
+    python -m benchmarks.ws_load --connections 4000 --rate 500 --duration 60
+    python -m benchmarks.ws_load --workers 4 --mark-read 0.2 --history 0.1
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.ws_load
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time as clock
+import uuid
+from collections import Counter, deque
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_URL = os.environ.get("BENCH_DATABASE_URL") or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'load.db')}"
+os.environ["DATABASE_URL"] = DB_URL
+
+import websockets  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app.auth.jwt_utils import JWTUtils  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models.employee import Employee  # noqa: E402
+from app.models.salon import Salon  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.models.user_chat import UserChat  # noqa: E402
+from benchmarks.resp_broker import RespBroker  # noqa: E402
+from benchmarks.ws_fanout_check import free_port, wait_ready  # noqa: E402
+
+CONNECT_TIMEOUT = 30.0
+DRAIN = 3.0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="WebSocket chat load test")
+    parser.add_argument("--connections", type=int, default=1000, help="socketlar soni (har chatga 2 ta)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn processlar soni")
+    parser.add_argument("--rate", type=float, default=200.0, help="jami event/s (xabar + mark_read + history)")
+    parser.add_argument("--duration", type=float, default=20.0, help="trafik davomiyligi, soniya")
+    parser.add_argument("--mark-read", type=float, default=0.1, help="eventlar ichida mark_read ulushi")
+    parser.add_argument("--history", type=float, default=0.1, help="eventlar ichida history ulushi")
+    parser.add_argument("--ramp", type=float, default=500.0, help="ulanish/s")
+    return parser.parse_args()
+
+
+def raise_fd_limit() -> int:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        # Server processlari ham shu chegarani meros oladi
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+def seed(chats: int) -> list:
+    """(user_id, employee_id) juftlari; phone/email takrorlanmasligi uchun har ishga tushirishda yangi prefiks"""
+    for table in Base.metadata.sorted_tables:
+        try:
+            table.create(engine, checkfirst=True)
+        except Exception:
+            # SQLite'da yaratib bo'lmaydigan jadvallar chat uchun kerak emas
+            pass
+    run = uuid.uuid4().hex[:6]
+    db = SessionLocal()
+    salon = Salon(salon_name=f"Load salon {run}")
+    db.add(salon)
+    db.flush()
+    users = [{"id": str(uuid.uuid4()), "phone": f"L{run}u{i:07d}", "full_name": f"Load user {i}", "password_hash": "x"} for i in range(chats)]
+    employees = [
+        {
+            "id": str(uuid.uuid4()), "salon_id": salon.id, "name": f"Load employee {i}",
+            "phone": f"L{run}e{i:07d}", "email": f"load-{run}-{i}@bench.local",
+            "username": f"load_{run}_{i}", "employee_password": "x", "is_active": True,
+        }
+        for i in range(chats)
+    ]
+    pairs = [(u["id"], e["id"]) for u, e in zip(users, employees)]
+    db.execute(insert(User.__table__), users)
+    db.execute(insert(Employee.__table__), employees)
+    db.execute(insert(UserChat.__table__), [
+        {"id": str(uuid.uuid4()), "user_id": user_id, "employee_id": employee_id, "chat_type": "user_employee", "message_count": 0}
+        for user_id, employee_id in pairs
+    ])
+    db.commit()
+    db.close()
+    return pairs
+
+
+def start_workers(count: int, pubsub_url):
+    env = dict(os.environ, DATABASE_URL=DB_URL)
+    env.pop("CHAT_PUBSUB_URL", None)
+    if pubsub_url:
+        env["CHAT_PUBSUB_URL"] = pubsub_url
+    workers = []
+    for _ in range(count):
+        port = free_port()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        workers.append((port, proc))
+    return workers
+
+
+def rss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def percentiles(samples) -> str:
+    if not samples:
+        return f"{'-':>8} {'-':>8} {'-':>8} {'-':>8} {0:>8}"
+    ordered = sorted(samples)
+
+    def at(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return f"{at(0.50):>8.1f} {at(0.95):>8.1f} {at(0.99):>8.1f} {ordered[-1] * 1000:>8.1f} {len(ordered):>8}"
+
+
+class Stats:
+    def __init__(self):
+        self.connect = []
+        self.fanout = []
+        self.ack = []
+        self.read = []
+        self.history = []
+        self.sent = Counter()
+        self.delivered = 0
+        self.errors = Counter()
+        self.closes = Counter()
+        # xabar tokeni -> yuborilgan vaqt (fan-out va ack uchun)
+        self.pending = {}
+
+
+class Client:
+    def __init__(self, port: int, me: str, role: str, peer: str, peer_type: str, stats: Stats):
+        token = JWTUtils.create_access_token({"id": me, "role": role})
+        self.url = f"ws://127.0.0.1:{port}/api/ws/chat?token={token}&receiver_type={peer_type}&receiver_id={peer}"
+        self.me = me
+        self.stats = stats
+        self.ws = None
+        self.reader = None
+        self.refs = 0
+        self.reads = deque()
+        self.histories = deque()
+
+    async def connect(self) -> bool:
+        started = clock.perf_counter()
+        try:
+            self.ws = await asyncio.wait_for(websockets.connect(self.url, max_queue=None, open_timeout=None), CONNECT_TIMEOUT)
+            while True:
+                event = json.loads(await asyncio.wait_for(self.ws.recv(), CONNECT_TIMEOUT))
+                if event.get("event") == "history":
+                    break
+        except Exception as exc:
+            self.stats.errors[f"connect: {type(exc).__name__}"] += 1
+            if self.ws is not None:
+                await self.ws.close()
+                self.ws = None
+            return False
+        self.stats.connect.append(clock.perf_counter() - started)
+        self.reader = asyncio.create_task(self.read())
+        return True
+
+    async def read(self) -> None:
+        stats = self.stats
+        try:
+            async for raw in self.ws:
+                now = clock.perf_counter()
+                event = json.loads(raw)
+                kind = event.get("event")
+                if kind == "message":
+                    message = event["message"]
+                    if message["sender_id"] != self.me:
+                        sent_at = stats.pending.get(message["message_text"], (None,))[0]
+                        if sent_at is not None:
+                            stats.fanout.append(now - sent_at)
+                            stats.delivered += 1
+                elif kind == "ack":
+                    entry = stats.pending.get(event.get("ref"))
+                    if entry:
+                        stats.ack.append(now - entry[0])
+                elif kind == "read" and event.get("by_user_id") == self.me and self.reads:
+                    stats.read.append(now - self.reads.popleft())
+                elif kind == "history" and self.histories:
+                    stats.history.append(now - self.histories.popleft())
+                elif kind == "ping":
+                    await self.ws.send(json.dumps({"event": "pong"}))
+                elif kind == "error":
+                    stats.errors[f"server: {event.get('code')}"] += 1
+        except websockets.ConnectionClosed:
+            pass
+        code = self.ws.close_code
+        if code not in (None, 1000):
+            stats.closes[code] += 1
+
+    async def message(self) -> None:
+        self.refs += 1
+        token = f"{self.me[:8]}-{self.refs}"
+        sent_at = clock.perf_counter()
+        # Matn ham, ref ham token: fan-out "message" ni, ack esa ref ni qaytaradi
+        self.stats.pending[token] = (sent_at,)
+        await self.ws.send(json.dumps({"message_text": token, "ref": token}))
+        self.stats.sent["message"] += 1
+
+    async def mark_read(self) -> None:
+        self.reads.append(clock.perf_counter())
+        await self.ws.send(json.dumps({"event": "mark_read"}))
+        self.stats.sent["mark_read"] += 1
+
+    async def history(self) -> None:
+        self.histories.append(clock.perf_counter())
+        await self.ws.send(json.dumps({"event": "history", "limit": 20}))
+        self.stats.sent["history"] += 1
+
+    async def close(self) -> None:
+        if self.ws is not None:
+            await self.ws.close()
+            await asyncio.gather(self.reader, return_exceptions=True)
+
+
+async def connect_all(clients, ramp: float):
+    begin = clock.perf_counter()
+    tasks = []
+    for i, client in enumerate(clients):
+        delay = begin + i / ramp - clock.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(client.connect()))
+    results = await asyncio.gather(*tasks)
+    return [c for c, ok in zip(clients, results) if ok], clock.perf_counter() - begin
+
+
+async def drive(clients, args, stats: Stats) -> float:
+    rng = random.Random(47)
+    actions = (
+        (args.mark_read, Client.mark_read),
+        (args.mark_read + args.history, Client.history),
+    )
+    begin = clock.perf_counter()
+    total = int(args.rate * args.duration)
+    for i in range(total):
+        delay = begin + i / args.rate - clock.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        client = rng.choice(clients)
+        roll = rng.random()
+        action = next((fn for share, fn in actions if roll < share), Client.message)
+        try:
+            await action(client)
+        except websockets.ConnectionClosed:
+            stats.errors["send: closed"] += 1
+    return clock.perf_counter() - begin
+
+
+async def run(args) -> None:
+    chats = max(1, args.connections // 2)
+    pairs = seed(chats)
+    broker = None
+    pubsub_url = None
+    if args.workers > 1:
+        broker = RespBroker()
+        pubsub_url = f"redis://127.0.0.1:{await broker.start()}/0"
+    workers = start_workers(args.workers, pubsub_url)
+    stats = Stats()
+    clients = []
+    try:
+        deadline = clock.monotonic() + 60
+        for port, _ in workers:
+            await wait_ready(port, deadline)
+        ports = [port for port, _ in workers]
+        for i, (user_id, employee_id) in enumerate(pairs):
+            clients.append(Client(ports[(2 * i) % len(ports)], user_id, "user", employee_id, "employee", stats))
+            clients.append(Client(ports[(2 * i + 1) % len(ports)], employee_id, "employee", user_id, "user", stats))
+
+        rss_before = sum(rss_kb(proc.pid) for _, proc in workers)
+        connected, connect_s = await connect_all(clients, args.ramp)
+        await asyncio.sleep(1.0)
+        rss_after = sum(rss_kb(proc.pid) for _, proc in workers)
+        if not connected:
+            raise SystemExit("no connections succeeded")
+
+        elapsed = await drive(connected, args, stats)
+        await asyncio.sleep(DRAIN)
+        rss_load = sum(rss_kb(proc.pid) for _, proc in workers)
+        await asyncio.gather(*(client.close() for client in connected))
+    finally:
+        for _, proc in workers:
+            proc.terminate()
+        for _, proc in workers:
+            await asyncio.to_thread(proc.wait, 10)
+        if broker is not None:
+            await broker.stop()
+
+    messages = stats.sent["message"]
+    per_conn = (rss_after - rss_before) / len(connected)
+    print(f"backend: {engine.dialect.name}, workers: {args.workers}, connections: {len(connected)}/{len(clients)} "
+          f"in {connect_s:.1f}s, rate: {args.rate:.0f}/s for {args.duration:.0f}s")
+    print(f"{'latency ms':>10} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'samples':>8}")
+    for label, samples in (("connect", stats.connect), ("fan-out", stats.fanout), ("ack", stats.ack),
+                           ("read", stats.read), ("history", stats.history)):
+        print(f"{label:>10} {percentiles(samples)}")
+    print(f"sent: {dict(stats.sent)}; messages/s sent {messages / elapsed:.0f}, "
+          f"delivered {stats.delivered / elapsed:.0f} ({stats.delivered}/{messages})")
+    print(f"server RSS: {rss_before / 1024:.0f} MB idle, {rss_after / 1024:.0f} MB connected, "
+          f"{rss_load / 1024:.0f} MB after traffic; {per_conn:.1f} KB/connection")
+    if stats.errors or stats.closes:
+        print(f"errors: {dict(stats.errors)}; close codes: {dict(stats.closes)}")
+
+
+def main():
+    args = parse_args()
+    limit = raise_fd_limit()
+    if args.connections * 2 + 100 > limit:
+        raise SystemExit(f"open files limit {limit} is too low for {args.connections} connections")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark: bitta sekin mijoz xonadagi boshqalarga yetkazishni sekinlashtiradimi.
+
+Bitta xonada FAST ta tez socket va bitta sekin socket (har send SLOW_DELAY
+soniya). Xonaga MESSAGES ta broadcast yuboriladi va o'lchanadi:
+  "sender" — broadcast() chaqiruvlari qancha vaqt band qildi (yuboruvchining receive loop'i);
+  "fast"   — tez socketlar hamma xabarni qachon oldi.
+"sequential" — oldingi yo'l: har socketga ketma-ket await send_text;
+"queued"     — ConnectionManager: socket navbati + yozuvchi vazifa; navbat
+               (QUEUE ta) to'lganda sekin mijoz 1013 bilan uziladi.
+Tarmoq yo'q — soxta socketlar, faqat menejer mantig'i o'lchanadi.
+
+Ishga tushirish:
+    python -m benchmarks.ws_slow_consumer_bench
+"""
+import asyncio
+import json
+import time as clock
+
+from app.routers.ws_chat import ConnectionManager
+from app.services.pubsub import InProcessPubSub
+
+FAST = 50
+MESSAGES = 200
+SLOW_DELAY = 0.05
+QUEUE = 64
+
+
+class FakeSocket:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.received = 0
+        self.last_at = None
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, payload: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received += 1
+        self.last_at = clock.perf_counter()
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+
+async def sequential(fast, slow):
+    sockets = [slow, *fast]
+    begin = clock.perf_counter()
+    busy = 0.0
+    for i in range(MESSAGES):
+        started = clock.perf_counter()
+        payload = json.dumps({"event": "message", "n": i})
+        for ws in sockets:
+            await ws.send_text(payload)
+        busy += clock.perf_counter() - started
+    return begin, busy, None
+
+
+async def queued(fast, slow):
+    manager = ConnectionManager(pubsub=InProcessPubSub(), send_queue_size=QUEUE)
+    for ws in [slow, *fast]:
+        await manager.connect("room", ws)
+    begin = clock.perf_counter()
+    busy = 0.0
+    for i in range(MESSAGES):
+        started = clock.perf_counter()
+        await manager.broadcast("room", {"event": "message", "n": i})
+        busy += clock.perf_counter() - started
+        # Haqiqiy yuboruvchi ham xabarlar orasida event loop'ga qaytadi
+        await asyncio.sleep(0)
+    while any(ws.received < MESSAGES for ws in fast):
+        await asyncio.sleep(0.001)
+    await asyncio.sleep(0)
+    dropped = manager.dropped
+    await manager.close()
+    return begin, busy, dropped
+
+
+async def run(mode: str) -> None:
+    fast = [FakeSocket() for _ in range(FAST)]
+    slow = FakeSocket(SLOW_DELAY)
+    begin, busy, dropped = await (sequential if mode == "sequential" else queued)(fast, slow)
+    fast_done = max(ws.last_at for ws in fast) - begin
+    assert all(ws.received == MESSAGES for ws in fast), "fast client missed messages"
+    slow_state = f"closed {slow.closed_with}" if slow.closed_with else f"{slow.received} received"
+    print(f"{mode:>10} {busy * 1000:>10.1f} {fast_done * 1000:>10.1f}   {slow_state}")
+
+
+def main():
+    print(f"fast sockets: {FAST}, slow send: {SLOW_DELAY * 1000:.0f} ms, messages: {MESSAGES}, queue: {QUEUE}")
+    print(f"{'mode':>10} {'sender ms':>10} {'fast ms':>10}   slow client")
+    for mode in ("sequential", "queued"):
+        asyncio.run(run(mode))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark: WebSocket chat messages/second per worker, sync commit vs write-behind.
+
+Bitta uvicorn worker, CLIENTS ta user har biri o'z chatida salonga
+MESSAGES ta xabarni ketma-ket (javob kutmasdan) yuboradi.
+"delivered" — sender o'z xabarining broadcast'ini olguncha,
+"durable"   — hamma "ack" (bazaga yozildi) kelguncha.
+
+"sync"  — CHAT_WRITE_BEHIND=0: har xabar uchun event loop'da commit (oldingi yo'l);
+"batch" — CHAT_WRITE_BEHIND=1: navbat + batch yozuvchi.
+Oxirida bazadagi xabarlar, chat hisoblagichlari va salonning o'qilmaganlari tekshiriladi.
+
+Ishga tushirish:
+    python -m benchmarks.ws_write_bench
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.ws_write_bench
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time as clock
+
+CLIENTS = 10
+MESSAGES = 200
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_URL = os.environ.get("BENCH_DATABASE_URL") or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'write.db')}"
+os.environ["DATABASE_URL"] = DB_URL
+
+import websockets  # noqa: E402
+from sqlalchemy import func  # noqa: E402
+
+from app.auth.jwt_utils import JWTUtils  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models.message import Message  # noqa: E402
+from app.models.salon import Salon  # noqa: E402
+from app.models.unread_counter import UnreadTotal  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.models.user_chat import UserChat  # noqa: E402
+from benchmarks.ws_fanout_check import free_port, wait_ready  # noqa: E402
+
+TABLES = ["users", "salons", "user_chats", "messages", "chat_unread_counters", "unread_totals", "notifications"]
+
+
+def reset():
+    tables = [Base.metadata.tables[name] for name in TABLES]
+    Base.metadata.drop_all(engine, tables=tables)
+    Base.metadata.create_all(engine, tables=tables)
+    db = SessionLocal()
+    salon = Salon(salon_name="Bench salon")
+    users = [User(phone=f"99890{i:07d}", full_name=f"User {i}", password_hash="x") for i in range(CLIENTS)]
+    db.add_all([salon, *users])
+    db.commit()
+    ids = str(salon.id), [str(u.id) for u in users]
+    db.close()
+    return ids
+
+
+async def client(port: int, salon_id: str, user_id: str, started: dict, done: dict) -> None:
+    token = JWTUtils.create_access_token({"id": user_id, "role": "user"})
+    url = f"ws://127.0.0.1:{port}/api/ws/chat?token={token}&receiver_type=salon&receiver_id={salon_id}"
+    async with websockets.connect(url, max_queue=None) as ws:
+        while json.loads(await ws.recv())["event"] != "history":
+            pass
+        await started["barrier"].wait()
+        for i in range(MESSAGES):
+            await ws.send(json.dumps({"message_text": f"{user_id[:8]} #{i}", "ref": i}))
+        delivered = acked = 0
+        while acked < MESSAGES:
+            message = json.loads(await asyncio.wait_for(ws.recv(), 60))
+            if message["event"] == "message" and message["message"]["sender_id"] == user_id:
+                delivered += 1
+                if delivered == MESSAGES:
+                    done["delivered"].append(clock.perf_counter())
+            elif message["event"] == "ack":
+                acked += 1
+            elif message["event"] == "error":
+                raise RuntimeError(message)
+        done["durable"].append(clock.perf_counter())
+
+
+def check_db(salon_id: str) -> None:
+    db = SessionLocal()
+    total = CLIENTS * MESSAGES
+    assert db.query(func.count(Message.id)).scalar() == total, "messages lost"
+    assert db.query(func.sum(UserChat.message_count)).scalar() == total, "message_count drift"
+    unread = db.query(UnreadTotal.count).filter(UnreadTotal.receiver_id == salon_id).scalar()
+    assert unread == total, f"salon unread {unread} != {total}"
+    db.close()
+
+
+async def run(mode: str) -> None:
+    salon_id, user_ids = reset()
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=DB_URL, CHAT_WRITE_BEHIND="1" if mode == "batch" else "0")
+    env.pop("CHAT_PUBSUB_URL", None)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        await wait_ready(port, clock.monotonic() + 60)
+        started = {"barrier": asyncio.Event()}
+        done = {"delivered": [], "durable": []}
+        tasks = [asyncio.create_task(client(port, salon_id, uid, started, done)) for uid in user_ids]
+        await asyncio.sleep(1.0)
+        begin = clock.perf_counter()
+        started["barrier"].set()
+        await asyncio.gather(*tasks)
+    finally:
+        proc.terminate()
+        await asyncio.to_thread(proc.wait, 10)
+    check_db(salon_id)
+    total = CLIENTS * MESSAGES
+    delivered = total / (max(done["delivered"]) - begin)
+    durable = total / (max(done["durable"]) - begin)
+    print(f"{mode:>6} {total:>8} {delivered:>12.0f} {durable:>10.0f}")
+
+
+def main():
+    modes = sys.argv[1:] or ["sync", "batch"]
+    print(f"backend: {engine.dialect.name}, clients: {CLIENTS}, messages/client: {MESSAGES}, workers: 1")
+    print(f"{'mode':>6} {'messages':>8} {'delivered/s':>12} {'durable/s':>10}")
+    for mode in modes:
+        asyncio.run(run(mode))
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,11 @@ from contextlib import asynccontextmanager
 import os
 from dotenv import load_dotenv
 
-from app.database import engine, Base
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+
+from app.database import engine, Base, SessionLocal
 from app.routers import auth_router, admin_router
 from app.routers.photos import router as photos_router
 # from app.routers.payment import router as payment_router
@@ -36,6 +40,12 @@ from app.routers.mobile_noitf import router as mobile_notifications_router
 from app.routers.history import router as history_router
 from app.routers.click import router as click_router
 from app.routers.ws_chat import router as ws_chat_router
+from app.services.booking_payments import expire_stale_booking_payments
+from app.services.job_lock import single_run
+from app.services.message_archive import archive_messages
+from app.services.notif_subscriptions import SUBSCRIPTIONS_CHANNEL, notif_subscriptions
+from app.services.notifications import notification_service
+from app.config import settings
 
 
 
@@ -60,7 +70,83 @@ async def lifespan(app: FastAPI):
         # Avoid breaking startup if admin creation fails
         pass
 
+    # Bildirishnomalar fon navbati (handlerlar faqat notify() chaqiradi)
+    notification_service.start()
+    # Notif obunalari xotirada; boshqa workerlardagi subscribe/unsubscribe pub/sub orqali keladi
+    try:
+        from app.routers.ws_chat import manager
+        print(f"[Startup] Loaded {notif_subscriptions.reload(SessionLocal)} notification subscriber(s)")
+        await manager.listen(SUBSCRIPTIONS_CHANNEL, notif_subscriptions.apply)
+    except Exception as e:
+        print(f"[Startup] Notification subscriptions not preloaded: {e}")
+
+    # APScheduler: muddati o'tgan payment_pending appointmentlarni bekor qilish (slotni bo'shatish)
+    try:
+        scheduler = BackgroundScheduler(timezone="UTC")
+
+        # Har bir uvicorn worker'da scheduler bor: job'ni faqat lock olgan worker bajaradi
+        def _expire_booking_payments_job():
+            with single_run(engine, "expire_booking_payments") as acquired:
+                if not acquired:
+                    return
+                db = SessionLocal()
+                try:
+                    count = expire_stale_booking_payments(db)
+                    if count:
+                        print(f"[Scheduler] Cancelled {count} unpaid booking(s)")
+                finally:
+                    db.close()
+
+        scheduler.add_job(_expire_booking_payments_job, IntervalTrigger(minutes=1))
+
+        # Oylik rollover: eski o'qilgan chat xabarlari messages_archive ga (batch bilan)
+        def _archive_messages_job():
+            with single_run(engine, "archive_messages") as acquired:
+                if not acquired:
+                    return
+                db = SessionLocal()
+                try:
+                    count = archive_messages(db, settings.chat_archive_after_days)
+                    if count:
+                        print(f"[Scheduler] Archived {count} chat message(s)")
+                except Exception as e:
+                    print(f"[Scheduler] Chat archive failed: {e}")
+                finally:
+                    db.close()
+
+        # Pub/sub uzilishida o'tkazib yuborilgan obuna o'zgarishlarini tuzatish
+        def _reload_notif_subscriptions_job():
+            try:
+                notif_subscriptions.reload(SessionLocal)
+            except Exception as e:
+                print(f"[Scheduler] Notification subscriptions reload failed: {e}")
+
+        scheduler.add_job(_reload_notif_subscriptions_job, IntervalTrigger(minutes=10))
+
+        if settings.chat_archive_after_days > 0:
+            scheduler.add_job(_archive_messages_job, CronTrigger(day=1, hour=2))
+        scheduler.start()
+        app.state.scheduler = scheduler
+    except Exception as e:
+        print(f"[Startup] Failed to start APScheduler: {e}")
     yield
+    # Shutdown
+    try:
+        sched = getattr(app.state, "scheduler", None)
+        if sched:
+            sched.shutdown(wait=False)
+    except Exception:
+        pass
+    # WS xabarlar navbati va pub/sub ulanishlarini yopish
+    try:
+        from app.routers.ws_chat import manager, message_writer
+        # Navbatdagi xabarlar avval yoziladi (ack/notification'lar manager orqali)
+        await message_writer.close()
+        # Chat xabarlaridan tushgan bildirishnomalar ham yozilib, socketlarga yuboriladi
+        await notification_service.close()
+        await manager.close()
+    except Exception:
+        pass
 
 
 app = FastAPI(